@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Basket checkout latency vs one /api/sale per item, by basket size.
+
+For each basket size, times what N separate ``/api/sale`` requests do in the
+database (``fetch_event``, ``fetch_product`` and ``record_sale`` per item)
+against a single ``db.checkout`` call. Uses a scratch event and category:
+
+    DATABASE_URL=postgresql://... python3 App/benchmarks/bench_checkout.py --sizes 1 5 20 50
+"""
+import argparse
+import secrets
+import statistics
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+
+
+def median_ms(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def basket_lines(category: str, size: int) -> list:
+    return [
+        {
+            'category': category,
+            'product_folder': f'GT-BEN-{index % 10:05d} - Item',
+            'sku': '',
+            'color': 'Red',
+            'size': '',
+            'quantity': 1,
+            'unit_price': None,
+            'override_price': '',
+        }
+        for index in range(size)
+    ]
+
+
+def per_item(event_id: int, lines: list):
+    for line in lines:
+        db.fetch_event(event_id)
+        product = db.fetch_product(line['category'], line['product_folder'])
+        db.record_sale({
+            **line,
+            'event_id': event_id,
+            'product_id': product['id'],
+            'sku': product['sku'],
+            'unit_price': Decimal('5.00'),
+            'payment_method': 'Card',
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 5, 20, 50])
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+
+    db.ensure_schema()
+    category = f'_bench-checkout-{secrets.token_hex(3)}'
+    for index in range(10):
+        db.insert_product({
+            'category': category, 'product_folder': f'GT-BEN-{index:05d} - Item',
+            'sku': f'GT-BEN-{index:05d}', 'sale_price': '5.00',
+        })
+    event_id = db.insert_event({'name': '_bench-checkout', 'event_date': '2026-07-04'})['id']
+    try:
+        for size in args.sizes:
+            lines = basket_lines(category, size)
+            separate_ms = median_ms(lambda: per_item(event_id, lines), args.repeat)
+            basket_ms = median_ms(
+                lambda: db.checkout({'event_id': event_id, 'payment_method': 'Card', 'lines': lines,
+                                     'discount_pct': Decimal('10')}),
+                args.repeat,
+            )
+            print(f'{size:>3} items   one sale per item {separate_ms:7.1f} ms   checkout {basket_ms:6.1f} ms')
+    finally:
+        db.delete_event(event_id)
+        with db.get_connection() as conn:
+            conn.execute('DELETE FROM products WHERE category = %s', (category,))
+            conn.execute('DELETE FROM stock WHERE category = %s', (category,))
+            conn.execute('DELETE FROM production_queue WHERE category = %s', (category,))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Event totals: fetch every sale and sum in Python vs one SQL aggregation.
+
+Creates a scratch event with N sales (some with override prices), then times
+``calculate_event_totals(db.fetch_sales(...))`` against
+``db.fetch_event_totals`` (which also returns SKU and hourly breakdowns).
+Needs a scratch database:
+
+    DATABASE_URL=postgresql://... python3 App/benchmarks/bench_event_totals.py --sales 1000 50000
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+from server import calculate_event_totals  # noqa: E402
+
+
+def seed(event_id: int, count: int):
+    with db.get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO sales (event_id, sku, quantity, unit_price, override_price, payment_method, sold_at)
+            SELECT %(event_id)s, 'GT-BEN-' || lpad((g %% 300)::text, 5, '0'), 1 + g %% 3,
+                   5 + (g %% 20) / 4.0,
+                   CASE WHEN g %% 10 = 0 THEN '4.00' ELSE '' END,
+                   (ARRAY['Cash', 'Card', ''])[1 + g %% 3],
+                   '2026-03-07 09:00+00'::timestamptz + (g %% 480) * interval '1 minute'
+            FROM generate_series(1, %(count)s) AS g
+            """,
+            {'event_id': event_id, 'count': count},
+        )
+        conn.execute('ANALYZE sales')
+
+
+def median_ms(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sales', type=int, nargs='+', default=[1000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db.ensure_schema()
+    for count in args.sales:
+        event = db.insert_event({'name': '_bench-event-totals', 'event_date': '2026-03-07'})
+        try:
+            seed(event['id'], count)
+            python_ms = median_ms(lambda: calculate_event_totals(db.fetch_sales(event['id'])), args.repeat)
+            sql_ms = median_ms(lambda: db.fetch_event_totals(event['id']), args.repeat)
+            print(f'{count:>7} sales  python {python_ms:8.1f} ms   sql {sql_ms:8.1f} ms')
+        finally:
+            db.delete_event(event['id'])
+
+
+if __name__ == '__main__':
+    main()
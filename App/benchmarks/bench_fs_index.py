@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Product folder listings: walking the tree per request vs the cached index.
+
+Builds N scratch product folders (Media, STL, MISC, UKCA with a few files
+each) and times what /api/media, /api/3mf and collect_sku_renames did per
+request (``iterdir`` / ``rglob`` plus a stat per entry) against
+``fs_index`` listings, both within the check interval and revalidated by
+directory mtimes. No database is needed:
+
+    python3 App/benchmarks/bench_fs_index.py --products 500 --files 40
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fs_index  # noqa: E402
+
+
+def median_ms(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def build(root: Path, products: int, files: int) -> list[Path]:
+    folders = []
+    for index in range(products):
+        folder = root / f'GT-BEN-{index:05d} - Item'
+        for sub in ('Media', 'STL', 'MISC', 'UKCA/Declarations'):
+            (folder / sub).mkdir(parents=True)
+        for number in range(files):
+            sub, ext = [('Media', '.jpg'), ('STL', '.3mf'), ('MISC', '.txt')][number % 3]
+            (folder / sub / f'GT-BEN-{index:05d}-{number:02d}{ext}').write_bytes(b'x' * 64)
+        (folder / 'UKCA' / 'README.md').write_text('# UKCA')
+        folders.append(folder)
+    stamp = time.time() - 60
+    for path in root.rglob('*'):
+        if path.is_dir():
+            os.utime(path, (stamp, stamp))
+    return folders
+
+
+def walk(folder: Path):
+    media = [entry.stat().st_size for entry in sorted((folder / 'Media').iterdir()) if entry.is_file()]
+    models = [entry for entry in sorted(folder.rglob('*')) if entry.is_file() and entry.suffix.lower() == '.3mf']
+    renames = [path for path in folder.rglob('*') if path.is_file() and '_Deleted' not in path.parts]
+    return media, models, renames
+
+
+def cached(index: fs_index.FsIndex, folder: Path, fresh: bool):
+    listing = index.listing(folder, fresh)
+    return listing.in_dir('Media'), listing.with_kind('3mf'), listing.files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--files', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        folders = build(Path(tmp), args.products, args.files)
+        index = fs_index.FsIndex(max_products=args.products, check_seconds=3600)
+        walk_ms = median_ms(lambda: [walk(folder) for folder in folders], args.repeat)
+        cold_ms = median_ms(lambda: (index.clear(), [cached(index, folder, False) for folder in folders]), args.repeat)
+        [cached(index, folder, False) for folder in folders]
+        warm_ms = median_ms(lambda: [cached(index, folder, False) for folder in folders], args.repeat)
+        fresh_ms = median_ms(lambda: [cached(index, folder, True) for folder in folders], args.repeat)
+        per = 1000 / args.products
+        print(f'{args.products} products x {args.files} files, per product:')
+        print(f'  walk {walk_ms * per:7.1f} us   cold scan {cold_ms * per:7.1f} us   '
+              f'revalidate {fresh_ms * per:6.1f} us   cached {warm_ms * per:5.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Bytes on the wire and encode time for the /api/rows payload.
+
+Builds synthetic product rows shaped like ``db.fetch_products()`` and times
+``json.dumps`` plus compression for each representation (row objects vs
+``?format=columns``) and encoding (identity, gzip, brotli if installed).
+No database needed:
+
+    python3 App/benchmarks/bench_json.py --rows 1000 10000 100000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+import server  # noqa: E402
+
+
+def make_rows(count: int) -> list[dict]:
+    rows = []
+    for index in range(count):
+        sku = f'GT-TOY-{index:05d}'
+        rows.append({
+            'id': index + 1,
+            'category': 'Toys & Games',
+            'product_folder': f'{sku} - Articulated Dragon {index}',
+            'sku': sku,
+            'UKCA': 'Yes' if index % 3 else 'No',
+            'Listings': 'Etsy, eBay',
+            'tags': 'dragon, flexi, fidget, gift',
+            'TikTok URL': '',
+            'Ebay URL': f'https://www.ebay.co.uk/itm/{100000000 + index}',
+            'Etsy URL': f'https://www.etsy.com/listing/{200000000 + index}',
+            'Status': 'Live',
+            'Completed': 'Yes',
+            'Colors': 'Red, Blue, Silk Gold',
+            'Sizes': 'Small, Large',
+            'Cost To Make': f'{1 + index % 7}.25',
+            'Sale Price': f'{8 + index % 5}.00',
+            'Postage Price': '3.20',
+        })
+    return rows
+
+
+def measure(payload, encoding: str | None, repeat: int) -> tuple[int, float]:
+    best = None
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        data = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        data = server.compress_body(data, encoding)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        size = len(data)
+    return size, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    encodings = [None, 'gzip'] + (['br'] if server.brotli else [])
+    print(f'{"rows":>7} {"format":<8} {"encoding":<9} {"bytes":>12} {"ms":>9}')
+    for count in args.rows:
+        rows = make_rows(count)
+        legacy = json.dumps({'headers': db.PRODUCT_HEADERS, 'rows': rows}).encode('utf-8')
+        print(f'{count:>7} {"objects":<8} {"(before)":<9} {len(legacy):>12}')
+        payloads = {
+            'objects': {'headers': db.PRODUCT_HEADERS, 'rows': rows},
+            'columns': server.columnar(rows, db.PRODUCT_HEADERS),
+        }
+        for name, payload in payloads.items():
+            for encoding in encodings:
+                size, seconds = measure(payload, encoding, args.repeat)
+                print(f'{count:>7} {name:<8} {encoding or "identity":<9} {size:>12} {seconds * 1000:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Quick-sale lookup latency against a synthetic catalogue.
+
+Compares a linear scan over every product (what filtering the full product
+list does) with ``lookup_index.LookupIndex`` for exact SKU, SKU prefix and
+name queries, and reports the bulk load and single-row delta costs:
+
+    python3 App/benchmarks/bench_lookup.py --skus 10000 100000
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import lookup_index  # noqa: E402
+
+WORDS = [
+    'dragon', 'planter', 'egg', 'cat', 'skull', 'lamp', 'vase', 'dice', 'tower', 'owl',
+    'fox', 'bowl', 'tray', 'hook', 'stand', 'box', 'frog', 'moon', 'star', 'gear',
+]
+COLORS = ['Black', 'White', 'Red', 'Green', 'Blue']
+
+
+def synthetic_changes(count: int, seed: int = 1) -> dict:
+    rng = random.Random(seed)
+    products = []
+    stock = []
+    for product_id in range(1, count + 1):
+        category = f'Category {product_id % 40}'
+        folder = f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {product_id}'
+        products.append({
+            'id': product_id,
+            'category': category,
+            'product_folder': folder,
+            'sku': f'SKU-{product_id:06d}',
+            'tags': ', '.join(rng.sample(WORDS, 2)),
+        })
+        for offset, color in enumerate(rng.sample(COLORS, 2)):
+            stock.append({
+                'id': product_id * 10 + offset,
+                'category': category,
+                'product_folder': folder,
+                'sku': '',
+                'color': color,
+                'size': 'M',
+                'quantity': rng.randint(0, 20),
+            })
+    return {'cursor': 1, 'products': products, 'stock': stock, 'deleted': {'products': [], 'stock': []}}
+
+
+def linear_search(products: list[dict], query: str, limit: int = 10) -> list[dict]:
+    needle = query.lower()
+    matches = []
+    for product in products:
+        haystack = f"{product['sku']} {product['product_folder']} {product['tags']}".lower()
+        if needle in haystack:
+            matches.append(product)
+            if len(matches) >= limit:
+                break
+    return matches
+
+
+def median_us(func, queries: list[str]) -> float:
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        func(query)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--skus', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f'{"skus":>7} {"query":<11} {"scan us":>9} {"index us":>9}')
+    for count in args.skus:
+        changes = synthetic_changes(count)
+        index = lookup_index.LookupIndex()
+        start = time.perf_counter()
+        index.load(changes)
+        load_ms = (time.perf_counter() - start) * 1000
+        rng = random.Random(2)
+        ids = [rng.randint(1, count) for _ in range(args.queries)]
+        query_sets = {
+            'exact_sku': [f'SKU-{product_id:06d}' for product_id in ids],
+            'sku_prefix': [f'SKU-{product_id:06d}'[:-2] for product_id in ids],
+            'name': [f'{rng.choice(WORDS)} {rng.choice(WORDS)[:3]}' for _ in ids],
+        }
+        for name, queries in query_sets.items():
+            scan = median_us(lambda q: linear_search(changes['products'], q), queries)
+            indexed = median_us(index.search, queries)
+            print(f'{count:>7} {name:<11} {scan:>9.1f} {indexed:>9.1f}')
+
+        renamed = dict(changes['products'][count // 2], product_folder='Renamed Item', sku='SKU-RENAMED')
+        delta = {'cursor': 2, 'products': [renamed], 'stock': [], 'deleted': {'products': [], 'stock': []}}
+        start = time.perf_counter()
+        index.apply(delta)
+        apply_ms = (time.perf_counter() - start) * 1000
+        print(f'{count:>7} load {load_ms:.0f} ms, one-row delta {apply_ms:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
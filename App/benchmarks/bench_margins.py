@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Margin report: fetch every product and parse prices in Python vs SQL.
+
+Seeds scratch categories with N priced products, then times the Python path
+(``fetch_products`` + ``parse_price`` per row + per-category rollup) against
+``db.fetch_margins`` (rollups plus the 500 lowest-margin products). Needs a
+scratch database:
+
+    DATABASE_URL=postgresql://... python3 App/benchmarks/bench_margins.py --products 100000
+"""
+import argparse
+import secrets
+import statistics
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+from server import parse_price  # noqa: E402
+
+
+def seed(prefix: str, count: int):
+    with db.get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO products (category, product_folder, cost_to_make, sale_price, postage_price, status)
+            SELECT %(prefix)s || (g %% 25), 'Item ' || g,
+                   to_char(1 + (g %% 700) / 100.0, 'FM990.00'),
+                   to_char(5 + (g %% 2500) / 100.0, 'FM990.00'),
+                   CASE WHEN g %% 3 = 0 THEN '' ELSE '2.97' END,
+                   (ARRAY['Live', 'Draft'])[1 + g %% 2]
+            FROM generate_series(1, %(count)s) AS g
+            """,
+            {'prefix': prefix, 'count': count},
+        )
+        conn.execute('ANALYZE products')
+
+
+def python_report(prefix: str) -> int:
+    groups = {}
+    for row in db.fetch_products():
+        if not row['category'].startswith(prefix):
+            continue
+        price = parse_price(row['Sale Price'])
+        cost = parse_price(row['Cost To Make'])
+        if price is None or cost is None:
+            continue
+        totals = groups.setdefault(row['category'], [Decimal('0'), Decimal('0')])
+        totals[0] += price - cost
+        totals[1] += price
+    return len(groups)
+
+
+def sql_report(prefix: str) -> int:
+    result = db.fetch_margins(sort='margin', limit=500)
+    return sum(1 for row in result['groups']['category'] if row['category'].startswith(prefix))
+
+
+def median_ms(func, prefix: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(prefix)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db.ensure_schema()
+    prefix = f'_bench-margins-{secrets.token_hex(3)}-'
+    seed(prefix, args.products)
+    try:
+        print(f'python (fetch + parse_price): {median_ms(python_report, prefix, args.repeat):8.1f} ms')
+        print(f'sql (db.fetch_margins):       {median_ms(sql_report, prefix, args.repeat):8.1f} ms')
+    finally:
+        with db.get_connection() as conn:
+            conn.execute('DELETE FROM products WHERE category LIKE %s', (prefix + '%',))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Compare the streaming multipart parser with the old email-based one.
+
+Writes a multi-file multipart body to a temp file, then parses it in a fresh
+subprocess per parser so peak RSS (ru_maxrss) is measured in isolation:
+
+    python3 App/benchmarks/bench_multipart.py --files 4 --file-mb 25
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from email import message_from_bytes
+from email.policy import default
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import multipart_stream  # noqa: E402
+
+BOUNDARY = 'BenchBoundary7MA4YWxkTrZu0gW'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+
+
+def legacy_parse(content_type: str, body: bytes):
+    """The pre-streaming ``parse_multipart_form_data``."""
+    message = message_from_bytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body,
+        policy=default,
+    )
+    fields = {}
+    files = []
+    for part in message.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        filename = part.get_filename()
+        if filename:
+            files.append({'name': name, 'filename': filename, 'content': part.get_payload(decode=True) or b''})
+        else:
+            fields[name] = part.get_content()
+    return fields, files
+
+
+def write_body(path: Path, files: int, file_mb: int):
+    chunk = os.urandom(1024 * 1024)
+    with path.open('wb') as f:
+        for name, value in (('category', 'Toys'), ('folder_name', 'Bench'), ('sku', 'GT-TOY-00001')):
+            f.write(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        for index in range(files):
+            f.write(
+                f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="clip-{index}.mp4"\r\n'
+                'Content-Type: video/mp4\r\n\r\n'.encode()
+            )
+            for _ in range(file_mb):
+                f.write(chunk)
+            f.write(b'\r\n')
+        f.write(f'--{BOUNDARY}--\r\n'.encode())
+
+
+def run_child(mode: str, body_path: Path, out_dir: Path) -> dict:
+    start = time.perf_counter()
+    length = body_path.stat().st_size
+    if mode == 'legacy':
+        body = body_path.read_bytes()
+        _, files = legacy_parse(CONTENT_TYPE, body)
+        for item in files:
+            (out_dir / item['filename']).write_bytes(item['content'])
+    else:
+        with body_path.open('rb') as stream:
+            _, files = multipart_stream.parse_stream(
+                stream, CONTENT_TYPE, length,
+                lambda fields, name, filename: multipart_stream.TempUpload(out_dir),
+            )
+        for item in files:
+            item['file'].commit(out_dir / item['filename'])
+    elapsed = time.perf_counter() - start
+    return {
+        'seconds': elapsed,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'files': len(files),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--file-mb', type=int, default=25)
+    parser.add_argument('--child', choices=('legacy', 'stream'), help=argparse.SUPPRESS)
+    parser.add_argument('--body', help=argparse.SUPPRESS)
+    parser.add_argument('--out', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, Path(args.body), Path(args.out))))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        body_path = tmp_path / 'body.bin'
+        write_body(body_path, args.files, args.file_mb)
+        size_mb = body_path.stat().st_size / (1024 * 1024)
+        print(f'{args.files} files, {size_mb:.1f} MB body')
+        print(f'{"parser":<8} {"seconds":>8} {"peak RSS MB":>12}')
+        for mode in ('legacy', 'stream'):
+            out_dir = tmp_path / mode
+            out_dir.mkdir()
+            result = subprocess.run(
+                [sys.executable, __file__, '--child', mode, '--body', str(body_path), '--out', str(out_dir)],
+                check=True, capture_output=True, text=True,
+            )
+            stats = json.loads(result.stdout)
+            print(f'{mode:<8} {stats["seconds"]:>8.2f} {stats["peak_rss_mb"]:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Per-page cost deep into a long sales history: OFFSET vs keyset cursors.
+
+Seeds one scratch event with N sales, then times fetching a page at several
+depths with ``LIMIT/OFFSET`` and by following ``db.fetch_page`` cursors
+(the per-page timing is taken at that depth). Needs a scratch database:
+
+    DATABASE_URL=postgresql://... python3 App/benchmarks/bench_pagination.py --sales 200000
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+
+
+def seed(count: int) -> int:
+    with db.get_connection() as conn:
+        event_id = conn.execute(
+            "INSERT INTO events (name, event_date) VALUES ('_bench-pagination', current_date) RETURNING id"
+        ).fetchone()[0]
+        conn.execute(
+            """
+            INSERT INTO sales (event_id, category, product_folder, sku, quantity, unit_price, payment_method, sold_at)
+            SELECT %s, 'Bench', 'Item ' || (g %% 500), 'GT-BEN-' || (g %% 500), 1, 5,
+                   (ARRAY['Cash', 'Card'])[1 + g %% 2], now() - g * interval '1 minute'
+            FROM generate_series(1, %s) AS g
+            """,
+            (event_id, count),
+        )
+        conn.execute('ANALYZE sales')
+    return event_id
+
+
+def offset_page(event_id: int, offset: int, limit: int) -> list:
+    with db.get_connection() as conn:
+        with conn.cursor(row_factory=db.dict_row) as cur:
+            cur.execute(
+                db.RECENT_SALES_SELECT + " WHERE s.event_id = %s ORDER BY s.sold_at DESC, s.id DESC LIMIT %s OFFSET %s",
+                (event_id, limit, offset),
+            )
+            return cur.fetchall()
+
+
+def timed_ms(func, repeat: int = 5) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sales', type=int, default=200000)
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    db.ensure_schema()
+    event_id = seed(args.sales)
+    filters = {'event_id': str(event_id)}
+    try:
+        depths = sorted({0, args.sales // 10, args.sales // 2, args.sales - args.limit * 2})
+        print(f'{"page at row":>12} {"offset ms":>10} {"keyset ms":>10}')
+        for depth in depths:
+            # Reach the cursor for this depth through the page just before it.
+            cursor = None
+            if depth:
+                before = offset_page(event_id, depth - 1, 1)[0]
+                cursor = db.encode_page_cursor('sold_at', True, [before['sold_at'], before['id']])
+            offset_ms = timed_ms(lambda: offset_page(event_id, depth, args.limit))
+            keyset_ms = timed_ms(lambda: db.fetch_page('sales', filters, cursor=cursor, limit=args.limit))
+            print(f'{depth:>12} {offset_ms:>10.2f} {keyset_ms:>10.2f}')
+    finally:
+        with db.get_connection() as conn:
+            conn.execute('DELETE FROM events WHERE id = %s', (event_id,))
+
+
+if __name__ == '__main__':
+    main()
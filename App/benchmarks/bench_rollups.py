@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Dashboard reads from sales rollups vs scanning sales, plus write overhead.
+
+Seeds N sales over scratch events, then times the event league, best sellers
+and revenue by month computed by grouping ``sales`` against the rollup-backed
+``db`` helpers, and single-sale INSERT latency with the rollup triggers on
+and off. Needs a scratch database (the triggers are briefly disabled):
+
+    DATABASE_URL=postgresql://... python3 App/benchmarks/bench_rollups.py --sales 200000
+"""
+import argparse
+import secrets
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+
+SCAN_QUERIES = {
+    'event league': """
+        SELECT event_id, count(*), sum(quantity), sum(line_total) FROM sales
+        GROUP BY event_id ORDER BY sum(line_total) DESC LIMIT 50
+    """,
+    'best sellers': """
+        SELECT category, product_folder, sku, sum(quantity) FROM sales
+        GROUP BY 1, 2, 3 ORDER BY 4 DESC LIMIT 20
+    """,
+    'revenue by month': """
+        SELECT date_trunc('month', sale_day(sold_at)), count(*), sum(quantity), sum(line_total) FROM sales
+        GROUP BY 1 ORDER BY 1
+    """,
+}
+ROLLUP_CALLS = {
+    'event league': lambda: db.fetch_event_league(),
+    'best sellers': lambda: db.fetch_best_sellers(),
+    'revenue by month': lambda: db.fetch_revenue_by_month(),
+}
+INSERT_SQL = """
+    INSERT INTO sales (event_id, category, product_folder, sku, quantity, unit_price)
+    VALUES (%s, %s, 'Item', 'GT-BEN-1', 1, 5)
+"""
+ROLLUP_TRIGGERS = ('sales_rollup_insert', 'sales_rollup_update', 'sales_rollup_delete')
+
+
+def median_ms(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def seed(event_ids: list, category: str, count: int):
+    with db.get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO sales (event_id, category, product_folder, sku, color, quantity, unit_price, sold_at)
+            SELECT (%(events)s::bigint[])[1 + g %% cardinality(%(events)s::bigint[])],
+                   %(category)s, 'Item ' || (g %% 400), 'GT-BEN-' || (g %% 400),
+                   (ARRAY['Red', 'Blue', 'Green'])[1 + g %% 3], 1 + g %% 3, 5 + (g %% 12),
+                   '2023-01-01'::timestamptz + (g %% 1100) * interval '1 day'
+            FROM generate_series(1, %(count)s) AS g
+            """,
+            {'events': event_ids, 'category': category, 'count': count},
+        )
+        conn.execute('ANALYZE sales')
+
+
+def insert_latency(event_id: int, category: str, repeat: int, triggers: bool) -> float:
+    action = 'ENABLE' if triggers else 'DISABLE'
+    with db.get_connection() as conn:
+        for trigger in ROLLUP_TRIGGERS:
+            conn.execute(f'ALTER TABLE sales {action} TRIGGER {trigger}')
+    try:
+        def insert():
+            with db.get_connection() as conn:
+                conn.execute(INSERT_SQL, (event_id, category))
+        return median_ms(insert, repeat)
+    finally:
+        with db.get_connection() as conn:
+            for trigger in ROLLUP_TRIGGERS:
+                conn.execute(f'ALTER TABLE sales ENABLE TRIGGER {trigger}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sales', type=int, default=200000)
+    parser.add_argument('--events', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db.ensure_schema()
+    category = f'_bench-rollups-{secrets.token_hex(3)}'
+    event_ids = [
+        db.insert_event({'name': f'_bench-rollups {index}', 'event_date': '2025-06-01'})['id']
+        for index in range(args.events)
+    ]
+    try:
+        seed(event_ids, category, args.sales)
+        for name, sql in SCAN_QUERIES.items():
+            def scan():
+                with db.get_connection() as conn:
+                    conn.execute(sql).fetchall()
+            scan_ms = median_ms(scan, args.repeat)
+            rollup_ms = median_ms(ROLLUP_CALLS[name], args.repeat)
+            print(f'{name:<17} scan {scan_ms:8.1f} ms   rollup {rollup_ms:6.2f} ms')
+        plain = insert_latency(event_ids[0], category, args.repeat * 20, triggers=False)
+        maintained = insert_latency(event_ids[0], category, args.repeat * 20, triggers=True)
+        print(f'single sale insert  no rollups {plain:.2f} ms   with rollups {maintained:.2f} ms')
+    finally:
+        for event_id in event_ids:
+            db.delete_event(event_id)
+        db.rebuild_sales_rollups()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Flushing a till's offline queue: one batch vs one request per sale.
+
+Times recording N queued sales with ``db.record_sale`` in a loop (what the
+Quick Sale UI does today, one transaction each) against a single
+``db.record_sales_batch`` call, then re-sends the batch to time the
+all-duplicates retry path. Uses a scratch event and category:
+
+    DATABASE_URL=postgresql://... python3 App/benchmarks/bench_sales_batch.py --sales 200
+"""
+import argparse
+import secrets
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+
+COLORS = ('Red', 'Blue', 'Green', 'Black')
+
+
+def sale_lines(event_id: int, category: str, count: int) -> list:
+    prefix = secrets.token_hex(4)
+    return [
+        {
+            'idempotency_key': f'{prefix}-{index}',
+            'event_id': event_id,
+            'category': category,
+            'product_folder': f'Item {index % 25}',
+            'sku': f'GT-BEN-{index % 25}',
+            'color': COLORS[index % len(COLORS)],
+            'size': '',
+            'quantity': 1,
+            'unit_price': Decimal('6.00'),
+            'override_price': '',
+            'payment_method': 'Card',
+            'sold_at': None,
+        }
+        for index in range(count)
+    ]
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    func()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sales', type=int, default=200)
+    args = parser.parse_args()
+
+    db.ensure_schema()
+    category = f'_bench-batch-{secrets.token_hex(3)}'
+    event_id = db.insert_event({'name': '_bench-batch', 'event_date': '2026-06-06'})['id']
+    try:
+        singles = sale_lines(event_id, category, args.sales)
+        loop_ms = timed(lambda: [db.record_sale({**line, 'product_id': None}) for line in singles])
+        batch = sale_lines(event_id, category, args.sales)
+        batch_ms = timed(lambda: db.record_sales_batch(batch))
+        retry_ms = timed(lambda: db.record_sales_batch(batch))
+        print(f'{args.sales} sales   one per call {loop_ms:8.1f} ms   batch {batch_ms:7.1f} ms   '
+              f'retried batch {retry_ms:6.1f} ms')
+    finally:
+        db.delete_event(event_id)
+        with db.get_connection() as conn:
+            conn.execute('DELETE FROM stock WHERE category = %s', (category,))
+            conn.execute('DELETE FROM production_queue WHERE category = %s', (category,))
+
+
+if __name__ == '__main__':
+    main()
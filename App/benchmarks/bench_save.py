@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Benchmark table saves: legacy full rewrite vs diff-based /api/save.
+
+Seeds a scratch category with N products, then saves the whole table with a
+small fraction of rows edited. Reports wall time and how many product rows
+were actually rewritten (row_version bumps). Needs a scratch database:
+
+    DATABASE_URL=postgresql://... AUTH_DISABLED=1 \\
+        python3 App/benchmarks/bench_save.py --products 5000 50000 --changed 0.01
+"""
+import argparse
+import json
+import secrets
+import sys
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+import server  # noqa: E402
+
+
+def seed(category: str, count: int) -> list[dict]:
+    db.upsert_products([
+        {'category': category, 'product_folder': f'Item {index:06d}', 'sku': f'GT-BEN-{index:05d}', 'Sale Price': '5.00'}
+        for index in range(count)
+    ])
+    return [row for row in db.fetch_products() if row['category'] == category]
+
+
+def edit(rows: list[dict], fraction: float, price: str) -> list[dict]:
+    step = max(int(1 / fraction), 1) if fraction > 0 else len(rows) + 1
+    edited = [dict(row) for row in rows]
+    for index in range(0, len(edited), step):
+        edited[index]['Sale Price'] = price
+    return edited
+
+
+def latest_version() -> int:
+    with db.get_connection() as conn:
+        return conn.execute('SELECT COALESCE(MAX(row_version), 0) FROM products').fetchone()[0]
+
+
+def rewritten(category: str, since: int) -> int:
+    with db.get_connection() as conn:
+        return conn.execute(
+            'SELECT count(*) FROM products WHERE category = %s AND row_version > %s',
+            (category, since),
+        ).fetchone()[0]
+
+
+def legacy_save(rows: list[dict]):
+    """The DB work of the old /api/save: per-row update, stock sync, then upsert all."""
+    existing = {row['id']: row for row in db.fetch_products()}
+    for row in rows:
+        stored = existing[row['id']]
+        db.update_product(stored['category'], stored['product_folder'], row)
+        if row.get('sku'):
+            db.update_stock_refs(stored['category'], stored['product_folder'], row['category'], row['product_folder'], row['sku'])
+    db.upsert_products(rows)
+
+
+def diff_save(base_url: str, rows: list[dict]) -> dict:
+    request = urllib.request.Request(
+        f'{base_url}/api/save',
+        data=json.dumps({'rows': rows}).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+    )
+    with urllib.request.urlopen(request, timeout=600) as response:
+        return json.loads(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, nargs='+', default=[5000, 50000])
+    parser.add_argument('--changed', type=float, default=0.01, help='fraction of rows edited per save')
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    db.ensure_schema()
+    httpd = server.BoundedThreadPoolHTTPServer(('127.0.0.1', 0), server.Handler, 2)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{httpd.server_address[1]}'
+    print(f'{"products":>9} {"mode":<7} {"seconds":>8} {"rows written":>13}')
+    try:
+        for count in args.products:
+            category = f'_bench-{secrets.token_hex(4)}'
+            try:
+                rows = seed(category, count)
+                modes = [('diff', lambda edited: diff_save(base_url, edited))]
+                if not args.skip_legacy:
+                    modes.insert(0, ('legacy', legacy_save))
+                for index, (mode, save) in enumerate(modes):
+                    edited = edit(rows, args.changed, f'{6 + index}.00')
+                    before = latest_version()
+                    start = time.perf_counter()
+                    save(edited)
+                    elapsed = time.perf_counter() - start
+                    print(f'{count:>9} {mode:<7} {elapsed:>8.2f} {rewritten(category, before):>13}')
+            finally:
+                with db.get_connection() as conn:
+                    conn.execute('DELETE FROM products WHERE category = %s', (category,))
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Catalogue search: full /api/rows download + client filter vs /api/search.
+
+Seeds scratch categories with N synthetic products (names, tags, colours and
+README text), then times the old IndexView approach (fetch every row and
+substring-filter tags/sku/folder) against ``db.search_products`` for a few
+queries. Needs a scratch database:
+
+    DATABASE_URL=postgresql://... python3 App/benchmarks/bench_search.py --products 100000
+"""
+import argparse
+import json
+import secrets
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+
+WORDS = [
+    'dragon', 'planter', 'egg', 'cat', 'skull', 'lamp', 'vase', 'dice', 'tower', 'owl',
+    'fox', 'bowl', 'tray', 'hook', 'stand', 'box', 'frog', 'moon', 'star', 'gear',
+]
+QUERIES = ['dragon', 'drag pla', 'GT-BEN-004242', 'lithophane', 'owl green']
+
+
+def seed(prefix: str, count: int):
+    words = "ARRAY['" + "','".join(WORDS) + "']"
+    with db.get_connection() as conn:
+        conn.execute(
+            f"""
+            INSERT INTO products (category, product_folder, sku, tags, colors, sizes, status, ukca, readme_text)
+            SELECT %(prefix)s || (g %% 20),
+                   'GT-BEN-' || lpad(g::text, 6, '0') || ' - ' || initcap(w[1 + g %% 20]) || ' ' || initcap(w[1 + (g / 20) %% 20]),
+                   'GT-BEN-' || lpad(g::text, 6, '0'),
+                   w[1 + (g / 7) %% 20] || ', ' || w[1 + (g / 3) %% 20],
+                   (ARRAY['Green', 'Red', 'Blue', 'Black'])[1 + g %% 4],
+                   (ARRAY['S', 'M', 'L'])[1 + g %% 3],
+                   (ARRAY['Live', 'Draft', 'Archived'])[1 + g %% 3],
+                   (ARRAY['Yes', 'No', 'N/A'])[1 + g %% 3],
+                   'Printed in PLA. ' || CASE WHEN g %% 97 = 0 THEN 'Includes a lithophane insert. ' ELSE '' END
+                       || repeat('Care: wipe clean, keep out of direct sun. ', 5)
+            FROM generate_series(1, %(count)s) AS g, (SELECT {words} AS w) AS words
+            """,
+            {'prefix': prefix, 'count': count},
+        )
+        conn.execute('ANALYZE products')
+
+
+def cleanup(prefix: str):
+    with db.get_connection() as conn:
+        conn.execute("DELETE FROM products WHERE category LIKE %s", (prefix + '%',))
+        conn.execute("DELETE FROM change_tombstones WHERE deleted_at > now() - interval '1 hour' AND table_name = 'products'")
+
+
+def legacy_search(query: str) -> int:
+    # IndexView: download every row as JSON, then filter in the browser.
+    payload = json.dumps({'headers': db.PRODUCT_HEADERS, 'rows': db.fetch_products()}, default=str)
+    rows = json.loads(payload)['rows']
+    needle = query.lower()
+    return sum(
+        1 for row in rows
+        if needle in f"{row['tags']} {row['sku']} {row['product_folder']}".lower()
+    )
+
+
+def indexed_search(query: str) -> int:
+    return db.search_products(query, limit=50)['total']
+
+
+def median_ms(func, query: str, repeat: int) -> tuple[float, int]:
+    samples = []
+    result = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db.ensure_schema()
+    prefix = f'_bench-search-{secrets.token_hex(3)}-'
+    start = time.perf_counter()
+    seed(prefix, args.products)
+    print(f'seeded {args.products} products in {time.perf_counter() - start:.1f}s (fuzzy={db.trigram_available()})')
+    try:
+        print(f'{"query":<14} {"legacy ms":>10} {"hits":>7} {"search ms":>10} {"hits":>7}')
+        for query in QUERIES:
+            legacy_ms, legacy_hits = median_ms(legacy_search, query, args.repeat)
+            search_ms, search_hits = median_ms(indexed_search, query, args.repeat)
+            print(f'{query:<14} {legacy_ms:>10.1f} {legacy_hits:>7} {search_ms:>10.1f} {search_hits:>7}')
+    finally:
+        cleanup(prefix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Load benchmark for the server's serving modes.
+
+Starts ``server.py`` once per mode, drives ``GET /api/rows`` and
+``POST /api/sale`` with concurrent clients and prints throughput and
+latency percentiles.
+
+Needs a scratch database (sales are really recorded) and auth disabled:
+
+    DATABASE_URL=postgresql://... AUTH_DISABLED=1 \\
+        python3 App/benchmarks/bench_serving.py --event-id 1 \\
+        --category "Toys & Games" --folder "GT-TOY-00001 - Dragon"
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+SERVER_PATH = Path(__file__).resolve().parents[1] / 'server.py'
+
+
+def wait_for_server(base_url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/session', timeout=2):
+                return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {base_url} did not start')
+
+
+def timed_request(request: urllib.request.Request) -> float:
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=60) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def run_load(make_request, total: int, concurrency: int) -> dict:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(lambda _: timed_request(make_request()), range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': total,
+        'throughput_rps': total / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='single,threaded,prefork')
+    parser.add_argument('--port', type=int, default=8655)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--event-id', type=int, required=True)
+    parser.add_argument('--category', required=True)
+    parser.add_argument('--folder', required=True)
+    args = parser.parse_args()
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    sale_body = json.dumps({
+        'event_id': args.event_id,
+        'category': args.category,
+        'product_folder': args.folder,
+        'quantity': 1,
+        'unit_price': '1.00',
+        'payment_method': 'Benchmark',
+    }).encode('utf-8')
+
+    def rows_request():
+        return urllib.request.Request(f'{base_url}/api/rows')
+
+    def sale_request():
+        return urllib.request.Request(
+            f'{base_url}/api/sale',
+            data=sale_body,
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+
+    print(f"{'mode':<10} {'endpoint':<10} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+        env = dict(os.environ, SERVER_MODE=mode, CSV_EDITOR_PORT=str(args.port))
+        proc = subprocess.Popen([sys.executable, str(SERVER_PATH)], env=env, stdout=subprocess.DEVNULL)
+        try:
+            wait_for_server(base_url)
+            for endpoint, factory in (('rows', rows_request), ('sale', sale_request)):
+                result = run_load(factory, args.requests, args.concurrency)
+                print(
+                    f"{mode:<10} {endpoint:<10} {result['throughput_rps']:>10.1f} "
+                    f"{result['p50_ms']:>10.2f} {result['p99_ms']:>10.2f}"
+                )
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Per-request auth cost as the number of live sessions grows.
+
+Compares the old dict-plus-scan lookup (``cleanup_sessions()`` on every
+request) with ``sessions.MemorySessionStore`` and, with ``--postgres``, the
+Postgres store (needs a scratch ``DATABASE_URL``):
+
+    python3 App/benchmarks/bench_sessions.py --sessions 1000 10000 100000
+"""
+import argparse
+import secrets
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import sessions  # noqa: E402
+
+
+class LegacyStore:
+    """The previous server.py behaviour: scan every session on each lookup."""
+
+    def __init__(self):
+        self.sessions = {}
+
+    def create(self, username: str, ttl_seconds: int) -> str:
+        session_id = secrets.token_hex(24)
+        self.sessions[session_id] = {'user': username, 'expires_at': int(time.time()) + ttl_seconds}
+        return session_id
+
+    def get(self, session_id: str):
+        now = int(time.time())
+        expired = [key for key, value in self.sessions.items() if value['expires_at'] <= now]
+        for key in expired:
+            self.sessions.pop(key, None)
+        return self.sessions.get(session_id)
+
+
+def time_lookups(store, session_ids: list[str], lookups: int) -> float:
+    start = time.perf_counter()
+    for index in range(lookups):
+        store.get(session_ids[index % len(session_ids)])
+    return (time.perf_counter() - start) * 1e6 / lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--postgres', action='store_true')
+    args = parser.parse_args()
+
+    backends = [('legacy', LegacyStore), ('memory', sessions.MemorySessionStore)]
+    if args.postgres:
+        sessions.db.ensure_schema()
+        backends.append(('postgres', sessions.PostgresSessionStore))
+    print(f'{"sessions":>9} {"backend":<9} {"us/request":>11}')
+    for count in args.sessions:
+        for name, factory in backends:
+            store = factory()
+            if name == 'postgres':
+                with sessions.db.get_connection() as conn:
+                    conn.execute('DELETE FROM auth_sessions')
+                    conn.execute(
+                        """
+                        INSERT INTO auth_sessions (session_hash, username, expires_at)
+                        SELECT md5(g::text), 'bench', now() + interval '1 hour'
+                        FROM generate_series(1, %s) g
+                        """,
+                        (count,),
+                    )
+                session_ids = [store.create('bench', 3600) for _ in range(50)]
+            else:
+                session_ids = [store.create('bench', 3600) for _ in range(count)]
+            lookups = args.lookups if name != 'legacy' else max(args.lookups // 20, 20)
+            print(f'{count:>9} {name:<9} {time_lookups(store, session_ids, lookups):>11.1f}')
+            if name == 'postgres':
+                with sessions.db.get_connection() as conn:
+                    conn.execute('DELETE FROM auth_sessions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Next-SKU lookup: scanning the category's SKUs vs the sku_counters allocator.
+
+Seeds N products under a scratch prefix, then times the previous approach
+(select every SKU in the category and take the max in Python) against
+``db.reserve_skus`` for one SKU, and a 100-SKU bulk reservation:
+
+    DATABASE_URL=postgresql://... python3 App/benchmarks/bench_sku_allocation.py --products 20000
+"""
+import argparse
+import secrets
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+
+
+def median_ms(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def scan_next_sku(category: str, prefix: str) -> str:
+    max_num = 0
+    with db.get_connection() as conn:
+        for (sku,) in conn.execute('SELECT sku FROM products WHERE category = %s', (category,)).fetchall():
+            if sku and sku.startswith(prefix + '-'):
+                digits = ''.join(ch for ch in sku[len(prefix) + 1:] if ch.isdigit())
+                if digits:
+                    max_num = max(max_num, int(digits))
+    return f'{prefix}-{max_num + 1:05d}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    db.ensure_schema()
+    prefix = f'GT-B{secrets.token_hex(3).upper()}'
+    category = f'_bench-sku-{prefix}'
+    try:
+        with db.get_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO products (category, product_folder, sku)
+                SELECT %s, format_sku(%s, g) || ' - Item', format_sku(%s, g)
+                FROM generate_series(1, %s) AS g
+                """,
+                (category, prefix, prefix, args.products),
+            )
+            conn.execute('ANALYZE products')
+        scan_ms = median_ms(lambda: scan_next_sku(category, prefix), args.repeat)
+        db.seed_sku_counters([prefix])
+        counter_ms = median_ms(lambda: db.reserve_skus(prefix), args.repeat)
+        bulk_ms = median_ms(lambda: db.reserve_skus(prefix, 100), args.repeat)
+        print(f'{args.products} products   scan {scan_ms:7.2f} ms   counter {counter_ms:5.2f} ms   '
+              f'100 SKUs {bulk_ms:5.2f} ms')
+    finally:
+        with db.get_connection() as conn:
+            conn.execute('DELETE FROM products WHERE category = %s', (category,))
+            conn.execute('DELETE FROM sku_counters WHERE prefix = %s', (prefix,))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Schema work at startup: run-everything schema.sql vs versioned migrations.
+
+The legacy path rebuilds the old single ``schema.sql`` from the migration
+files and executes it, as ``ensure_schema()`` used to on every boot. The new
+path is ``schema_migrations.migrate()`` against an up-to-date database. Both
+include opening a connection. Needs a migrated scratch database:
+
+    DATABASE_URL=postgresql://... python3 App/benchmarks/bench_startup.py --runs 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import psycopg  # noqa: E402
+
+import schema_migrations  # noqa: E402
+
+
+def legacy_schema_sql() -> str:
+    parts = []
+    for migration in schema_migrations.discover():
+        if migration.optional:
+            continue  # the old schema.sql ran pg_trgm setup separately
+        parts.append(migration.sql.replace(' CONCURRENTLY', ''))
+    return '\n'.join(parts)
+
+
+def timed_ms(func, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit('DATABASE_URL is not set')
+
+    schema_migrations.migrate(database_url, log=lambda message: None)
+    schema_sql = legacy_schema_sql()
+
+    def legacy():
+        with psycopg.connect(database_url) as conn:
+            conn.execute(schema_sql)
+
+    def migrations():
+        schema_migrations.migrate(database_url)
+
+    def connect_only():
+        with psycopg.connect(database_url):
+            pass
+
+    print(f'{"path":<22} {"median ms":>10}')
+    for name, func in (('connect only', connect_only), ('legacy schema.sql', legacy), ('migrations (current)', migrations)):
+        print(f'{name:<22} {timed_ms(func, args.runs):>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Point-in-time stock from the nearest snapshot vs replaying the whole ledger.
+
+Writes N stock changes for a scratch category (each recorded in
+``stock_movements`` by the ledger trigger), snapshots every ``--every``
+changes, then times ``db.fetch_stock_as_of`` against summing every movement
+up to the same moment. Also reports single stock UPDATE latency with the
+ledger trigger on and off, so use a scratch database:
+
+    DATABASE_URL=postgresql://... python3 App/benchmarks/bench_stock_ledger.py --movements 200000
+"""
+import argparse
+import secrets
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+
+REPLAY_SQL = """
+    SELECT category, product_folder, color, size, sum(delta)
+    FROM stock_movements
+    WHERE category = %s AND created_at < %s
+    GROUP BY 1, 2, 3, 4
+"""
+UPDATE_SQL = """
+    UPDATE stock SET quantity = quantity + 1
+    WHERE category = %s AND product_folder = 'Item 0' AND color = 'Red' AND size = ''
+"""
+
+
+def median_ms(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def seed(category: str, variants: int, movements: int, every: int):
+    with db.get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO stock (category, product_folder, sku, color, size, quantity)
+            SELECT %s, 'Item ' || g, 'GT-BEN-' || g, 'Red', '', 100
+            FROM generate_series(0, %s - 1) AS g
+            """,
+            (category, variants),
+        )
+    done = 0
+    while done < movements:
+        batch = min(every, movements - done)
+        with db.get_connection() as conn:
+            for offset in range(0, batch, variants):
+                conn.execute(
+                    """
+                    UPDATE stock SET quantity = quantity + 1 - 2 * (random() < 0.5)::int
+                    WHERE category = %s AND product_folder IN (
+                        SELECT 'Item ' || g FROM generate_series(0, %s - 1) AS g
+                    )
+                    """,
+                    (category, min(variants, batch - offset)),
+                )
+        done += batch
+        db.take_stock_snapshot('bench')
+    with db.get_connection() as conn:
+        conn.execute('ANALYZE stock_movements')
+
+
+def update_latency(category: str, repeat: int, trigger: bool) -> float:
+    action = 'ENABLE' if trigger else 'DISABLE'
+    with db.get_connection() as conn:
+        conn.execute(f'ALTER TABLE stock {action} TRIGGER stock_movement_record')
+    try:
+        def update():
+            with db.get_connection() as conn:
+                conn.execute(UPDATE_SQL, (category,))
+        return median_ms(update, repeat)
+    finally:
+        with db.get_connection() as conn:
+            conn.execute('ALTER TABLE stock ENABLE TRIGGER stock_movement_record')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movements', type=int, default=200000)
+    parser.add_argument('--variants', type=int, default=500)
+    parser.add_argument('--every', type=int, default=20000, help='movements between snapshots')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    db.ensure_schema()
+    category = f'_bench-ledger-{secrets.token_hex(3)}'
+    try:
+        seed(category, args.variants, args.movements, args.every)
+        with db.get_connection() as conn:
+            moment = conn.execute('SELECT clock_timestamp()').fetchone()[0]
+
+        def replay():
+            with db.get_connection() as conn:
+                conn.execute(REPLAY_SQL, (category, moment)).fetchall()
+
+        replay_ms = median_ms(replay, args.repeat)
+        snapshot_ms = median_ms(lambda: db.fetch_stock_as_of(moment, {'category': category}), args.repeat)
+        print(f'stock as of now   full replay {replay_ms:8.1f} ms   from snapshot {snapshot_ms:6.1f} ms')
+        plain = update_latency(category, args.repeat * 20, trigger=False)
+        recorded = update_latency(category, args.repeat * 20, trigger=True)
+        print(f'single stock update  no ledger {plain:.2f} ms   with ledger {recorded:.2f} ms')
+    finally:
+        with db.get_connection() as conn:
+            conn.execute('DELETE FROM stock WHERE category = %s', (category,))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""3MF metadata extraction: config-only reads vs decompressing the whole archive.
+
+Writes a scratch Bambu-style 3MF with a mesh of the given size and times
+``threemf.extract`` (slicer configs plus the model header) against reading
+every member and parsing the model XML, which is what opening the project to
+count objects would cost. The hash pass used as the cache key is timed too:
+
+    python3 App/benchmarks/bench_threemf.py --mesh-mb 20 50
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import threemf  # noqa: E402
+
+SLICE_INFO = (
+    '<config><plate><metadata key="index" value="1"/><metadata key="prediction" value="3600"/>'
+    '<metadata key="weight" value="20.5"/><object identify_id="1" name="Part" skipped="false"/>'
+    '<filament id="1" type="PLA" color="#FFFFFF" used_g="20.5"/></plate></config>'
+)
+
+
+def median_ms(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def build(path: Path, mesh_mb: int):
+    rng = random.Random(mesh_mb)
+    written = 0
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('3D/3dmodel.model', 'w') as handle:
+            handle.write(b'<model><metadata name="Application">BambuStudio-01.09</metadata><resources>'
+                         b'<object id="1"><mesh><vertices>')
+            while written < mesh_mb * 1024 * 1024:
+                chunk = ''.join(
+                    f'<vertex x="{rng.uniform(0, 200):.4f}" y="{rng.uniform(0, 200):.4f}" z="{rng.uniform(0, 90):.4f}"/>'
+                    for _ in range(10000)
+                ).encode()
+                handle.write(chunk)
+                written += len(chunk)
+            handle.write(b'</vertices></mesh></object></resources></model>')
+        archive.writestr('Metadata/slice_info.config', SLICE_INFO)
+        archive.writestr('Metadata/plate_1.png', b'\x89PNG' + bytes(40000))
+
+
+def full_read(path: Path):
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            data = archive.read(name)
+            if name == '3D/3dmodel.model':
+                ET.fromstring(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mesh-mb', type=int, nargs='+', default=[5, 20])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mesh_mb in args.mesh_mb:
+            path = Path(tmp) / f'mesh-{mesh_mb}.3mf'
+            build(path, mesh_mb)
+            full_ms = median_ms(lambda: full_read(path), args.repeat)
+            extract_ms = median_ms(lambda: threemf.extract(path), args.repeat)
+            hash_ms = median_ms(lambda: threemf.file_sha256(path), args.repeat)
+            print(f'{mesh_mb:>3} MB mesh ({path.stat().st_size / 1e6:5.1f} MB zipped)   '
+                  f'full read {full_ms:8.1f} ms   extract {extract_ms:6.2f} ms   sha256 {hash_ms:6.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""UKCA pack generation: the old per-product path vs ukca_bulk.
+
+Seeds N scratch products and generates their packs into a temp folder the
+way ``/api/ukca_create`` used to (re-read each template, sequential
+``str.replace``, four ``set_ukca_doc`` calls and ``set_product_ukca`` per
+product), then with ``ukca_bulk.generate`` using threads and processes:
+
+    DATABASE_URL=postgresql://... python3 App/benchmarks/bench_ukca_bulk.py --products 200 --workers 4
+"""
+import argparse
+import secrets
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+import ukca_bulk  # noqa: E402
+
+
+def per_product(products: list, out_dir: Path):
+    for row in products:
+        product_path = out_dir / row['category'] / row['product_folder']
+        values = ukca_bulk.replacements_for({'product_name': row['product_folder'], 'sku': row['sku']})
+        for subdir in ukca_bulk.UKCA_SUBDIRS:
+            (product_path / subdir).mkdir(parents=True, exist_ok=True)
+        for key, name in ukca_bulk.TEMPLATE_FILES.items():
+            content = (ukca_bulk.UKCA_SHARED_DIR / name).read_text(encoding='utf-8')
+            if key != 'en71':
+                for placeholder, value in values.items():
+                    content = content.replace(f'{{{{{placeholder}}}}}', value)
+            (product_path / ukca_bulk.UKCA_FILES[key]).write_text(content, encoding='utf-8')
+            db.set_ukca_doc(row['category'], row['product_folder'], key, content)
+        db.set_product_ukca(row['category'], row['product_folder'], 'Yes')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=ukca_bulk.UKCA_WORKERS)
+    args = parser.parse_args()
+
+    db.ensure_schema()
+    category = f'_bench-ukca-{secrets.token_hex(3)}'
+    try:
+        with db.get_connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO products (category, product_folder, sku, ukca)
+                SELECT %s, format('GT-BEN-%%s - Toy', lpad(g::text, 5, '0')),
+                       format('GT-BEN-%%s', lpad(g::text, 5, '0')), 'No'
+                FROM generate_series(1, %s) AS g
+                """,
+                (category, args.products),
+            )
+        products = db.fetch_ukca_candidates({'category': category})
+        templates = ukca_bulk.load_templates()
+
+        def bulk(out: Path, workers: int, processes: bool = False):
+            jobs = ukca_bulk.jobs_for(products, resolve=lambda c, f, s: out / c / f)
+            ukca_bulk.generate(jobs, templates, workers=workers, processes=processes)
+
+        for label, run in (
+            ('per product', lambda out: per_product(products, out)),
+            ('bulk, 1 worker', lambda out: bulk(out, 1)),
+            (f'bulk, {args.workers} threads', lambda out: bulk(out, args.workers)),
+            (f'bulk, {args.workers} processes', lambda out: bulk(out, args.workers, processes=True)),
+        ):
+            with tempfile.TemporaryDirectory() as tmp:
+                start = time.perf_counter()
+                run(Path(tmp))
+                seconds = time.perf_counter() - start
+            print(f'{label:<22} {seconds * 1000:8.1f} ms   {args.products / seconds:8.1f} packs/s')
+    finally:
+        with db.get_connection() as conn:
+            conn.execute('DELETE FROM products WHERE category = %s', (category,))
+
+
+if __name__ == '__main__':
+    main()
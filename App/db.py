@@ -1,13 +1,21 @@
+import atexit
+import base64
+import datetime
+import hashlib
 import json
 import os
+import random
+import re
+import threading
 import time
-from pathlib import Path
+from contextlib import contextmanager
+from decimal import Decimal
 
 import psycopg
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 
-BASE_DIR = Path(__file__).resolve().parent
-SCHEMA_PATH = BASE_DIR / 'schema.sql'
+import schema_migrations
 
 PRODUCT_HEADERS = [
     'id',
@@ -31,8 +39,7 @@ PRODUCT_HEADERS = [
 
 STOCK_HEADERS = ['category', 'product_folder', 'sku', 'color', 'size', 'quantity']
 
-PRODUCT_SELECT_BASE = """
-    SELECT
+PRODUCT_SELECT_COLUMNS = """
         id,
         category,
         product_folder,
@@ -50,11 +57,31 @@ PRODUCT_SELECT_BASE = """
         cost_to_make AS "Cost To Make",
         sale_price AS "Sale Price",
         postage_price AS "Postage Price"
-    FROM products
 """
 
+PRODUCT_SELECT_BASE = "SELECT" + PRODUCT_SELECT_COLUMNS + "FROM products\n"
+
 PRODUCT_SELECT_SQL = PRODUCT_SELECT_BASE + " ORDER BY category, product_folder"
 
+# Indexed with gin_trgm_ops (migrations/0005_search_trigram.sql) for
+# typo-tolerant matching; queries must use the same expression for the index
+# to apply.
+SEARCH_TEXT_SQL = "(product_folder || ' ' || sku || ' ' || tags)"
+SEARCH_FACETS = ('category', 'status', 'ukca')
+SEARCH_WORD_RE = re.compile(r'[^\W_]+')
+README_TEXT_MAX_CHARS = int(os.environ.get('README_TEXT_MAX_CHARS', '20000'))
+
+
+POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '1'))
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '10'))
+POOL_MAX_IDLE_SECONDS = float(os.environ.get('DB_POOL_MAX_IDLE_SECONDS', '600'))
+POOL_MAX_LIFETIME_SECONDS = float(os.environ.get('DB_POOL_MAX_LIFETIME_SECONDS', '3600'))
+POOL_TIMEOUT_SECONDS = float(os.environ.get('DB_POOL_TIMEOUT_SECONDS', '30'))
+POOL_CHECK_INTERVAL_SECONDS = float(os.environ.get('DB_POOL_CHECK_INTERVAL_SECONDS', '60'))
+
+_pool = None
+_pool_lock = threading.Lock()
+
 
 def _get_database_url() -> str:
     database_url = os.environ.get('DATABASE_URL')
@@ -63,26 +90,92 @@ def _get_database_url() -> str:
     return database_url
 
 
+def _check_pool_loop(pool: ConnectionPool):
+    # Periodically validate idle connections so a Postgres restart is noticed
+    # without paying a health-check round trip on every checkout.
+    while not pool.closed:
+        time.sleep(POOL_CHECK_INTERVAL_SECONDS)
+        if pool.closed:
+            return
+        try:
+            pool.check()
+        except Exception:
+            continue
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = ConnectionPool(
+                _get_database_url(),
+                min_size=max(POOL_MIN_SIZE, 0),
+                max_size=max(POOL_MAX_SIZE, POOL_MIN_SIZE, 1),
+                max_idle=POOL_MAX_IDLE_SECONDS,
+                max_lifetime=POOL_MAX_LIFETIME_SECONDS,
+                timeout=POOL_TIMEOUT_SECONDS,
+                name='geekythings',
+                open=True,
+            )
+            if POOL_CHECK_INTERVAL_SECONDS > 0:
+                threading.Thread(target=_check_pool_loop, args=(pool,), daemon=True).start()
+            _pool = pool
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+atexit.register(close_pool)
+
+
+def pool_stats() -> dict:
+    pool = _pool
+    config = {
+        'min_size': POOL_MIN_SIZE,
+        'max_size': POOL_MAX_SIZE,
+        'max_idle_seconds': POOL_MAX_IDLE_SECONDS,
+        'max_lifetime_seconds': POOL_MAX_LIFETIME_SECONDS,
+        'timeout_seconds': POOL_TIMEOUT_SECONDS,
+    }
+    if pool is None:
+        return {'open': False, 'config': config, 'stats': {}}
+    return {'open': not pool.closed, 'config': config, 'stats': pool.get_stats()}
+
+
 def get_connection():
-    return psycopg.connect(_get_database_url())
+    # Returns a context manager: the connection commits (or rolls back on
+    # error) when the block exits and goes back to the pool.
+    return get_pool().connection()
 
 
-def ensure_schema():
-    schema_sql = SCHEMA_PATH.read_text(encoding='utf-8')
-    retries = int(os.environ.get('DB_CONNECT_RETRIES', '30'))
-    delay = float(os.environ.get('DB_CONNECT_DELAY_SECONDS', '1'))
-    last_error = None
-    for _ in range(max(retries, 1)):
+def _wait_for_database():
+    """Retry connecting with capped exponential backoff (the DB may still be starting)."""
+    retries = max(int(os.environ.get('DB_CONNECT_RETRIES', '30')), 1)
+    delay = float(os.environ.get('DB_CONNECT_DELAY_SECONDS', '0.25'))
+    max_delay = float(os.environ.get('DB_CONNECT_MAX_DELAY_SECONDS', '5'))
+    for attempt in range(retries):
         try:
-            with get_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(schema_sql)
-            return
-        except psycopg.OperationalError as exc:
-            last_error = exc
-            time.sleep(delay)
-    if last_error:
-        raise last_error
+            # Direct connection so startup retries are not masked by pool timeouts.
+            with psycopg.connect(_get_database_url(), connect_timeout=10):
+                return
+        except psycopg.OperationalError:
+            if attempt == retries - 1:
+                raise
+            time.sleep(min(delay * 2 ** attempt, max_delay) * random.uniform(0.5, 1.0))
+
+
+def ensure_schema():
+    """Apply pending migrations from ``migrations/`` (see schema_migrations.py)."""
+    _wait_for_database()
+    schema_migrations.migrate(_get_database_url())
 
 
 def normalize_status(value: str) -> str:
@@ -164,123 +257,182 @@ def product_exists(category: str, product_folder: str) -> bool:
             return cur.fetchone() is not None
 
 
+PRODUCT_FIELDS = [
+    'category',
+    'product_folder',
+    'sku',
+    'ukca',
+    'listings',
+    'tags',
+    'tiktok_url',
+    'ebay_url',
+    'etsy_url',
+    'status',
+    'completed',
+    'colors',
+    'sizes',
+    'cost_to_make',
+    'sale_price',
+    'postage_price',
+]
+
+PRODUCT_UPSERT_SQL = """
+    INSERT INTO products (
+        category,
+        product_folder,
+        sku,
+        ukca,
+        listings,
+        tags,
+        tiktok_url,
+        ebay_url,
+        etsy_url,
+        status,
+        completed,
+        colors,
+        sizes,
+        cost_to_make,
+        sale_price,
+        postage_price,
+        updated_at
+    )
+    VALUES (
+        %(category)s,
+        %(product_folder)s,
+        %(sku)s,
+        %(ukca)s,
+        %(listings)s,
+        %(tags)s,
+        %(tiktok_url)s,
+        %(ebay_url)s,
+        %(etsy_url)s,
+        %(status)s,
+        %(completed)s,
+        %(colors)s,
+        %(sizes)s,
+        %(cost_to_make)s,
+        %(sale_price)s,
+        %(postage_price)s,
+        now()
+    )
+    ON CONFLICT (category, product_folder)
+    DO UPDATE SET
+        sku = EXCLUDED.sku,
+        ukca = EXCLUDED.ukca,
+        listings = EXCLUDED.listings,
+        tags = EXCLUDED.tags,
+        tiktok_url = EXCLUDED.tiktok_url,
+        ebay_url = EXCLUDED.ebay_url,
+        etsy_url = EXCLUDED.etsy_url,
+        status = EXCLUDED.status,
+        completed = EXCLUDED.completed,
+        colors = EXCLUDED.colors,
+        sizes = EXCLUDED.sizes,
+        cost_to_make = EXCLUDED.cost_to_make,
+        sale_price = EXCLUDED.sale_price,
+        postage_price = EXCLUDED.postage_price,
+        updated_at = now()
+"""
+
+PRODUCT_UPDATE_SQL = """
+    UPDATE products
+    SET
+        category = %(category)s,
+        product_folder = %(product_folder)s,
+        sku = %(sku)s,
+        ukca = %(ukca)s,
+        listings = %(listings)s,
+        tags = %(tags)s,
+        tiktok_url = %(tiktok_url)s,
+        ebay_url = %(ebay_url)s,
+        etsy_url = %(etsy_url)s,
+        status = %(status)s,
+        completed = %(completed)s,
+        colors = %(colors)s,
+        sizes = %(sizes)s,
+        cost_to_make = %(cost_to_make)s,
+        sale_price = %(sale_price)s,
+        postage_price = %(postage_price)s,
+        updated_at = now()
+    WHERE category = %(old_category)s AND product_folder = %(old_product_folder)s
+    RETURNING id
+"""
+
+STOCK_REFS_UPDATE_SQL = """
+    UPDATE stock
+    SET category = %(category)s,
+        product_folder = %(product_folder)s,
+        sku = COALESCE(%(sku)s, sku)
+    WHERE category = %(old_category)s AND product_folder = %(old_product_folder)s
+"""
+
+
 def upsert_products(rows: list[dict]):
     if not rows:
         return
     payloads = [normalize_product_row(row) for row in rows]
     with get_connection() as conn:
         with conn.cursor() as cur:
-            cur.executemany(
-                """
-                INSERT INTO products (
-                    category,
-                    product_folder,
-                    sku,
-                    ukca,
-                    listings,
-                    tags,
-                    tiktok_url,
-                    ebay_url,
-                    etsy_url,
-                    status,
-                    completed,
-                    colors,
-                    sizes,
-                    cost_to_make,
-                    sale_price,
-                    postage_price,
-                    updated_at
-                )
-                VALUES (
-                    %(category)s,
-                    %(product_folder)s,
-                    %(sku)s,
-                    %(ukca)s,
-                    %(listings)s,
-                    %(tags)s,
-                    %(tiktok_url)s,
-                    %(ebay_url)s,
-                    %(etsy_url)s,
-                    %(status)s,
-                    %(completed)s,
-                    %(colors)s,
-                    %(sizes)s,
-                    %(cost_to_make)s,
-                    %(sale_price)s,
-                    %(postage_price)s,
-                    now()
-                )
-                ON CONFLICT (category, product_folder)
-                DO UPDATE SET
-                    sku = EXCLUDED.sku,
-                    ukca = EXCLUDED.ukca,
-                    listings = EXCLUDED.listings,
-                    tags = EXCLUDED.tags,
-                    tiktok_url = EXCLUDED.tiktok_url,
-                    ebay_url = EXCLUDED.ebay_url,
-                    etsy_url = EXCLUDED.etsy_url,
-                    status = EXCLUDED.status,
-                    completed = EXCLUDED.completed,
-                    colors = EXCLUDED.colors,
-                    sizes = EXCLUDED.sizes,
-                    cost_to_make = EXCLUDED.cost_to_make,
-                    sale_price = EXCLUDED.sale_price,
-                    postage_price = EXCLUDED.postage_price,
-                    updated_at = now()
-                """,
-                payloads,
-            )
+            cur.executemany(PRODUCT_UPSERT_SQL, payloads)
+
+
+def diff_product_row(stored: dict, row: dict) -> list[str]:
+    """Names of the normalized product fields that differ between two rows."""
+    old = normalize_product_row(stored)
+    new = normalize_product_row(row)
+    return [field for field in PRODUCT_FIELDS if old[field] != new[field]]
+
+
+def save_product_changes(updates: list[dict], inserts: list[dict]) -> bool:
+    """Apply a table save in one transaction.
+
+    ``updates`` items carry ``old_category``, ``old_product_folder``, ``row``
+    and ``stock_refs`` (True to point stock rows at the new key/SKU);
+    ``inserts`` are upserted. Returns False, with nothing written, if any
+    update no longer matches a stored row.
+    """
+    if not updates and not inserts:
+        return True
+    update_params = []
+    stock_params = []
+    for item in updates:
+        payload = normalize_product_row(item['row'])
+        keys = {'old_category': item['old_category'], 'old_product_folder': item['old_product_folder']}
+        update_params.append({**payload, **keys})
+        if item.get('stock_refs'):
+            stock_params.append({
+                'category': payload['category'],
+                'product_folder': payload['product_folder'],
+                'sku': payload['sku'] or None,
+                **keys,
+            })
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            if update_params:
+                cur.executemany(PRODUCT_UPDATE_SQL, update_params, returning=True)
+                matched = 0
+                while True:
+                    if cur.fetchone() is not None:
+                        matched += 1
+                    if not cur.nextset():
+                        break
+                if matched != len(update_params):
+                    conn.rollback()
+                    return False
+            if stock_params:
+                cur.executemany(STOCK_REFS_UPDATE_SQL, stock_params)
+            if inserts:
+                cur.executemany(PRODUCT_UPSERT_SQL, [normalize_product_row(row) for row in inserts])
+    return True
 
 
 def update_product(old_category: str, old_product_folder: str, data: dict) -> bool:
     payload = normalize_product_row(data)
+    payload['old_category'] = old_category
+    payload['old_product_folder'] = old_product_folder
     with get_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                """
-                UPDATE products
-                SET
-                    category = %s,
-                    product_folder = %s,
-                    sku = %s,
-                    ukca = %s,
-                    listings = %s,
-                    tags = %s,
-                    tiktok_url = %s,
-                    ebay_url = %s,
-                    etsy_url = %s,
-                    status = %s,
-                    completed = %s,
-                    colors = %s,
-                    sizes = %s,
-                    cost_to_make = %s,
-                    sale_price = %s,
-                    postage_price = %s,
-                    updated_at = now()
-                WHERE category = %s AND product_folder = %s
-                RETURNING id
-                """,
-                (
-                    payload['category'],
-                    payload['product_folder'],
-                    payload['sku'],
-                    payload['ukca'],
-                    payload['listings'],
-                    payload['tags'],
-                    payload['tiktok_url'],
-                    payload['ebay_url'],
-                    payload['etsy_url'],
-                    payload['status'],
-                    payload['completed'],
-                    payload['colors'],
-                    payload['sizes'],
-                    payload['cost_to_make'],
-                    payload['sale_price'],
-                    payload['postage_price'],
-                    old_category,
-                    old_product_folder,
-                ),
-            )
+            cur.execute(PRODUCT_UPDATE_SQL, payload)
             return cur.fetchone() is not None
 
 
@@ -330,57 +482,103 @@ def set_product_ukca(category: str, folder_name: str, value: str) -> bool:
             return cur.fetchone() is not None
 
 
+PRODUCT_INSERT_SQL = """
+    INSERT INTO products (
+        category,
+        product_folder,
+        sku,
+        ukca,
+        listings,
+        tags,
+        tiktok_url,
+        ebay_url,
+        etsy_url,
+        status,
+        completed,
+        colors,
+        sizes,
+        cost_to_make,
+        sale_price,
+        postage_price,
+        updated_at
+    )
+    VALUES (
+        %(category)s,
+        %(product_folder)s,
+        %(sku)s,
+        %(ukca)s,
+        %(listings)s,
+        %(tags)s,
+        %(tiktok_url)s,
+        %(ebay_url)s,
+        %(etsy_url)s,
+        %(status)s,
+        %(completed)s,
+        %(colors)s,
+        %(sizes)s,
+        %(cost_to_make)s,
+        %(sale_price)s,
+        %(postage_price)s,
+        now()
+    )
+    RETURNING id
+    """
+
+
 def insert_product(data: dict):
     payload = normalize_product_row(data)
     with get_connection() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
-                """
-                INSERT INTO products (
-                    category,
-                    product_folder,
-                    sku,
-                    ukca,
-                    listings,
-                    tags,
-                    tiktok_url,
-                    ebay_url,
-                    etsy_url,
-                    status,
-                    completed,
-                    colors,
-                    sizes,
-                    cost_to_make,
-                    sale_price,
-                    postage_price,
-                    updated_at
-                )
-                VALUES (
-                    %(category)s,
-                    %(product_folder)s,
-                    %(sku)s,
-                    %(ukca)s,
-                    %(listings)s,
-                    %(tags)s,
-                    %(tiktok_url)s,
-                    %(ebay_url)s,
-                    %(etsy_url)s,
-                    %(status)s,
-                    %(completed)s,
-                    %(colors)s,
-                    %(sizes)s,
-                    %(cost_to_make)s,
-                    %(sale_price)s,
-                    %(postage_price)s,
-                    now()
-                )
-                RETURNING id
-                """,
-                payload,
-            )
+            cur.execute(PRODUCT_INSERT_SQL, payload)
             return cur.fetchone()
 
 
+def seed_sku_counters(prefixes) -> None:
+    """Create or raise SKU counters to the highest existing SKU per prefix."""
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO sku_counters AS c (prefix, last_value)
+            SELECT prefix, sku_existing_max(prefix)
+            FROM unnest(%s::text[]) AS prefix
+            ORDER BY prefix
+            ON CONFLICT (prefix) DO UPDATE
+            SET last_value = GREATEST(c.last_value, EXCLUDED.last_value)
+            WHERE c.last_value < EXCLUDED.last_value
+            """,
+            (sorted(set(prefixes)),),
+        )
+
+
+def reserve_skus(prefix: str, count: int = 1) -> list[str]:
+    """Allocate ``count`` consecutive new SKUs for ``prefix`` (e.g. for batch creation)."""
+    with get_connection() as conn:
+        return [row[0] for row in conn.execute('SELECT allocate_skus(%s, %s)', (prefix, count)).fetchall()]
+
+
+def insert_product_with_new_sku(prefix: str, description: str, data: dict, prepare=None) -> dict:
+    """Insert a product under a freshly allocated ``<sku> - <description>`` folder.
+
+    The SKU is allocated, the row inserted and ``prepare(payload)`` (e.g.
+    creating the product folder) run in one transaction; if any step raises,
+    nothing is written and the SKU number is not used up. Raises ValueError
+    if the row already exists.
+    """
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute('SELECT allocate_skus(%s, 1) AS sku', (prefix,))
+            sku = cur.fetchone()['sku']
+            payload = normalize_product_row({**data, 'sku': sku, 'product_folder': f'{sku} - {description}'})
+            try:
+                cur.execute(PRODUCT_INSERT_SQL, payload)
+            except psycopg.errors.UniqueViolation:
+                raise ValueError('Row already exists') from None
+            payload['id'] = cur.fetchone()['id']
+            if prepare is not None:
+                prepare(payload)
+            return payload
+
+
 def get_product_id(category: str, folder_name: str) -> int | None:
     with get_connection() as conn:
         with conn.cursor() as cur:
@@ -492,6 +690,413 @@ def set_ukca_doc(category: str, folder_name: str, file_key: str, content: str) -
             return True
 
 
+def fetch_ukca_candidates(filters: dict | None = None) -> list:
+    """Products for bulk UKCA generation, filtered by ``category``,
+    ``status``, ``ukca`` (exact) and ``skus`` (a list)."""
+    filters = filters or {}
+    conditions = []
+    params = []
+    for column in ('category', 'status', 'ukca'):
+        value = _normalize_text(filters.get(column))
+        if value:
+            conditions.append(f'{column} = %s')
+            params.append(normalize_status(value) if column == 'status' else value)
+    skus = [sku for sku in (_normalize_text(sku) for sku in filters.get('skus') or []) if sku]
+    if skus:
+        conditions.append('sku = ANY(%s)')
+        params.append(skus)
+    where_sql = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                f"""
+                SELECT id, category, product_folder, sku, status, ukca
+                FROM products
+                {where_sql}
+                ORDER BY category, product_folder
+                """,
+                params,
+            )
+            return cur.fetchall()
+
+
+def save_ukca_packs(packs: list) -> dict:
+    """Upsert every pack's documents and mark the products UKCA ``Yes``.
+
+    ``packs`` are ``{'product_id', 'docs': {file_key: content}}``; everything
+    is written in one transaction (the upserts are pipelined).
+    """
+    rows = [
+        (pack['product_id'], normalize_ukca_key(key), content or '')
+        for pack in packs
+        for key, content in pack['docs'].items()
+        if normalize_ukca_key(key)
+    ]
+    product_ids = sorted({pack['product_id'] for pack in packs})
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.executemany(
+                """
+                INSERT INTO ukca_documents (product_id, file_key, content, updated_at)
+                VALUES (%s, %s, %s, now())
+                ON CONFLICT (product_id, file_key)
+                DO UPDATE SET content = EXCLUDED.content, updated_at = now()
+                """,
+                rows,
+            )
+            cur.execute(
+                "UPDATE products SET ukca = 'Yes', updated_at = now() WHERE id = ANY(%s)",
+                (product_ids,),
+            )
+            return {'documents': len(rows), 'products': cur.rowcount}
+
+
+def set_product_readme_text(category: str, folder_name: str, text: str) -> bool:
+    """Store README text for search; returns True only if it changed."""
+    text = (text or '')[:README_TEXT_MAX_CHARS]
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE products
+                SET readme_text = %s, updated_at = now()
+                WHERE category = %s AND product_folder = %s
+                  AND readme_text IS DISTINCT FROM %s
+                """,
+                (text, category, folder_name, text),
+            )
+            return cur.rowcount > 0
+
+
+def fetch_readme_texts() -> dict:
+    """``{(category, product_folder): readme_text}`` for every product."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT category, product_folder, readme_text FROM products")
+            return {(category, folder): text for category, folder, text in cur.fetchall()}
+
+
+_trigram_available = None
+
+
+def trigram_available() -> bool:
+    global _trigram_available
+    if _trigram_available is None:
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')
+                       AND to_regclass('products_search_trgm_idx') IS NOT NULL
+                    """
+                )
+                _trigram_available = cur.fetchone()[0]
+    return _trigram_available
+
+
+def search_tsquery(text: str) -> str:
+    """Prefix query matching every word, e.g. ``'drag pla'`` -> ``'drag:* & pla:*'``."""
+    return ' & '.join(f'{word}:*' for word in SEARCH_WORD_RE.findall((text or '').lower()))
+
+
+def search_products(text: str, filters: dict | None = None, limit: int = 50, offset: int = 0) -> dict:
+    """Ranked product search with facet counts by category, status and UKCA.
+
+    Words match as prefixes against folder name and SKU (weight A), tags (B),
+    colours and sizes (C) and README text (D). With pg_trgm installed, rows
+    whose name, SKU or tags are a close fuzzy match are included too. Facets
+    count every match under the same filters, ignoring pagination.
+    """
+    filters = filters or {}
+    tsquery = search_tsquery(text)
+    fuzzy = bool(tsquery) and trigram_available()
+    params = {'tsquery': tsquery, 'text': (text or '').strip(), 'limit': limit, 'offset': offset}
+    conditions = []
+    rank_sql = '0'
+    if tsquery:
+        match_sql = "search_vector @@ to_tsquery('simple', %(tsquery)s)"
+        rank_sql = "ts_rank(search_vector, to_tsquery('simple', %(tsquery)s))"
+        if fuzzy:
+            match_sql = f"({match_sql} OR %(text)s <%% {SEARCH_TEXT_SQL})"
+            rank_sql = f"{rank_sql} + word_similarity(%(text)s, {SEARCH_TEXT_SQL})"
+        conditions.append(match_sql)
+    for column in SEARCH_FACETS:
+        value = (filters.get(column) or '').strip()
+        if value:
+            params[column] = normalize_status(value) if column == 'status' else value
+            conditions.append(f'{column} = %({column})s')
+    where_sql = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as page_cur, conn.cursor(row_factory=dict_row) as facet_cur:
+            with conn.pipeline():
+                page_cur.execute(
+                    f"""
+                    SELECT {PRODUCT_SELECT_COLUMNS}, {rank_sql} AS rank
+                    FROM products
+                    {where_sql}
+                    ORDER BY rank DESC, category, product_folder, id
+                    LIMIT %(limit)s OFFSET %(offset)s
+                    """,
+                    params,
+                )
+                facet_cur.execute(
+                    f"""
+                    SELECT category, status, ukca, GROUPING(category) AS by_category,
+                           GROUPING(status) AS by_status, count(*) AS count
+                    FROM products
+                    {where_sql}
+                    GROUP BY GROUPING SETS ((category), (status), (ukca))
+                    """,
+                    params,
+                )
+            results = page_cur.fetchall()
+            facet_rows = facet_cur.fetchall()
+    facets = {column: {} for column in SEARCH_FACETS}
+    for row in facet_rows:
+        if row['by_category'] == 0:
+            facets['category'][row['category']] = row['count']
+        elif row['by_status'] == 0:
+            facets['status'][row['status']] = row['count']
+        else:
+            facets['ukca'][row['ukca']] = row['count']
+    for row in results:
+        row['rank'] = round(float(row['rank']), 4)
+    return {
+        'total': sum(facets['category'].values()),
+        'fuzzy': fuzzy,
+        'results': results,
+        'facets': facets,
+    }
+
+
+# Margin analytics over the numeric price copies (migrations/0007). Each
+# metric takes the price expression so current and proposed (repriced)
+# figures come from the same SQL.
+MARGIN_SQL = "(sale_price_amount - cost_to_make_amount)"
+PROPOSED_PRICE_SQL = "round(sale_price_amount * (1 + %(pct)s::numeric / 100) + %(amount)s::numeric, 2)"
+MARGIN_SORTS = {
+    'margin': [MARGIN_SQL],
+    'margin_pct': [f"{MARGIN_SQL} / NULLIF(sale_price_amount, 0)"],
+    'markup_pct': [f"{MARGIN_SQL} / NULLIF(cost_to_make_amount, 0)"],
+    'profit': [f"{MARGIN_SQL} - coalesce(postage_price_amount, 0)"],
+    'price': ["sale_price_amount"],
+    'folder': ["category", "product_folder"],
+}
+
+
+def _margin_columns(price_sql: str, prefix: str) -> str:
+    margin = f"({price_sql} - cost_to_make_amount)"
+    return f"""
+        {margin}::text AS {prefix}margin,
+        round({margin} * 100 / NULLIF({price_sql}, 0), 1)::text AS {prefix}margin_pct,
+        round({margin} * 100 / NULLIF(cost_to_make_amount, 0), 1)::text AS {prefix}markup_pct,
+        ({margin} - coalesce(postage_price_amount, 0))::text AS {prefix}profit_after_postage"""
+
+
+def _margin_aggregates(price_sql: str, prefix: str) -> str:
+    margin = f"({price_sql} - cost_to_make_amount)"
+    return f"""
+        round(avg({margin}), 2)::text AS {prefix}avg_margin,
+        round(sum({margin}) * 100 / NULLIF(sum({price_sql}) FILTER (WHERE {margin} IS NOT NULL), 0), 1)::text
+            AS {prefix}margin_pct,
+        round(sum({margin}) * 100 / NULLIF(sum(cost_to_make_amount) FILTER (WHERE {margin} IS NOT NULL), 0), 1)::text
+            AS {prefix}markup_pct,
+        round(avg({margin} - coalesce(postage_price_amount, 0)), 2)::text AS {prefix}avg_profit_after_postage"""
+
+
+def fetch_margins(
+    filters: dict | None = None,
+    reprice_pct=0,
+    reprice_amount=0,
+    sort: str = 'margin_pct',
+    descending: bool = False,
+    limit: int = 500,
+) -> dict:
+    """Per-product margins plus rollups by category, status and overall.
+
+    Margin is sale price minus cost to make; ``profit_after_postage`` also
+    subtracts the postage price (postage absorbed by the seller). With
+    ``reprice_pct``/``reprice_amount`` set, ``proposed_*`` columns preview
+    every product repriced to ``price * (1 + pct/100) + amount``. Products
+    without a parsable price or cost have NULL metrics and are left out of
+    averages. Raises ValueError for an unknown sort.
+    """
+    if sort not in MARGIN_SORTS:
+        raise ValueError(f'Unknown sort: {sort}')
+    filters = filters or {}
+    params = {'pct': reprice_pct, 'amount': reprice_amount, 'limit': min(max(int(limit), 1), 5000)}
+    conditions = []
+    for column in ('category', 'status'):
+        value = (filters.get(column) or '').strip()
+        if value:
+            params[column] = normalize_status(value) if column == 'status' else value
+            conditions.append(f'{column} = %({column})s')
+    where_sql = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    direction = 'DESC' if descending else 'ASC'
+    order_sql = ', '.join(f'{part} {direction} NULLS LAST' for part in MARGIN_SORTS[sort])
+    proposed_columns = proposed_aggregates = ''
+    if reprice_pct or reprice_amount:
+        proposed_columns = f""",
+                           {PROPOSED_PRICE_SQL}::text AS proposed_price,
+                           {_margin_columns(PROPOSED_PRICE_SQL, 'proposed_')}"""
+        proposed_aggregates = f",{_margin_aggregates(PROPOSED_PRICE_SQL, 'proposed_')}"
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as product_cur, conn.cursor(row_factory=dict_row) as group_cur:
+            with conn.pipeline():
+                # Sort and limit before projecting: otherwise the numeric
+                # columns are computed for every row, not just the page.
+                product_cur.execute(
+                    f"""
+                    SELECT id, category, product_folder, sku, status,
+                           cost_to_make_amount::text AS cost_to_make,
+                           sale_price_amount::text AS sale_price,
+                           postage_price_amount::text AS postage_price,
+                           {_margin_columns('sale_price_amount', '')}{proposed_columns}
+                    FROM (
+                        SELECT * FROM products
+                        {where_sql}
+                        ORDER BY {order_sql}, id
+                        LIMIT %(limit)s
+                    ) AS products
+                    ORDER BY {order_sql}, id
+                    """,
+                    params,
+                )
+                group_cur.execute(
+                    f"""
+                    SELECT category, status, GROUPING(category) AS by_category, GROUPING(status) AS by_status,
+                           count(*) AS products,
+                           count({MARGIN_SQL}) AS costed,
+                           {_margin_aggregates('sale_price_amount', '')}{proposed_aggregates}
+                    FROM products
+                    {where_sql}
+                    GROUP BY GROUPING SETS ((category), (status), ())
+                    ORDER BY category, status
+                    """,
+                    params,
+                )
+            products = product_cur.fetchall()
+            group_rows = group_cur.fetchall()
+    groups = {'category': [], 'status': [], 'total': None}
+    for row in group_rows:
+        by_category = row.pop('by_category')
+        by_status = row.pop('by_status')
+        if by_category == 0:
+            row.pop('status')
+            groups['category'].append(row)
+        elif by_status == 0:
+            row.pop('category')
+            groups['status'].append(row)
+        else:
+            row.pop('category')
+            row.pop('status')
+            groups['total'] = row
+    return {'products': products, 'groups': groups}
+
+
+def fetch_unparsed_prices() -> list:
+    """Products whose price text has no numeric reading (amount left NULL)."""
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT id, category, product_folder, field, value
+                FROM products,
+                     LATERAL (VALUES
+                         ('Cost To Make', cost_to_make, cost_to_make_amount),
+                         ('Sale Price', sale_price, sale_price_amount),
+                         ('Postage Price', postage_price, postage_price_amount)
+                     ) AS prices (field, value, amount)
+                WHERE value <> '' AND amount IS NULL
+                ORDER BY category, product_folder, field
+                """
+            )
+            return cur.fetchall()
+
+
+def fetch_change_version(table_name: str) -> str:
+    """ETag version for ``products`` or ``stock``, including deletes.
+
+    ``row_version`` values are drawn before commit, so a later version can
+    commit first and the maximum alone would miss the earlier one. The
+    version therefore also carries the newest writing transaction id below
+    the snapshot's xmin (the ``/api/changes`` window), which moves once every
+    earlier transaction has finished. All lookups are single index probes.
+    """
+    if table_name not in ('products', 'stock'):
+        raise ValueError(f'Untracked table: {table_name}')
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                WITH snapshot AS (
+                    SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint AS xmin
+                )
+                SELECT GREATEST(
+                           (SELECT COALESCE(MAX(row_version), 0) FROM {table_name}),
+                           (SELECT COALESCE(MAX(row_version), 0) FROM change_tombstones WHERE table_name = %s)
+                       ),
+                       GREATEST(
+                           (SELECT row_xid FROM {table_name}
+                            WHERE row_xid < (SELECT xmin FROM snapshot)
+                            ORDER BY row_xid DESC LIMIT 1),
+                           (SELECT row_xid FROM change_tombstones
+                            WHERE table_name = %s AND row_xid < (SELECT xmin FROM snapshot)
+                            ORDER BY row_xid DESC LIMIT 1),
+                           0
+                       )
+                """,
+                (table_name, table_name),
+            )
+            version, xid = cur.fetchone()
+            return f'{version}.{xid}'
+
+
+def fetch_changes(since: int) -> dict:
+    """Products and stock rows changed after ``since``, plus deleted ids.
+
+    Cursors are transaction ids (``migrations/0015_change_xids.sql``). One
+    repeatable-read snapshot returns rows written by transactions in
+    ``[since, xmin)``; every transaction below the snapshot's xmin has
+    finished, so nothing can commit later behind the returned cursor. Rows
+    from transactions still open are left for the next call.
+    """
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+            cur.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint AS cursor")
+            cursor = cur.fetchone()['cursor']
+            window = (since, cursor)
+            cur.execute(
+                PRODUCT_SELECT_BASE + " WHERE row_xid >= %s AND row_xid < %s ORDER BY row_version",
+                window,
+            )
+            products = cur.fetchall()
+            cur.execute(
+                """
+                SELECT id, category, product_folder, sku, color, size, quantity
+                FROM stock
+                WHERE row_xid >= %s AND row_xid < %s
+                ORDER BY row_version
+                """,
+                window,
+            )
+            stock = cur.fetchall()
+            cur.execute(
+                """
+                SELECT table_name, row_id
+                FROM change_tombstones
+                WHERE row_xid >= %s AND row_xid < %s
+                ORDER BY row_version
+                """,
+                window,
+            )
+            deleted = {'products': [], 'stock': []}
+            for row in cur.fetchall():
+                deleted[row['table_name']].append(row['row_id'])
+    return {'cursor': cursor, 'products': products, 'stock': stock, 'deleted': deleted}
+
+
 def fetch_stock() -> list:
     with get_connection() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
@@ -519,8 +1124,11 @@ def get_stock_entry(category: str, product_folder: str, color: str, size: str) -
             return cur.fetchone()
 
 
-def upsert_stock_entry(category: str, product_folder: str, sku: str, color: str, size: str, quantity: int):
+def upsert_stock_entry(
+    category: str, product_folder: str, sku: str, color: str, size: str, quantity: int, reason: str = 'manual'
+):
     with get_connection() as conn:
+        _queue_stock_context(conn, reason)
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -533,8 +1141,9 @@ def upsert_stock_entry(category: str, product_folder: str, sku: str, color: str,
             )
 
 
-def delete_stock_entry(category: str, product_folder: str, color: str, size: str):
+def delete_stock_entry(category: str, product_folder: str, color: str, size: str, reason: str = 'manual'):
     with get_connection() as conn:
+        _queue_stock_context(conn, reason)
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -568,6 +1177,188 @@ def update_stock_refs(old_category: str, old_folder: str, new_category: str, new
                 )
 
 
+def adjust_stock(
+    category: str, product_folder: str, sku: str, color: str, size: str, delta: int, reason: str = 'adjust'
+) -> dict | None:
+    """Add ``delta`` to a stock row in SQL, removing it when it reaches zero.
+
+    Returns ``{'quantity', 'removed'}``, or None when decrementing a variant
+    that has no stock row.
+    """
+    with get_connection() as conn:
+        with conn.pipeline():
+            _queue_stock_context(conn, reason)
+            cur = conn.cursor()
+            if delta > 0:
+                cur.execute(
+                    """
+                    INSERT INTO stock (category, product_folder, sku, color, size, quantity)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (category, product_folder, color, size)
+                    DO UPDATE SET quantity = stock.quantity + EXCLUDED.quantity,
+                                  sku = coalesce(nullif(EXCLUDED.sku, ''), stock.sku)
+                    RETURNING quantity
+                    """,
+                    (category, product_folder, sku, color, size, delta),
+                )
+            else:
+                cur = _queue_stock_change(conn, category, product_folder, sku, color, size, delta)
+        row = cur.fetchone()
+    if row is None:
+        return None
+    return {'quantity': row[0], 'removed': row[0] <= 0}
+
+
+def complete_production(item_id: int) -> dict | None:
+    """Move a production item into stock and remove it, atomically.
+
+    Returns None if the item does not exist (e.g. completed concurrently),
+    else ``{'stock_adjusted', 'new_quantity'}``.
+    """
+    with get_connection() as conn:
+        with conn.pipeline():
+            _queue_stock_context(conn, 'production', production_id=item_id)
+            item_cur = conn.cursor()
+            item_cur.execute("SELECT quantity FROM production_queue WHERE id = %s FOR UPDATE", (item_id,))
+            stock_cur = conn.cursor()
+            stock_cur.execute(
+                """
+                WITH item AS (
+                    DELETE FROM production_queue
+                    WHERE id = %s
+                    RETURNING category, product_folder, sku, color, size, quantity
+                )
+                INSERT INTO stock (category, product_folder, sku, color, size, quantity)
+                SELECT category, product_folder, sku, color, size, quantity
+                FROM item
+                WHERE quantity > 0
+                ON CONFLICT (category, product_folder, color, size)
+                DO UPDATE SET quantity = stock.quantity + EXCLUDED.quantity,
+                              sku = coalesce(nullif(EXCLUDED.sku, ''), stock.sku)
+                RETURNING quantity
+                """,
+                (item_id,),
+            )
+        item = item_cur.fetchone()
+        stock = stock_cur.fetchone()
+    if item is None:
+        return None
+    return {'stock_adjusted': stock is not None, 'new_quantity': stock[0] if stock else None}
+
+
+def take_stock_snapshot(note: str = '') -> dict:
+    """Checkpoint every stock row for ``fetch_stock_as_of`` (briefly blocks stock writes)."""
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute("SELECT take_stock_snapshot(%s) AS id", (note,))
+            snapshot_id = cur.fetchone()['id']
+            cur.execute(
+                """
+                SELECT id, taken_at::text AS taken_at, last_movement_id, note,
+                       (SELECT count(*) FROM stock_snapshot_rows WHERE snapshot_id = s.id) AS rows
+                FROM stock_snapshots AS s
+                WHERE id = %s
+                """,
+                (snapshot_id,),
+            )
+            return cur.fetchone()
+
+
+def maybe_take_stock_snapshot(min_movements: int) -> dict | None:
+    """Take a snapshot if at least ``min_movements`` were recorded since the last one."""
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            # Several workers may run the periodic check; only one snapshots.
+            cur.execute("SELECT pg_try_advisory_xact_lock(hashtext('stock_snapshots'))")
+            if not cur.fetchone()[0]:
+                return None
+            cur.execute(
+                """
+                SELECT coalesce((SELECT max(id) FROM stock_movements), 0)
+                     - coalesce((SELECT max(last_movement_id) FROM stock_snapshots), 0)
+                """
+            )
+            if cur.fetchone()[0] < min_movements:
+                return None
+    return take_stock_snapshot('periodic')
+
+
+def fetch_stock_snapshots(limit: int = 100) -> list:
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT id, taken_at::text AS taken_at, last_movement_id, note
+                FROM stock_snapshots
+                ORDER BY taken_at DESC
+                LIMIT %s
+                """,
+                (limit,),
+            )
+            return cur.fetchall()
+
+
+def fetch_stock_as_of(before: datetime.datetime, filters: dict | None = None) -> dict:
+    """Stock per variant just before ``before``.
+
+    Starts from the latest snapshot taken before then and replays only the
+    movements recorded after it. Returns ``{'snapshot', 'replayed', 'rows'}``.
+    """
+    filters = filters or {}
+    conditions = []
+    params = {'before': before}
+    for column in ('category', 'product_folder', 'sku'):
+        value = (filters.get(column) or '').strip()
+        if value:
+            params[column] = value
+            conditions.append(f'{column} = %({column})s')
+    filter_sql = ''.join(f' AND {condition}' for condition in conditions)
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT id, taken_at::text AS taken_at, last_movement_id, note
+                FROM stock_snapshots
+                WHERE taken_at < %(before)s
+                ORDER BY taken_at DESC
+                LIMIT 1
+                """,
+                params,
+            )
+            snapshot = cur.fetchone()
+            params['snapshot_id'] = snapshot['id'] if snapshot else None
+            params['after_id'] = snapshot['last_movement_id'] if snapshot else 0
+            cur.execute(
+                f"""
+                WITH changes AS (
+                    SELECT category, product_folder, sku, color, size, quantity, 0::bigint AS seq
+                    FROM stock_snapshot_rows
+                    WHERE snapshot_id = %(snapshot_id)s{filter_sql}
+                    UNION ALL
+                    SELECT category, product_folder, sku, color, size, delta, id
+                    FROM stock_movements
+                    WHERE id > %(after_id)s AND created_at < %(before)s{filter_sql}
+                )
+                SELECT category, product_folder,
+                       (array_agg(sku ORDER BY seq DESC))[1] AS sku,
+                       color, size,
+                       sum(quantity)::int AS quantity,
+                       count(*) FILTER (WHERE seq > 0) AS replayed
+                FROM changes
+                GROUP BY category, product_folder, color, size
+                ORDER BY category, product_folder, color, size
+                """,
+                params,
+            )
+            rows = cur.fetchall()
+    replayed = sum(row.pop('replayed') for row in rows)
+    return {
+        'snapshot': snapshot,
+        'replayed': replayed,
+        'rows': [row for row in rows if row['quantity'] != 0],
+    }
+
+
 def normalize_event_row(row: dict) -> dict:
     return {
         'name': _normalize_text(row.get('name')),
@@ -674,59 +1465,19 @@ def update_event(event_id: int, data: dict) -> bool:
                     payload['event_date'],
                     payload['location'],
                     payload['contact_name'],
-                    payload['contact_email'],
-                    payload['notes'],
-                    event_id,
-                ),
-            )
-            return cur.fetchone() is not None
-
-
-def delete_event(event_id: int) -> bool:
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("DELETE FROM events WHERE id = %s RETURNING id", (event_id,))
-            return cur.fetchone() is not None
-
-
-def insert_sale(data: dict) -> dict | None:
-    with get_connection() as conn:
-        with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
-                """
-                INSERT INTO sales (
-                    event_id,
-                    product_id,
-                    category,
-                    product_folder,
-                    sku,
-                    color,
-                    size,
-                    quantity,
-                    unit_price,
-                    override_price,
-                    payment_method
-                )
-                VALUES (
-                    %(event_id)s,
-                    %(product_id)s,
-                    %(category)s,
-                    %(product_folder)s,
-                    %(sku)s,
-                    %(color)s,
-                    %(size)s,
-                    %(quantity)s,
-                    %(unit_price)s,
-                    %(override_price)s,
-                    %(payment_method)s
-                )
-                RETURNING id, event_id, product_id, category, product_folder, sku, color, size,
-                          quantity, unit_price::text AS unit_price, override_price,
-                          payment_method, sold_at::text AS sold_at
-                """,
-                data,
+                    payload['contact_email'],
+                    payload['notes'],
+                    event_id,
+                ),
             )
-            return cur.fetchone()
+            return cur.fetchone() is not None
+
+
+def delete_event(event_id: int) -> bool:
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM events WHERE id = %s RETURNING id", (event_id,))
+            return cur.fetchone() is not None
 
 
 def fetch_sales(event_id: int) -> list:
@@ -736,7 +1487,8 @@ def fetch_sales(event_id: int) -> list:
                 """
                 SELECT id, event_id, product_id, category, product_folder, sku, color, size,
                        quantity, unit_price::text AS unit_price, override_price,
-                       payment_method, sold_at::text AS sold_at
+                       payment_method, sold_at::text AS sold_at,
+                       discount::text AS discount, transaction_id
                 FROM sales
                 WHERE event_id = %s
                 ORDER BY sold_at DESC, id DESC
@@ -881,75 +1633,6 @@ def adjust_production_quantity(item_id: int, delta: int) -> dict | None:
             return row
 
 
-def adjust_production_by_key(
-    category: str,
-    product_folder: str,
-    sku: str,
-    color: str,
-    size: str,
-    delta: int,
-    status: str = 'Queued',
-) -> dict | None:
-    if delta == 0:
-        return None
-    with get_connection() as conn:
-        with conn.cursor(row_factory=dict_row) as cur:
-            if delta > 0:
-                cur.execute(
-                    """
-                    INSERT INTO production_queue (
-                        category,
-                        product_folder,
-                        sku,
-                        color,
-                        size,
-                        quantity,
-                        status,
-                        updated_at
-                    )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, now())
-                    ON CONFLICT (category, product_folder, color, size, status)
-                    DO UPDATE SET
-                        quantity = production_queue.quantity + EXCLUDED.quantity,
-                        sku = EXCLUDED.sku,
-                        updated_at = now()
-                    RETURNING id, category, product_folder, sku, color, size, quantity,
-                              status, created_at::text AS created_at, updated_at::text AS updated_at
-                    """,
-                    (category, product_folder, sku, color, size, delta, status),
-                )
-                return cur.fetchone()
-            cur.execute(
-                """
-                UPDATE production_queue
-                SET quantity = quantity + %s, updated_at = now()
-                WHERE category = %s
-                  AND product_folder = %s
-                  AND color = %s
-                  AND size = %s
-                  AND status = %s
-                RETURNING id, quantity
-                """,
-                (delta, category, product_folder, color, size, status),
-            )
-            row = cur.fetchone()
-            if not row:
-                return None
-            if row['quantity'] <= 0:
-                cur.execute("DELETE FROM production_queue WHERE id = %s", (row['id'],))
-                return None
-            cur.execute(
-                """
-                SELECT id, category, product_folder, sku, color, size, quantity,
-                       status, created_at::text AS created_at, updated_at::text AS updated_at
-                FROM production_queue
-                WHERE id = %s
-                """,
-                (row['id'],),
-            )
-            return cur.fetchone()
-
-
 def fetch_event_media(event_id: int) -> list:
     with get_connection() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
@@ -1014,7 +1697,8 @@ def fetch_sale(sale_id: int) -> dict | None:
                 """
                 SELECT id, event_id, product_id, category, product_folder, sku, color, size,
                        quantity, unit_price::text AS unit_price, override_price,
-                       payment_method, sold_at::text AS sold_at
+                       payment_method, sold_at::text AS sold_at,
+                       discount::text AS discount, transaction_id
                 FROM sales
                 WHERE id = %s
                 """,
@@ -1023,10 +1707,530 @@ def fetch_sale(sale_id: int) -> dict | None:
             return cur.fetchone()
 
 
-def update_sale(sale_id: int, data: dict) -> dict | None:
+def _queue_stock_context(conn, reason: str, sale_id: int | None = None, production_id: int | None = None):
+    # Transaction-local tags read by the stock_movements trigger (migration 0010).
+    conn.execute(
+        """
+        SELECT set_config('stock_ledger.reason', %s, true),
+               set_config('stock_ledger.sale_id', %s, true),
+               set_config('stock_ledger.production_id', %s, true)
+        """,
+        (reason, '' if sale_id is None else str(sale_id), '' if production_id is None else str(production_id)),
+    )
+
+
+def _queue_stock_change(conn, category: str, product_folder: str, sku: str, color: str, size: str, delta: int):
+    # Applies the delta in SQL so concurrent sales cannot lose an update; rows
+    # that reach zero are removed, matching the stock table's convention.
+    # sku=None uses the SKU resolved by _queue_sale_lookup.
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE stock
+        SET quantity = GREATEST(quantity + %s, 0), sku = coalesce(%s, current_setting('sale.sku', true))
+        WHERE category = %s AND product_folder = %s AND color = %s AND size = %s
+        RETURNING quantity
+        """,
+        (delta, sku, category, product_folder, color, size),
+    )
+    if delta < 0:
+        conn.execute(
+            """
+            DELETE FROM stock
+            WHERE category = %s AND product_folder = %s AND color = %s AND size = %s AND quantity <= 0
+            """,
+            (category, product_folder, color, size),
+        )
+    return cur
+
+
+def _queue_production_change(
+    conn,
+    category: str,
+    product_folder: str,
+    sku: str,
+    color: str,
+    size: str,
+    delta: int,
+    status: str = 'Queued',
+):
+    if delta > 0:
+        conn.execute(
+            """
+            INSERT INTO production_queue (
+                category,
+                product_folder,
+                sku,
+                color,
+                size,
+                quantity,
+                status,
+                updated_at
+            )
+            VALUES (%s, %s, coalesce(%s, current_setting('sale.sku', true)), %s, %s, %s, %s, now())
+            ON CONFLICT (category, product_folder, color, size, status)
+            DO UPDATE SET
+                quantity = production_queue.quantity + EXCLUDED.quantity,
+                sku = EXCLUDED.sku,
+                updated_at = now()
+            """,
+            (category, product_folder, sku, color, size, delta, status),
+        )
+    elif delta < 0:
+        conn.execute(
+            """
+            UPDATE production_queue
+            SET quantity = quantity + %s, updated_at = now()
+            WHERE category = %s AND product_folder = %s AND color = %s AND size = %s AND status = %s
+            """,
+            (delta, category, product_folder, color, size, status),
+        )
+        conn.execute(
+            """
+            DELETE FROM production_queue
+            WHERE category = %s AND product_folder = %s AND color = %s AND size = %s AND status = %s
+              AND quantity <= 0
+            """,
+            (category, product_folder, color, size, status),
+        )
+
+
+def _stock_result(cursors: list, new_quantity_cursor=None) -> dict:
+    results = {id(cur): cur.fetchone() for cur in cursors}
+    adjusted = any(row is not None for row in results.values())
+    new_quantity = None
+    if new_quantity_cursor is not None:
+        row = results.get(id(new_quantity_cursor))
+        if row is not None:
+            new_quantity = row[0]
+    return {'stock_adjusted': adjusted, 'new_quantity': new_quantity}
+
+
+def _queue_sale_lookup(conn, data: dict):
+    # Resolves the sale's product id and SKU (the product's SKU when it has
+    # one, else the till's) into transaction settings, so the statements
+    # queued after it need no lookup round trip. Pass product_id/sku as None
+    # to those statements to use them.
+    conn.execute(
+        """
+        SELECT set_config('sale.product_id', coalesce(p.id::text, ''), true),
+               set_config('sale.sku', coalesce(nullif(btrim(p.sku), ''), %(sku)s), true)
+        FROM (SELECT 1) AS one
+        LEFT JOIN products AS p ON p.category = %(category)s AND p.product_folder = %(product_folder)s
+        """,
+        data,
+    )
+
+
+def _queue_sale_insert(conn, data: dict):
+    # Inserts the sale and tags the following stock statements with its id
+    # (currval of the sales sequence) for the stock ledger.
+    sale_cur = conn.cursor(row_factory=dict_row)
+    sale_cur.execute(
+        """
+        INSERT INTO sales (
+            event_id,
+            product_id,
+            category,
+            product_folder,
+            sku,
+            color,
+            size,
+            quantity,
+            unit_price,
+            override_price,
+            payment_method,
+            sold_at,
+            transaction_id,
+            discount
+        )
+        VALUES (
+            %(event_id)s,
+            coalesce(%(product_id)s, nullif(current_setting('sale.product_id', true), '')::bigint),
+            %(category)s,
+            %(product_folder)s,
+            coalesce(%(sku)s, current_setting('sale.sku', true)),
+            %(color)s,
+            %(size)s,
+            %(quantity)s,
+            %(unit_price)s,
+            %(override_price)s,
+            %(payment_method)s,
+            coalesce(%(sold_at)s::timestamptz, now()),
+            %(transaction_id)s,
+            coalesce(%(discount)s, 0)
+        )
+        RETURNING id, event_id, product_id, category, product_folder, sku, color, size,
+                  quantity, unit_price::text AS unit_price, override_price,
+                  payment_method, sold_at::text AS sold_at,
+                  discount::text AS discount, transaction_id, line_total::text AS line_total
+        """,
+        {**data, 'sold_at': data.get('sold_at'), 'transaction_id': data.get('transaction_id'),
+         'discount': data.get('discount')},
+    )
+    conn.execute(
+        """
+        SELECT set_config('stock_ledger.reason', 'sale', true),
+               set_config('stock_ledger.sale_id', currval(pg_get_serial_sequence('sales', 'id'))::text, true)
+        """
+    )
+    return sale_cur
+
+
+def record_sale(data: dict) -> dict | None:
+    """Insert a sale, decrement stock and queue a reprint in one transaction.
+
+    ``data`` is a till sale as from ``server.parse_sale_line``; the product
+    id and SKU are looked up here. All statements are pipelined, so the
+    whole sale costs one round trip, and the sales foreign key reports an
+    unknown event. ``sold_at`` is optional (defaults to now).
+    Returns ``{'sale', 'stock_adjusted', 'new_quantity'}``, or
+    ``{'error': 'Event not found'}``.
+    """
+    key = (data['category'], data['product_folder'], None, data['color'], data['size'])
+    try:
+        with get_connection() as conn:
+            with conn.pipeline():
+                _queue_sale_lookup(conn, data)
+                sale_cur = _queue_sale_insert(conn, {**data, 'product_id': None, 'sku': None})
+                stock_cur = _queue_stock_change(conn, *key, -data['quantity'])
+                _queue_production_change(conn, *key, data['quantity'])
+            sale = sale_cur.fetchone()
+            if not sale:
+                return None
+            return {'sale': sale, **_stock_result([stock_cur], stock_cur)}
+    except psycopg.errors.ForeignKeyViolation as exc:
+        if exc.diag.constraint_name != 'sales_event_id_fkey':
+            raise
+        return {'error': 'Event not found'}
+
+
+def sale_fingerprint(line: dict) -> str:
+    """Stable hash of what a till sent for a sale, ignoring looked-up fields."""
+    sold_at = line.get('sold_at')
+    payload = [
+        line['event_id'], line['category'], line['product_folder'], line['color'], line['size'],
+        line['quantity'], str(line['unit_price']), line['override_price'], line['payment_method'],
+        sold_at.isoformat() if sold_at else None,
+    ]
+    return hashlib.sha256(json.dumps(payload).encode('utf-8')).hexdigest()
+
+
+def record_sales_batch(lines: list) -> dict:
+    """Record many till sales, each under a client idempotency key, in one transaction.
+
+    Each line is a ``record_sale`` payload without ``product_id`` plus an
+    ``idempotency_key``; product id and SKU are looked up here. Keys are
+    claimed in ``sale_requests`` with ``ON CONFLICT DO NOTHING``, so a key
+    already recorded (or being recorded by a concurrent request, which is
+    waited for) is not applied again. Sales are applied in variant order so
+    concurrent batches lock stock rows in the same order.
+
+    Returns ``{'results', 'stock'}``: one result per line in input order with
+    ``status`` ``applied``, ``duplicate`` (same key and same sale),
+    ``conflict`` (same key, different sale) or ``error`` (unknown event),
+    and the resulting quantity of every variant the batch named.
+    """
+    results = [{'idempotency_key': line['idempotency_key']} for line in lines]
+    fingerprints = [sale_fingerprint(line) for line in lines]
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                "SELECT id FROM events WHERE id = ANY(%s)",
+                (sorted({line['event_id'] for line in lines}),),
+            )
+            events = {row['id'] for row in cur.fetchall()}
+            cur.execute(
+                """
+                SELECT category, product_folder, id, sku
+                FROM products
+                WHERE (category, product_folder) IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+                """,
+                ([line['category'] for line in lines], [line['product_folder'] for line in lines]),
+            )
+            products = {(row['category'], row['product_folder']): row for row in cur.fetchall()}
+
+            first_by_key = {}
+            for index, line in enumerate(lines):
+                if line['event_id'] not in events:
+                    results[index].update(status='error', error='Event not found')
+                else:
+                    first_by_key.setdefault(line['idempotency_key'], index)
+            cur.execute(
+                """
+                INSERT INTO sale_requests (idempotency_key, fingerprint)
+                SELECT * FROM unnest(%s::text[], %s::text[]) ORDER BY 1
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING idempotency_key
+                """,
+                (list(first_by_key), [fingerprints[index] for index in first_by_key.values()]),
+            )
+            claimed = sorted(
+                (first_by_key[row['idempotency_key']] for row in cur.fetchall()),
+                key=lambda index: (lines[index]['category'], lines[index]['product_folder'],
+                                   lines[index]['color'], lines[index]['size'], index),
+            )
+
+        pending = []
+        with conn.pipeline():
+            for index in claimed:
+                line = lines[index]
+                product = products.get((line['category'], line['product_folder']))
+                data = {
+                    **line,
+                    'product_id': product['id'] if product else None,
+                    'sku': ((product['sku'] or '').strip() if product else '') or line['sku'],
+                }
+                key = (data['category'], data['product_folder'], data['sku'], data['color'], data['size'])
+                sale_cur = _queue_sale_insert(conn, data)
+                conn.execute(
+                    """
+                    UPDATE sale_requests SET sale_id = currval(pg_get_serial_sequence('sales', 'id'))
+                    WHERE idempotency_key = %s
+                    """,
+                    (line['idempotency_key'],),
+                )
+                stock_cur = _queue_stock_change(conn, *key, -data['quantity'])
+                _queue_production_change(conn, *key, data['quantity'])
+                pending.append((index, sale_cur, stock_cur))
+        for index, sale_cur, stock_cur in pending:
+            results[index].update(status='applied', sale=sale_cur.fetchone(), **_stock_result([stock_cur], stock_cur))
+
+        with conn.cursor(row_factory=dict_row) as cur:
+            repeated = [index for index, result in enumerate(results) if 'status' not in result]
+            if repeated:
+                cur.execute(
+                    """
+                    SELECT r.idempotency_key, r.fingerprint,
+                           s.id, s.event_id, s.product_id, s.category, s.product_folder, s.sku, s.color,
+                           s.size, s.quantity, s.unit_price::text AS unit_price, s.override_price,
+                           s.payment_method, s.sold_at::text AS sold_at, s.discount::text AS discount,
+                           s.transaction_id, s.line_total::text AS line_total
+                    FROM sale_requests AS r
+                    LEFT JOIN sales AS s ON s.id = r.sale_id
+                    WHERE r.idempotency_key = ANY(%s)
+                    """,
+                    ([lines[index]['idempotency_key'] for index in repeated],),
+                )
+                recorded = {row.pop('idempotency_key'): row for row in cur.fetchall()}
+                for index in repeated:
+                    row = dict(recorded[lines[index]['idempotency_key']])
+                    fingerprint = row.pop('fingerprint')
+                    if fingerprint != fingerprints[index]:
+                        results[index].update(status='conflict', error='Idempotency key was used for a different sale')
+                    else:
+                        # sale is None when the original sale has since been deleted.
+                        results[index].update(status='duplicate', sale=row if row['id'] is not None else None)
+
+            variants = sorted({
+                (line['category'], line['product_folder'], line['color'], line['size'])
+                for index, line in enumerate(lines) if results[index]['status'] != 'error'
+            })
+            cur.execute(
+                """
+                SELECT v.category, v.product_folder, v.color, v.size, coalesce(s.quantity, 0) AS quantity
+                FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[]) AS v(category, product_folder, color, size)
+                LEFT JOIN stock AS s USING (category, product_folder, color, size)
+                ORDER BY 1, 2, 3, 4
+                """,
+                tuple(list(column) for column in zip(*variants)) if variants else ([], [], [], []),
+            )
+            stock = cur.fetchall()
+    return {'results': results, 'stock': stock}
+
+
+def allocate_discount(amounts: list, discount: Decimal) -> list:
+    """Split ``discount`` across line amounts in proportion, to the penny.
+
+    Shares are rounded down and the leftover pennies go to the lines with the
+    largest remainders (earliest first on ties), so they always sum to
+    ``discount`` and no line is discounted below zero.
+    """
+    total = sum(amounts, Decimal('0'))
+    if not discount or not total:
+        return [Decimal('0.00')] * len(amounts)
+    penny = Decimal('0.01')
+    exact = [discount * amount / total for amount in amounts]
+    shares = [value.quantize(penny, rounding='ROUND_DOWN') for value in exact]
+    leftover = int((discount - sum(shares, Decimal('0'))) / penny)
+    by_remainder = sorted(range(len(amounts)), key=lambda index: (shares[index] - exact[index], index))
+    for index in by_remainder[:leftover]:
+        shares[index] += penny
+    return shares
+
+
+SALE_TRANSACTION_COLUMNS = """
+    id, event_id, payment_method, items, subtotal::text AS subtotal, discount::text AS discount,
+    total::text AS total, idempotency_key, created_at::text AS created_at
+"""
+
+
+def _select_sale_transaction(cur, transaction_id: int) -> dict | None:
+    cur.execute(
+        f"SELECT {SALE_TRANSACTION_COLUMNS} FROM sale_transactions WHERE id = %s",
+        (transaction_id,),
+    )
+    transaction = cur.fetchone()
+    if not transaction:
+        return None
+    cur.execute(
+        """
+        SELECT id, event_id, product_id, category, product_folder, sku, color, size,
+               quantity, unit_price::text AS unit_price, override_price,
+               payment_method, sold_at::text AS sold_at,
+               discount::text AS discount, transaction_id, line_total::text AS line_total
+        FROM sales
+        WHERE transaction_id = %s
+        ORDER BY id
+        """,
+        (transaction_id,),
+    )
+    return {'transaction': transaction, 'lines': cur.fetchall()}
+
+
+def fetch_sale_transaction(transaction_id: int) -> dict | None:
+    """A checkout basket with its current sales lines."""
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            return _select_sale_transaction(cur, transaction_id)
+
+
+def checkout(basket: dict) -> dict:
+    """Price and record a multi-line basket as one sale transaction.
+
+    ``basket`` has ``event_id``, ``payment_method``, ``discount`` (amount)
+    or ``discount_pct``, optional ``idempotency_key`` and ``sold_at``, and
+    ``lines`` of category, product_folder, sku, color, size, quantity,
+    unit_price (None to use the product's sale price) and override_price.
+
+    Three round trips whatever the basket size: one query validates the
+    event and prices every line, one inserts the header, and one pipeline
+    records the lines with their stock and production changes (in variant
+    order, like ``record_sales_batch``). Raises ValueError for an unknown
+    event, an unpriced line or a discount larger than the subtotal. A
+    repeated ``idempotency_key`` returns the original basket with
+    ``duplicate`` set.
+    """
+    lines = basket['lines']
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT l.position, p.id AS product_id, p.sku AS product_sku,
+                       coalesce(l.unit_price, p.sale_price_amount) AS unit_price,
+                       sale_line_total(l.quantity, coalesce(l.unit_price, p.sale_price_amount), l.override_price)
+                           AS gross,
+                       EXISTS (SELECT 1 FROM events WHERE id = %s) AS event_exists
+                FROM unnest(%s::text[], %s::text[], %s::int[], %s::numeric[], %s::text[])
+                     WITH ORDINALITY AS l(category, product_folder, quantity, unit_price, override_price, position)
+                LEFT JOIN products AS p USING (category, product_folder)
+                ORDER BY l.position
+                """,
+                (
+                    basket['event_id'],
+                    [line['category'] for line in lines],
+                    [line['product_folder'] for line in lines],
+                    [line['quantity'] for line in lines],
+                    [line['unit_price'] for line in lines],
+                    [line['override_price'] for line in lines],
+                ),
+            )
+            priced = cur.fetchall()
+            if not priced[0]['event_exists']:
+                raise ValueError('Event not found')
+            unpriced = [row['position'] for row in priced if row['unit_price'] is None]
+            if unpriced:
+                raise ValueError(f'No price for line {unpriced[0]}; send unit_price')
+            subtotal = sum((row['gross'] for row in priced), Decimal('0.00'))
+            discount = basket.get('discount') or Decimal('0.00')
+            if basket.get('discount_pct'):
+                discount = (subtotal * basket['discount_pct'] / 100).quantize(Decimal('0.01'))
+            if discount > subtotal:
+                raise ValueError('Discount is larger than the basket total')
+            if any(row['gross'] < 0 for row in priced) and discount:
+                raise ValueError('Cannot discount a basket with negative lines')
+            shares = allocate_discount([row['gross'] for row in priced], discount)
+
+            cur.execute(
+                f"""
+                INSERT INTO sale_transactions
+                    (event_id, payment_method, items, subtotal, discount, total, idempotency_key)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING {SALE_TRANSACTION_COLUMNS}
+                """,
+                (
+                    basket['event_id'], basket['payment_method'], sum(line['quantity'] for line in lines),
+                    subtotal, discount, subtotal - discount, basket.get('idempotency_key') or None,
+                ),
+            )
+            transaction = cur.fetchone()
+            if transaction is None:
+                cur.execute(
+                    "SELECT id FROM sale_transactions WHERE idempotency_key = %s",
+                    (basket['idempotency_key'],),
+                )
+                return {**_select_sale_transaction(cur, cur.fetchone()['id']), 'duplicate': True}
+
+        order = sorted(
+            range(len(lines)),
+            key=lambda index: (lines[index]['category'], lines[index]['product_folder'],
+                               lines[index]['color'], lines[index]['size'], index),
+        )
+        recorded = [None] * len(lines)
+        with conn.pipeline():
+            for index in order:
+                line, row = lines[index], priced[index]
+                data = {
+                    **line,
+                    'event_id': basket['event_id'],
+                    'product_id': row['product_id'],
+                    'sku': (row['product_sku'] or '').strip() or line['sku'],
+                    'unit_price': row['unit_price'],
+                    'payment_method': basket['payment_method'],
+                    'sold_at': basket.get('sold_at'),
+                    'transaction_id': transaction['id'],
+                    'discount': shares[index],
+                }
+                key = (data['category'], data['product_folder'], data['sku'], data['color'], data['size'])
+                sale_cur = _queue_sale_insert(conn, data)
+                stock_cur = _queue_stock_change(conn, *key, -data['quantity'])
+                _queue_production_change(conn, *key, data['quantity'])
+                recorded[index] = (sale_cur, stock_cur)
+        return {
+            'transaction': transaction,
+            'lines': [
+                {**sale_cur.fetchone(), **_stock_result([stock_cur], stock_cur)}
+                for sale_cur, stock_cur in recorded
+            ],
+            'duplicate': False,
+        }
+
+
+def record_sale_update(sale_id: int, data: dict) -> dict | None:
+    """Update a sale and move its stock/production effect in one transaction.
+
+    The stored sale is locked first so concurrent edits see a consistent
+    quantity; the remaining statements are pipelined.
+    """
     with get_connection() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
             cur.execute(
+                "SELECT category, product_folder, sku, color, size, quantity FROM sales WHERE id = %s FOR UPDATE",
+                (sale_id,),
+            )
+            existing = cur.fetchone()
+        if not existing:
+            return None
+        old_key = (existing['category'], existing['product_folder'], existing['color'], existing['size'])
+        old_qty = existing['quantity'] or 0
+        old_sku = existing['sku'] or ''
+        new_key = (data['category'], data['product_folder'], data['color'], data['size'])
+        quantity = data['quantity']
+        sku = data['sku']
+        with conn.pipeline():
+            sale_cur = conn.cursor(row_factory=dict_row)
+            sale_cur.execute(
                 """
                 UPDATE sales
                 SET product_id = %(product_id)s,
@@ -1044,15 +2248,31 @@ def update_sale(sale_id: int, data: dict) -> dict | None:
                           quantity, unit_price::text AS unit_price, override_price,
                           payment_method, sold_at::text AS sold_at
                 """,
-                {
-                    'sale_id': sale_id,
-                    **data,
-                },
+                {'sale_id': sale_id, **data},
             )
-            return cur.fetchone()
-
-
-def delete_sale(sale_id: int) -> dict | None:
+            _queue_stock_context(conn, 'sale_update', sale_id=sale_id)
+            if old_key == new_key:
+                new_cur = _queue_stock_change(
+                    conn, new_key[0], new_key[1], sku, new_key[2], new_key[3], old_qty - quantity
+                )
+                stock_cursors = [new_cur]
+                _queue_production_change(
+                    conn, new_key[0], new_key[1], sku, new_key[2], new_key[3], quantity - old_qty
+                )
+            else:
+                old_cur = _queue_stock_change(conn, old_key[0], old_key[1], old_sku, old_key[2], old_key[3], old_qty)
+                new_cur = _queue_stock_change(conn, new_key[0], new_key[1], sku, new_key[2], new_key[3], -quantity)
+                stock_cursors = [old_cur, new_cur]
+                _queue_production_change(conn, old_key[0], old_key[1], old_sku, old_key[2], old_key[3], -old_qty)
+                _queue_production_change(conn, new_key[0], new_key[1], sku, new_key[2], new_key[3], quantity)
+        sale = sale_cur.fetchone()
+        if not sale:
+            return None
+        return {'sale': sale, **_stock_result(stock_cursors, new_cur)}
+
+
+def record_sale_delete(sale_id: int) -> dict | None:
+    """Delete a sale, return its items to stock and shrink the reprint queue."""
     with get_connection() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
             cur.execute(
@@ -1065,36 +2285,36 @@ def delete_sale(sale_id: int) -> dict | None:
                 """,
                 (sale_id,),
             )
-            return cur.fetchone()
-
-
-def fetch_recent_sales(limit: int) -> list:
-    with get_connection() as conn:
-        with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
-                """
-                SELECT s.id,
-                       s.event_id,
-                       e.name AS event_name,
-                       s.product_id,
-                       s.category,
-                       s.product_folder,
-                       s.sku,
-                       s.color,
-                       s.size,
-                       s.quantity,
-                       s.unit_price::text AS unit_price,
-                       s.override_price,
-                       s.payment_method,
-                       s.sold_at::text AS sold_at
-                FROM sales AS s
-                JOIN events AS e ON e.id = s.event_id
-                ORDER BY s.sold_at DESC, s.id DESC
-                LIMIT %s
-                """,
-                (limit,),
-            )
-            return cur.fetchall()
+            deleted = cur.fetchone()
+        if not deleted:
+            return None
+        key = (deleted['category'], deleted['product_folder'], deleted['sku'] or '', deleted['color'], deleted['size'])
+        old_qty = deleted['quantity'] or 0
+        with conn.pipeline():
+            _queue_stock_context(conn, 'sale_delete', sale_id=sale_id)
+            stock_cur = _queue_stock_change(conn, *key, old_qty)
+            _queue_production_change(conn, *key, -old_qty)
+        return {'sale': deleted, **_stock_result([stock_cur], stock_cur)}
+
+
+RECENT_SALES_SELECT = """
+    SELECT s.id,
+           s.event_id,
+           e.name AS event_name,
+           s.product_id,
+           s.category,
+           s.product_folder,
+           s.sku,
+           s.color,
+           s.size,
+           s.quantity,
+           s.unit_price::text AS unit_price,
+           s.override_price,
+           s.payment_method,
+           s.sold_at::text AS sold_at
+    FROM sales AS s
+    JOIN events AS e ON e.id = s.event_id
+"""
 
 
 def fetch_event_targets(event_id: int) -> list:
@@ -1162,35 +2382,426 @@ def delete_event_target(target_id: int) -> bool:
 
 
 def fetch_event_totals(event_id: int) -> dict:
+    """Totals for an event plus payment, SKU and hourly breakdowns.
+
+    Revenue uses ``sales.line_total`` (override price when it parses, else
+    unit price, times quantity). Everything comes from one GROUPING SETS
+    query, so the cost is a single scan of the event's sales.
+    """
     with get_connection() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
             cur.execute(
                 """
-                SELECT COALESCE(SUM(quantity), 0)::int AS total_items,
-                       COALESCE(SUM(quantity * unit_price), 0)::numeric(10, 2)::text AS total_revenue
+                SELECT coalesce(nullif(payment_method, ''), 'Unknown') AS payment_method,
+                       sku, category, product_folder,
+                       date_trunc('hour', sold_at AT TIME ZONE 'Europe/London')::text AS hour,
+                       GROUPING(coalesce(nullif(payment_method, ''), 'Unknown')) AS by_payment,
+                       GROUPING(sku, category, product_folder) AS by_sku,
+                       GROUPING(date_trunc('hour', sold_at AT TIME ZONE 'Europe/London')) AS by_hour,
+                       count(*) AS sales,
+                       count(*) FILTER (WHERE parse_price_text(override_price) IS NOT NULL) AS overridden,
+                       sum(quantity)::int AS items,
+                       sum(line_total)::numeric(12, 2)::text AS revenue
                 FROM sales
                 WHERE event_id = %s
+                GROUP BY GROUPING SETS (
+                    (),
+                    (coalesce(nullif(payment_method, ''), 'Unknown')),
+                    (sku, category, product_folder),
+                    (date_trunc('hour', sold_at AT TIME ZONE 'Europe/London'))
+                )
                 """,
                 (event_id,),
             )
-            totals = cur.fetchone() or {'total_items': 0, 'total_revenue': '0.00'}
+            rows = cur.fetchall()
+    totals = {
+        'total_items': 0,
+        'total_revenue': '0.00',
+        'sales': 0,
+        'overridden': 0,
+        'payments': {},
+        'by_payment': [],
+        'by_sku': [],
+        'hourly': [],
+    }
+    for row in rows:
+        by_payment = row.pop('by_payment')
+        by_sku = row.pop('by_sku')
+        by_hour = row.pop('by_hour')
+        if by_payment == 0:
+            totals['by_payment'].append(
+                {key: row[key] for key in ('payment_method', 'sales', 'items', 'revenue')}
+            )
+        elif by_sku == 0:
+            totals['by_sku'].append(
+                {key: row[key] for key in ('sku', 'category', 'product_folder', 'sales', 'items', 'revenue')}
+            )
+        elif by_hour == 0:
+            totals['hourly'].append({key: row[key] for key in ('hour', 'sales', 'items', 'revenue')})
+        elif row['sales']:
+            totals['total_items'] = row['items']
+            totals['total_revenue'] = row['revenue']
+            totals['sales'] = row['sales']
+            totals['overridden'] = row['overridden']
+    totals['by_payment'].sort(key=lambda item: item['payment_method'])
+    totals['payments'] = {item['payment_method']: item['revenue'] for item in totals['by_payment']}
+    totals['by_sku'].sort(key=lambda item: (-Decimal(item['revenue']), item['sku'], item['category'], item['product_folder']))
+    totals['hourly'].sort(key=lambda item: item['hour'])
+    running = Decimal('0')
+    for item in totals['hourly']:
+        running += Decimal(item['revenue'])
+        item['cumulative_revenue'] = str(running)
+    return totals
+
+
+ROLLUP_MEASURES = ('items', 'revenue', 'sales')
+MONTH_RE = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+
+def rebuild_sales_rollups() -> dict:
+    """Recompute the sales rollup tables from ``sales`` (blocks sale writes meanwhile)."""
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute("SELECT rebuild_sales_rollups()")
             cur.execute(
                 """
-                SELECT payment_method,
-                       COALESCE(SUM(quantity * unit_price), 0)::numeric(10, 2)::text AS total
-                FROM sales
-                WHERE event_id = %s
-                GROUP BY payment_method
-                ORDER BY payment_method
-                """,
-                (event_id,),
+                SELECT (SELECT count(*) FROM sales_rollup_events) AS events,
+                       (SELECT count(*) FROM sales_rollup_days) AS days,
+                       (SELECT count(*) FROM sales_rollup_variants) AS variants
+                """
             )
-            payments = {row['payment_method'] or 'Unknown': row['total'] for row in cur.fetchall()}
-    return {
-        'total_items': totals.get('total_items', 0),
-        'total_revenue': totals.get('total_revenue', '0.00'),
-        'payments': payments,
+            return cur.fetchone()
+
+
+def check_sales_rollups() -> dict:
+    """Keys per rollup table whose totals differ from a fresh aggregate of ``sales``."""
+    checks = {
+        'events': ('event_id', 'event_id', 'sales_rollup_events'),
+        'days': ('sale_day(sold_at) AS day, category', 'day, category', 'sales_rollup_days'),
+        'variants': (
+            'category, product_folder, sku, color, size',
+            'category, product_folder, sku, color, size',
+            'sales_rollup_variants',
+        ),
     }
+    result = {}
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            for name, (select_keys, keys, table) in checks.items():
+                cur.execute(
+                    f"""
+                    WITH fresh AS (
+                        SELECT {select_keys}, count(*) AS sales, sum(quantity) AS items, sum(line_total) AS revenue
+                        FROM sales
+                        GROUP BY {keys}
+                    ),
+                    stored AS (
+                        SELECT * FROM {table} WHERE sales <> 0 OR items <> 0 OR revenue <> 0
+                    )
+                    SELECT count(*)
+                    FROM fresh FULL JOIN stored USING ({keys})
+                    WHERE (fresh.sales, fresh.items, fresh.revenue)
+                          IS DISTINCT FROM (stored.sales, stored.items, stored.revenue)
+                    """
+                )
+                result[name] = cur.fetchone()[0]
+    return result
+
+
+def fetch_best_sellers(by: str = 'items', level: str = 'product', category: str = '', limit: int = 20) -> list:
+    """Top products (or colour/size variants) across all sales, from the rollups."""
+    if by not in ROLLUP_MEASURES:
+        raise ValueError(f'Unknown measure: {by}')
+    if level not in ('product', 'variant'):
+        raise ValueError(f'Unknown level: {level}')
+    keys = 'category, product_folder, sku' + (', color, size' if level == 'variant' else '')
+    params = {'limit': limit}
+    where_sql = ''
+    if category:
+        params['category'] = category
+        where_sql = 'WHERE category = %(category)s'
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                f"""
+                SELECT {keys},
+                       sum(sales)::int AS sales,
+                       sum(items)::int AS items,
+                       sum(revenue)::text AS revenue
+                FROM sales_rollup_variants
+                {where_sql}
+                GROUP BY {keys}
+                HAVING sum(sales) > 0
+                ORDER BY sum({by}) DESC, {keys}
+                LIMIT %(limit)s
+                """,
+                params,
+            )
+            return cur.fetchall()
+
+
+def fetch_revenue_by_month(category: str = '', month_from: str = '', month_to: str = '') -> list:
+    """Monthly sales, items and revenue (``YYYY-MM`` bounds, inclusive)."""
+    conditions = ['sales > 0']
+    params = {}
+    for name, value, operator in (('month_from', month_from, '>='), ('month_to', month_to, '<')):
+        if not value:
+            continue
+        if not MONTH_RE.match(value):
+            raise ValueError(f'Invalid month: {value}')
+        params[name] = f'{value}-01'
+        bound = f'%({name})s::date' + (" + interval '1 month'" if name == 'month_to' else '')
+        conditions.append(f'day {operator} {bound}')
+    if category:
+        params['category'] = category
+        conditions.append('category = %(category)s')
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                f"""
+                SELECT to_char(date_trunc('month', day), 'YYYY-MM') AS month,
+                       sum(sales)::int AS sales,
+                       sum(items)::int AS items,
+                       sum(revenue)::text AS revenue
+                FROM sales_rollup_days
+                WHERE {' AND '.join(conditions)}
+                GROUP BY 1
+                ORDER BY 1
+                """,
+                params,
+            )
+            return cur.fetchall()
+
+
+def fetch_event_league(by: str = 'revenue', limit: int = 50) -> list:
+    """Events ranked by revenue, items or sales, from the rollups."""
+    if by not in ROLLUP_MEASURES:
+        raise ValueError(f'Unknown measure: {by}')
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                f"""
+                SELECT rank() OVER (ORDER BY r.{by} DESC)::int AS rank,
+                       e.id AS event_id, e.name, e.event_date::text AS event_date, e.location,
+                       r.sales::int AS sales, r.items::int AS items, r.revenue::text AS revenue,
+                       round(r.revenue / NULLIF(r.sales, 0), 2)::text AS average_sale
+                FROM sales_rollup_events AS r
+                JOIN events AS e ON e.id = r.event_id
+                WHERE r.sales > 0
+                ORDER BY r.{by} DESC, e.event_date DESC, e.id
+                LIMIT %s
+                """,
+                (limit,),
+            )
+            return cur.fetchall()
+
+
+PRINT_FILE_COLUMNS = """
+    f.rel_path, f.category, f.product_folder, f.file_name, f.file_size, f.mtime_ns, f.sha256,
+    m.slicer, m.printer, coalesce(m.sliced, false) AS sliced, m.plate_count, m.object_count,
+    m.print_seconds, m.filament_grams::text AS filament_grams,
+    coalesce(m.filament_by_color, '{}'::jsonb) AS filament_by_color, m.error,
+    m.extracted_at::text AS extracted_at
+"""
+PRINT_FILE_SORTS = {
+    'time': ['m.print_seconds'],
+    'grams': ['m.filament_grams'],
+    'objects': ['m.object_count'],
+    'plates': ['m.plate_count'],
+    'size': ['f.file_size'],
+    'name': ['f.file_name'],
+    'folder': ['f.category', 'f.product_folder', 'f.file_name'],
+    'recent': ['f.indexed_at'],
+}
+
+
+@contextmanager
+def try_advisory_lock(name: str):
+    """Yield whether this process got the named session lock.
+
+    Lets one of several server processes run a background job; the lock is
+    released (or dropped with the connection) when the block exits.
+    """
+    key = int.from_bytes(hashlib.sha256(name.encode('utf-8')).digest()[:8], 'big', signed=True)
+    with get_connection() as conn:
+        acquired = conn.execute('SELECT pg_try_advisory_lock(%s)', (key,)).fetchone()[0]
+        conn.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute('SELECT pg_advisory_unlock(%s)', (key,))
+
+
+def fetch_print_file_meta(sha256: str) -> dict | None:
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                "SELECT sha256, extractor_version, metadata, error FROM print_file_meta WHERE sha256 = %s",
+                (sha256,),
+            )
+            row = cur.fetchone()
+    if not row:
+        return None
+    return {**row['metadata'], 'extractor_version': row['extractor_version'], 'error': row['error']}
+
+
+def save_print_file_meta(sha256: str, file_size: int, meta: dict | None, error: str | None = None):
+    """Store extracted metadata (or the extraction error) for a file hash."""
+    meta = meta or {}
+    grams = meta.get('filament_grams')
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO print_file_meta (
+                sha256, file_size, extractor_version, slicer, printer, sliced, plate_count,
+                object_count, print_seconds, filament_grams, filament_by_color, metadata, error
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s::jsonb, %s::jsonb, %s)
+            ON CONFLICT (sha256) DO UPDATE
+            SET extractor_version = EXCLUDED.extractor_version, slicer = EXCLUDED.slicer,
+                printer = EXCLUDED.printer, sliced = EXCLUDED.sliced, plate_count = EXCLUDED.plate_count,
+                object_count = EXCLUDED.object_count, print_seconds = EXCLUDED.print_seconds,
+                filament_grams = EXCLUDED.filament_grams, filament_by_color = EXCLUDED.filament_by_color,
+                metadata = EXCLUDED.metadata, error = EXCLUDED.error, extracted_at = now()
+            """,
+            (
+                sha256, file_size, meta.get('extractor_version', 0), meta.get('slicer'), meta.get('printer'),
+                bool(meta.get('sliced')), meta.get('plate_count'), meta.get('object_count'),
+                meta.get('print_seconds'), None if grams is None else Decimal(str(grams)),
+                json.dumps(meta.get('filament_by_color') or {}), json.dumps(meta), error,
+            ),
+        )
+
+
+def upsert_print_file(row: dict):
+    with get_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO print_files (rel_path, category, product_folder, file_name, file_size, mtime_ns, sha256)
+            VALUES (%(rel_path)s, %(category)s, %(product_folder)s, %(file_name)s, %(file_size)s,
+                    %(mtime_ns)s, %(sha256)s)
+            ON CONFLICT (rel_path) DO UPDATE
+            SET category = EXCLUDED.category, product_folder = EXCLUDED.product_folder,
+                file_name = EXCLUDED.file_name, file_size = EXCLUDED.file_size,
+                mtime_ns = EXCLUDED.mtime_ns, sha256 = EXCLUDED.sha256, indexed_at = now()
+            """,
+            row,
+        )
+
+
+def fetch_print_file_states(min_version: int) -> dict:
+    """``{rel_path: (file_size, mtime_ns, current)}`` for every indexed file.
+
+    ``current`` is false when the file's metadata is missing or was
+    extracted by an older extractor version.
+    """
+    with get_connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT f.rel_path, f.file_size, f.mtime_ns, coalesce(m.extractor_version >= %s, false)
+            FROM print_files AS f
+            LEFT JOIN print_file_meta AS m ON m.sha256 = f.sha256
+            """,
+            (min_version,),
+        ).fetchall()
+    return {rel_path: (size, mtime_ns, current) for rel_path, size, mtime_ns, current in rows}
+
+
+def prune_print_files(rel_paths: list) -> int:
+    """Forget files that no longer exist, and metadata no file points at."""
+    with get_connection() as conn:
+        deleted = conn.execute('DELETE FROM print_files WHERE rel_path = ANY(%s)', (list(rel_paths),)).rowcount
+        conn.execute(
+            """
+            DELETE FROM print_file_meta AS m
+            WHERE NOT EXISTS (SELECT 1 FROM print_files AS f WHERE f.sha256 = m.sha256)
+            """
+        )
+    return deleted
+
+
+def fetch_print_files_by_path(rel_paths: list) -> dict:
+    """Indexed rows (with the full metadata document) keyed by rel_path."""
+    if not rel_paths:
+        return {}
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                f"""
+                SELECT {PRINT_FILE_COLUMNS}, m.metadata
+                FROM print_files AS f
+                LEFT JOIN print_file_meta AS m ON m.sha256 = f.sha256
+                WHERE f.rel_path = ANY(%s)
+                """,
+                (list(rel_paths),),
+            )
+            return {row['rel_path']: row for row in cur.fetchall()}
+
+
+def fetch_print_files(
+    filters: dict | None = None,
+    sort: str = 'time',
+    descending: bool = False,
+    limit: int = 100,
+    offset: int = 0,
+) -> dict:
+    """Catalogue-wide 3MF listing: ``{'rows', 'total'}``.
+
+    Filters: ``category``, ``product_folder``, ``printer`` (exact), ``q``
+    (substring of file or folder name), ``color`` (a filament colour such as
+    ``#FFFFFF``), ``max_seconds``, ``max_grams``, ``max_objects`` and
+    ``sliced``. Files without a value for the sort column come last.
+    Raises ValueError for an unknown sort.
+    """
+    if sort not in PRINT_FILE_SORTS:
+        raise ValueError(f'Unknown sort: {sort}')
+    filters = filters or {}
+    params = {'limit': min(max(int(limit), 1), PAGE_MAX_LIMIT), 'offset': max(int(offset), 0)}
+    conditions = []
+    for column, sql in (('category', 'f.category'), ('product_folder', 'f.product_folder'), ('printer', 'm.printer')):
+        value = (filters.get(column) or '').strip()
+        if value:
+            params[column] = value
+            conditions.append(f'{sql} = %({column})s')
+    if (filters.get('q') or '').strip():
+        params['q'] = filters['q'].strip().lower()
+        conditions.append('(strpos(lower(f.file_name), %(q)s) > 0 OR strpos(lower(f.product_folder), %(q)s) > 0)')
+    if (filters.get('color') or '').strip():
+        params['color'] = filters['color'].strip().upper()
+        conditions.append('m.filament_by_color ? %(color)s')
+    for name, sql in (
+        ('max_seconds', 'm.print_seconds <= %(max_seconds)s'),
+        ('max_grams', 'm.filament_grams <= %(max_grams)s'),
+        ('max_objects', 'm.object_count <= %(max_objects)s'),
+    ):
+        if filters.get(name) is not None:
+            params[name] = filters[name]
+            conditions.append(sql)
+    if filters.get('sliced') is not None:
+        params['sliced'] = bool(filters['sliced'])
+        conditions.append('coalesce(m.sliced, false) = %(sliced)s')
+    where_sql = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    direction = 'DESC' if descending else 'ASC'
+    order_sql = ', '.join(f'{column} {direction} NULLS LAST' for column in PRINT_FILE_SORTS[sort])
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                f"""
+                SELECT {PRINT_FILE_COLUMNS}, count(*) OVER () AS total
+                FROM print_files AS f
+                LEFT JOIN print_file_meta AS m ON m.sha256 = f.sha256
+                {where_sql}
+                ORDER BY {order_sql}, f.rel_path
+                LIMIT %(limit)s OFFSET %(offset)s
+                """,
+                params,
+            )
+            rows = cur.fetchall()
+    total = rows[0]['total'] if rows else 0
+    for row in rows:
+        del row['total']
+    return {'rows': rows, 'total': total}
 
 
 def normalize_supply_row(row: dict) -> dict:
@@ -1207,18 +2818,18 @@ def normalize_supply_row(row: dict) -> dict:
     }
 
 
+SUPPLY_SELECT = """
+    SELECT id, name, category, unit, quantity, reorder_point, vendor,
+           lead_time_days, location, notes, created_at::text AS created_at,
+           updated_at::text AS updated_at
+    FROM supplies
+"""
+
+
 def fetch_supplies() -> list:
     with get_connection() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
-                """
-                SELECT id, name, category, unit, quantity, reorder_point, vendor,
-                       lead_time_days, location, notes, created_at::text AS created_at,
-                       updated_at::text AS updated_at
-                FROM supplies
-                ORDER BY name
-                """
-            )
+            cur.execute(SUPPLY_SELECT + " ORDER BY name")
             return cur.fetchall()
 
 
@@ -1333,26 +2944,26 @@ def normalize_expense_row(row: dict) -> dict:
     }
 
 
+EXPENSE_SELECT = """
+    SELECT id,
+           expense_date::text AS expense_date,
+           vendor,
+           description,
+           category,
+           amount::text AS amount,
+           payment_method,
+           reference,
+           receipt_path,
+           created_at::text AS created_at,
+           updated_at::text AS updated_at
+    FROM expenses
+"""
+
+
 def fetch_expenses() -> list:
     with get_connection() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
-                """
-                SELECT id,
-                       expense_date::text AS expense_date,
-                       vendor,
-                       description,
-                       category,
-                       amount::text AS amount,
-                       payment_method,
-                       reference,
-                       receipt_path,
-                       created_at::text AS created_at,
-                       updated_at::text AS updated_at
-                FROM expenses
-                ORDER BY expense_date DESC, id DESC
-                """
-            )
+            cur.execute(EXPENSE_SELECT + " ORDER BY expense_date DESC, id DESC")
             return cur.fetchall()
 
 
@@ -1439,3 +3050,234 @@ def delete_expense(expense_id: int) -> bool:
         with conn.cursor() as cur:
             cur.execute("DELETE FROM expenses WHERE id = %s RETURNING id", (expense_id,))
             return cur.fetchone() is not None
+
+
+def insert_auth_session(session_hash: str, username: str, ttl_seconds: int):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO auth_sessions (session_hash, username, expires_at)
+                VALUES (%s, %s, now() + make_interval(secs => %s))
+                """,
+                (session_hash, username, ttl_seconds),
+            )
+
+
+def fetch_auth_session(session_hash: str) -> dict | None:
+    with get_connection() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(
+                """
+                SELECT username AS user, extract(epoch FROM expires_at)::bigint AS expires_at
+                FROM auth_sessions
+                WHERE session_hash = %s AND expires_at > now()
+                """,
+                (session_hash,),
+            )
+            return cur.fetchone()
+
+
+def delete_auth_session(session_hash: str):
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM auth_sessions WHERE session_hash = %s", (session_hash,))
+
+
+def purge_auth_sessions() -> int:
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM auth_sessions WHERE expires_at <= now()")
+            return cur.rowcount
+
+
+def count_auth_sessions() -> int:
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM auth_sessions WHERE expires_at > now()")
+            return cur.fetchone()[0]
+
+
+# Paged listings. A sort key is a list of (sql, row_key, type) columns that
+# gets the table's id appended unless it is already unique, so
+# ``(key) > (last row's key)`` is a stable keyset cursor that the matching
+# composite index (migrations/0006_list_indexes.sql) can seek to. Columns are
+# table-qualified so ORDER BY uses the raw column, not a ``::text`` alias.
+LIST_QUERIES = {
+    'products': {
+        'select': PRODUCT_SELECT_BASE,
+        'filters': {
+            'category': 'products.category', 'status': 'products.status',
+            'completed': 'products.completed', 'ukca': 'products.ukca',
+        },
+        'sorts': {
+            'folder': {
+                'columns': [('products.category', 'category', 'text'), ('products.product_folder', 'product_folder', 'text')],
+                'unique': True,
+            },
+            'sku': {'columns': [('products.sku', 'sku', 'text')]},
+        },
+        'id': 'products.id',
+    },
+    'stock': {
+        'select': "SELECT id, category, product_folder, sku, color, size, quantity FROM stock\n",
+        'filters': {'category': 'stock.category', 'product_folder': 'stock.product_folder', 'sku': 'stock.sku'},
+        'sorts': {
+            'folder': {
+                'columns': [
+                    ('stock.category', 'category', 'text'), ('stock.product_folder', 'product_folder', 'text'),
+                    ('stock.color', 'color', 'text'), ('stock.size', 'size', 'text'),
+                ],
+                'unique': True,
+            },
+            'quantity': {'columns': [('stock.quantity', 'quantity', 'integer')]},
+        },
+        'id': 'stock.id',
+    },
+    'expenses': {
+        'select': EXPENSE_SELECT,
+        'filters': {
+            'category': 'expenses.category', 'payment_method': 'expenses.payment_method',
+            'vendor': 'expenses.vendor',
+        },
+        'date_column': 'expenses.expense_date',
+        'sorts': {
+            'date': {'columns': [('expenses.expense_date', 'expense_date', 'date')], 'descending': True},
+            'amount': {'columns': [('expenses.amount', 'amount', 'numeric')], 'descending': True},
+        },
+        'id': 'expenses.id',
+    },
+    'supplies': {
+        'select': SUPPLY_SELECT,
+        'filters': {'category': 'supplies.category', 'vendor': 'supplies.vendor'},
+        'sorts': {'name': {'columns': [('supplies.name', 'name', 'text')]}},
+        'id': 'supplies.id',
+    },
+    'stock_movements': {
+        'select': (
+            "SELECT id, category, product_folder, sku, color, size, delta, quantity_after, reason,"
+            " sale_id, production_id, created_at::text AS created_at FROM stock_movements\n"
+        ),
+        'filters': {
+            'category': 'stock_movements.category', 'product_folder': 'stock_movements.product_folder',
+            'color': 'stock_movements.color', 'size': 'stock_movements.size', 'sku': 'stock_movements.sku',
+            'reason': 'stock_movements.reason', 'sale_id': 'stock_movements.sale_id',
+            'production_id': 'stock_movements.production_id',
+        },
+        'date_column': 'stock_movements.created_at',
+        'sorts': {'recent': {'columns': [('stock_movements.id', 'id', 'bigint')], 'descending': True, 'unique': True}},
+        'id': 'stock_movements.id',
+    },
+    'sales': {
+        'select': RECENT_SALES_SELECT,
+        'filters': {
+            'event_id': 's.event_id', 'category': 's.category',
+            'payment_method': 's.payment_method', 'sku': 's.sku',
+        },
+        'date_column': 's.sold_at',
+        'sorts': {'sold_at': {'columns': [('s.sold_at', 'sold_at', 'timestamptz')], 'descending': True}},
+        'id': 's.id',
+    },
+}
+PAGE_MAX_LIMIT = 500
+
+
+def encode_page_cursor(sort: str, descending: bool, values: list) -> str:
+    payload = json.dumps([sort, descending, values], separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+def decode_page_cursor(cursor: str) -> tuple[str, bool, list]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort, descending, values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor') from None
+    if not isinstance(sort, str) or not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return sort, bool(descending), values
+
+
+def fetch_page(
+    name: str,
+    filters: dict | None = None,
+    sort: str | None = None,
+    cursor: str | None = None,
+    limit: int = 100,
+) -> dict:
+    """One page of a LIST_QUERIES listing: ``{'rows', 'next_cursor'}``.
+
+    ``sort`` is a sort name, prefixed with ``-`` to reverse its default
+    direction. ``filters`` may hold the listing's filter columns plus
+    ``date_from``/``date_to`` (inclusive ISO dates) where it has a date
+    column. Raises ValueError for unknown sorts, bad dates or cursors.
+    """
+    spec = LIST_QUERIES[name]
+    filters = filters or {}
+    sort_name = (sort or '').strip() or next(iter(spec['sorts']))
+    reverse = sort_name.startswith('-')
+    sort_name = sort_name.lstrip('-')
+    if sort_name not in spec['sorts']:
+        raise ValueError(f'Unknown sort: {sort_name}')
+    sort_spec = spec['sorts'][sort_name]
+    descending = sort_spec.get('descending', False) != reverse
+    key = list(sort_spec['columns'])
+    if not sort_spec.get('unique'):
+        key.append((spec['id'], 'id', 'bigint'))
+    limit = min(max(int(limit), 1), PAGE_MAX_LIMIT)
+
+    conditions = []
+    params = []
+    for filter_name, column in spec['filters'].items():
+        value = filters.get(filter_name)
+        if value is None or str(value).strip() == '':
+            continue
+        value = str(value).strip()
+        if filter_name == 'status':
+            value = normalize_status(value)
+        conditions.append(f'{column} = %s')
+        params.append(value)
+    date_column = spec.get('date_column')
+    for bound, operator, offset in (('date_from', '>=', ''), ('date_to', '<', ' + 1')):
+        value = (filters.get(bound) or '').strip()
+        if not value:
+            continue
+        if not date_column:
+            raise ValueError(f'{name} has no date filter')
+        try:
+            value = datetime.date.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f'Invalid {bound}') from None
+        conditions.append(f'{date_column} {operator} %s::date{offset}')
+        params.append(value)
+    if cursor:
+        cursor_sort, cursor_descending, values = decode_page_cursor(cursor)
+        if cursor_sort != sort_name or cursor_descending != descending or len(values) != len(key):
+            raise ValueError('Cursor does not match sort')
+        key_sql = ', '.join(column for column, _, _ in key)
+        value_sql = ', '.join(f'%s::{pg_type}' for _, _, pg_type in key)
+        conditions.append(f"({key_sql}) {'<' if descending else '>'} ({value_sql})")
+        params.extend(values)
+
+    direction = 'DESC' if descending else 'ASC'
+    sql = (
+        spec['select']
+        + (' WHERE ' + ' AND '.join(conditions) if conditions else '')
+        + ' ORDER BY ' + ', '.join(f'{column} {direction}' for column, _, _ in key)
+        + ' LIMIT %s'
+    )
+    params.append(limit + 1)
+    try:
+        with get_connection() as conn:
+            with conn.cursor(row_factory=dict_row) as cur:
+                cur.execute(sql, params)
+                rows = cur.fetchall()
+    except psycopg.errors.DataError:
+        # e.g. a non-numeric event_id or a tampered cursor value
+        raise ValueError('Invalid filter or cursor value') from None
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_page_cursor(sort_name, descending, [last[row_key] for _, row_key, _ in key])
+    return {'rows': rows, 'next_cursor': next_cursor}
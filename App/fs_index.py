@@ -0,0 +1,206 @@
+"""Cached listings of product folder trees (Media, STL, MISC, UKCA, ...).
+
+A product folder is scanned once with ``os.scandir`` into a flat listing of
+its files (relative path, size, mtime, kind) plus the mtime of every
+directory in the tree. Creating, deleting or renaming an entry updates its
+parent directory's mtime, so a cached listing is revalidated with one stat
+per directory instead of a stat per file, and that check is skipped for
+FS_INDEX_CHECK_SECONDS after the last one. The server calls ``invalidate()``
+after its own writes; only changes made outside the app wait for the check.
+
+Rewriting a file in place leaves directory mtimes alone, so such a file's
+size and mtime can lag until the next structural change. Network
+filesystems often store 1-2 s mtimes, so a listing scanned within
+FS_INDEX_RACY_SECONDS of a directory change is rescanned on next use rather
+than trusted. ``_Deleted`` folders and in-progress uploads are not indexed.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple
+
+import multipart_stream
+
+FS_INDEX_CHECK_SECONDS = float(os.environ.get('FS_INDEX_CHECK_SECONDS', '2'))
+FS_INDEX_RACY_SECONDS = float(os.environ.get('FS_INDEX_RACY_SECONDS', '2'))
+FS_INDEX_MAX_PRODUCTS = int(os.environ.get('FS_INDEX_MAX_PRODUCTS', '2000'))
+SKIPPED_DIRS = frozenset({'_Deleted'})
+KINDS = {
+    **dict.fromkeys(('.png', '.jpg', '.jpeg', '.gif', '.webp', '.tiff', '.heic'), 'image'),
+    **dict.fromkeys(('.mp4', '.mov', '.mkv', '.avi', '.webm', '.m4v'), 'video'),
+    **dict.fromkeys(('.md', '.txt', '.pdf'), 'document'),
+    '.3mf': '3mf',
+    '.stl': 'stl',
+}
+
+
+class Entry(NamedTuple):
+    rel_path: str
+    name: str
+    size: int
+    mtime: float
+    mtime_ns: int
+    kind: str
+
+
+def kind_for(name: str) -> str:
+    return KINDS.get(os.path.splitext(name)[1].lower(), 'other')
+
+
+class Listing:
+    __slots__ = ('root', 'files', 'dirs', 'paths', 'checked_at', 'racy')
+
+    def __init__(self, root: str, files: list[Entry], dirs: dict[str, int], racy: bool):
+        self.root = root
+        # Ordered like sorted(Path.rglob()), i.e. by path components.
+        self.files = tuple(sorted(files, key=lambda entry: entry.rel_path.split('/')))
+        self.dirs = dirs
+        self.paths = frozenset(entry.rel_path for entry in files) | frozenset(dirs)
+        self.checked_at = time.monotonic()
+        self.racy = racy
+
+    def exists(self, rel_path: str) -> bool:
+        return rel_path in self.paths
+
+    def in_dir(self, rel_dir: str) -> list[Entry]:
+        """Files directly inside ``rel_dir`` ('' for the product folder itself)."""
+        prefix = f'{rel_dir}/' if rel_dir else ''
+        return [
+            entry for entry in self.files
+            if entry.rel_path.startswith(prefix) and '/' not in entry.rel_path[len(prefix):]
+        ]
+
+    def with_kind(self, kind: str) -> list[Entry]:
+        return [entry for entry in self.files if entry.kind == kind]
+
+
+def scan(root: str) -> Listing | None:
+    """Walk one product folder; None if it is not a directory."""
+    try:
+        root_mtime = os.stat(root).st_mtime_ns
+    except OSError:
+        return None
+    started = time.time_ns()
+    files = []
+    dirs = {'': root_mtime}
+    pending = ['']
+    while pending:
+        rel_dir = pending.pop()
+        try:
+            with os.scandir(os.path.join(root, rel_dir) if rel_dir else root) as iterator:
+                items = list(iterator)
+        except OSError:
+            continue
+        for item in items:
+            rel_path = f'{rel_dir}/{item.name}' if rel_dir else item.name
+            try:
+                if item.is_dir(follow_symlinks=False):
+                    if item.name not in SKIPPED_DIRS:
+                        dirs[rel_path] = item.stat(follow_symlinks=False).st_mtime_ns
+                        pending.append(rel_path)
+                elif item.is_file() and not item.name.startswith(multipart_stream.TEMP_PREFIX):
+                    info = item.stat()
+                    files.append(Entry(
+                        rel_path, item.name, info.st_size, info.st_mtime, info.st_mtime_ns, kind_for(item.name),
+                    ))
+            except OSError:
+                continue
+    racy_after = started - int(FS_INDEX_RACY_SECONDS * 1e9)
+    return Listing(root, files, dirs, any(mtime > racy_after for mtime in dirs.values()))
+
+
+def _unchanged(listing: Listing) -> bool:
+    for rel_dir, mtime in listing.dirs.items():
+        try:
+            if os.stat(os.path.join(listing.root, rel_dir) if rel_dir else listing.root).st_mtime_ns != mtime:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+class FsIndex:
+    def __init__(self, max_products: int = FS_INDEX_MAX_PRODUCTS, check_seconds: float = FS_INDEX_CHECK_SECONDS):
+        self.lock = threading.Lock()
+        self.max_products = max_products
+        self.check_seconds = check_seconds
+        self.listings = OrderedDict()
+        self.counters = {'hits': 0, 'misses': 0, 'revalidations': 0, 'invalidations': 0, 'evictions': 0}
+
+    def listing(self, root: Path, fresh: bool = False) -> Listing | None:
+        """Listing for a product folder (None if missing).
+
+        ``fresh`` skips the check interval, so directory mtimes are always
+        compared; use it before acting on the listing (e.g. renames).
+        """
+        key = os.path.abspath(root)
+        with self.lock:
+            cached = self.listings.get(key)
+            if cached is not None:
+                self.listings.move_to_end(key)
+                if not fresh and not cached.racy and time.monotonic() - cached.checked_at < self.check_seconds:
+                    self.counters['hits'] += 1
+                    return cached
+        if cached is not None and not cached.racy:
+            unchanged = _unchanged(cached)
+            with self.lock:
+                self.counters['revalidations'] += 1
+                if unchanged:
+                    cached.checked_at = time.monotonic()
+                    self.counters['hits'] += 1
+                    return cached
+        listing = scan(key)
+        with self.lock:
+            self.counters['misses'] += 1
+            if listing is None:
+                self.listings.pop(key, None)
+                return None
+            self.listings[key] = listing
+            while len(self.listings) > self.max_products:
+                self.listings.popitem(last=False)
+                self.counters['evictions'] += 1
+        return listing
+
+    def invalidate(self, path: Path):
+        """Forget listings containing, or contained in, ``path``."""
+        target = os.path.abspath(path)
+        with self.lock:
+            stale = [
+                key for key in self.listings
+                if key == target or target.startswith(key + os.sep) or key.startswith(target + os.sep)
+            ]
+            for key in stale:
+                del self.listings[key]
+            self.counters['invalidations'] += len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.listings.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.counters['hits'] + self.counters['misses']
+            return {
+                'products': len(self.listings),
+                'max_products': self.max_products,
+                'check_seconds': self.check_seconds,
+                'hit_rate': round(self.counters['hits'] / lookups, 4) if lookups else None,
+                **self.counters,
+            }
+
+
+INDEX = FsIndex()
+
+
+def listing(root: Path, fresh: bool = False) -> Listing | None:
+    return INDEX.listing(root, fresh)
+
+
+def invalidate(path: Path):
+    INDEX.invalidate(path)
+
+
+def stats() -> dict:
+    return INDEX.stats()
@@ -132,6 +132,7 @@ def main():
             row['color'],
             row['size'],
             row['quantity'],
+            reason='import',
         )
     pricing_count = load_pricing(product_rows)
     ukca_count = load_ukca_docs(product_rows)
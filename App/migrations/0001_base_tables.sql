@@ -1,3 +1,5 @@
+-- Baseline tables. Everything is IF NOT EXISTS so databases created by the
+-- old schema.sql adopt the migration history without changes.
 CREATE TABLE IF NOT EXISTS products (
     id BIGSERIAL PRIMARY KEY,
     category TEXT NOT NULL,
@@ -0,0 +1,66 @@
+-- Change tracking for delta sync (/api/changes) and ETags on /api/rows and /api/stock.
+CREATE SEQUENCE IF NOT EXISTS change_seq;
+
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS row_version BIGINT NOT NULL DEFAULT nextval('change_seq');
+ALTER TABLE stock
+    ADD COLUMN IF NOT EXISTS row_version BIGINT NOT NULL DEFAULT nextval('change_seq');
+
+CREATE INDEX IF NOT EXISTS products_row_version_idx
+    ON products (row_version);
+CREATE INDEX IF NOT EXISTS stock_row_version_idx
+    ON stock (row_version);
+
+CREATE TABLE IF NOT EXISTS change_tombstones (
+    row_version BIGINT PRIMARY KEY,
+    table_name TEXT NOT NULL,
+    row_id BIGINT NOT NULL,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS change_tombstones_table_version_idx
+    ON change_tombstones (table_name, row_version);
+
+-- Versions are handed out under a transaction-scoped advisory lock so they
+-- become visible in commit order; a reader holding cursor N can then never
+-- miss a row that commits later with a version <= N.
+CREATE OR REPLACE FUNCTION next_row_version() RETURNS BIGINT AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('change_seq'));
+    RETURN nextval('change_seq');
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bump_row_version() RETURNS trigger AS $$
+BEGIN
+    NEW.row_version := next_row_version();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION record_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO change_tombstones (row_version, table_name, row_id)
+    VALUES (next_row_version(), TG_TABLE_NAME, OLD.id);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER products_version_insert
+    BEFORE INSERT ON products
+    FOR EACH ROW EXECUTE FUNCTION bump_row_version();
+CREATE OR REPLACE TRIGGER products_version_update
+    BEFORE UPDATE ON products
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION bump_row_version();
+CREATE OR REPLACE TRIGGER products_tombstone
+    AFTER DELETE ON products
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone();
+CREATE OR REPLACE TRIGGER stock_version_insert
+    BEFORE INSERT ON stock
+    FOR EACH ROW EXECUTE FUNCTION bump_row_version();
+CREATE OR REPLACE TRIGGER stock_version_update
+    BEFORE UPDATE ON stock
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION bump_row_version();
+CREATE OR REPLACE TRIGGER stock_tombstone
+    AFTER DELETE ON stock
+    FOR EACH ROW EXECUTE FUNCTION record_tombstone();
@@ -0,0 +1,10 @@
+-- Login sessions for SESSION_BACKEND=postgres (keyed by a hash of the cookie).
+CREATE TABLE IF NOT EXISTS auth_sessions (
+    session_hash TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    expires_at TIMESTAMPTZ NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS auth_sessions_expires_idx
+    ON auth_sessions (expires_at);
@@ -0,0 +1,37 @@
+-- Catalogue search (/api/search). The document is kept by a trigger rather
+-- than a generated column: generated columns read as NULL in BEFORE triggers,
+-- which would make every no-op UPDATE look like a change to row_version.
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS readme_text TEXT NOT NULL DEFAULT '';
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION product_search_document(
+    product_folder TEXT, sku TEXT, tags TEXT, colors TEXT, sizes TEXT, readme_text TEXT
+) RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(product_folder, '') || ' ' || coalesce(sku, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(tags, '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(colors, '') || ' ' || coalesce(sizes, '')), 'C')
+        || setweight(to_tsvector('simple', coalesce(readme_text, '')), 'D');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION products_search_refresh() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := product_search_document(
+        NEW.product_folder, NEW.sku, NEW.tags, NEW.colors, NEW.sizes, NEW.readme_text
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Fires before products_version_* (triggers run in name order).
+CREATE OR REPLACE TRIGGER products_search_vector
+    BEFORE INSERT OR UPDATE OF product_folder, sku, tags, colors, sizes, readme_text ON products
+    FOR EACH ROW EXECUTE FUNCTION products_search_refresh();
+
+UPDATE products
+SET search_vector = product_search_document(product_folder, sku, tags, colors, sizes, readme_text)
+WHERE search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS products_search_idx
+    ON products USING GIN (search_vector);
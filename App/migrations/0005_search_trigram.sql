@@ -0,0 +1,8 @@
+-- migrate: optional
+-- Typo-tolerant matching for /api/search. Needs the pg_trgm extension; where
+-- it cannot be created this is recorded as skipped and search stays
+-- prefix-only until `schema_migrations.py --retry-skipped` applies it. The
+-- expression must match db.SEARCH_TEXT_SQL.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS products_search_trgm_idx
+    ON products USING GIN ((product_folder || ' ' || sku || ' ' || tags) gin_trgm_ops);
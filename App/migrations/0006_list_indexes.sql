@@ -0,0 +1,26 @@
+-- migrate: no-transaction
+-- Keyset pagination (db.fetch_page): one index per sort key, and per common
+-- equality filter + sort key, each ending in id so cursors seek directly.
+-- Built CONCURRENTLY so large sales/expenses tables stay writable meanwhile.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_sku_id_idx
+    ON products (sku, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_status_folder_idx
+    ON products (status, category, product_folder);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS stock_quantity_id_idx
+    ON stock (quantity, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS expenses_date_id_idx
+    ON expenses (expense_date, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS expenses_category_date_id_idx
+    ON expenses (category, expense_date, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS expenses_payment_date_id_idx
+    ON expenses (payment_method, expense_date, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS expenses_amount_id_idx
+    ON expenses (amount, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS supplies_name_id_idx
+    ON supplies (name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sales_sold_at_id_idx
+    ON sales (sold_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sales_event_sold_at_id_idx
+    ON sales (event_id, sold_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sales_payment_sold_at_id_idx
+    ON sales (payment_method, sold_at, id);
@@ -0,0 +1,68 @@
+-- Numeric copies of the free-text price fields for SQL-side analytics
+-- (/api/margins). The text columns stay the source of truth for the editor,
+-- so "20" is not rewritten as "20.00"; a trigger keeps the amounts in sync.
+-- Text that is not a plain amount (after dropping currency symbols, commas
+-- and spaces) leaves the amount NULL; db.fetch_unparsed_prices() lists those.
+CREATE OR REPLACE FUNCTION parse_price_text(value TEXT) RETURNS NUMERIC AS $$
+DECLARE
+    cleaned TEXT := regexp_replace(coalesce(value, ''), '[£$€,[:space:]]', '', 'g');
+    amount NUMERIC;
+BEGIN
+    IF cleaned !~ '^-?([0-9]+(\.[0-9]*)?|\.[0-9]+)$' THEN
+        RETURN NULL;
+    END IF;
+    amount := round(cleaned::numeric, 2);
+    IF abs(amount) >= 1e8 THEN
+        RETURN NULL;
+    END IF;
+    RETURN amount;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS cost_to_make_amount NUMERIC(10, 2),
+    ADD COLUMN IF NOT EXISTS sale_price_amount NUMERIC(10, 2),
+    ADD COLUMN IF NOT EXISTS postage_price_amount NUMERIC(10, 2);
+
+CREATE OR REPLACE FUNCTION products_price_refresh() RETURNS trigger AS $$
+BEGIN
+    NEW.cost_to_make_amount := parse_price_text(NEW.cost_to_make);
+    NEW.sale_price_amount := parse_price_text(NEW.sale_price);
+    NEW.postage_price_amount := parse_price_text(NEW.postage_price);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Named to fire before products_version_* (triggers run in name order).
+CREATE OR REPLACE TRIGGER products_price_amounts
+    BEFORE INSERT OR UPDATE OF cost_to_make, sale_price, postage_price ON products
+    FOR EACH ROW EXECUTE FUNCTION products_price_refresh();
+
+UPDATE products
+SET cost_to_make_amount = parse_price_text(cost_to_make),
+    sale_price_amount = parse_price_text(sale_price),
+    postage_price_amount = parse_price_text(postage_price)
+WHERE cost_to_make_amount IS DISTINCT FROM parse_price_text(cost_to_make)
+   OR sale_price_amount IS DISTINCT FROM parse_price_text(sale_price)
+   OR postage_price_amount IS DISTINCT FROM parse_price_text(postage_price);
+
+DO $$
+DECLARE
+    unparsed INTEGER;
+BEGIN
+    SELECT count(*) INTO unparsed
+    FROM products
+    WHERE (cost_to_make <> '' AND cost_to_make_amount IS NULL)
+       OR (sale_price <> '' AND sale_price_amount IS NULL)
+       OR (postage_price <> '' AND postage_price_amount IS NULL);
+    IF unparsed > 0 THEN
+        RAISE NOTICE '% products have price text that is not a number; see GET /api/margins (unparsed)', unparsed;
+    END IF;
+END;
+$$;
+
+CREATE INDEX IF NOT EXISTS products_margin_idx
+    ON products ((sale_price_amount - cost_to_make_amount))
+    WHERE sale_price_amount IS NOT NULL;
+CREATE INDEX IF NOT EXISTS products_status_category_idx
+    ON products (status, category);
@@ -0,0 +1,27 @@
+-- Effective line total per sale: the override price when it parses as an
+-- amount (parse_price_text, migration 0007), otherwise the unit price, times
+-- quantity. Kept by a trigger so event totals and rollups aggregate one
+-- column instead of re-parsing override text per row. Sales by event and
+-- time use sales_event_sold_at_id_idx (event_id, sold_at, id) from 0006.
+ALTER TABLE sales
+    ADD COLUMN IF NOT EXISTS line_total NUMERIC(12, 2) NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION sale_line_total(quantity INTEGER, unit_price NUMERIC, override_price TEXT)
+RETURNS NUMERIC AS $$
+    SELECT coalesce(parse_price_text(override_price), unit_price) * quantity;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION sales_line_total_refresh() RETURNS trigger AS $$
+BEGIN
+    NEW.line_total := sale_line_total(NEW.quantity, NEW.unit_price, NEW.override_price);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER sales_line_total
+    BEFORE INSERT OR UPDATE OF quantity, unit_price, override_price ON sales
+    FOR EACH ROW EXECUTE FUNCTION sales_line_total_refresh();
+
+UPDATE sales
+SET line_total = sale_line_total(quantity, unit_price, override_price)
+WHERE line_total IS DISTINCT FROM sale_line_total(quantity, unit_price, override_price);
@@ -0,0 +1,162 @@
+-- Sales rollups for dashboards: per event, per day and category, and per
+-- SKU variant. Statement-level triggers fold each INSERT/UPDATE/DELETE on
+-- sales into the rollups inside the same transaction (one upsert per table
+-- per statement, so batch inserts stay cheap). Rows whose sales drop to 0
+-- are kept until the next rebuild; readers filter them out.
+-- rebuild_sales_rollups() recomputes everything from sales.
+CREATE TABLE IF NOT EXISTS sales_rollup_events (
+    event_id BIGINT PRIMARY KEY REFERENCES events(id) ON DELETE CASCADE,
+    sales BIGINT NOT NULL DEFAULT 0,
+    items BIGINT NOT NULL DEFAULT 0,
+    revenue NUMERIC(14, 2) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS sales_rollup_days (
+    day DATE NOT NULL,
+    category TEXT NOT NULL,
+    sales BIGINT NOT NULL DEFAULT 0,
+    items BIGINT NOT NULL DEFAULT 0,
+    revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, category)
+);
+
+CREATE TABLE IF NOT EXISTS sales_rollup_variants (
+    category TEXT NOT NULL,
+    product_folder TEXT NOT NULL,
+    sku TEXT NOT NULL,
+    color TEXT NOT NULL,
+    size TEXT NOT NULL,
+    sales BIGINT NOT NULL DEFAULT 0,
+    items BIGINT NOT NULL DEFAULT 0,
+    revenue NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (category, product_folder, sku, color, size)
+);
+
+-- Sales days are UK calendar days whatever the session time zone.
+CREATE OR REPLACE FUNCTION sale_day(sold_at TIMESTAMPTZ) RETURNS DATE AS $$
+    SELECT (sold_at AT TIME ZONE 'Europe/London')::date;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE TYPE sales_rollup_delta AS (
+    sign INTEGER,
+    event_id BIGINT,
+    sold_at TIMESTAMPTZ,
+    category TEXT,
+    product_folder TEXT,
+    sku TEXT,
+    color TEXT,
+    size TEXT,
+    quantity INTEGER,
+    line_total NUMERIC
+);
+
+-- Collects the signed rows of the transition tables, then applies them with
+-- one static statement (plpgsql caches its plan per connection). Keys are
+-- upserted in sorted order so concurrent statements lock rollup rows in the
+-- same order.
+CREATE OR REPLACE FUNCTION sales_rollup_refresh() RETURNS trigger AS $$
+DECLARE
+    deltas sales_rollup_delta[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg((1, event_id, sold_at, category, product_folder, sku, color, size, quantity, line_total)
+                         ::sales_rollup_delta)
+        INTO deltas FROM new_sales;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg((-1, event_id, sold_at, category, product_folder, sku, color, size, quantity, line_total)
+                         ::sales_rollup_delta)
+        INTO deltas FROM old_sales;
+    ELSE
+        SELECT array_agg(delta) INTO deltas FROM (
+            SELECT (-1, event_id, sold_at, category, product_folder, sku, color, size, quantity, line_total)
+                   ::sales_rollup_delta AS delta
+            FROM old_sales
+            UNION ALL
+            SELECT (1, event_id, sold_at, category, product_folder, sku, color, size, quantity, line_total)
+                   ::sales_rollup_delta
+            FROM new_sales
+        ) AS changed;
+    END IF;
+    IF deltas IS NULL THEN
+        RETURN NULL;
+    END IF;
+    WITH delta AS (SELECT * FROM unnest(deltas)),
+    events_delta AS (
+        INSERT INTO sales_rollup_events AS r (event_id, sales, items, revenue)
+        SELECT event_id, sum(sign), sum(sign * quantity), sum(sign * line_total)
+        FROM delta
+        -- Deleting an event cascades to its sales and its rollup row.
+        WHERE EXISTS (SELECT 1 FROM events WHERE events.id = delta.event_id)
+        GROUP BY event_id
+        HAVING sum(sign) <> 0 OR sum(sign * quantity) <> 0 OR sum(sign * line_total) <> 0
+        ORDER BY event_id
+        ON CONFLICT (event_id) DO UPDATE
+        SET sales = r.sales + EXCLUDED.sales,
+            items = r.items + EXCLUDED.items,
+            revenue = r.revenue + EXCLUDED.revenue
+    ),
+    days_delta AS (
+        INSERT INTO sales_rollup_days AS r (day, category, sales, items, revenue)
+        SELECT sale_day(sold_at), category, sum(sign), sum(sign * quantity), sum(sign * line_total)
+        FROM delta
+        GROUP BY 1, 2
+        HAVING sum(sign) <> 0 OR sum(sign * quantity) <> 0 OR sum(sign * line_total) <> 0
+        ORDER BY 1, 2
+        ON CONFLICT (day, category) DO UPDATE
+        SET sales = r.sales + EXCLUDED.sales,
+            items = r.items + EXCLUDED.items,
+            revenue = r.revenue + EXCLUDED.revenue
+    )
+    INSERT INTO sales_rollup_variants AS r (category, product_folder, sku, color, size, sales, items, revenue)
+    SELECT category, product_folder, sku, color, size, sum(sign), sum(sign * quantity), sum(sign * line_total)
+    FROM delta
+    GROUP BY 1, 2, 3, 4, 5
+    HAVING sum(sign) <> 0 OR sum(sign * quantity) <> 0 OR sum(sign * line_total) <> 0
+    ORDER BY 1, 2, 3, 4, 5
+    ON CONFLICT (category, product_folder, sku, color, size) DO UPDATE
+    SET sales = r.sales + EXCLUDED.sales,
+        items = r.items + EXCLUDED.items,
+        revenue = r.revenue + EXCLUDED.revenue;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER sales_rollup_insert
+    AFTER INSERT ON sales REFERENCING NEW TABLE AS new_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_rollup_refresh();
+CREATE OR REPLACE TRIGGER sales_rollup_update
+    AFTER UPDATE ON sales REFERENCING OLD TABLE AS old_sales NEW TABLE AS new_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_rollup_refresh();
+CREATE OR REPLACE TRIGGER sales_rollup_delete
+    AFTER DELETE ON sales REFERENCING OLD TABLE AS old_sales
+    FOR EACH STATEMENT EXECUTE FUNCTION sales_rollup_refresh();
+
+-- Blocks sale writes for the duration so no delta is lost or counted twice.
+CREATE OR REPLACE FUNCTION rebuild_sales_rollups() RETURNS void AS $$
+BEGIN
+    LOCK TABLE sales IN SHARE MODE;
+    LOCK TABLE sales_rollup_events, sales_rollup_days, sales_rollup_variants IN EXCLUSIVE MODE;
+    DELETE FROM sales_rollup_events;
+    DELETE FROM sales_rollup_days;
+    DELETE FROM sales_rollup_variants;
+    INSERT INTO sales_rollup_events (event_id, sales, items, revenue)
+    SELECT event_id, count(*), sum(quantity), sum(line_total)
+    FROM sales
+    GROUP BY event_id;
+    INSERT INTO sales_rollup_days (day, category, sales, items, revenue)
+    SELECT sale_day(sold_at), category, count(*), sum(quantity), sum(line_total)
+    FROM sales
+    GROUP BY 1, 2;
+    INSERT INTO sales_rollup_variants (category, product_folder, sku, color, size, sales, items, revenue)
+    SELECT category, product_folder, sku, color, size, count(*), sum(quantity), sum(line_total)
+    FROM sales
+    GROUP BY 1, 2, 3, 4, 5;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_sales_rollups();
+
+CREATE INDEX IF NOT EXISTS sales_rollup_variants_items_idx
+    ON sales_rollup_variants (items DESC);
+CREATE INDEX IF NOT EXISTS sales_rollup_variants_revenue_idx
+    ON sales_rollup_variants (revenue DESC);
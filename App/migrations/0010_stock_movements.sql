@@ -0,0 +1,133 @@
+-- Append-only stock ledger. A row trigger on stock records every quantity
+-- change in the same transaction, so no writer can bypass it. Writers tag
+-- the change with transaction-local settings (db._queue_stock_context):
+-- stock_ledger.reason, stock_ledger.sale_id and stock_ledger.production_id.
+-- Snapshots checkpoint the whole stock table so point-in-time queries
+-- replay only the movements after the nearest earlier snapshot.
+CREATE TABLE IF NOT EXISTS stock_movements (
+    id BIGSERIAL PRIMARY KEY,
+    category TEXT NOT NULL,
+    product_folder TEXT NOT NULL,
+    sku TEXT NOT NULL DEFAULT '',
+    color TEXT NOT NULL DEFAULT '',
+    size TEXT NOT NULL DEFAULT '',
+    delta INTEGER NOT NULL,
+    quantity_after INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    sale_id BIGINT,
+    production_id BIGINT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE INDEX IF NOT EXISTS stock_movements_variant_id_idx
+    ON stock_movements (category, product_folder, color, size, id);
+CREATE INDEX IF NOT EXISTS stock_movements_created_at_idx
+    ON stock_movements (created_at);
+CREATE INDEX IF NOT EXISTS stock_movements_sale_idx
+    ON stock_movements (sale_id) WHERE sale_id IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    id BIGSERIAL PRIMARY KEY,
+    taken_at TIMESTAMPTZ NOT NULL,
+    last_movement_id BIGINT NOT NULL,
+    note TEXT NOT NULL DEFAULT ''
+);
+
+CREATE INDEX IF NOT EXISTS stock_snapshots_taken_at_idx
+    ON stock_snapshots (taken_at);
+
+CREATE TABLE IF NOT EXISTS stock_snapshot_rows (
+    snapshot_id BIGINT NOT NULL REFERENCES stock_snapshots(id) ON DELETE CASCADE,
+    category TEXT NOT NULL,
+    product_folder TEXT NOT NULL,
+    sku TEXT NOT NULL DEFAULT '',
+    color TEXT NOT NULL DEFAULT '',
+    size TEXT NOT NULL DEFAULT '',
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (snapshot_id, category, product_folder, color, size)
+);
+
+CREATE OR REPLACE FUNCTION stock_ledger_setting(name TEXT) RETURNS TEXT AS $$
+    SELECT nullif(current_setting('stock_ledger.' || name, true), '');
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION stock_movement_record() RETURNS trigger AS $$
+DECLARE
+    movement_reason TEXT := coalesce(stock_ledger_setting('reason'), 'manual');
+    movement_sale_id BIGINT := stock_ledger_setting('sale_id')::bigint;
+    movement_production_id BIGINT := stock_ledger_setting('production_id')::bigint;
+    moved BOOLEAN := TG_OP = 'UPDATE'
+        AND (OLD.category, OLD.product_folder, OLD.color, OLD.size)
+            IS DISTINCT FROM (NEW.category, NEW.product_folder, NEW.color, NEW.size);
+BEGIN
+    IF moved AND stock_ledger_setting('reason') IS NULL THEN
+        movement_reason := 'rename';
+    END IF;
+    IF TG_OP = 'DELETE' OR moved THEN
+        IF OLD.quantity <> 0 THEN
+            INSERT INTO stock_movements
+                (category, product_folder, sku, color, size, delta, quantity_after, reason, sale_id, production_id)
+            VALUES
+                (OLD.category, OLD.product_folder, OLD.sku, OLD.color, OLD.size, -OLD.quantity, 0,
+                 movement_reason, movement_sale_id, movement_production_id);
+        END IF;
+    END IF;
+    IF TG_OP = 'INSERT' OR moved THEN
+        IF NEW.quantity <> 0 THEN
+            INSERT INTO stock_movements
+                (category, product_folder, sku, color, size, delta, quantity_after, reason, sale_id, production_id)
+            VALUES
+                (NEW.category, NEW.product_folder, NEW.sku, NEW.color, NEW.size, NEW.quantity, NEW.quantity,
+                 movement_reason, movement_sale_id, movement_production_id);
+        END IF;
+    ELSIF TG_OP = 'UPDATE' AND NEW.quantity <> OLD.quantity THEN
+        INSERT INTO stock_movements
+            (category, product_folder, sku, color, size, delta, quantity_after, reason, sale_id, production_id)
+        VALUES
+            (NEW.category, NEW.product_folder, NEW.sku, NEW.color, NEW.size, NEW.quantity - OLD.quantity,
+             NEW.quantity, movement_reason, movement_sale_id, movement_production_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER stock_movement_record
+    AFTER INSERT OR UPDATE OR DELETE ON stock
+    FOR EACH ROW EXECUTE FUNCTION stock_movement_record();
+
+CREATE OR REPLACE FUNCTION stock_movements_append_only() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION 'stock_movements is append-only';
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER stock_movements_append_only
+    BEFORE UPDATE OR DELETE ON stock_movements
+    FOR EACH ROW EXECUTE FUNCTION stock_movements_append_only();
+
+-- The SHARE lock waits for in-flight stock writers, so every movement up to
+-- last_movement_id is committed and reflected in the copied rows.
+CREATE OR REPLACE FUNCTION take_stock_snapshot(snapshot_note TEXT DEFAULT '') RETURNS BIGINT AS $$
+DECLARE
+    new_id BIGINT;
+BEGIN
+    LOCK TABLE stock IN SHARE MODE;
+    INSERT INTO stock_snapshots (taken_at, last_movement_id, note)
+    SELECT clock_timestamp(), coalesce(max(id), 0), snapshot_note FROM stock_movements
+    RETURNING id INTO new_id;
+    INSERT INTO stock_snapshot_rows (snapshot_id, category, product_folder, sku, color, size, quantity)
+    SELECT new_id, category, product_folder, sku, color, size, quantity
+    FROM stock
+    WHERE quantity <> 0;
+    RETURN new_id;
+END;
+$$ LANGUAGE plpgsql;
+
+INSERT INTO stock_movements (category, product_folder, sku, color, size, delta, quantity_after, reason)
+SELECT category, product_folder, sku, color, size, quantity, quantity, 'opening'
+FROM stock
+WHERE quantity <> 0
+  AND NOT EXISTS (SELECT 1 FROM stock_movements);
+
+SELECT take_stock_snapshot('opening balance')
+WHERE NOT EXISTS (SELECT 1 FROM stock_snapshots);
@@ -0,0 +1,15 @@
+-- Idempotency keys for sales sent by tills (POST /api/sales_batch, or
+-- /api/sale with idempotency_key). A key is claimed in the same transaction
+-- as its sale, so a retried request finds the key and is reported as a
+-- duplicate instead of being recorded twice. fingerprint is a hash of the
+-- sale line, used to spot a key reused for a different sale. The key
+-- outlives its sale: deleting the sale later only clears sale_id.
+CREATE TABLE IF NOT EXISTS sale_requests (
+    idempotency_key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    sale_id BIGINT REFERENCES sales(id) ON DELETE SET NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS sale_requests_sale_idx
+    ON sale_requests (sale_id) WHERE sale_id IS NOT NULL;
@@ -0,0 +1,42 @@
+-- Baskets from /api/checkout: one sale_transactions row per checkout, linked
+-- to its sales lines by sales.transaction_id. The header keeps the amounts
+-- charged at checkout; later edits to individual lines do not rewrite it.
+-- A basket discount is split across its lines (sales.discount, to the
+-- penny) so line_total, event totals and rollups report what was taken.
+CREATE TABLE IF NOT EXISTS sale_transactions (
+    id BIGSERIAL PRIMARY KEY,
+    event_id BIGINT NOT NULL REFERENCES events(id) ON DELETE CASCADE,
+    payment_method TEXT NOT NULL DEFAULT '',
+    items INTEGER NOT NULL DEFAULT 0,
+    subtotal NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    discount NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    total NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    idempotency_key TEXT UNIQUE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS sale_transactions_event_idx
+    ON sale_transactions (event_id, id);
+
+ALTER TABLE sales
+    ADD COLUMN IF NOT EXISTS transaction_id BIGINT REFERENCES sale_transactions(id) ON DELETE SET NULL,
+    ADD COLUMN IF NOT EXISTS discount NUMERIC(12, 2) NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS sales_transaction_idx
+    ON sales (transaction_id) WHERE transaction_id IS NOT NULL;
+
+CREATE OR REPLACE FUNCTION sale_line_total(quantity INTEGER, unit_price NUMERIC, override_price TEXT, discount NUMERIC)
+RETURNS NUMERIC AS $$
+    SELECT sale_line_total(quantity, unit_price, override_price) - coalesce(discount, 0);
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION sales_line_total_refresh() RETURNS trigger AS $$
+BEGIN
+    NEW.line_total := sale_line_total(NEW.quantity, NEW.unit_price, NEW.override_price, NEW.discount);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER sales_line_total
+    BEFORE INSERT OR UPDATE OF quantity, unit_price, override_price, discount ON sales
+    FOR EACH ROW EXECUTE FUNCTION sales_line_total_refresh();
@@ -0,0 +1,70 @@
+-- Per-prefix SKU counters (prefixes are server.CATEGORY_PREFIXES, e.g.
+-- GT-FDG). allocate_skus() bumps a counter row and returns the next SKUs;
+-- the row lock is held until the caller commits, so concurrent product
+-- creations get distinct SKUs and an aborted creation gives its number back.
+-- A counter is seeded from the highest existing SKU with its prefix the
+-- first time it is used (db.seed_sku_counters also seeds them at startup),
+-- and a trigger raises it when a higher SKU is saved by hand.
+CREATE TABLE IF NOT EXISTS sku_counters (
+    prefix TEXT PRIMARY KEY,
+    last_value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- The number after "<prefix>-" (leading digits only), or NULL.
+CREATE OR REPLACE FUNCTION sku_number(sku TEXT, sku_prefix TEXT) RETURNS BIGINT AS $$
+    SELECT CASE WHEN starts_with(sku, sku_prefix || '-')
+                THEN substring(substr(sku, length(sku_prefix) + 2) FROM '^[0-9]{1,18}')::bigint
+           END;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION format_sku(sku_prefix TEXT, number BIGINT) RETURNS TEXT AS $$
+    SELECT sku_prefix || '-' || lpad(number::text, greatest(5, length(number::text)), '0');
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION sku_existing_max(sku_prefix TEXT) RETURNS BIGINT AS $$
+    SELECT coalesce(max(sku_number(sku, sku_prefix)), 0)
+    FROM products
+    WHERE starts_with(sku, sku_prefix || '-');
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION allocate_skus(sku_prefix TEXT, how_many INTEGER DEFAULT 1) RETURNS SETOF TEXT AS $$
+DECLARE
+    last BIGINT;
+BEGIN
+    IF how_many IS NULL OR how_many < 1 THEN
+        RAISE EXCEPTION 'allocate_skus: how_many must be at least 1';
+    END IF;
+    UPDATE sku_counters
+    SET last_value = last_value + how_many, updated_at = now()
+    WHERE prefix = sku_prefix
+    RETURNING last_value INTO last;
+    IF NOT FOUND THEN
+        INSERT INTO sku_counters AS c (prefix, last_value)
+        VALUES (sku_prefix, sku_existing_max(sku_prefix) + how_many)
+        ON CONFLICT (prefix) DO UPDATE
+        SET last_value = c.last_value + how_many, updated_at = now()
+        RETURNING last_value INTO last;
+    END IF;
+    RETURN QUERY
+    SELECT format_sku(sku_prefix, number)
+    FROM generate_series(last - how_many + 1, last) AS number;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Only a counter below the saved SKU is updated (and locked); saving a
+-- product with an allocated SKU just reads the handful of counter rows.
+CREATE OR REPLACE FUNCTION products_sku_counter() RETURNS trigger AS $$
+BEGIN
+    UPDATE sku_counters
+    SET last_value = sku_number(NEW.sku, prefix), updated_at = now()
+    WHERE starts_with(NEW.sku, prefix || '-')
+      AND last_value < sku_number(NEW.sku, prefix);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER products_sku_counter
+    AFTER INSERT OR UPDATE OF sku ON products
+    FOR EACH ROW WHEN (NEW.sku <> '')
+    EXECUTE FUNCTION products_sku_counter();
@@ -0,0 +1,40 @@
+-- 3MF print-file metadata (threemf.py). print_file_meta is keyed by content
+-- hash, so a file copied between products or renamed is not re-extracted;
+-- print_files maps each .3mf path under the Categories folder to its hash
+-- and is kept in step by the catalogue sync (size + mtime decide whether a
+-- file needs hashing again). Summary columns are denormalised from the
+-- metadata document so /api/print_files can sort and filter on indexes.
+CREATE TABLE IF NOT EXISTS print_file_meta (
+    sha256 TEXT PRIMARY KEY,
+    file_size BIGINT NOT NULL,
+    extractor_version INTEGER NOT NULL DEFAULT 0,
+    slicer TEXT,
+    printer TEXT,
+    sliced BOOLEAN NOT NULL DEFAULT false,
+    plate_count INTEGER,
+    object_count INTEGER,
+    print_seconds INTEGER,
+    filament_grams NUMERIC(10,2),
+    filament_by_color JSONB NOT NULL DEFAULT '{}'::jsonb,
+    metadata JSONB NOT NULL DEFAULT '{}'::jsonb,
+    error TEXT,
+    extracted_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS print_file_meta_seconds_idx ON print_file_meta (print_seconds);
+CREATE INDEX IF NOT EXISTS print_file_meta_grams_idx ON print_file_meta (filament_grams);
+CREATE INDEX IF NOT EXISTS print_file_meta_colors_idx ON print_file_meta USING GIN (filament_by_color);
+
+CREATE TABLE IF NOT EXISTS print_files (
+    rel_path TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    product_folder TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    file_size BIGINT NOT NULL,
+    mtime_ns BIGINT NOT NULL,
+    sha256 TEXT NOT NULL,
+    indexed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS print_files_product_idx ON print_files (category, product_folder);
+CREATE INDEX IF NOT EXISTS print_files_sha256_idx ON print_files (sha256);
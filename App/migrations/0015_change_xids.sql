@@ -0,0 +1,44 @@
+-- Delta sync without a global lock. 0002 serialized every products/stock
+-- write on one advisory lock so versions became visible in commit order;
+-- instead each row version now records the writing transaction's id, and
+-- /api/changes pages by transaction id: a call returns rows written by
+-- transactions below its snapshot's xmin (all finished, so none can still
+-- commit behind the cursor) and hands that xmin back as the next cursor.
+-- Existing rows keep row_xid 0.
+ALTER TABLE products
+    ADD COLUMN IF NOT EXISTS row_xid BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE stock
+    ADD COLUMN IF NOT EXISTS row_xid BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE change_tombstones
+    ADD COLUMN IF NOT EXISTS row_xid BIGINT NOT NULL DEFAULT 0;
+
+CREATE INDEX IF NOT EXISTS products_row_xid_idx
+    ON products (row_xid);
+CREATE INDEX IF NOT EXISTS stock_row_xid_idx
+    ON stock (row_xid);
+CREATE INDEX IF NOT EXISTS change_tombstones_row_xid_idx
+    ON change_tombstones (row_xid);
+
+CREATE OR REPLACE FUNCTION next_row_version() RETURNS BIGINT AS $$
+    SELECT nextval('change_seq');
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION current_row_xid() RETURNS BIGINT AS $$
+    SELECT pg_current_xact_id()::text::bigint;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION bump_row_version() RETURNS trigger AS $$
+BEGIN
+    NEW.row_version := next_row_version();
+    NEW.row_xid := current_row_xid();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION record_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO change_tombstones (row_version, table_name, row_id, row_xid)
+    VALUES (next_row_version(), TG_TABLE_NAME, OLD.id, current_row_xid());
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,232 @@
+"""Incremental multipart/form-data parser.
+
+Uploads are read from the socket in fixed-size chunks and each file part is
+written straight to a sink (a temp file next to its destination for real
+uploads), so memory use stays flat regardless of upload size.
+"""
+import errno
+import os
+import secrets
+import shutil
+from email.parser import BytesHeaderParser
+from email.policy import default
+from pathlib import Path
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+MAX_FIELD_BYTES = 1024 * 1024
+TEMP_PREFIX = '.upload-'
+TEMP_SUFFIX = '.part'
+
+
+class MultipartError(ValueError):
+    pass
+
+
+def boundary_from_content_type(content_type: str) -> bytes | None:
+    if not content_type or 'multipart/form-data' not in content_type:
+        return None
+    message = BytesHeaderParser(policy=default).parsebytes(
+        f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8')
+    )
+    boundary = message.get_param('boundary')
+    if not boundary:
+        return None
+    return str(boundary).encode('latin-1')
+
+
+class TempUpload:
+    """File part spooled to disk until it is committed to its final name."""
+
+    def __init__(self, directory: Path):
+        directory.mkdir(parents=True, exist_ok=True)
+        # Opened with the normal umask (unlike mkstemp) so committed files get
+        # the same permissions as before.
+        self.path = directory / f'{TEMP_PREFIX}{secrets.token_hex(8)}{TEMP_SUFFIX}'
+        self.handle = self.path.open('xb')
+        self.size = 0
+
+    def write(self, data: bytes):
+        self.handle.write(data)
+        self.size += len(data)
+
+    def close(self):
+        if not self.handle.closed:
+            self.handle.close()
+
+    def commit(self, dest_path: Path):
+        """Move the upload to ``dest_path``; fails if ``dest_path`` exists."""
+        self.close()
+        try:
+            os.link(self.path, dest_path)
+        except OSError as exc:
+            if exc.errno not in (errno.EXDEV, errno.EPERM, errno.ENOTSUP):
+                raise
+            with self.path.open('rb') as src, dest_path.open('xb') as dst:
+                shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        self.discard()
+
+    def discard(self):
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class MultipartParser:
+    """Push parser: call ``feed`` with body chunks, then ``close``.
+
+    ``open_file(fields, name, filename)`` is called when a file part starts
+    and must return an object with ``write``; it sees every field sent before
+    that part. Parsed parts end up in ``fields`` and ``files``.
+    """
+
+    def __init__(self, boundary: bytes, open_file, max_field_bytes: int = MAX_FIELD_BYTES):
+        self.delimiter = b'\r\n--' + boundary
+        self.open_file = open_file
+        self.max_field_bytes = max_field_bytes
+        self.fields = {}
+        self.files = []
+        # Treat the body as if it started with CRLF so the first boundary
+        # matches the same delimiter as every later one.
+        self.buffer = bytearray(b'\r\n')
+        self.state = 'preamble'
+        self.part = None
+
+    def feed(self, data: bytes):
+        self.buffer += data
+        while True:
+            if self.state == 'preamble':
+                index = self.buffer.find(self.delimiter)
+                if index < 0:
+                    keep = len(self.delimiter) - 1
+                    if len(self.buffer) > keep:
+                        del self.buffer[:len(self.buffer) - keep]
+                    return
+                del self.buffer[:index + len(self.delimiter)]
+                self.state = 'after_boundary'
+            elif self.state == 'after_boundary':
+                if len(self.buffer) < 2:
+                    return
+                marker = bytes(self.buffer[:2])
+                if marker == b'--':
+                    self.state = 'done'
+                    self.buffer.clear()
+                    return
+                if marker != b'\r\n':
+                    raise MultipartError('Malformed multipart boundary')
+                del self.buffer[:2]
+                self.state = 'headers'
+            elif self.state == 'headers':
+                index = self.buffer.find(b'\r\n\r\n')
+                if index < 0:
+                    if len(self.buffer) > MAX_HEADER_BYTES:
+                        raise MultipartError('Multipart headers too large')
+                    return
+                raw_headers = bytes(self.buffer[:index + 4])
+                del self.buffer[:index + 4]
+                self.start_part(raw_headers)
+                self.state = 'body'
+            elif self.state == 'body':
+                index = self.buffer.find(self.delimiter)
+                if index < 0:
+                    safe = len(self.buffer) - len(self.delimiter) + 1
+                    if safe > 0:
+                        self.write_part(self.buffer[:safe])
+                        del self.buffer[:safe]
+                    return
+                self.write_part(self.buffer[:index])
+                del self.buffer[:index + len(self.delimiter)]
+                self.finish_part()
+                self.state = 'after_boundary'
+            else:
+                self.buffer.clear()
+                return
+
+    def close(self):
+        if self.state != 'done':
+            raise MultipartError('Incomplete multipart body')
+
+    def start_part(self, raw_headers: bytes):
+        headers = BytesHeaderParser(policy=default).parsebytes(raw_headers)
+        if headers.get_content_disposition() != 'form-data':
+            self.part = {'skip': True}
+            return
+        name = headers.get_param('name', header='content-disposition')
+        filename = headers.get_filename()
+        if filename:
+            sink = self.open_file(self.fields, name, filename)
+            self.part = {'name': name, 'filename': filename, 'sink': sink, 'size': 0}
+        else:
+            charset = headers.get_content_charset() or 'utf-8'
+            self.part = {'name': name, 'value': bytearray(), 'charset': charset}
+
+    def write_part(self, data):
+        part = self.part
+        if not data or part.get('skip'):
+            return
+        if 'sink' in part:
+            part['sink'].write(bytes(data))
+            part['size'] += len(data)
+            return
+        if len(part['value']) + len(data) > self.max_field_bytes:
+            raise MultipartError('Multipart field too large')
+        part['value'] += data
+
+    def finish_part(self):
+        part = self.part
+        self.part = None
+        if part is None or part.get('skip'):
+            return
+        if 'sink' in part:
+            if isinstance(part['sink'], TempUpload):
+                part['sink'].close()
+            self.files.append({
+                'name': part['name'],
+                'filename': part['filename'],
+                'file': part['sink'],
+                'size': part['size'],
+            })
+            return
+        try:
+            value = part['value'].decode(part['charset'], errors='replace')
+        except LookupError:
+            value = part['value'].decode('utf-8', errors='replace')
+        self.fields[part['name']] = value
+
+
+def parse_stream(stream, content_type: str, content_length: int, open_file,
+                 chunk_size: int = CHUNK_SIZE) -> tuple[dict, list]:
+    """Parse ``content_length`` bytes of multipart data from ``stream``.
+
+    On error every file sink opened so far that has a ``discard`` method is
+    discarded before the exception propagates.
+    """
+    boundary = boundary_from_content_type(content_type)
+    if not boundary:
+        return {}, []
+    opened = []
+
+    def tracked_open(fields, name, filename):
+        sink = open_file(fields, name, filename)
+        opened.append(sink)
+        return sink
+
+    parser = MultipartParser(boundary, tracked_open)
+    remaining = content_length
+    try:
+        while remaining > 0:
+            chunk = stream.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            parser.feed(chunk)
+        parser.close()
+    except BaseException:
+        for sink in opened:
+            discard = getattr(sink, 'discard', None)
+            if discard:
+                discard()
+        raise
+    return parser.fields, parser.files
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""Recompute the sales rollup tables from the sales table.
+
+The rollups are kept current by triggers on ``sales``; run this after bulk
+imports done with triggers disabled, or if ``--check`` reports drift. Sale
+writes wait until the rebuild commits.
+
+    DATABASE_URL=postgresql://... python3 App/rebuild_rollups.py [--check]
+"""
+import argparse
+import sys
+
+import db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check', action='store_true', help='report rows that differ from sales without rebuilding')
+    args = parser.parse_args()
+    db.ensure_schema()
+    if args.check:
+        drift = db.check_sales_rollups()
+        print(', '.join(f'{name}: {count} differing rows' for name, count in drift.items()))
+        sys.exit(1 if any(drift.values()) else 0)
+    counts = db.rebuild_sales_rollups()
+    print(f"Rebuilt rollups: {counts['events']} events, {counts['days']} days, {counts['variants']} variants")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""Numbered SQL migrations in ``migrations/``.
+
+Files are named ``NNNN_description.sql`` and applied in order, each recorded
+in ``schema_migrations`` with a checksum. A file runs in one transaction with
+its bookkeeping row unless its header contains a marker comment:
+
+``-- migrate: no-transaction``
+    Statements run one by one in autocommit mode, as ``CREATE INDEX
+    CONCURRENTLY`` requires. Statements must end with ``;`` at end of line.
+    Invalid leftovers of an interrupted concurrent build are dropped before
+    a retry.
+``-- migrate: optional``
+    A failure is logged and recorded as skipped instead of raised (e.g.
+    extensions that are not installed everywhere). ``--retry-skipped``
+    tries skipped files again.
+
+Concurrent runners serialize on a session advisory lock. When every file is
+already recorded, a run costs two catalog reads and takes no lock.
+
+    python3 App/schema_migrations.py            # apply pending migrations
+    python3 App/schema_migrations.py --status   # list applied/pending
+    python3 App/schema_migrations.py --retry-skipped
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+import psycopg
+
+BASE_DIR = Path(__file__).resolve().parent
+MIGRATIONS_DIR = BASE_DIR / 'migrations'
+MIGRATIONS_TABLE = 'schema_migrations'
+# Arbitrary constant shared by every process that runs migrations.
+MIGRATION_LOCK_ID = 0x6d696772
+FILE_RE = re.compile(r'^(\d+)_([\w-]+)\.sql$')
+MARKER_RE = re.compile(r'^--\s*migrate:\s*([\w-]+)\s*$', re.MULTILINE)
+CONCURRENT_INDEX_RE = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.IGNORECASE
+)
+
+
+class MigrationError(RuntimeError):
+    pass
+
+
+class Migration:
+    def __init__(self, path: Path):
+        match = FILE_RE.match(path.name)
+        if not match:
+            raise MigrationError(f'Bad migration file name: {path.name}')
+        self.path = path
+        self.version = int(match.group(1))
+        self.name = match.group(2)
+        self.sql = path.read_text(encoding='utf-8')
+        self.checksum = hashlib.sha256(self.sql.encode('utf-8')).hexdigest()
+        self.markers = set(MARKER_RE.findall(self.sql))
+        unknown = self.markers - {'no-transaction', 'optional'}
+        if unknown:
+            raise MigrationError(f'{path.name}: unknown marker(s) {sorted(unknown)}')
+
+    @property
+    def transactional(self) -> bool:
+        return 'no-transaction' not in self.markers
+
+    @property
+    def optional(self) -> bool:
+        return 'optional' in self.markers
+
+    def statements(self) -> list[str]:
+        """Split on ``;`` at end of line (no-transaction files only)."""
+        statements = []
+        current = []
+        for line in self.sql.splitlines():
+            if not current and (not line.strip() or line.lstrip().startswith('--')):
+                continue
+            current.append(line)
+            if line.rstrip().endswith(';'):
+                statements.append('\n'.join(current))
+                current = []
+        if current:
+            statements.append('\n'.join(current))
+        return statements
+
+    def concurrent_indexes(self) -> list[str]:
+        return CONCURRENT_INDEX_RE.findall(self.sql)
+
+
+def discover(directory: Path = MIGRATIONS_DIR) -> list[Migration]:
+    migrations = sorted(
+        (Migration(path) for path in directory.glob('*.sql')),
+        key=lambda migration: migration.version,
+    )
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError('Duplicate migration version numbers')
+    return migrations
+
+
+def applied_versions(conn, table: str = MIGRATIONS_TABLE) -> dict:
+    """``{version: checksum}``; empty if the bookkeeping table is missing."""
+    exists = conn.execute('SELECT to_regclass(%s) IS NOT NULL', (table,)).fetchone()[0]
+    if not exists:
+        return {}
+    return dict(conn.execute(f'SELECT version, checksum FROM {table}').fetchall())
+
+
+def _drop_invalid_indexes(conn, names: list[str]):
+    for (name,) in conn.execute(
+        """
+        SELECT c.relname
+        FROM pg_index AS i
+        JOIN pg_class AS c ON c.oid = i.indexrelid
+        WHERE NOT i.indisvalid AND c.relname = ANY(%s)
+        """,
+        (names,),
+    ).fetchall():
+        conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+def _record(conn, migration: Migration, table: str, skipped: bool = False):
+    conn.execute(
+        f'INSERT INTO {table} (version, name, checksum, skipped) VALUES (%s, %s, %s, %s)',
+        (migration.version, migration.name, migration.checksum, skipped),
+    )
+
+
+def _apply(conn, migration: Migration, table: str):
+    if migration.transactional:
+        with conn.transaction():
+            conn.execute(migration.sql)
+            _record(conn, migration, table)
+        return
+    indexes = migration.concurrent_indexes()
+    if indexes:
+        _drop_invalid_indexes(conn, indexes)
+    for statement in migration.statements():
+        conn.execute(statement)
+    _record(conn, migration, table)
+
+
+def _acquire_lock(conn):
+    # Poll instead of blocking in pg_advisory_lock: a waiting backend is in a
+    # transaction, and CREATE INDEX CONCURRENTLY in the lock holder waits for
+    # every open transaction to finish, which would deadlock.
+    delay = 0.05
+    while not conn.execute('SELECT pg_try_advisory_lock(%s)', (MIGRATION_LOCK_ID,)).fetchone()[0]:
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+
+def migrate(
+    database_url: str,
+    directory: Path = MIGRATIONS_DIR,
+    table: str = MIGRATIONS_TABLE,
+    log=print,
+) -> list[int]:
+    """Apply pending migrations; returns the versions applied by this call."""
+    migrations = discover(directory)
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        applied = applied_versions(conn, table)
+        if all(migration.version in applied for migration in migrations):
+            return []
+        _acquire_lock(conn)
+        try:
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    checksum TEXT NOT NULL,
+                    skipped BOOLEAN NOT NULL DEFAULT false,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+                """
+            )
+            # Another process may have applied some while we waited.
+            applied = applied_versions(conn, table)
+            done = []
+            for migration in migrations:
+                if migration.version in applied:
+                    if applied[migration.version] != migration.checksum:
+                        log(f'Migration {migration.path.name} changed after it was applied')
+                    continue
+                try:
+                    _apply(conn, migration, table)
+                except psycopg.Error as exc:
+                    if not migration.optional:
+                        raise MigrationError(f'{migration.path.name} failed: {exc}') from exc
+                    log(f'Optional migration {migration.path.name} skipped: {exc}')
+                    _record(conn, migration, table, skipped=True)
+                    continue
+                log(f'Applied migration {migration.path.name}')
+                done.append(migration.version)
+            return done
+        finally:
+            conn.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_ID,))
+
+
+def status(database_url: str, directory: Path = MIGRATIONS_DIR, table: str = MIGRATIONS_TABLE) -> list[dict]:
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        applied = applied_versions(conn, table)
+        skipped = set(conn.execute(f'SELECT version FROM {table} WHERE skipped').fetchall()) if applied else set()
+    return [
+        {
+            'file': migration.path.name,
+            'applied': migration.version in applied,
+            'skipped': (migration.version,) in skipped,
+            'modified': migration.version in applied and applied[migration.version] != migration.checksum,
+        }
+        for migration in discover(directory)
+    ]
+
+
+def forget_skipped(database_url: str, table: str = MIGRATIONS_TABLE) -> int:
+    """Un-record skipped optional migrations so the next run retries them."""
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        if not applied_versions(conn, table):
+            return 0
+        return conn.execute(f'DELETE FROM {table} WHERE skipped').rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--status', action='store_true', help='list migrations without applying them')
+    parser.add_argument('--retry-skipped', action='store_true', help='retry optional migrations that failed before')
+    args = parser.parse_args()
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        sys.exit('DATABASE_URL is not set')
+    if args.status:
+        for row in status(database_url):
+            state = 'skipped' if row['skipped'] else 'applied' if row['applied'] else 'pending'
+            if row['modified']:
+                state += ' (modified)'
+            print(f"{row['file']:<40} {state}")
+        return
+    if args.retry_skipped:
+        forget_skipped(database_url)
+    applied = migrate(database_url)
+    print(f'Applied {len(applied)} migration(s)' if applied else 'Schema is up to date')
+
+
+if __name__ == '__main__':
+    main()
@@ -7,20 +7,45 @@ import shutil
 import time
 import secrets
 import hmac
+import base64
+import datetime
+import hashlib
+import signal
+import tempfile
+import threading
 try:
     import pyotp
 except ModuleNotFoundError:  # Optional for TOTP-enabled auth
     pyotp = None
+try:
+    import brotli
+except ModuleNotFoundError:  # Optional; gzip is used when brotli is missing
+    brotli = None
+try:
+    import fcntl
+except ModuleNotFoundError:  # Not available on Windows; thread lock still applies
+    fcntl = None
+import gzip
+import io
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from decimal import Decimal, InvalidOperation
-from email import message_from_bytes
-from email.policy import default
+from email.utils import formatdate, parsedate_to_datetime
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from pathlib import Path
 from urllib.parse import urlparse, parse_qs, unquote, quote
+from zoneinfo import ZoneInfo
 
 import db
+import fs_index
+import lookup_index
+import multipart_stream
+import sessions
+import threemf
+import thumbnails
+import ukca_bulk
 
 BASE_DIR = Path(__file__).resolve().parent
 ROOT_DIR = BASE_DIR.parent
@@ -35,9 +60,15 @@ AUTH_TOTP_SECRET = os.environ.get('AUTH_TOTP_SECRET')
 AUTH_COOKIE_SECURE = os.environ.get('AUTH_COOKIE_SECURE', '').lower() in ('1', 'true', 'yes')
 AUTH_DISABLED = os.environ.get('AUTH_DISABLED', '').lower() in ('1', 'true', 'yes')
 SESSION_TTL_SECONDS = int(os.environ.get('SESSION_TTL_SECONDS', '43200'))
-SESSIONS = {}
-FILE_TOKENS = {}
 FILE_TOKEN_TTL_SECONDS = int(os.environ.get('FILE_TOKEN_TTL_SECONDS', '300'))
+# Set FILE_TOKEN_SECRET when running several nodes; prefork workers inherit
+# the random default from the parent process.
+FILE_TOKEN_SECRET = (os.environ.get('FILE_TOKEN_SECRET') or secrets.token_hex(32)).encode('utf-8')
+FS_LOCK = threading.Lock()
+FS_LOCK_PATH = Path(os.environ.get('FS_LOCK_PATH', Path(tempfile.gettempdir()) / 'geekythings-fs.lock'))
+SERVER_MODE = (os.environ.get('SERVER_MODE') or 'threaded').strip().lower()
+SERVER_THREADS = max(int(os.environ.get('SERVER_THREADS', '16')), 1)
+SERVER_WORKERS = max(int(os.environ.get('SERVER_WORKERS', str(os.cpu_count() or 2))), 1)
 CATEGORIES_DIR = PRODUCTS_DIR / 'Categories'
 ARCHIVE_DIR = CATEGORIES_DIR / '_Archive'
 DRAFT_DIR = CATEGORIES_DIR / '_Draft'
@@ -50,6 +81,24 @@ else:
     OPEN_FOLDER_ENABLED = OPEN_FOLDER_ENABLED.lower() in ('1', 'true', 'yes')
 OPEN_3MF_APP = (os.environ.get('OPEN_3MF_APP') or '').strip()
 UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', str(100 * 1024 * 1024)))
+UPLOAD_STAGING_DIR = Path(os.environ.get('UPLOAD_STAGING_DIR', tempfile.gettempdir()))
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '5'))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '4'))
+FILE_CACHE_MAX_AGE = int(os.environ.get('FILE_CACHE_MAX_AGE', '3600'))
+FILE_TOKEN_CACHE_CONTROL = 'private, max-age=300'
+RECORDS_CACHE_CONTROL = 'private, no-cache'
+MEDIA_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.tiff', '.heic', '.mp4', '.mov', '.mkv', '.avi', '.webm', '.m4v')
+JSON_MAX_BYTES = int(os.environ.get('JSON_MAX_BYTES', str(20 * 1024 * 1024)))
+SEARCH_MAX_PAGE_SIZE = 200
+ROLLUP_MAX_LIMIT = 200
+SALES_BATCH_MAX_LINES = int(os.environ.get('SALES_BATCH_MAX_LINES', '500'))
+SKU_RESERVE_MAX = 500
+# Calendar dates in query strings (e.g. /api/stock_as_of?at=) are UK dates.
+LOCAL_TIME_ZONE = ZoneInfo('Europe/London')
+STOCK_SNAPSHOT_INTERVAL_SECONDS = float(os.environ.get('STOCK_SNAPSHOT_INTERVAL_SECONDS', '3600'))
+STOCK_SNAPSHOT_MIN_MOVEMENTS = int(os.environ.get('STOCK_SNAPSHOT_MIN_MOVEMENTS', '1000'))
+PRINT_FILE_SYNC_SECONDS = float(os.environ.get('PRINT_FILE_SYNC_SECONDS', '900'))
 CATEGORY_PREFIXES = {
     'Automotive': 'GT-AUT',
     'Bookish & Stationery': 'GT-BKS',
@@ -146,18 +195,18 @@ def derive_folder_for_sku(folder_name: str, old_sku: str, new_sku: str) -> tuple
 def collect_sku_renames(product_path: Path, old_sku: str, new_sku: str) -> tuple[list[tuple[Path, Path]], str | None]:
     if not old_sku or not new_sku or old_sku == new_sku:
         return [], None
+    listing = fs_index.listing(product_path, fresh=True)
+    if listing is None:
+        return [], None
     renames = []
-    for path in product_path.rglob('*'):
-        if not path.is_file():
-            continue
-        if '_Deleted' in path.parts:
-            continue
-        name = path.name
+    for entry in listing.files:
+        name = entry.name
         if not name.startswith(old_sku):
             continue
         new_name = f"{new_sku}{name[len(old_sku):]}"
         if new_name == name:
             continue
+        path = product_path / entry.rel_path
         renames.append((path, path.with_name(new_name)))
     dests = set()
     for src, dest in renames:
@@ -175,6 +224,7 @@ def apply_sku_renames(product_path: Path, old_sku: str, new_sku: str) -> tuple[b
         return False, error, 0
     for src, dest in renames:
         src.rename(dest)
+    fs_index.invalidate(product_path)
     return True, None, len(renames)
 
 
@@ -186,6 +236,7 @@ def apply_sku_renames_with_tracking(
         return False, error, []
     for src, dest in renames:
         src.rename(dest)
+    fs_index.invalidate(product_path)
     return True, None, renames
 
 
@@ -194,10 +245,17 @@ def rollback_sku_renames(renames: list[tuple[Path, Path]]):
         try:
             if dest.exists() and not src.exists():
                 dest.rename(src)
+                fs_index.invalidate(src.parent)
         except OSError:
             continue
 
 
+def move_product_folder(src: Path, dest: Path):
+    src.rename(dest)
+    fs_index.invalidate(src)
+    fs_index.invalidate(dest)
+
+
 def product_base_dir(status: str) -> Path:
     normalized = normalize_status(status)
     if normalized == 'Draft':
@@ -207,17 +265,65 @@ def product_base_dir(status: str) -> Path:
     return CATEGORIES_DIR
 
 
+def print_thumbnail_url(rel_path: str, plate: int | None = None) -> str:
+    url = f"/api/print_file_thumbnail?path={quote(rel_path)}"
+    return f"{url}&plate={plate}" if plate is not None else url
+
+
+def print_file_summary(row: dict, detail: bool = False) -> dict:
+    """Public fields of an indexed 3MF row (``detail`` adds per-plate data)."""
+    summary = {
+        key: row[key]
+        for key in (
+            'slicer', 'printer', 'sliced', 'plate_count', 'object_count', 'print_seconds',
+            'filament_grams', 'filament_by_color', 'error',
+        )
+    }
+    summary['thumbnail_url'] = print_thumbnail_url(row['rel_path'])
+    if detail:
+        meta = row.get('metadata') or {}
+        for key in ('title', 'designer', 'layer_height', 'filament_colors', 'filament_types'):
+            summary[key] = meta.get(key)
+        summary['plates'] = [
+            {
+                **plate,
+                'thumbnail_url': print_thumbnail_url(row['rel_path'], plate['index']) if plate.get('thumbnail') else None,
+            }
+            for plate in meta.get('plates') or []
+        ]
+    return summary
+
+
 def product_dir(category: str, folder_name: str, status: str) -> Path:
     return product_base_dir(status) / category / folder_name
 
 
+def read_readme_text(category: str, folder_name: str, status: str) -> str:
+    readme_path = product_dir(category, folder_name, status) / 'README.md'
+    try:
+        return readme_path.read_text(encoding='utf-8', errors='replace')
+    except OSError:
+        return ''
+
+
+def index_product_readme(category: str, folder_name: str, status: str):
+    db.set_product_readme_text(category, folder_name, read_readme_text(category, folder_name, status))
+
+
+def sync_readme_index() -> int:
+    """Copy every product README into ``products.readme_text`` for search."""
+    stored = db.fetch_readme_texts()
+    updated = 0
+    for row in db.fetch_products():
+        key = (row['category'], row['product_folder'])
+        text = read_readme_text(row['category'], row['product_folder'], row['Status'])[:db.README_TEXT_MAX_CHARS]
+        if stored.get(key) != text and db.set_product_readme_text(*key, text):
+            updated += 1
+    return updated
+
+
 def ukca_file_paths(product_path: Path) -> dict:
-    return {
-        'readme': product_path / 'UKCA' / 'README.md',
-        'declaration': product_path / 'UKCA' / 'Declarations' / 'UKCA_Declaration_of_Conformity.md',
-        'risk_assessment': product_path / 'UKCA' / 'Risk_Assessment' / 'Risk_Assessment.md',
-        'en71': product_path / 'UKCA' / 'EN71-1_Compliance_Pack.md',
-    }
+    return {key: product_path / rel_path for key, rel_path in ukca_bulk.UKCA_FILES.items()}
 
 
 def list_folder_entries(base_dir: Path):
@@ -292,43 +398,6 @@ def unique_filename(dest_dir: Path, name: str) -> str | None:
     return None
 
 
-def next_sku_for_category(category: str) -> str:
-    prefix = CATEGORY_PREFIXES.get(category)
-    if not prefix:
-        return ''
-    max_num = 0
-    with db.get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT sku FROM products WHERE category = %s", (category,))
-            for (sku,) in cur.fetchall():
-                if not sku or not sku.startswith(prefix + '-'):
-                    continue
-                suffix = sku[len(prefix) + 1:]
-                digits = ''.join(ch for ch in suffix if ch.isdigit())
-                if not digits:
-                    continue
-                try:
-                    num = int(digits)
-                except ValueError:
-                    continue
-                if num > max_num:
-                    max_num = num
-    return f'{prefix}-{max_num + 1:05d}'
-
-
-def read_template(path: Path) -> str:
-    if path.exists():
-        return path.read_text(encoding='utf-8')
-    return ''
-
-
-def apply_replacements(template: str, replacements: dict) -> str:
-    content = template
-    for key, value in replacements.items():
-        content = content.replace(f'{{{{{key}}}}}', value)
-    return content
-
-
 def parse_cookies(header_value: str) -> dict:
     cookies = {}
     if not header_value:
@@ -342,49 +411,74 @@ def parse_cookies(header_value: str) -> dict:
 
 
 def create_session(username: str) -> str:
-    session_id = secrets.token_hex(24)
-    expires_at = int(time.time()) + SESSION_TTL_SECONDS
-    SESSIONS[session_id] = {'user': username, 'expires_at': expires_at}
-    return session_id
+    return sessions.get_store().create(username, SESSION_TTL_SECONDS)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
 
 
-def cleanup_sessions():
-    now = int(time.time())
-    expired = [key for key, value in SESSIONS.items() if value['expires_at'] <= now]
-    for key in expired:
-        SESSIONS.pop(key, None)
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
 
 
-def cleanup_file_tokens():
-    now = int(time.time())
-    expired = [key for key, value in FILE_TOKENS.items() if value['expires_at'] <= now]
-    for key in expired:
-        FILE_TOKENS.pop(key, None)
+def _file_token_signature(message: str) -> str:
+    return _b64encode(hmac.new(FILE_TOKEN_SECRET, message.encode('utf-8'), hashlib.sha256).digest())
 
 
 def create_file_token(path: Path) -> str:
-    cleanup_file_tokens()
-    token = secrets.token_urlsafe(24)
-    FILE_TOKENS[token] = {
-        'path': str(path),
-        'expires_at': int(time.time()) + FILE_TOKEN_TTL_SECONDS,
-    }
-    return token
+    """Self-expiring ``<expiry>.<path>.<signature>`` token; no server state."""
+    expires_at = int(time.time()) + FILE_TOKEN_TTL_SECONDS
+    message = f'{expires_at:x}.{_b64encode(str(path).encode("utf-8"))}'
+    return f'{message}.{_file_token_signature(message)}'
+
+
+def get_file_token(token: str) -> dict | None:
+    parts = token.split('.')
+    if len(parts) != 3:
+        return None
+    expires_hex, path_part, signature = parts
+    message = f'{expires_hex}.{path_part}'
+    # Compare bytes: compare_digest rejects non-ASCII str, and the token comes
+    # straight from the request path.
+    if not hmac.compare_digest(signature.encode('utf-8'), _file_token_signature(message).encode('utf-8')):
+        return None
+    try:
+        expires_at = int(expires_hex, 16)
+        path = _b64decode(path_part).decode('utf-8')
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if expires_at <= int(time.time()):
+        return None
+    return {'path': path, 'expires_at': expires_at}
 
 
 def get_session(headers) -> dict | None:
-    cleanup_sessions()
     cookies = parse_cookies(headers.get('Cookie'))
     session_id = cookies.get('session_id')
     if not session_id:
         return None
-    session = SESSIONS.get(session_id)
-    if not session:
-        return None
-    if session['expires_at'] <= int(time.time()):
-        SESSIONS.pop(session_id, None)
-        return None
-    return session
+    return sessions.get_store().get(session_id)
+
+
+def delete_session(session_id: str):
+    sessions.get_store().delete(session_id)
+
+
+@contextmanager
+def fs_lock():
+    # Serialises check-then-rename filesystem moves across threads and, via
+    # flock, across prefork worker processes sharing the same host.
+    with FS_LOCK:
+        if fcntl is None:
+            yield
+            return
+        with open(FS_LOCK_PATH, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
 
 
 def check_credentials(username: str, password: str) -> bool:
@@ -416,31 +510,244 @@ def open_path_in_os(path: Path) -> tuple[bool, str | None]:
 
 
 def parse_multipart_form_data(content_type: str, body: bytes) -> tuple[dict, list]:
-    if not content_type or 'multipart/form-data' not in content_type:
-        return {}, []
-    message = message_from_bytes(
-        f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body,
-        policy=default,
+    fields, files = multipart_stream.parse_stream(
+        io.BytesIO(body),
+        content_type,
+        len(body),
+        lambda fields, name, filename: io.BytesIO(),
     )
-    fields = {}
-    files = []
-    for part in message.iter_parts():
-        if part.get_content_disposition() != 'form-data':
+    return fields, [
+        {'name': item['name'], 'filename': item['filename'], 'content': item['file'].getvalue()}
+        for item in files
+    ]
+
+
+def upload_subdir(ext: str) -> str:
+    if ext in MEDIA_EXTENSIONS:
+        return 'Media'
+    if ext == '.3mf':
+        return 'STL'
+    return 'MISC'
+
+
+def categories_file_path(rel: str) -> Path | None:
+    rel_path = Path(*[p for p in rel.split('/') if p and p not in ('.', '..')])
+    file_path = (CATEGORIES_DIR / rel_path).resolve()
+    if not file_path.is_relative_to(CATEGORIES_DIR.resolve()):
+        return None
+    return file_path
+
+
+def records_file_path(rel: str) -> Path | None:
+    rel_path = safe_rel_path(rel)
+    if not rel_path:
+        return None
+    file_path = (RECORDS_DIR / rel_path).resolve()
+    if not file_path.is_relative_to(RECORDS_DIR.resolve()):
+        return None
+    return file_path
+
+
+def thumb_url(file_url: str, path: Path, size: str) -> str | None:
+    """Derivative URL for a ``/files/`` or ``/files-records/`` URL, if resizable."""
+    if not thumbnails.supports(path):
+        return None
+    return f"/thumbs{file_url}?size={size}"
+
+
+def choose_encoding(accept_encoding: str | None) -> str | None:
+    """Pick ``br`` or ``gzip`` from an Accept-Encoding header (None = identity)."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(','):
+        token, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+    wildcard = accepted.get('*', 0.0)
+    for encoding in ('br', 'gzip'):
+        if encoding == 'br' and brotli is None:
             continue
-        name = part.get_param('name', header='content-disposition')
-        filename = part.get_filename()
-        if filename:
-            files.append({
-                'name': name,
-                'filename': filename,
-                'content': part.get_payload(decode=True) or b'',
-            })
-        else:
-            value = part.get_content()
-            if isinstance(value, bytes):
-                value = value.decode(part.get_content_charset() or 'utf-8', errors='replace')
-            fields[name] = value
-    return fields, files
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress_body(data: bytes, encoding: str | None) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    return data
+
+
+def columnar(rows: list[dict], headers: list[str] | None = None) -> dict:
+    """``{'headers': [...], 'rows': [[...], ...]}`` with each key sent once."""
+    if headers is None:
+        headers = list(rows[0].keys()) if rows else []
+    return {'headers': headers, 'rows': [[row.get(key) for key in headers] for row in rows]}
+
+
+def wants_columns(parsed) -> bool:
+    return parse_qs(parsed.query).get('format', [''])[0] == 'columns'
+
+
+PAGE_PARAMS = ('limit', 'cursor', 'sort', 'date_from', 'date_to')
+
+
+def page_request(parsed, name: str, always: bool = False) -> dict | None:
+    """``db.fetch_page`` arguments from the query string.
+
+    Returns None when no paging, sort or filter parameter is present (and
+    ``always`` is false) so the endpoint can keep sending the full listing.
+    """
+    query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+    filter_names = set(db.LIST_QUERIES[name]['filters']) | {'date_from', 'date_to'}
+    if not always and not (set(query) & (filter_names | set(PAGE_PARAMS))):
+        return None
+    return {
+        'filters': {key: value for key, value in query.items() if key in filter_names},
+        'sort': query.get('sort'),
+        'cursor': query.get('cursor'),
+        'limit': query.get('limit', '100'),
+    }
+
+
+def parse_sale_line(data: dict, require_price: bool = True) -> tuple[dict | None, str | None]:
+    """Validate a sale as sent by a till; returns ``(line, None)`` or ``(None, error)``.
+
+    ``sold_at`` (ISO timestamp, UK time when naive) lets queued offline sales
+    keep the time they were made. ``product_id`` is left to the caller. With
+    ``require_price=False`` a missing unit price is returned as None.
+    """
+    try:
+        event_id = int(data.get('event_id'))
+    except (TypeError, ValueError):
+        return None, 'Invalid event id'
+    category = safe_path_component(data.get('category', ''))
+    product_folder = safe_path_component(data.get('product_folder', ''))
+    if not category or not product_folder:
+        return None, 'Missing category/product_folder'
+    try:
+        quantity = int(data.get('quantity', 1))
+    except (TypeError, ValueError):
+        return None, 'Invalid quantity'
+    if quantity <= 0:
+        return None, 'Quantity must be greater than 0'
+    unit_price_raw = str(data.get('unit_price') or '').strip()
+    unit_price = None
+    if unit_price_raw or require_price:
+        try:
+            unit_price = Decimal(unit_price_raw)
+        except (InvalidOperation, TypeError):
+            return None, 'Invalid unit price'
+        if not unit_price.is_finite() or unit_price < 0:
+            return None, 'Unit price must be non-negative'
+        unit_price = unit_price.quantize(Decimal('0.01'))
+    sold_at = None
+    sold_at_raw = str(data.get('sold_at') or '').strip()
+    if sold_at_raw:
+        try:
+            sold_at = datetime.datetime.fromisoformat(sold_at_raw)
+        except ValueError:
+            return None, 'Invalid sold_at'
+        if sold_at.tzinfo is None:
+            sold_at = sold_at.replace(tzinfo=LOCAL_TIME_ZONE)
+    idempotency_key = str(data.get('idempotency_key') or '').strip()
+    if len(idempotency_key) > 200:
+        return None, 'idempotency_key is too long'
+    return {
+        'idempotency_key': idempotency_key,
+        'event_id': event_id,
+        'category': category,
+        'product_folder': product_folder,
+        'sku': (data.get('sku') or '').strip(),
+        'color': (data.get('color') or '').strip(),
+        'size': (data.get('size') or '').strip(),
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'override_price': (data.get('override_price') or '').strip(),
+        'payment_method': (data.get('payment_method') or '').strip(),
+        'sold_at': sold_at,
+    }, None
+
+
+def parse_as_of(value: str) -> datetime.datetime:
+    """End of a ``YYYY-MM-DD`` day, or an ISO timestamp (UK time when naive)."""
+    value = (value or '').strip()
+    if len(value) == 10:
+        day = datetime.date.fromisoformat(value)
+        return datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time(), LOCAL_TIME_ZONE)
+    moment = datetime.datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=LOCAL_TIME_ZONE)
+    return moment
+
+
+def parse_range_header(value: str | None, size: int) -> tuple[int, int] | None:
+    """Return the inclusive byte span of a single ``bytes=`` range.
+
+    None means the header is absent or unsupported (multiple ranges, other
+    units) and the full file should be sent; ValueError means the range is
+    unsatisfiable (416).
+    """
+    if not value:
+        return None
+    unit, _, spec = value.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    start_text, sep, end_text = spec.strip().partition('-')
+    if not sep:
+        return None
+    start_text = start_text.strip()
+    end_text = end_text.strip()
+    if not (start_text.isdigit() or start_text == '') or not (end_text.isdigit() or end_text == ''):
+        return None
+    if not start_text:
+        if not end_text:
+            return None
+        suffix = int(end_text)
+        if suffix == 0 or size == 0:
+            raise ValueError('Unsatisfiable range')
+        return max(size - suffix, 0), size - 1
+    start = int(start_text)
+    end = int(end_text) if end_text else size - 1
+    if end_text and end < start:
+        return None
+    if start >= size:
+        raise ValueError('Unsatisfiable range')
+    return start, min(end, size - 1)
+
+
+def file_etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def etag_matches(header_value: str, etag: str) -> bool:
+    if header_value.strip() == '*':
+        return True
+    candidates = [item.strip() for item in header_value.split(',')]
+    return any(item.removeprefix('W/') == etag for item in candidates)
+
+
+def not_modified(headers, etag: str, mtime: float) -> bool:
+    if_none_match = headers.get('If-None-Match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = headers.get('If-Modified-Since')
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return int(mtime) <= since.timestamp()
 
 
 def parse_price(value):
@@ -466,6 +773,7 @@ def format_money(value) -> str:
 
 
 def calculate_event_totals(rows: list[dict]) -> dict:
+    """Totals for already-fetched sale rows; /api/event_totals uses db.fetch_event_totals."""
     total_items = 0
     total_revenue = Decimal('0.00')
     payments: dict[str, Decimal] = {}
@@ -477,7 +785,7 @@ def calculate_event_totals(rows: list[dict]) -> dict:
         unit_price = parse_price(row.get('unit_price')) or Decimal('0.00')
         override_price = parse_price(row.get('override_price'))
         effective_price = override_price if override_price is not None else unit_price
-        line_total = effective_price * quantity
+        line_total = effective_price * quantity - (parse_price(row.get('discount')) or Decimal('0.00'))
         total_items += quantity
         total_revenue += line_total
         payment_method = row.get('payment_method') or 'Unknown'
@@ -489,15 +797,156 @@ def calculate_event_totals(rows: list[dict]) -> dict:
     }
 
 
+class Route:
+    __slots__ = ('method', 'path', 'func', 'body', 'auth', 'max_bytes', 'prefix', 'count', 'total_seconds', 'max_seconds')
+
+    def __init__(self, method: str, path: str, func, body: str | None, auth: bool, max_bytes: int | None, prefix: bool):
+        self.method = method
+        self.path = path
+        self.func = func
+        self.body = body
+        self.auth = auth
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+
+class RouteRegistry:
+    """Dispatch table for Handler.
+
+    Exact paths resolve with a single dict lookup; prefix routes (such as
+    ``/files/``) are keyed by their first path segment so unknown paths never
+    scan the whole table.
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.prefixes = {}
+        self.lock = threading.Lock()
+        self.lookups = 0
+        self.lookup_seconds = 0.0
+
+    def route(self, method: str, path: str, body: str | None = None, auth: bool = True,
+              max_bytes: int | None = None, prefix: bool = False):
+        if body not in (None, 'json', 'raw'):
+            raise ValueError(f'Unknown body type: {body}')
+        if body == 'json' and max_bytes is None:
+            max_bytes = JSON_MAX_BYTES
+
+        def decorator(func):
+            entry = Route(method, path, func, body, auth, max_bytes, prefix)
+            if prefix:
+                segment = path.strip('/').split('/', 1)[0]
+                self.prefixes.setdefault((method, segment), []).append(entry)
+            else:
+                if (method, path) in self.exact:
+                    raise ValueError(f'Duplicate route: {method} {path}')
+                self.exact[(method, path)] = entry
+            return func
+
+        return decorator
+
+    def resolve(self, method: str, path: str) -> Route | None:
+        entry = self.exact.get((method, path))
+        if entry is not None:
+            return entry
+        segment = path.lstrip('/').split('/', 1)[0]
+        for candidate in self.prefixes.get((method, segment), ()):
+            if path.startswith(candidate.path):
+                return candidate
+        return None
+
+    def record(self, entry: Route | None, lookup_seconds: float, seconds: float = 0.0):
+        with self.lock:
+            self.lookups += 1
+            self.lookup_seconds += lookup_seconds
+            if entry is None:
+                return
+            entry.count += 1
+            entry.total_seconds += seconds
+            if seconds > entry.max_seconds:
+                entry.max_seconds = seconds
+
+    def routes(self) -> list[Route]:
+        entries = list(self.exact.values())
+        for group in self.prefixes.values():
+            entries.extend(group)
+        return entries
+
+    def stats(self) -> dict:
+        with self.lock:
+            routes = [
+                {
+                    'method': entry.method,
+                    'path': entry.path,
+                    'count': entry.count,
+                    'avg_ms': round(entry.total_seconds * 1000 / entry.count, 3) if entry.count else 0.0,
+                    'max_ms': round(entry.max_seconds * 1000, 3),
+                }
+                for entry in self.routes()
+            ]
+            lookup_avg_ns = round(self.lookup_seconds * 1e9 / self.lookups) if self.lookups else 0
+            lookups = self.lookups
+        routes.sort(key=lambda item: (-item['count'], item['path']))
+        return {'routes': routes, 'lookups': lookups, 'lookup_avg_ns': lookup_avg_ns}
+
+
+ROUTES = RouteRegistry()
+
+
 class Handler(BaseHTTPRequestHandler):
-    def _send_json(self, status, payload):
-        data = json.dumps(payload).encode('utf-8')
+    def _send_json(self, status, payload, extra_headers: dict | None = None):
+        data = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        encoding = None
+        if len(data) >= COMPRESS_MIN_BYTES:
+            encoding = choose_encoding(self.headers.get('Accept-Encoding'))
+            data = compress_body(data, encoding)
         self.send_response(status)
         self.send_header('Content-Type', 'application/json; charset=utf-8')
         self.send_header('Content-Length', str(len(data)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        for name, value in (extra_headers or {}).items():
+            if name == 'ETag' and encoding:
+                # Each encoding is a different representation, so it needs its own strong ETag.
+                value = f'{value[:-1]}-{encoding}"'
+            self.send_header(name, value)
         self.end_headers()
         self.wfile.write(data)
 
+    def _send_json_versioned(self, etag: str, build_payload):
+        """Answer 304 if the client holds ``etag``, else send ``build_payload()``."""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            candidates = [etag] + [f'{etag[:-1]}-{encoding}"' for encoding in ('br', 'gzip')]
+            matched = next((item for item in candidates if etag_matches(if_none_match, item)), None)
+            if matched:
+                self.send_response(304)
+                self.send_header('ETag', matched)
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Vary', 'Accept-Encoding')
+                self.end_headers()
+                return
+        self._send_json(200, build_payload(), {'ETag': etag, 'Cache-Control': 'no-cache'})
+
+    def _send_page(self, parsed, name: str, request: dict, headers: list | None = None):
+        try:
+            page = db.fetch_page(name, **request)
+        except ValueError as exc:
+            self._send_json(400, {'error': str(exc)})
+            return
+        if wants_columns(parsed):
+            payload = columnar(page['rows'], headers)
+        elif headers:
+            payload = {'headers': headers, 'rows': page['rows']}
+        else:
+            payload = {'rows': page['rows']}
+        payload['next_cursor'] = page['next_cursor']
+        self._send_json(200, payload)
+
     def _send_text(self, status, text):
         data = text.encode('utf-8')
         self.send_response(status)
@@ -510,10 +959,6 @@ class Handler(BaseHTTPRequestHandler):
         self._send_json(401, {'error': 'Unauthorized'})
 
     def _send_file(self, path: Path):
-        if not path.exists() or not path.is_file():
-            self.send_error(404)
-            return
-        content = path.read_bytes()
         mime = 'text/plain'
         if path.suffix == '.html':
             mime = 'text/html; charset=utf-8'
@@ -521,631 +966,999 @@ class Handler(BaseHTTPRequestHandler):
             mime = 'text/css; charset=utf-8'
         elif path.suffix == '.js':
             mime = 'text/javascript; charset=utf-8'
-        self.send_response(200)
-        self.send_header('Content-Type', mime)
-        self.send_header('Content-Length', str(len(content)))
-        self.end_headers()
-        self.wfile.write(content)
+        # Vite emits content-hashed names under assets/; index.html must revalidate.
+        if 'assets' in path.relative_to(UI_DIST_DIR).parts:
+            cache_control = 'public, max-age=31536000, immutable'
+        else:
+            cache_control = 'no-cache'
+        self._send_path(path, mime, cache_control)
 
-    def _send_file_dynamic(self, path: Path):
-        if not path.exists() or not path.is_file():
-            self.send_error(404)
-            return
-        content = path.read_bytes()
+    def _send_file_dynamic(self, path: Path, cache_control: str | None = None, extra_headers: dict | None = None):
         mime, _ = mimetypes.guess_type(str(path))
         if not mime:
             mime = 'application/octet-stream'
-        self.send_response(200)
-        self.send_header('Content-Type', mime)
-        self.send_header('Content-Length', str(len(content)))
-        self.end_headers()
-        self.wfile.write(content)
+        self._send_path(path, mime, cache_control or f'private, max-age={FILE_CACHE_MAX_AGE}', extra_headers)
 
-    def do_GET(self):
-        parsed = urlparse(self.path)
-        session = get_session(self.headers)
-        if auth_enabled():
-            if parsed.path.startswith('/api') and parsed.path not in ('/api/session', '/api/login'):
-                if not session:
-                    self._send_unauthorized()
-                    return
-            if parsed.path.startswith('/files/') or parsed.path.startswith('/files-records/'):
-                if not session:
-                    self._send_unauthorized()
-                    return
+    def _send_path(self, path: Path, mime: str, cache_control: str, extra_headers: dict | None = None):
+        """Serve a file with ETag/Last-Modified validation and single-range support.
 
-        if parsed.path.startswith('/files-token/'):
-            token_part = parsed.path.replace('/files-token/', '', 1)
-            token = token_part.split('/', 1)[0]
-            cleanup_file_tokens()
-            token_data = FILE_TOKENS.get(token)
-            if not token_data:
+        The body is streamed with ``socket.sendfile`` (zero-copy ``os.sendfile``
+        where the platform has it) instead of being read into memory.
+        """
+        try:
+            handle = path.open('rb')
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            self.send_error(404)
+            return
+        with handle:
+            stat = os.fstat(handle.fileno())
+            if not os.path.isfile(path):
                 self.send_error(404)
                 return
-            file_path = Path(token_data['path'])
-            if not file_path.exists():
-                self.send_error(404)
+            size = stat.st_size
+            etag = file_etag(stat)
+            last_modified = formatdate(stat.st_mtime, usegmt=True)
+            if not_modified(self.headers, etag, stat.st_mtime):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.send_header('Cache-Control', cache_control)
+                for name, value in (extra_headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                return
+            range_header = self.headers.get('Range')
+            if_range = self.headers.get('If-Range')
+            if range_header and if_range and if_range.strip() != etag and if_range.strip() != last_modified:
+                range_header = None
+            try:
+                span = parse_range_header(range_header, size)
+            except ValueError:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if span:
+                start, end = span
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            else:
+                start, end = 0, size - 1
+                self.send_response(200)
+            length = end - start + 1
+            self.send_header('Content-Type', mime)
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('Cache-Control', cache_control)
+            for name, value in (extra_headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            if length <= 0:
                 return
-            self._send_file_dynamic(file_path)
-            return
-        if parsed.path == '/api/rows':
-            rows = db.fetch_products()
-            self._send_json(200, {'headers': db.PRODUCT_HEADERS, 'rows': rows})
-            return
+            try:
+                self.wfile.flush()
+                self.connection.sendfile(handle, offset=start, count=length)
+            except (BrokenPipeError, ConnectionResetError):
+                # Media players routinely abort range requests while seeking.
+                self.close_connection = True
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
 
-        if parsed.path == '/api/session':
-            if not auth_enabled():
-                self._send_json(200, {'authenticated': True, 'user': 'local', 'auth_disabled': True})
+    def _dispatch(self, method: str):
+        parsed = urlparse(self.path)
+        self.session = get_session(self.headers)
+        start = time.perf_counter()
+        route = ROUTES.resolve(method, parsed.path)
+        lookup_seconds = time.perf_counter() - start
+        if route is None:
+            ROUTES.record(None, lookup_seconds)
+            if auth_enabled() and not self.session and parsed.path.startswith('/api'):
+                self._send_unauthorized()
                 return
-            if session:
-                self._send_json(200, {'authenticated': True, 'user': session['user']})
+            if method == 'GET':
+                self._serve_ui(parsed)
                 return
-            self._send_json(200, {'authenticated': False})
+            self.send_error(404)
             return
-        if parsed.path == '/api/config':
-            self._send_json(
-                200,
-                {
-                    'open_folder_enabled': OPEN_FOLDER_ENABLED,
-                    'paths': {
-                        'products': str(PRODUCTS_DIR),
-                        'categories': str(CATEGORIES_DIR),
-                        'drafts': str(DRAFT_DIR),
-                        'archived': str(ARCHIVE_DIR),
-                    },
-                },
-            )
+        if route.auth and auth_enabled() and not self.session:
+            self._send_unauthorized()
             return
+        data = None
+        if route.body is not None:
+            length = int(self.headers.get('Content-Length', '0'))
+            if route.max_bytes is not None and length > route.max_bytes:
+                self._send_json(413, {'error': 'Upload exceeds size limit' if route.body == 'raw' else 'Request body too large'})
+                return
+            if route.body == 'json':
+                body = self.rfile.read(length) if length > 0 else b''
+                try:
+                    data = json.loads(body.decode('utf-8') or '{}')
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    self._send_json(400, {'error': 'Invalid JSON'})
+                    return
+        start = time.perf_counter()
+        try:
+            route.func(self, parsed, data)
+        finally:
+            ROUTES.record(route, lookup_seconds, time.perf_counter() - start)
+            if method == 'POST':
+                # Any write may touch products or stock; the next lookup
+                # pulls the delta instead of waiting out the refresh interval.
+                lookup_index.mark_stale()
+
+    def _read_multipart(self, spool_dir) -> tuple[dict, list] | None:
+        """Stream the multipart body to temp files in ``spool_dir(fields, filename)``.
+
+        Sends a 400 and returns None if the body is malformed.
+        """
+        content_length = int(self.headers.get('Content-Length', '0'))
+        try:
+            return multipart_stream.parse_stream(
+                self.rfile,
+                self.headers.get('Content-Type', ''),
+                content_length,
+                lambda fields, name, filename: multipart_stream.TempUpload(spool_dir(fields, filename)),
+            )
+        except multipart_stream.MultipartError as exc:
+            self.close_connection = True
+            self._send_json(400, {'error': str(exc)})
+            return None
 
-        if parsed.path == '/api/archived':
-            items = db.fetch_products_by_status('Archived')
-            self._send_json(200, {'items': items})
+    def _serve_ui(self, parsed):
+        if UI_DIST_DIR.exists():
+            if parsed.path == '/':
+                self._send_file(UI_DIST_DIR / 'index.html')
+                return
+            rel = parsed.path.lstrip('/')
+            if rel:
+                candidate = UI_DIST_DIR / rel
+                if candidate.exists():
+                    self._send_file(candidate)
+                    return
+            self._send_file(UI_DIST_DIR / 'index.html')
             return
 
-        if parsed.path == '/api/drafts':
-            items = db.fetch_products_by_status('Draft')
-            self._send_json(200, {'items': items})
+        if parsed.path == '/':
+            self._send_text(503, 'UI build not found. Run `npm run build` in App/ui or use Vite dev server.')
             return
 
-        if parsed.path == '/api/stock':
-            rows = db.fetch_stock()
-            self._send_json(200, {'headers': db.STOCK_HEADERS, 'rows': rows})
-            return
+        self.send_error(404)
 
-        if parsed.path == '/api/events':
-            events = db.fetch_events()
-            self._send_json(200, {'events': events})
+    @ROUTES.route('GET', '/files-token/', auth=False, prefix=True)
+    def handle_get_files_token(self, parsed, data):
+        token_part = parsed.path.replace('/files-token/', '', 1)
+        token = token_part.split('/', 1)[0]
+        token_data = get_file_token(token)
+        if not token_data:
+            self.send_error(404)
             return
-
-        if parsed.path == '/api/event_media':
-            query = parse_qs(parsed.query)
-            event_id_raw = query.get('event_id', [''])[0]
-            try:
-                event_id = int(event_id_raw)
-            except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid event_id'})
-                return
-            if not db.fetch_event(event_id):
-                self._send_json(404, {'error': 'Event not found'})
-                return
-            rows = db.fetch_event_media(event_id)
-            self._send_json(200, {'rows': rows})
+        file_path = Path(token_data['path'])
+        if not file_path.exists():
+            self.send_error(404)
             return
+        self._send_file_dynamic(file_path, FILE_TOKEN_CACHE_CONTROL)
 
-        if parsed.path == '/api/sales':
-            query = parse_qs(parsed.query)
-            event_id_raw = query.get('event_id', [''])[0]
-            try:
-                event_id = int(event_id_raw)
-            except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid event_id'})
-                return
-            rows = db.fetch_sales(event_id)
-            self._send_json(200, {'rows': rows})
+    @ROUTES.route('GET', '/api/rows')
+    def handle_get_rows(self, parsed, data):
+        request = page_request(parsed, 'products')
+        if request is not None:
+            self._send_page(parsed, 'products', request, db.PRODUCT_HEADERS)
             return
-
-        if parsed.path == '/api/sales_recent':
-            query = parse_qs(parsed.query)
-            limit_raw = query.get('limit', ['50'])[0]
-            try:
-                limit = int(limit_raw)
-            except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid limit'})
-                return
-            if limit <= 0:
-                self._send_json(400, {'error': 'Invalid limit'})
-                return
-            limit = min(limit, 200)
-            rows = db.fetch_recent_sales(limit)
-            self._send_json(200, {'rows': rows})
+        if wants_columns(parsed):
+            etag = f'"products-{db.fetch_change_version("products")}-columns"'
+            self._send_json_versioned(etag, lambda: columnar(db.fetch_products(), db.PRODUCT_HEADERS))
             return
+        etag = f'"products-{db.fetch_change_version("products")}"'
+        self._send_json_versioned(etag, lambda: {'headers': db.PRODUCT_HEADERS, 'rows': db.fetch_products()})
 
-        if parsed.path == '/api/event_totals':
-            query = parse_qs(parsed.query)
-            event_id_raw = query.get('event_id', [''])[0]
-            try:
-                event_id = int(event_id_raw)
-            except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid event_id'})
-                return
-            if not db.fetch_event(event_id):
-                self._send_json(404, {'error': 'Event not found'})
-                return
-            rows = db.fetch_sales(event_id)
-            totals = calculate_event_totals(rows)
-            self._send_json(200, {'totals': totals})
+    @ROUTES.route('GET', '/api/session', auth=False)
+    def handle_get_session(self, parsed, data):
+        if not auth_enabled():
+            self._send_json(200, {'authenticated': True, 'user': 'local', 'auth_disabled': True})
             return
-
-        if parsed.path == '/api/event_targets':
-            query = parse_qs(parsed.query)
-            event_id_raw = query.get('event_id', [''])[0]
-            try:
-                event_id = int(event_id_raw)
-            except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid event_id'})
-                return
-            targets = db.fetch_event_targets(event_id)
-            stock_rows = db.fetch_stock()
-            stock_map = {
-                (row.get('category'), row.get('product_folder'), row.get('color'), row.get('size')): row.get('quantity')
-                for row in stock_rows
-            }
-            enriched = []
-            for row in targets:
-                key = (row.get('category'), row.get('product_folder'), row.get('color'), row.get('size'))
-                current_qty = stock_map.get(key) or 0
-                try:
-                    current_qty = int(current_qty)
-                except (TypeError, ValueError):
-                    current_qty = 0
-                try:
-                    target_qty = int(row.get('target_qty') or 0)
-                except (TypeError, ValueError):
-                    target_qty = 0
-                deficit = max(target_qty - current_qty, 0)
-                entry = dict(row)
-                entry['current_qty'] = current_qty
-                entry['deficit'] = deficit
-                enriched.append(entry)
-            self._send_json(200, {'rows': enriched})
+        if self.session:
+            self._send_json(200, {'authenticated': True, 'user': self.session['user']})
             return
-
-        if parsed.path == '/api/supplies':
-            rows = db.fetch_supplies()
-            self._send_json(200, {'rows': rows})
+        self._send_json(200, {'authenticated': False})
+
+    @ROUTES.route('GET', '/api/config')
+    def handle_get_config(self, parsed, data):
+        self._send_json(
+            200,
+            {
+                'open_folder_enabled': OPEN_FOLDER_ENABLED,
+                'paths': {
+                    'products': str(PRODUCTS_DIR),
+                    'categories': str(CATEGORIES_DIR),
+                    'drafts': str(DRAFT_DIR),
+                    'archived': str(ARCHIVE_DIR),
+                },
+            },
+        )
+
+    @ROUTES.route('GET', '/api/db_pool')
+    def handle_get_db_pool(self, parsed, data):
+        self._send_json(200, db.pool_stats())
+
+    @ROUTES.route('GET', '/api/route_stats')
+    def handle_get_route_stats(self, parsed, data):
+        self._send_json(200, ROUTES.stats())
+
+    @ROUTES.route('GET', '/api/archived')
+    def handle_get_archived(self, parsed, data):
+        items = db.fetch_products_by_status('Archived')
+        self._send_json(200, {'items': items})
+
+    @ROUTES.route('GET', '/api/drafts')
+    def handle_get_drafts(self, parsed, data):
+        items = db.fetch_products_by_status('Draft')
+        self._send_json(200, {'items': items})
+
+    @ROUTES.route('GET', '/api/stock')
+    def handle_get_stock(self, parsed, data):
+        request = page_request(parsed, 'stock')
+        if request is not None:
+            self._send_page(parsed, 'stock', request, db.STOCK_HEADERS)
             return
-
-        if parsed.path == '/api/expenses':
-            rows = db.fetch_expenses()
-            self._send_json(200, {'rows': rows})
+        if wants_columns(parsed):
+            etag = f'"stock-{db.fetch_change_version("stock")}-columns"'
+            self._send_json_versioned(etag, lambda: columnar(db.fetch_stock(), db.STOCK_HEADERS))
             return
+        etag = f'"stock-{db.fetch_change_version("stock")}"'
+        self._send_json_versioned(etag, lambda: {'headers': db.STOCK_HEADERS, 'rows': db.fetch_stock()})
 
-        if parsed.path == '/api/production':
-            query = parse_qs(parsed.query)
-            status = (query.get('status', [''])[0] or '').strip()
-            rows = db.fetch_production_queue(status or None)
-            self._send_json(200, {'rows': rows})
-            return
+    @ROUTES.route('GET', '/api/stock_movements')
+    def handle_get_stock_movements(self, parsed, data):
+        self._send_page(parsed, 'stock_movements', page_request(parsed, 'stock_movements', always=True))
 
-        if parsed.path == '/api/media':
-            query = parse_qs(parsed.query)
-            category = safe_path_component(query.get('category', [''])[0])
-            folder_name = safe_path_component(query.get('folder', [''])[0])
-            status = query.get('status', [''])[0]
-            if not category or not folder_name:
-                self._send_json(400, {'error': 'Missing category/folder'})
-                return
-            base_path = product_dir(category, folder_name, status)
-            media_dir = base_path / 'Media'
-            if not media_dir.exists():
-                self._send_json(200, {'files': []})
-                return
-            files = []
-            for entry in sorted(media_dir.iterdir()):
-                if not entry.is_file():
-                    continue
-                if entry.name == '_Deleted':
-                    continue
-                rel = entry.relative_to(CATEGORIES_DIR)
-                url = f"/files/{quote(rel.as_posix())}"
-                files.append({
-                    'name': entry.name,
-                    'rel_path': entry.relative_to(base_path).as_posix(),
-                    'url': url,
-                })
-            self._send_json(200, {'files': files})
+    @ROUTES.route('GET', '/api/stock_as_of')
+    def handle_get_stock_as_of(self, parsed, data):
+        query = parse_qs(parsed.query)
+        try:
+            before = parse_as_of(query.get('at', [''])[0])
+        except ValueError:
+            self._send_json(400, {'error': 'Invalid at (use YYYY-MM-DD or an ISO timestamp)'})
             return
-
-        if parsed.path == '/api/3mf':
-            query = parse_qs(parsed.query)
-            category = safe_path_component(query.get('category', [''])[0])
-            folder_name = safe_path_component(query.get('folder', [''])[0])
-            status = query.get('status', [''])[0]
-            if not category or not folder_name:
-                self._send_json(400, {'error': 'Missing category/folder'})
-                return
-            product_path = product_dir(category, folder_name, status)
-            if not product_path.exists():
-                self._send_json(200, {'files': []})
-                return
-            files = []
-            for entry in sorted(product_path.rglob('*')):
-                if not entry.is_file():
-                    continue
-                if '_Deleted' in entry.parts:
-                    continue
-                if entry.suffix.lower() != '.3mf':
-                    continue
-                rel = entry.relative_to(CATEGORIES_DIR)
-                url = f"/files/{quote(rel.as_posix())}"
-                files.append({
-                    'name': entry.name,
-                    'rel_path': entry.relative_to(product_path).as_posix(),
-                    'abs_path': str(entry.resolve()),
-                    'url': url,
-                })
-            self._send_json(200, {'files': files})
+        filters = {key: query.get(key, [''])[0] for key in ('category', 'product_folder', 'sku')}
+        result = db.fetch_stock_as_of(before, filters)
+        result['as_of'] = before.isoformat()
+        self._send_json(200, result)
+
+    @ROUTES.route('GET', '/api/stock_snapshots')
+    def handle_get_stock_snapshots(self, parsed, data):
+        query = parse_qs(parsed.query)
+        try:
+            limit = min(max(int(query.get('limit', ['50'])[0]), 1), ROLLUP_MAX_LIMIT)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid limit'})
             return
+        self._send_json(200, {'rows': db.fetch_stock_snapshots(limit)})
 
-        if parsed.path == '/api/ukca_pack':
-            query = parse_qs(parsed.query)
-            category = safe_path_component(query.get('category', [''])[0])
-            folder_name = safe_path_component(query.get('folder', [''])[0])
-            status = query.get('status', [''])[0]
-            if not category or not folder_name:
-                self._send_json(400, {'error': 'Missing category/folder'})
-                return
-            product_path = product_dir(category, folder_name, status)
-            stored_keys = db.list_ukca_doc_keys(category, folder_name)
-            files = []
-            for key, path in ukca_file_paths(product_path).items():
-                files.append({
-                    'key': key,
-                    'exists': path.exists() or key in stored_keys,
-                })
-            self._send_json(200, {'files': files})
+    @ROUTES.route('GET', '/api/changes')
+    def handle_get_changes(self, parsed, data):
+        query = parse_qs(parsed.query)
+        since_raw = query.get('since', ['0'])[0]
+        try:
+            since = int(since_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid since'})
             return
-
-        if parsed.path.startswith('/files/'):
-            rel = unquote(parsed.path.replace('/files/', '', 1))
-            rel_path = Path(*[p for p in rel.split('/') if p and p not in ('.', '..')])
-            file_path = (CATEGORIES_DIR / rel_path).resolve()
-            if not file_path.is_relative_to(CATEGORIES_DIR.resolve()):
-                self.send_error(403)
-                return
-            self._send_file_dynamic(file_path)
+        if since < 0:
+            self._send_json(400, {'error': 'Invalid since'})
             return
+        self._send_json(200, db.fetch_changes(since))
 
-        if parsed.path.startswith('/files-records/'):
-            rel = unquote(parsed.path.replace('/files-records/', '', 1))
-            rel_path = safe_rel_path(rel)
-            if not rel_path:
-                self.send_error(403)
-                return
-            file_path = (RECORDS_DIR / rel_path).resolve()
-            if not file_path.is_relative_to(RECORDS_DIR.resolve()):
-                self.send_error(403)
-                return
-            self._send_file_dynamic(file_path)
+    @ROUTES.route('GET', '/api/lookup')
+    def handle_get_lookup(self, parsed, data):
+        query = parse_qs(parsed.query)
+        q = query.get('q', [''])[0]
+        limit_raw = query.get('limit', ['10'])[0]
+        try:
+            limit = int(limit_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid limit'})
             return
+        limit = min(max(limit, 1), 50)
+        results = lookup_index.lookup(q, limit)
+        self._send_json(200, {'query': q, 'results': results, 'index': lookup_index.INDEX.stats()})
 
-        if UI_DIST_DIR.exists():
-            if parsed.path == '/':
-                self._send_file(UI_DIST_DIR / 'index.html')
-                return
-            rel = parsed.path.lstrip('/')
-            if rel:
-                candidate = UI_DIST_DIR / rel
-                if candidate.exists():
-                    self._send_file(candidate)
-                    return
-            self._send_file(UI_DIST_DIR / 'index.html')
+    @ROUTES.route('GET', '/api/search')
+    def handle_get_search(self, parsed, data):
+        query = parse_qs(parsed.query)
+        try:
+            page = int(query.get('page', ['1'])[0])
+            page_size = int(query.get('page_size', ['50'])[0])
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid page/page_size'})
+            return
+        page = max(page, 1)
+        page_size = min(max(page_size, 1), SEARCH_MAX_PAGE_SIZE)
+        text = query.get('q', [''])[0]
+        filters = {column: query.get(column, [''])[0] for column in db.SEARCH_FACETS}
+        result = db.search_products(text, filters, page_size, (page - 1) * page_size)
+        self._send_json(200, {
+            'query': text,
+            'page': page,
+            'page_size': page_size,
+            'headers': db.PRODUCT_HEADERS,
+            **result,
+        })
+
+    @ROUTES.route('GET', '/api/margins')
+    def handle_get_margins(self, parsed, data):
+        query = parse_qs(parsed.query)
+        reprice = {}
+        for key in ('reprice_pct', 'reprice_amount'):
+            raw = query.get(key, [''])[0]
+            value = parse_price(raw) if raw else Decimal('0')
+            if value is None or not value.is_finite():
+                self._send_json(400, {'error': f'Invalid {key}'})
+                return
+            reprice[key] = value
+        try:
+            limit = int(query.get('limit', ['500'])[0])
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid limit'})
+            return
+        try:
+            result = db.fetch_margins(
+                {column: query.get(column, [''])[0] for column in ('category', 'status')},
+                reprice['reprice_pct'],
+                reprice['reprice_amount'],
+                sort=query.get('sort', ['margin_pct'])[0],
+                descending=query.get('order', ['asc'])[0] == 'desc',
+                limit=limit,
+            )
+        except ValueError as exc:
+            self._send_json(400, {'error': str(exc)})
+            return
+        result['unparsed'] = db.fetch_unparsed_prices()
+        result['reprice'] = {key: format_money(value) for key, value in reprice.items()}
+        self._send_json(200, result)
+
+    @ROUTES.route('GET', '/api/events')
+    def handle_get_events(self, parsed, data):
+        events = db.fetch_events()
+        self._send_json(200, {'events': events})
+
+    @ROUTES.route('GET', '/api/event_media')
+    def handle_get_event_media(self, parsed, data):
+        query = parse_qs(parsed.query)
+        event_id_raw = query.get('event_id', [''])[0]
+        try:
+            event_id = int(event_id_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid event_id'})
+            return
+        if not db.fetch_event(event_id):
+            self._send_json(404, {'error': 'Event not found'})
             return
+        rows = db.fetch_event_media(event_id)
+        for row in rows:
+            url = f"/files-records/{quote(row['file_path'])}"
+            row['url'] = url
+            row['thumb_url'] = thumb_url(url, RECORDS_DIR / row['file_path'], 'thumb')
+        self._send_json(200, {'rows': rows})
+
+    @ROUTES.route('GET', '/api/sales')
+    def handle_get_sales(self, parsed, data):
+        query = parse_qs(parsed.query)
+        event_id_raw = query.get('event_id', [''])[0]
+        try:
+            event_id = int(event_id_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid event_id'})
+            return
+        rows = db.fetch_sales(event_id)
+        self._send_json(200, columnar(rows) if wants_columns(parsed) else {'rows': rows})
 
-        if parsed.path == '/':
-            self._send_text(503, 'UI build not found. Run `npm run build` in App/ui or use Vite dev server.')
+    @ROUTES.route('GET', '/api/sales_recent')
+    def handle_get_sales_recent(self, parsed, data):
+        query = parse_qs(parsed.query)
+        limit_raw = query.get('limit', ['50'])[0]
+        try:
+            limit = int(limit_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid limit'})
+            return
+        if limit <= 0:
+            self._send_json(400, {'error': 'Invalid limit'})
+            return
+        request = page_request(parsed, 'sales', always=True)
+        request['limit'] = min(limit, 200)
+        self._send_page(parsed, 'sales', request)
+
+    @ROUTES.route('GET', '/api/event_totals')
+    def handle_get_event_totals(self, parsed, data):
+        query = parse_qs(parsed.query)
+        event_id_raw = query.get('event_id', [''])[0]
+        try:
+            event_id = int(event_id_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid event_id'})
             return
+        if not db.fetch_event(event_id):
+            self._send_json(404, {'error': 'Event not found'})
+            return
+        self._send_json(200, {'totals': db.fetch_event_totals(event_id)})
 
-        self.send_error(404)
+    @ROUTES.route('GET', '/api/best_sellers')
+    def handle_get_best_sellers(self, parsed, data):
+        query = parse_qs(parsed.query)
+        try:
+            limit = min(max(int(query.get('limit', ['20'])[0]), 1), ROLLUP_MAX_LIMIT)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid limit'})
+            return
+        try:
+            rows = db.fetch_best_sellers(
+                by=query.get('by', ['items'])[0],
+                level=query.get('level', ['product'])[0],
+                category=query.get('category', [''])[0].strip(),
+                limit=limit,
+            )
+        except ValueError as exc:
+            self._send_json(400, {'error': str(exc)})
+            return
+        self._send_json(200, {'rows': rows})
 
-    def do_POST(self):
-        parsed = urlparse(self.path)
-        session = get_session(self.headers)
-        if auth_enabled():
-            if parsed.path != '/api/login' and parsed.path.startswith('/api'):
-                if not session:
-                    self._send_unauthorized()
-                    return
-        if parsed.path == '/api/upload':
-            content_length = int(self.headers.get('Content-Length', '0'))
-            if content_length > UPLOAD_MAX_BYTES:
-                self._send_json(413, {'error': 'Upload exceeds size limit'})
-                return
-            body = self.rfile.read(content_length) if content_length > 0 else b''
-            fields, files_field = parse_multipart_form_data(
-                self.headers.get('Content-Type', ''),
-                body,
+    @ROUTES.route('GET', '/api/revenue_by_month')
+    def handle_get_revenue_by_month(self, parsed, data):
+        query = parse_qs(parsed.query)
+        try:
+            rows = db.fetch_revenue_by_month(
+                category=query.get('category', [''])[0].strip(),
+                month_from=query.get('from', [''])[0].strip(),
+                month_to=query.get('to', [''])[0].strip(),
             )
+        except ValueError as exc:
+            self._send_json(400, {'error': str(exc)})
+            return
+        self._send_json(200, {'rows': rows})
+
+    @ROUTES.route('GET', '/api/event_league')
+    def handle_get_event_league(self, parsed, data):
+        query = parse_qs(parsed.query)
+        try:
+            limit = min(max(int(query.get('limit', ['50'])[0]), 1), ROLLUP_MAX_LIMIT)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid limit'})
+            return
+        try:
+            rows = db.fetch_event_league(by=query.get('by', ['revenue'])[0], limit=limit)
+        except ValueError as exc:
+            self._send_json(400, {'error': str(exc)})
+            return
+        self._send_json(200, {'rows': rows})
+
+    @ROUTES.route('GET', '/api/event_targets')
+    def handle_get_event_targets(self, parsed, data):
+        query = parse_qs(parsed.query)
+        event_id_raw = query.get('event_id', [''])[0]
+        try:
+            event_id = int(event_id_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid event_id'})
+            return
+        targets = db.fetch_event_targets(event_id)
+        stock_rows = db.fetch_stock()
+        stock_map = {
+            (row.get('category'), row.get('product_folder'), row.get('color'), row.get('size')): row.get('quantity')
+            for row in stock_rows
+        }
+        enriched = []
+        for row in targets:
+            key = (row.get('category'), row.get('product_folder'), row.get('color'), row.get('size'))
+            current_qty = stock_map.get(key) or 0
+            try:
+                current_qty = int(current_qty)
+            except (TypeError, ValueError):
+                current_qty = 0
+            try:
+                target_qty = int(row.get('target_qty') or 0)
+            except (TypeError, ValueError):
+                target_qty = 0
+            deficit = max(target_qty - current_qty, 0)
+            entry = dict(row)
+            entry['current_qty'] = current_qty
+            entry['deficit'] = deficit
+            enriched.append(entry)
+        self._send_json(200, {'rows': enriched})
+
+    @ROUTES.route('GET', '/api/supplies')
+    def handle_get_supplies(self, parsed, data):
+        request = page_request(parsed, 'supplies')
+        if request is not None:
+            self._send_page(parsed, 'supplies', request)
+            return
+        rows = db.fetch_supplies()
+        self._send_json(200, columnar(rows) if wants_columns(parsed) else {'rows': rows})
+
+    @ROUTES.route('GET', '/api/expenses')
+    def handle_get_expenses(self, parsed, data):
+        request = page_request(parsed, 'expenses')
+        if request is not None:
+            self._send_page(parsed, 'expenses', request)
+            return
+        rows = db.fetch_expenses()
+        self._send_json(200, columnar(rows) if wants_columns(parsed) else {'rows': rows})
+
+    @ROUTES.route('GET', '/api/production')
+    def handle_get_production(self, parsed, data):
+        query = parse_qs(parsed.query)
+        status = (query.get('status', [''])[0] or '').strip()
+        rows = db.fetch_production_queue(status or None)
+        self._send_json(200, {'rows': rows})
+
+    @ROUTES.route('GET', '/api/media')
+    def handle_get_media(self, parsed, data):
+        query = parse_qs(parsed.query)
+        category = safe_path_component(query.get('category', [''])[0])
+        folder_name = safe_path_component(query.get('folder', [''])[0])
+        status = query.get('status', [''])[0]
+        if not category or not folder_name:
+            self._send_json(400, {'error': 'Missing category/folder'})
+            return
+        base_path = product_dir(category, folder_name, status)
+        listing = fs_index.listing(base_path)
+        if listing is None:
+            self._send_json(200, {'files': []})
+            return
+        url_base = f"/files/{quote(base_path.relative_to(CATEGORIES_DIR).as_posix())}/"
+        files = []
+        for entry in listing.in_dir('Media'):
+            url = url_base + quote(entry.rel_path)
+            files.append({
+                'name': entry.name,
+                'rel_path': entry.rel_path,
+                'url': url,
+                'thumb_url': thumb_url(url, Path(entry.name), 'grid'),
+                'size': entry.size,
+                'mtime': entry.mtime,
+            })
+        self._send_json(200, {'files': files})
+
+    @ROUTES.route('GET', '/api/3mf')
+    def handle_get_3mf(self, parsed, data):
+        query = parse_qs(parsed.query)
+        category = safe_path_component(query.get('category', [''])[0])
+        folder_name = safe_path_component(query.get('folder', [''])[0])
+        status = query.get('status', [''])[0]
+        if not category or not folder_name:
+            self._send_json(400, {'error': 'Missing category/folder'})
+            return
+        product_path = product_dir(category, folder_name, status)
+        listing = fs_index.listing(product_path)
+        if listing is None:
+            self._send_json(200, {'files': []})
+            return
+        base_rel = product_path.relative_to(CATEGORIES_DIR).as_posix()
+        abs_base = product_path.resolve()
+        entries = listing.with_kind('3mf')
+        indexed = db.fetch_print_files_by_path([f'{base_rel}/{entry.rel_path}' for entry in entries])
+        files = []
+        for entry in entries:
+            rel = f'{base_rel}/{entry.rel_path}'
+            row = indexed.get(rel)
+            current = row is not None and (row['file_size'], row['mtime_ns']) == (entry.size, entry.mtime_ns)
+            if not current:
+                threemf.schedule(product_path / entry.rel_path, rel, category, folder_name)
+            files.append({
+                'name': entry.name,
+                'rel_path': entry.rel_path,
+                'abs_path': str(abs_base / entry.rel_path),
+                'url': f"/files/{quote(rel)}",
+                'size': entry.size,
+                'mtime': entry.mtime,
+                'print': print_file_summary(row, detail=True) if current else None,
+                'pending': not current,
+            })
+        self._send_json(200, {'files': files})
+
+    @ROUTES.route('GET', '/api/print_files')
+    def handle_get_print_files(self, parsed, data):
+        query = parse_qs(parsed.query)
+        filters = {key: query.get(key, [''])[0] for key in ('category', 'product_folder', 'printer', 'q', 'color')}
+        try:
+            for key, cast in (('max_seconds', int), ('max_grams', Decimal), ('max_objects', int)):
+                raw = query.get(key, [''])[0].strip()
+                value = cast(raw) if raw else None
+                if isinstance(value, Decimal) and not value.is_finite():
+                    raise ValueError(key)
+                filters[key] = value
+            limit = min(max(int(query.get('limit', ['100'])[0]), 1), db.PAGE_MAX_LIMIT)
+            offset = max(int(query.get('offset', ['0'])[0]), 0)
+        except (ValueError, InvalidOperation):
+            self._send_json(400, {'error': 'Invalid number filter, limit or offset'})
+            return
+        sliced = query.get('sliced', [''])[0]
+        filters['sliced'] = None if sliced == '' else sliced in ('1', 'true', 'yes')
+        try:
+            result = db.fetch_print_files(
+                filters,
+                sort=query.get('sort', ['time'])[0],
+                descending=query.get('order', ['asc'])[0] == 'desc',
+                limit=limit,
+                offset=offset,
+            )
+        except ValueError as exc:
+            self._send_json(400, {'error': str(exc)})
+            return
+        rows = [
+            {**row, 'url': f"/files/{quote(row['rel_path'])}", 'thumbnail_url': print_thumbnail_url(row['rel_path'])}
+            for row in result['rows']
+        ]
+        self._send_json(200, {'rows': rows, 'total': result['total'], 'extractor': threemf.stats()})
+
+    @ROUTES.route('GET', '/api/print_file_thumbnail')
+    def handle_get_print_file_thumbnail(self, parsed, data):
+        query = parse_qs(parsed.query)
+        file_path = categories_file_path(query.get('path', [''])[0])
+        plate_raw = query.get('plate', [''])[0]
+        if not file_path or file_path.suffix.lower() != '.3mf' or (plate_raw and not plate_raw.isdigit()):
+            self._send_json(400, {'error': 'Invalid path or plate'})
+            return
+        try:
+            stat = file_path.stat()
+        except OSError:
+            self.send_error(404)
+            return
+        etag = file_etag(stat)
+        if not_modified(self.headers, etag, stat.st_mtime):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        image = threemf.read_thumbnail(file_path, int(plate_raw) if plate_raw else None)
+        if image is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(image)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', f'private, max-age={FILE_CACHE_MAX_AGE}')
+        self.end_headers()
+        self.wfile.write(image)
+
+    @ROUTES.route('GET', '/api/ukca_pack')
+    def handle_get_ukca_pack(self, parsed, data):
+        query = parse_qs(parsed.query)
+        category = safe_path_component(query.get('category', [''])[0])
+        folder_name = safe_path_component(query.get('folder', [''])[0])
+        status = query.get('status', [''])[0]
+        if not category or not folder_name:
+            self._send_json(400, {'error': 'Missing category/folder'})
+            return
+        product_path = product_dir(category, folder_name, status)
+        stored_keys = db.list_ukca_doc_keys(category, folder_name)
+        listing = fs_index.listing(product_path)
+        files = []
+        for key, path in ukca_file_paths(product_path).items():
+            on_disk = listing is not None and listing.exists(path.relative_to(product_path).as_posix())
+            files.append({
+                'key': key,
+                'exists': on_disk or key in stored_keys,
+            })
+        self._send_json(200, {'files': files})
+
+    @ROUTES.route('GET', '/files/', prefix=True)
+    def handle_get_files(self, parsed, data):
+        file_path = categories_file_path(unquote(parsed.path.replace('/files/', '', 1)))
+        if not file_path:
+            self.send_error(403)
+            return
+        self._send_file_dynamic(file_path)
+
+    @ROUTES.route('GET', '/files-records/', prefix=True)
+    def handle_get_files_records(self, parsed, data):
+        file_path = records_file_path(unquote(parsed.path.replace('/files-records/', '', 1)))
+        if not file_path:
+            self.send_error(403)
+            return
+        self._send_file_dynamic(file_path, RECORDS_CACHE_CONTROL)
+
+    @ROUTES.route('GET', '/thumbs/', prefix=True)
+    def handle_get_thumbs(self, parsed, data):
+        rel = unquote(parsed.path.replace('/thumbs/', '', 1))
+        root, _, rel = rel.partition('/')
+        if root == 'files':
+            file_path = categories_file_path(rel)
+            cache_control = None
+        elif root == 'files-records':
+            file_path = records_file_path(rel)
+            cache_control = RECORDS_CACHE_CONTROL
+        else:
+            self.send_error(404)
+            return
+        if not file_path:
+            self.send_error(403)
+            return
+        query = parse_qs(parsed.query)
+        width = thumbnails.resolve_width(query.get('size', [''])[0], query.get('w', [''])[0])
+        if not width:
+            self._send_json(400, {'error': 'Invalid size'})
+            return
+        fmt = thumbnails.choose_format(query.get('format', [''])[0], self.headers.get('Accept'))
+        # The format follows Accept, so shared caches must key on it.
+        vary = {'Vary': 'Accept'}
+        derivative = thumbnails.get(file_path, width, fmt) if file_path.is_file() else None
+        if not derivative:
+            # No Pillow, unsupported format or slow render: the original still works.
+            self._send_file_dynamic(file_path, cache_control, vary)
+            return
+        self._send_path(
+            derivative, thumbnails.mime_for(fmt), cache_control or f'private, max-age={FILE_CACHE_MAX_AGE}', vary
+        )
+
+    @ROUTES.route('GET', '/api/thumbnails')
+    def handle_get_thumbnails(self, parsed, data):
+        self._send_json(200, thumbnails.stats())
+
+    @ROUTES.route('GET', '/api/fs_index')
+    def handle_get_fs_index(self, parsed, data):
+        self._send_json(200, fs_index.stats())
+
+    @ROUTES.route('POST', '/api/upload', body='raw', max_bytes=UPLOAD_MAX_BYTES)
+    def handle_post_upload(self, parsed, data):
+        def spool_dir(fields, filename):
             category = safe_path_component(fields.get('category', ''))
             folder_name = safe_path_component(fields.get('folder_name', ''))
-            status = fields.get('status', '')
-            sku = (fields.get('sku', '') or '').strip()
-            use_provided_names = (fields.get('use_provided_names', '') or '').strip() == '1'
             if not category or not folder_name:
-                self._send_json(400, {'error': 'Missing category/folder_name'})
-                return
-            saved = []
+                return UPLOAD_STAGING_DIR
+            ext = os.path.splitext(os.path.basename(filename))[1].lower()
+            return product_dir(category, folder_name, fields.get('status', '')) / upload_subdir(ext)
+
+        parsed_form = self._read_multipart(spool_dir)
+        if parsed_form is None:
+            return
+        fields, files_field = parsed_form
+        try:
+            self._save_product_uploads(fields, files_field)
+        finally:
             for item in files_field:
-                filename = item.get('filename')
-                if not filename:
-                    continue
-                name = os.path.basename(filename)
-                ext = os.path.splitext(name)[1].lower()
-                if ext in ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.tiff', '.heic', '.mp4', '.mov', '.mkv', '.avi', '.webm', '.m4v'):
-                    dest_dir = product_dir(category, folder_name, status) / 'Media'
-                elif ext == '.3mf':
-                    dest_dir = product_dir(category, folder_name, status) / 'STL'
-                else:
-                    dest_dir = product_dir(category, folder_name, status) / 'MISC'
-                dest_dir.mkdir(parents=True, exist_ok=True)
-                if ext == '.3mf' and use_provided_names:
-                    candidate_name = sanitize_upload_filename(name)
-                    if candidate_name and not candidate_name.lower().endswith(ext):
-                        candidate_name = f"{candidate_name}{ext}"
-                    new_name = candidate_name or name
-                else:
-                    new_name = next_sku_filename(dest_dir, sku, ext) or name
+                item['file'].discard()
+
+    def _save_product_uploads(self, fields: dict, files_field: list):
+        category = safe_path_component(fields.get('category', ''))
+        folder_name = safe_path_component(fields.get('folder_name', ''))
+        status = fields.get('status', '')
+        sku = (fields.get('sku', '') or '').strip()
+        use_provided_names = (fields.get('use_provided_names', '') or '').strip() == '1'
+        if not category or not folder_name:
+            self._send_json(400, {'error': 'Missing category/folder_name'})
+            return
+        saved = []
+        for item in files_field:
+            filename = item.get('filename')
+            if not filename:
+                continue
+            name = os.path.basename(filename)
+            ext = os.path.splitext(name)[1].lower()
+            dest_dir = product_dir(category, folder_name, status) / upload_subdir(ext)
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            if ext == '.3mf' and use_provided_names:
+                candidate_name = sanitize_upload_filename(name)
+                if candidate_name and not candidate_name.lower().endswith(ext):
+                    candidate_name = f"{candidate_name}{ext}"
+                new_name = candidate_name or name
+            else:
+                new_name = next_sku_filename(dest_dir, sku, ext) or name
+            with fs_lock():
                 new_name = unique_filename(dest_dir, new_name)
                 if not new_name:
                     self._send_json(409, {'error': 'Failed to create unique filename'})
                     return
                 dest_path = dest_dir / new_name
-                with dest_path.open('wb') as f:
-                    f.write(item.get('content') or b'')
-                saved.append(str(dest_path))
-            self._send_json(200, {'ok': True, 'saved': saved})
+                item['file'].commit(dest_path)
+            fs_index.invalidate(dest_dir)
+            thumbnails.prefetch(dest_path)
+            if ext == '.3mf':
+                threemf.schedule(dest_path, dest_path.relative_to(CATEGORIES_DIR).as_posix(), category, folder_name)
+            saved.append(str(dest_path))
+        self._send_json(200, {'ok': True, 'saved': saved})
+
+    @ROUTES.route('POST', '/api/expense_upload', body='raw', max_bytes=UPLOAD_MAX_BYTES)
+    def handle_post_expense_upload(self, parsed, data):
+        parsed_form = self._read_multipart(lambda fields, filename: EXPENSES_DIR / time.strftime('%Y'))
+        if parsed_form is None:
             return
+        _, files_field = parsed_form
+        try:
+            self._save_expense_upload(files_field)
+        finally:
+            for item in files_field:
+                item['file'].discard()
 
-        if parsed.path == '/api/expense_upload':
-            content_length = int(self.headers.get('Content-Length', '0'))
-            if content_length > UPLOAD_MAX_BYTES:
-                self._send_json(413, {'error': 'Upload exceeds size limit'})
-                return
-            body = self.rfile.read(content_length) if content_length > 0 else b''
-            _, files_field = parse_multipart_form_data(
-                self.headers.get('Content-Type', ''),
-                body,
-            )
-            if not files_field:
-                self._send_json(400, {'error': 'Missing receipt file'})
-                return
-            file_item = files_field[0]
-            filename = file_item.get('filename') or ''
-            content = file_item.get('content') or b''
-            if not filename or not content:
-                self._send_json(400, {'error': 'Invalid receipt upload'})
-                return
+    def _save_expense_upload(self, files_field: list):
+        if not files_field:
+            self._send_json(400, {'error': 'Missing receipt file'})
+            return
+        file_item = files_field[0]
+        filename = file_item.get('filename') or ''
+        if not filename or not file_item['size']:
+            self._send_json(400, {'error': 'Invalid receipt upload'})
+            return
+        base_name = os.path.basename(filename)
+        name_part, ext = os.path.splitext(base_name)
+        safe_name = sanitize_filename(name_part) or 'receipt'
+        safe_ext = re.sub(r'[^A-Za-z0-9.]', '', ext.lower())
+        timestamp = time.strftime('%Y%m%d-%H%M%S')
+        token = secrets.token_hex(4)
+        dest_dir = EXPENSES_DIR / time.strftime('%Y')
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        dest_name = f"{timestamp}-{token}-{safe_name}{safe_ext}"
+        dest_path = dest_dir / dest_name
+        if dest_path.exists():
+            dest_name = f"{timestamp}-{token}-{secrets.token_hex(2)}-{safe_name}{safe_ext}"
+            dest_path = dest_dir / dest_name
+        file_item['file'].commit(dest_path)
+        rel_path = dest_path.relative_to(RECORDS_DIR).as_posix()
+        self._send_json(200, {'receipt_path': rel_path})
+
+    @ROUTES.route('POST', '/api/event_upload', body='raw', max_bytes=UPLOAD_MAX_BYTES)
+    def handle_post_event_upload(self, parsed, data):
+        def spool_dir(fields, filename):
+            event_id_raw = (fields.get('event_id', '') or '').strip()
+            if not event_id_raw.isdigit():
+                return UPLOAD_STAGING_DIR
+            return EVENT_MEDIA_DIR / str(int(event_id_raw))
+
+        parsed_form = self._read_multipart(spool_dir)
+        if parsed_form is None:
+            return
+        fields, files_field = parsed_form
+        try:
+            self._save_event_uploads(fields, files_field)
+        finally:
+            for item in files_field:
+                item['file'].discard()
+
+    def _save_event_uploads(self, fields: dict, files_field: list):
+        event_id_raw = fields.get('event_id', '')
+        try:
+            event_id = int(event_id_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid event_id'})
+            return
+        if not db.fetch_event(event_id):
+            self._send_json(404, {'error': 'Event not found'})
+            return
+        if not files_field:
+            self._send_json(400, {'error': 'Missing image files'})
+            return
+        allowed_exts = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+        rows = []
+        skipped = []
+        for item in files_field:
+            filename = item.get('filename') or ''
+            if not filename or not item['size']:
+                skipped.append({'filename': filename or 'unknown', 'reason': 'empty file'})
+                continue
             base_name = os.path.basename(filename)
             name_part, ext = os.path.splitext(base_name)
-            safe_name = sanitize_filename(name_part) or 'receipt'
-            safe_ext = re.sub(r'[^A-Za-z0-9.]', '', ext.lower())
+            ext = ext.lower()
+            if ext not in allowed_exts:
+                skipped.append({
+                    'filename': base_name or filename or 'unknown',
+                    'reason': f"unsupported file type: {ext or 'unknown'}",
+                })
+                continue
+            safe_name = sanitize_filename(name_part) or 'event'
             timestamp = time.strftime('%Y%m%d-%H%M%S')
             token = secrets.token_hex(4)
-            dest_dir = EXPENSES_DIR / time.strftime('%Y')
+            dest_dir = EVENT_MEDIA_DIR / str(event_id)
             dest_dir.mkdir(parents=True, exist_ok=True)
-            dest_name = f"{timestamp}-{token}-{safe_name}{safe_ext}"
+            dest_name = f"{timestamp}-{token}-{safe_name}{ext}"
             dest_path = dest_dir / dest_name
             if dest_path.exists():
-                dest_name = f"{timestamp}-{token}-{secrets.token_hex(2)}-{safe_name}{safe_ext}"
+                dest_name = f"{timestamp}-{token}-{secrets.token_hex(2)}-{safe_name}{ext}"
                 dest_path = dest_dir / dest_name
-            dest_path.write_bytes(content)
+            item['file'].commit(dest_path)
             rel_path = dest_path.relative_to(RECORDS_DIR).as_posix()
-            self._send_json(200, {'receipt_path': rel_path})
+            row = db.insert_event_media(event_id, rel_path)
+            if row:
+                thumbnails.prefetch(dest_path, widths=(thumbnails.NAMED_SIZES['thumb'],))
+                rows.append(row)
+            else:
+                try:
+                    dest_path.unlink()
+                except OSError:
+                    pass
+        if not rows:
+            self._send_json(400, {'error': 'No valid images to upload', 'skipped': skipped})
             return
-
-        if parsed.path == '/api/event_upload':
-            content_length = int(self.headers.get('Content-Length', '0'))
-            if content_length > UPLOAD_MAX_BYTES:
-                self._send_json(413, {'error': 'Upload exceeds size limit'})
-                return
-            body = self.rfile.read(content_length) if content_length > 0 else b''
-            fields, files_field = parse_multipart_form_data(
-                self.headers.get('Content-Type', ''),
-                body,
-            )
-            event_id_raw = fields.get('event_id', '')
-            try:
-                event_id = int(event_id_raw)
-            except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid event_id'})
-                return
-            if not db.fetch_event(event_id):
-                self._send_json(404, {'error': 'Event not found'})
-                return
-            if not files_field:
-                self._send_json(400, {'error': 'Missing image files'})
-                return
-            allowed_exts = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
-            rows = []
-            skipped = []
-            for item in files_field:
-                filename = item.get('filename') or ''
-                content = item.get('content') or b''
-                if not filename or not content:
-                    skipped.append({'filename': filename or 'unknown', 'reason': 'empty file'})
-                    continue
-                base_name = os.path.basename(filename)
-                name_part, ext = os.path.splitext(base_name)
-                ext = ext.lower()
-                if ext not in allowed_exts:
-                    skipped.append({
-                        'filename': base_name or filename or 'unknown',
-                        'reason': f"unsupported file type: {ext or 'unknown'}",
-                    })
-                    continue
-                safe_name = sanitize_filename(name_part) or 'event'
-                timestamp = time.strftime('%Y%m%d-%H%M%S')
-                token = secrets.token_hex(4)
-                dest_dir = EVENT_MEDIA_DIR / str(event_id)
-                dest_dir.mkdir(parents=True, exist_ok=True)
-                dest_name = f"{timestamp}-{token}-{safe_name}{ext}"
-                dest_path = dest_dir / dest_name
-                if dest_path.exists():
-                    dest_name = f"{timestamp}-{token}-{secrets.token_hex(2)}-{safe_name}{ext}"
-                    dest_path = dest_dir / dest_name
-                dest_path.write_bytes(content)
-                rel_path = dest_path.relative_to(RECORDS_DIR).as_posix()
-                row = db.insert_event_media(event_id, rel_path)
-                if row:
-                    rows.append(row)
-                else:
-                    try:
-                        dest_path.unlink()
-                    except OSError:
-                        pass
-            if not rows:
-                self._send_json(400, {'error': 'No valid images to upload', 'skipped': skipped})
-                return
-            payload = {'rows': rows}
-            if skipped:
-                payload['skipped'] = skipped
-            self._send_json(200, payload)
-            return
-
-        if parsed.path == '/api/login':
-            length = int(self.headers.get('Content-Length', '0'))
-            body = self.rfile.read(length) if length > 0 else b''
-            try:
-                data = json.loads(body.decode('utf-8') or '{}')
-            except json.JSONDecodeError:
-                self._send_json(400, {'error': 'Invalid JSON'})
-                return
-            if not auth_enabled():
-                self._send_json(200, {'ok': True})
+        payload = {'rows': rows}
+        if skipped:
+            payload['skipped'] = skipped
+        self._send_json(200, payload)
+
+    @ROUTES.route('POST', '/api/login', body='json', auth=False)
+    def handle_post_login(self, parsed, data):
+        if not auth_enabled():
+            self._send_json(200, {'ok': True})
+            return
+        username = (data.get('username') or '').strip()
+        password = (data.get('password') or '').strip()
+        if not check_credentials(username, password):
+            self._send_unauthorized()
+            return
+        if AUTH_TOTP_SECRET:
+            if pyotp is None:
+                self._send_json(500, {'error': 'TOTP enabled but pyotp is not installed'})
                 return
-            username = (data.get('username') or '').strip()
-            password = (data.get('password') or '').strip()
-            if not check_credentials(username, password):
+            totp_code = (data.get('totp') or '').strip()
+            totp = pyotp.TOTP(AUTH_TOTP_SECRET)
+            if not totp.verify(totp_code, valid_window=1):
                 self._send_unauthorized()
                 return
-            if AUTH_TOTP_SECRET:
-                if pyotp is None:
-                    self._send_json(500, {'error': 'TOTP enabled but pyotp is not installed'})
-                    return
-                totp_code = (data.get('totp') or '').strip()
-                totp = pyotp.TOTP(AUTH_TOTP_SECRET)
-                if not totp.verify(totp_code, valid_window=1):
-                    self._send_unauthorized()
-                    return
-            session_id = create_session(username)
-            self.send_response(200)
-            cookie = f"session_id={session_id}; Path=/; Max-Age={SESSION_TTL_SECONDS}; HttpOnly; SameSite=Lax"
-            if AUTH_COOKIE_SECURE:
-                cookie += "; Secure"
-            self.send_header('Set-Cookie', cookie)
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(json.dumps({'ok': True}).encode('utf-8'))
-            return
-
-        if parsed.path == '/api/logout':
-            if session:
-                cookies = parse_cookies(self.headers.get('Cookie'))
-                session_id = cookies.get('session_id')
-                if session_id:
-                    SESSIONS.pop(session_id, None)
-            self.send_response(200)
-            self.send_header('Set-Cookie', 'session_id=; Path=/; Max-Age=0; HttpOnly; SameSite=Lax')
-            self.send_header('Content-Type', 'application/json; charset=utf-8')
-            self.end_headers()
-            self.wfile.write(json.dumps({'ok': True}).encode('utf-8'))
+        session_id = create_session(username)
+        self.send_response(200)
+        cookie = f"session_id={session_id}; Path=/; Max-Age={SESSION_TTL_SECONDS}; HttpOnly; SameSite=Lax"
+        if AUTH_COOKIE_SECURE:
+            cookie += "; Secure"
+        self.send_header('Set-Cookie', cookie)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(json.dumps({'ok': True}).encode('utf-8'))
+
+    @ROUTES.route('POST', '/api/logout')
+    def handle_post_logout(self, parsed, data):
+        if self.session:
+            cookies = parse_cookies(self.headers.get('Cookie'))
+            session_id = cookies.get('session_id')
+            if session_id:
+                delete_session(session_id)
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'session_id=; Path=/; Max-Age=0; HttpOnly; SameSite=Lax')
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.end_headers()
+        self.wfile.write(json.dumps({'ok': True}).encode('utf-8'))
+
+    @ROUTES.route('POST', '/api/file_token', body='json')
+    def handle_post_file_token(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        folder_name = safe_path_component(data.get('folder_name', ''))
+        status = data.get('status', '')
+        rel_path = data.get('rel_path', '')
+        if not category or not folder_name or not rel_path:
+            self._send_json(400, {'error': 'Missing category/folder_name/rel_path'})
             return
-
-        if parsed.path == '/api/file_token':
-            length = int(self.headers.get('Content-Length', '0'))
-            body = self.rfile.read(length) if length > 0 else b''
-            try:
-                data = json.loads(body.decode('utf-8') or '{}')
-            except json.JSONDecodeError:
-                self._send_json(400, {'error': 'Invalid JSON'})
-                return
-            category = safe_path_component(data.get('category', ''))
-            folder_name = safe_path_component(data.get('folder_name', ''))
-            status = data.get('status', '')
-            rel_path = data.get('rel_path', '')
-            if not category or not folder_name or not rel_path:
-                self._send_json(400, {'error': 'Missing category/folder_name/rel_path'})
-                return
-            base_path = product_dir(category, folder_name, status).resolve()
-            rel_clean = safe_rel_path(rel_path)
-            if not rel_clean:
-                self._send_json(403, {'error': 'Invalid path'})
-                return
-            target_path = (base_path / rel_clean).resolve()
-            if not target_path.is_relative_to(base_path):
-                self._send_json(403, {'error': 'Invalid path'})
-                return
-            if not target_path.exists() or not target_path.is_file():
-                self._send_json(404, {'error': 'File not found'})
-                return
-            token = create_file_token(target_path)
-            self._send_json(200, {'token': token})
+        base_path = product_dir(category, folder_name, status).resolve()
+        rel_clean = safe_rel_path(rel_path)
+        if not rel_clean:
+            self._send_json(403, {'error': 'Invalid path'})
             return
-        if parsed.path == '/api/open_path':
-            length = int(self.headers.get('Content-Length', '0'))
-            body = self.rfile.read(length) if length > 0 else b''
-            try:
-                data = json.loads(body.decode('utf-8') or '{}')
-            except json.JSONDecodeError:
-                self._send_json(400, {'error': 'Invalid JSON'})
-                return
-            category = safe_path_component(data.get('category', ''))
-            folder_name = safe_path_component(data.get('folder_name', ''))
-            status = data.get('status', '')
-            rel_path = data.get('rel_path', '')
-            open_parent = bool(data.get('open_parent'))
-            if not category or not folder_name:
-                self._send_json(400, {'error': 'Missing category/folder_name'})
-                return
-            base_path = product_dir(category, folder_name, status).resolve()
-            target_path = base_path
-            if rel_path:
-                rel_clean = safe_rel_path(rel_path)
-                if not rel_clean:
-                    self._send_json(403, {'error': 'Invalid path'})
-                    return
-                target_path = (base_path / rel_clean).resolve()
-                if not target_path.is_relative_to(base_path):
-                    self._send_json(403, {'error': 'Invalid path'})
-                    return
-            if open_parent:
-                target_path = target_path.parent
-            if not target_path.exists():
-                self._send_json(404, {'error': 'Path not found'})
-                return
-            ok, error = open_path_in_os(target_path)
-            if not ok:
-                self._send_json(409, {'error': error or 'Failed to open path'})
-                return
-            self._send_json(200, {'ok': True})
+        target_path = (base_path / rel_clean).resolve()
+        if not target_path.is_relative_to(base_path):
+            self._send_json(403, {'error': 'Invalid path'})
             return
-        length = int(self.headers.get('Content-Length', '0'))
-        body = self.rfile.read(length) if length > 0 else b''
-        try:
-            data = json.loads(body.decode('utf-8') or '{}')
-        except json.JSONDecodeError:
-            self._send_json(400, {'error': 'Invalid JSON'})
+        if not target_path.exists() or not target_path.is_file():
+            self._send_json(404, {'error': 'File not found'})
             return
-
-        if parsed.path == '/api/delete_file':
-            category = safe_path_component(data.get('category', ''))
-            folder_name = safe_path_component(data.get('folder_name', ''))
-            status = data.get('status', '')
-            rel_path = data.get('rel_path', '')
-            if not category or not folder_name or not rel_path:
-                self._send_json(400, {'error': 'Missing category/folder_name/rel_path'})
-                return
-            base_path = product_dir(category, folder_name, status).resolve()
+        token = create_file_token(target_path)
+        self._send_json(200, {'token': token})
+
+    @ROUTES.route('POST', '/api/open_path', body='json')
+    def handle_post_open_path(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        folder_name = safe_path_component(data.get('folder_name', ''))
+        status = data.get('status', '')
+        rel_path = data.get('rel_path', '')
+        open_parent = bool(data.get('open_parent'))
+        if not category or not folder_name:
+            self._send_json(400, {'error': 'Missing category/folder_name'})
+            return
+        base_path = product_dir(category, folder_name, status).resolve()
+        target_path = base_path
+        if rel_path:
             rel_clean = safe_rel_path(rel_path)
             if not rel_clean:
                 self._send_json(403, {'error': 'Invalid path'})
@@ -1154,9 +1967,39 @@ class Handler(BaseHTTPRequestHandler):
             if not target_path.is_relative_to(base_path):
                 self._send_json(403, {'error': 'Invalid path'})
                 return
-            if not target_path.exists() or not target_path.is_file():
-                self._send_json(404, {'error': 'File not found'})
-                return
+        if open_parent:
+            target_path = target_path.parent
+        if not target_path.exists():
+            self._send_json(404, {'error': 'Path not found'})
+            return
+        ok, error = open_path_in_os(target_path)
+        if not ok:
+            self._send_json(409, {'error': error or 'Failed to open path'})
+            return
+        self._send_json(200, {'ok': True})
+
+    @ROUTES.route('POST', '/api/delete_file', body='json')
+    def handle_post_delete_file(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        folder_name = safe_path_component(data.get('folder_name', ''))
+        status = data.get('status', '')
+        rel_path = data.get('rel_path', '')
+        if not category or not folder_name or not rel_path:
+            self._send_json(400, {'error': 'Missing category/folder_name/rel_path'})
+            return
+        base_path = product_dir(category, folder_name, status).resolve()
+        rel_clean = safe_rel_path(rel_path)
+        if not rel_clean:
+            self._send_json(403, {'error': 'Invalid path'})
+            return
+        target_path = (base_path / rel_clean).resolve()
+        if not target_path.is_relative_to(base_path):
+            self._send_json(403, {'error': 'Invalid path'})
+            return
+        if not target_path.exists() or not target_path.is_file():
+            self._send_json(404, {'error': 'File not found'})
+            return
+        with fs_lock():
             deleted_dir = target_path.parent / '_Deleted'
             deleted_dir.mkdir(parents=True, exist_ok=True)
             dest_path = deleted_dir / target_path.name
@@ -1164,929 +2007,804 @@ class Handler(BaseHTTPRequestHandler):
                 self._send_json(409, {'error': 'Destination already exists'})
                 return
             target_path.rename(dest_path)
-            self._send_json(200, {'ok': True})
+        fs_index.invalidate(product_dir(category, folder_name, status))
+        self._send_json(200, {'ok': True})
+
+    @ROUTES.route('POST', '/api/rename_file', body='json')
+    def handle_post_rename_file(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        folder_name = safe_path_component(data.get('folder_name', ''))
+        status = data.get('status', '')
+        rel_path = data.get('rel_path', '')
+        new_name = data.get('new_name', '')
+        if not category or not folder_name or not rel_path:
+            self._send_json(400, {'error': 'Missing category/folder_name/rel_path'})
             return
-
-        if parsed.path == '/api/rename_file':
-            category = safe_path_component(data.get('category', ''))
-            folder_name = safe_path_component(data.get('folder_name', ''))
-            status = data.get('status', '')
-            rel_path = data.get('rel_path', '')
-            new_name = data.get('new_name', '')
-            if not category or not folder_name or not rel_path:
-                self._send_json(400, {'error': 'Missing category/folder_name/rel_path'})
-                return
-            base_path = product_dir(category, folder_name, status).resolve()
-            rel_clean = safe_rel_path(rel_path)
-            if not rel_clean:
-                self._send_json(403, {'error': 'Invalid path'})
-                return
-            target_path = (base_path / rel_clean).resolve()
-            if not target_path.is_relative_to(base_path):
-                self._send_json(403, {'error': 'Invalid path'})
-                return
-            if not target_path.exists() or not target_path.is_file():
-                self._send_json(404, {'error': 'File not found'})
-                return
-            if '_Deleted' in target_path.parts:
-                self._send_json(409, {'error': 'Cannot rename deleted files'})
-                return
-            cleaned_name = sanitize_upload_filename(new_name)
-            if not cleaned_name:
-                self._send_json(400, {'error': 'Invalid filename'})
-                return
-            ext = target_path.suffix.lower()
-            if ext and not cleaned_name.lower().endswith(ext):
-                cleaned_name = f"{cleaned_name}{ext}"
-            if cleaned_name == target_path.name:
-                rel_out = target_path.relative_to(base_path).as_posix()
-                self._send_json(200, {'ok': True, 'name': target_path.name, 'rel_path': rel_out})
-                return
+        base_path = product_dir(category, folder_name, status).resolve()
+        rel_clean = safe_rel_path(rel_path)
+        if not rel_clean:
+            self._send_json(403, {'error': 'Invalid path'})
+            return
+        target_path = (base_path / rel_clean).resolve()
+        if not target_path.is_relative_to(base_path):
+            self._send_json(403, {'error': 'Invalid path'})
+            return
+        if not target_path.exists() or not target_path.is_file():
+            self._send_json(404, {'error': 'File not found'})
+            return
+        if '_Deleted' in target_path.parts:
+            self._send_json(409, {'error': 'Cannot rename deleted files'})
+            return
+        cleaned_name = sanitize_upload_filename(new_name)
+        if not cleaned_name:
+            self._send_json(400, {'error': 'Invalid filename'})
+            return
+        ext = target_path.suffix.lower()
+        if ext and not cleaned_name.lower().endswith(ext):
+            cleaned_name = f"{cleaned_name}{ext}"
+        if cleaned_name == target_path.name:
+            rel_out = target_path.relative_to(base_path).as_posix()
+            self._send_json(200, {'ok': True, 'name': target_path.name, 'rel_path': rel_out})
+            return
+        with fs_lock():
             unique_name = unique_filename(target_path.parent, cleaned_name)
             if not unique_name:
                 self._send_json(409, {'error': 'Failed to create unique filename'})
                 return
             dest_path = target_path.parent / unique_name
             target_path.rename(dest_path)
-            rel_out = dest_path.relative_to(base_path).as_posix()
-            self._send_json(200, {'ok': True, 'name': dest_path.name, 'rel_path': rel_out})
-            return
-
-        if parsed.path == '/api/ukca_create':
-            category = safe_path_component(data.get('category', ''))
-            folder_name = safe_path_component(data.get('folder_name', ''))
-            status = data.get('status', '')
-            product_name = (data.get('product_name', '') or '').strip()
-            sku = (data.get('sku', '') or '').strip()
-            materials = (data.get('materials', '') or '').strip()
-            intended_age = (data.get('intended_age', '') or '').strip()
-            manufacturer = (data.get('manufacturer', '') or '').strip()
-            address = (data.get('address', '') or '').strip()
-            tester = (data.get('tester', '') or '').strip()
-            test_date = (data.get('test_date', '') or '').strip()
-            notes = (data.get('notes', '') or '').strip()
-            if not category or not folder_name:
-                self._send_json(400, {'error': 'Missing category/folder_name'})
-                return
-
-            product_path = product_dir(category, folder_name, status)
-            ukca_dir = product_path / 'UKCA'
-            (ukca_dir / 'Declarations').mkdir(parents=True, exist_ok=True)
-            (ukca_dir / 'Risk_Assessment').mkdir(parents=True, exist_ok=True)
-            (ukca_dir / 'Evidence').mkdir(parents=True, exist_ok=True)
-            (ukca_dir / 'Labels').mkdir(parents=True, exist_ok=True)
-
-            replacements = {
-                'PRODUCT_NAME': product_name or folder_name,
-                'SKU': sku,
-                'MATERIALS': materials or 'PLA / PETG',
-                'INTENDED_AGE': intended_age or '3+',
-                'MANUFACTURER': manufacturer or 'GeekyThingsUK',
-                'ADDRESS': address or 'United Kingdom',
-                'TESTER': tester or 'Dan Robinson',
-                'TEST_DATE': test_date or '',
-                'NOTES': notes,
-            }
-
-            readme_template_path = UKCA_SHARED_DIR / 'UKCA_README_TEMPLATE.md'
-            declaration_template_path = UKCA_SHARED_DIR / 'UKCA_Declaration_TEMPLATE.md'
-            risk_template_path = UKCA_SHARED_DIR / 'UKCA_Risk_Assessment_TEMPLATE.md'
-            en71_template_path = UKCA_SHARED_DIR / 'EN71-1_Compliance_Pack_TEMPLATE.md'
-
-            ukca_readme = apply_replacements(read_template(readme_template_path), replacements)
-            if ukca_readme:
-                (ukca_dir / 'README.md').write_text(ukca_readme, encoding='utf-8')
-                db.set_ukca_doc(category, folder_name, 'readme', ukca_readme)
-
-            declaration = apply_replacements(read_template(declaration_template_path), replacements)
-            if declaration:
-                (ukca_dir / 'Declarations' / 'UKCA_Declaration_of_Conformity.md').write_text(
-                    declaration, encoding='utf-8'
-                )
-                db.set_ukca_doc(category, folder_name, 'declaration', declaration)
-
-            risk = apply_replacements(read_template(risk_template_path), replacements)
-            if risk:
-                (ukca_dir / 'Risk_Assessment' / 'Risk_Assessment.md').write_text(
-                    risk, encoding='utf-8'
-                )
-                db.set_ukca_doc(category, folder_name, 'risk_assessment', risk)
-
-            en71 = read_template(en71_template_path)
-            if en71:
-                header = (
-                    f"# {replacements['PRODUCT_NAME']} (SKU: {replacements['SKU']})\n\n"
-                    f"Material: {replacements['MATERIALS']}\n\n"
-                    f"Intended age: {replacements['INTENDED_AGE']}\n\n"
-                    f"Date tested: {replacements['TEST_DATE']}\n\n"
-                    f"Tester: {replacements['TESTER']}\n\n"
-                    "---\n\n"
-                )
-                en71_content = header + en71
-                (ukca_dir / 'EN71-1_Compliance_Pack.md').write_text(en71_content, encoding='utf-8')
-                db.set_ukca_doc(category, folder_name, 'en71', en71_content)
-
-            db.set_product_ukca(category, folder_name, 'Yes')
-
-            self._send_json(200, {'ok': True})
+        fs_index.invalidate(product_dir(category, folder_name, status))
+        rel_out = dest_path.relative_to(base_path).as_posix()
+        self._send_json(200, {'ok': True, 'name': dest_path.name, 'rel_path': rel_out})
+
+    @ROUTES.route('POST', '/api/ukca_create', body='json')
+    def handle_post_ukca_create(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        folder_name = safe_path_component(data.get('folder_name', ''))
+        status = data.get('status', '')
+        if not category or not folder_name:
+            self._send_json(400, {'error': 'Missing category/folder_name'})
             return
-
-        if parsed.path == '/api/ukca_pack':
-            category = safe_path_component(data.get('category', ''))
-            folder_name = safe_path_component(data.get('folder_name', ''))
-            status = data.get('status', '')
-            action = (data.get('action', '') or '').strip().lower()
-            file_key = (data.get('file', '') or '').strip().lower()
-            if not category or not folder_name or not action or not file_key:
-                self._send_json(400, {'error': 'Missing category/folder/action/file'})
-                return
-            product_path = product_dir(category, folder_name, status)
-            target = ukca_file_paths(product_path).get(file_key)
-            if not target:
-                self._send_json(400, {'error': 'Unknown UKCA file'})
-                return
-            if action == 'read':
-                stored = db.get_ukca_doc(category, folder_name, file_key)
-                if stored is not None:
-                    self._send_json(200, {'content': stored})
-                    return
-                if not target.exists():
-                    self._send_json(404, {'error': 'UKCA file not found'})
-                    return
-                content = target.read_text(encoding='utf-8')
-                db.set_ukca_doc(category, folder_name, file_key, content)
-                self._send_json(200, {'content': content})
-                return
-            if action == 'write':
-                content = data.get('content', '')
-                if not db.set_ukca_doc(category, folder_name, file_key, content):
-                    self._send_json(404, {'error': 'Product not found'})
-                    return
-                target.parent.mkdir(parents=True, exist_ok=True)
-                target.write_text(content, encoding='utf-8')
-                self._send_json(200, {'ok': True})
-                return
-            self._send_json(400, {'error': 'Invalid action'})
+        fields = {field: data.get(field, '') for field in ukca_bulk.FIELDS}
+        fields['product_name'] = (fields['product_name'] or '').strip() or folder_name
+        product_path = product_dir(category, folder_name, status)
+        ukca_bulk.generate(
+            [{'product_id': db.get_product_id(category, folder_name), 'product_path': product_path, 'fields': fields}],
+            ukca_bulk.load_templates(UKCA_SHARED_DIR),
+            workers=1,
+        )
+        fs_index.invalidate(product_path)
+        self._send_json(200, {'ok': True})
+
+    @ROUTES.route('POST', '/api/ukca_bulk', body='json')
+    def handle_post_ukca_bulk(self, parsed, data):
+        skus = data.get('skus') or []
+        if not isinstance(skus, list):
+            self._send_json(400, {'error': 'skus must be a list'})
             return
-
-        if parsed.path == '/api/events':
-            action = (data.get('action') or 'create').strip().lower()
-            event = data.get('event') or {}
-            event_id = data.get('id') or event.get('id')
-            if action == 'delete':
-                try:
-                    event_id = int(event_id)
-                except (TypeError, ValueError):
-                    self._send_json(400, {'error': 'Invalid event id'})
-                    return
-                if not db.delete_event(event_id):
-                    self._send_json(404, {'error': 'Event not found'})
-                    return
-                event_dir = (EVENT_MEDIA_DIR / str(event_id)).resolve()
-                try:
-                    if event_dir.is_relative_to(EVENT_MEDIA_DIR.resolve()) and event_dir.exists():
-                        shutil.rmtree(event_dir)
-                except OSError:
-                    pass
-                self._send_json(200, {'ok': True})
-                return
-
-            name = (event.get('name') or '').strip()
-            event_date = (event.get('event_date') or '').strip()
-            if not name or not event_date:
-                self._send_json(400, {'error': 'Missing event name or date'})
-                return
-            if not EVENT_DATE_RE.match(event_date):
-                self._send_json(400, {'error': 'Event date must be YYYY-MM-DD'})
-                return
-            payload = {
-                'name': name,
-                'event_date': event_date,
-                'location': (event.get('location') or '').strip(),
-                'contact_name': (event.get('contact_name') or '').strip(),
-                'contact_email': (event.get('contact_email') or '').strip(),
-                'notes': (event.get('notes') or '').strip(),
-            }
-            if action == 'update':
-                try:
-                    event_id = int(event_id)
-                except (TypeError, ValueError):
-                    self._send_json(400, {'error': 'Invalid event id'})
-                    return
-                if not db.update_event(event_id, payload):
-                    self._send_json(404, {'error': 'Event not found'})
-                    return
-                updated = db.fetch_event(event_id)
-                self._send_json(200, {'ok': True, 'event': updated})
-                return
-            inserted = db.insert_event(payload)
-            if not inserted:
-                self._send_json(500, {'error': 'Failed to create event'})
-                return
-            self._send_json(200, {'ok': True, 'event': inserted})
+        filters = {key: data.get(key) for key in ('category', 'status', 'ukca')}
+        filters['skus'] = skus
+        if not (filters['category'] or filters['ukca'] or skus):
+            self._send_json(400, {'error': 'Choose products with category, ukca or skus'})
             return
-
-        if parsed.path == '/api/event_media':
-            action = (data.get('action') or '').strip().lower()
-            if action != 'delete':
-                self._send_json(400, {'error': 'Invalid action'})
+        try:
+            workers = min(max(int(data.get('workers') or ukca_bulk.UKCA_WORKERS), 1), ukca_bulk.UKCA_WORKERS)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid workers'})
+            return
+        products = db.fetch_ukca_candidates(filters)
+        jobs = ukca_bulk.jobs_for(products, {field: data.get(field) for field in ukca_bulk.FIELDS}, product_dir)
+        report = ukca_bulk.generate(
+            jobs,
+            ukca_bulk.load_templates(UKCA_SHARED_DIR),
+            workers=workers,
+            processes=bool(data.get('processes')),
+            dry_run=bool(data.get('dry_run')),
+        )
+        if not report['dry_run']:
+            for job in jobs:
+                fs_index.invalidate(job['product_path'])
+        report['errors'] = [
+            {**error, 'product_path': Path(error['product_path']).relative_to(CATEGORIES_DIR).as_posix()}
+            for error in report['errors']
+        ]
+        self._send_json(200, {'ok': True, **report})
+
+    @ROUTES.route('POST', '/api/ukca_pack', body='json')
+    def handle_post_ukca_pack(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        folder_name = safe_path_component(data.get('folder_name', ''))
+        status = data.get('status', '')
+        action = (data.get('action', '') or '').strip().lower()
+        file_key = (data.get('file', '') or '').strip().lower()
+        if not category or not folder_name or not action or not file_key:
+            self._send_json(400, {'error': 'Missing category/folder/action/file'})
+            return
+        product_path = product_dir(category, folder_name, status)
+        target = ukca_file_paths(product_path).get(file_key)
+        if not target:
+            self._send_json(400, {'error': 'Unknown UKCA file'})
+            return
+        if action == 'read':
+            stored = db.get_ukca_doc(category, folder_name, file_key)
+            if stored is not None:
+                self._send_json(200, {'content': stored})
                 return
-            media_id = data.get('id')
-            try:
-                media_id = int(media_id)
-            except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid media id'})
+            if not target.exists():
+                self._send_json(404, {'error': 'UKCA file not found'})
                 return
-            row = db.fetch_event_media_by_id(media_id)
-            if not row:
-                self._send_json(404, {'error': 'Media not found'})
-                return
-            rel_path = safe_rel_path(row.get('file_path') or '')
-            if rel_path:
-                file_path = (RECORDS_DIR / rel_path).resolve()
-                if file_path.is_relative_to(RECORDS_DIR.resolve()) and file_path.exists():
-                    try:
-                        file_path.unlink()
-                    except OSError:
-                        self._send_json(500, {'error': 'Failed to delete media file'})
-                        return
-            if not db.delete_event_media(media_id):
-                self._send_json(500, {'error': 'Failed to delete media record'})
+            content = target.read_text(encoding='utf-8')
+            db.set_ukca_doc(category, folder_name, file_key, content)
+            self._send_json(200, {'content': content})
+            return
+        if action == 'write':
+            content = data.get('content', '')
+            if not db.set_ukca_doc(category, folder_name, file_key, content):
+                self._send_json(404, {'error': 'Product not found'})
                 return
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(content, encoding='utf-8')
+            fs_index.invalidate(product_path)
             self._send_json(200, {'ok': True})
             return
-
-        if parsed.path == '/api/sale':
-            event_id_raw = data.get('event_id')
+        self._send_json(400, {'error': 'Invalid action'})
+
+    @ROUTES.route('POST', '/api/events', body='json')
+    def handle_post_events(self, parsed, data):
+        action = (data.get('action') or 'create').strip().lower()
+        event = data.get('event') or {}
+        event_id = data.get('id') or event.get('id')
+        if action == 'delete':
             try:
-                event_id = int(event_id_raw)
+                event_id = int(event_id)
             except (TypeError, ValueError):
                 self._send_json(400, {'error': 'Invalid event id'})
                 return
-            if not db.fetch_event(event_id):
+            if not db.delete_event(event_id):
                 self._send_json(404, {'error': 'Event not found'})
                 return
-            category = safe_path_component(data.get('category', ''))
-            product_folder = safe_path_component(data.get('product_folder', ''))
-            if not category or not product_folder:
-                self._send_json(400, {'error': 'Missing category/product_folder'})
-                return
-            try:
-                quantity = int(data.get('quantity', 1))
-            except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid quantity'})
-                return
-            if quantity <= 0:
-                self._send_json(400, {'error': 'Quantity must be greater than 0'})
-                return
-            unit_price_raw = (data.get('unit_price') or '').strip()
+            event_dir = (EVENT_MEDIA_DIR / str(event_id)).resolve()
             try:
-                unit_price = Decimal(unit_price_raw)
-            except (InvalidOperation, TypeError):
-                self._send_json(400, {'error': 'Invalid unit price'})
-                return
-            if unit_price < 0:
-                self._send_json(400, {'error': 'Unit price must be non-negative'})
-                return
-            unit_price = unit_price.quantize(Decimal('0.01'))
-            override_price = (data.get('override_price') or '').strip()
-            payment_method = (data.get('payment_method') or '').strip()
-            color = (data.get('color') or '').strip()
-            size = (data.get('size') or '').strip()
-
-            product = db.fetch_product(category, product_folder)
-            sku = (data.get('sku') or '').strip()
-            product_id = None
-            if product:
-                product_id = product.get('id')
-                sku = (product.get('sku') or '').strip() or sku
-
-            sale_row = db.insert_sale({
-                'event_id': event_id,
-                'product_id': product_id,
-                'category': category,
-                'product_folder': product_folder,
-                'sku': sku,
-                'color': color,
-                'size': size,
-                'quantity': quantity,
-                'unit_price': unit_price,
-                'override_price': override_price,
-                'payment_method': payment_method,
-            })
-            if not sale_row:
-                self._send_json(500, {'error': 'Failed to record sale'})
-                return
-
-            stock_adjusted = False
-            new_qty = None
-            existing = db.get_stock_entry(category, product_folder, color, size)
-            if existing:
-                try:
-                    current_qty = int(existing.get('quantity') or 0)
-                except (TypeError, ValueError):
-                    current_qty = 0
-                updated_qty = current_qty - quantity
-                if updated_qty <= 0:
-                    db.delete_stock_entry(category, product_folder, color, size)
-                    new_qty = 0
-                else:
-                    db.upsert_stock_entry(category, product_folder, sku, color, size, updated_qty)
-                    new_qty = updated_qty
-                stock_adjusted = True
-
-            db.adjust_production_by_key(
-                category,
-                product_folder,
-                sku,
-                color,
-                size,
-                quantity,
-                'Queued',
-            )
-
-            self._send_json(
-                200,
-                {
-                    'ok': True,
-                    'sale': sale_row,
-                    'stock_adjusted': stock_adjusted,
-                    'new_quantity': new_qty,
-                },
-            )
+                if event_dir.is_relative_to(EVENT_MEDIA_DIR.resolve()) and event_dir.exists():
+                    shutil.rmtree(event_dir)
+            except OSError:
+                pass
+            self._send_json(200, {'ok': True})
             return
 
-        if parsed.path == '/api/sale_update':
-            sale_id_raw = data.get('id')
+        name = (event.get('name') or '').strip()
+        event_date = (event.get('event_date') or '').strip()
+        if not name or not event_date:
+            self._send_json(400, {'error': 'Missing event name or date'})
+            return
+        if not EVENT_DATE_RE.match(event_date):
+            self._send_json(400, {'error': 'Event date must be YYYY-MM-DD'})
+            return
+        payload = {
+            'name': name,
+            'event_date': event_date,
+            'location': (event.get('location') or '').strip(),
+            'contact_name': (event.get('contact_name') or '').strip(),
+            'contact_email': (event.get('contact_email') or '').strip(),
+            'notes': (event.get('notes') or '').strip(),
+        }
+        if action == 'update':
             try:
-                sale_id = int(sale_id_raw)
+                event_id = int(event_id)
             except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid sale id'})
+                self._send_json(400, {'error': 'Invalid event id'})
                 return
-            existing = db.fetch_sale(sale_id)
-            if not existing:
-                self._send_json(404, {'error': 'Sale not found'})
+            if not db.update_event(event_id, payload):
+                self._send_json(404, {'error': 'Event not found'})
                 return
-            event_id_raw = data.get('event_id')
-            if event_id_raw is not None:
+            updated = db.fetch_event(event_id)
+            self._send_json(200, {'ok': True, 'event': updated})
+            return
+        inserted = db.insert_event(payload)
+        if not inserted:
+            self._send_json(500, {'error': 'Failed to create event'})
+            return
+        self._send_json(200, {'ok': True, 'event': inserted})
+
+    @ROUTES.route('POST', '/api/event_media', body='json')
+    def handle_post_event_media(self, parsed, data):
+        action = (data.get('action') or '').strip().lower()
+        if action != 'delete':
+            self._send_json(400, {'error': 'Invalid action'})
+            return
+        media_id = data.get('id')
+        try:
+            media_id = int(media_id)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid media id'})
+            return
+        row = db.fetch_event_media_by_id(media_id)
+        if not row:
+            self._send_json(404, {'error': 'Media not found'})
+            return
+        rel_path = safe_rel_path(row.get('file_path') or '')
+        if rel_path:
+            file_path = (RECORDS_DIR / rel_path).resolve()
+            if file_path.is_relative_to(RECORDS_DIR.resolve()) and file_path.exists():
                 try:
-                    event_id = int(event_id_raw)
-                except (TypeError, ValueError):
-                    self._send_json(400, {'error': 'Invalid event id'})
-                    return
-                if event_id != existing.get('event_id'):
-                    self._send_json(400, {'error': 'Event mismatch'})
+                    file_path.unlink()
+                except OSError:
+                    self._send_json(500, {'error': 'Failed to delete media file'})
                     return
-            category = safe_path_component(data.get('category', ''))
-            product_folder = safe_path_component(data.get('product_folder', ''))
-            if not category or not product_folder:
-                self._send_json(400, {'error': 'Missing category/product_folder'})
-                return
-            quantity_raw = data.get('quantity')
-            try:
-                quantity = int(quantity_raw)
-            except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid quantity'})
-                return
-            if quantity <= 0:
-                self._send_json(400, {'error': 'Quantity must be greater than 0'})
+        if not db.delete_event_media(media_id):
+            self._send_json(500, {'error': 'Failed to delete media record'})
+            return
+        self._send_json(200, {'ok': True})
+
+    @ROUTES.route('POST', '/api/sale', body='json')
+    def handle_post_sale(self, parsed, data):
+        line, error = parse_sale_line(data)
+        if error:
+            self._send_json(400, {'error': error})
+            return
+        if line['idempotency_key']:
+            result = db.record_sales_batch([line])['results'][0]
+            if result['status'] == 'error':
+                self._send_json(404, {'error': result['error']})
                 return
-            unit_price_raw = (data.get('unit_price') or '').strip()
-            try:
-                unit_price = Decimal(unit_price_raw)
-            except (InvalidOperation, TypeError):
-                self._send_json(400, {'error': 'Invalid unit price'})
+            if result['status'] == 'conflict':
+                self._send_json(409, {'error': result['error']})
                 return
-            if unit_price < 0:
-                self._send_json(400, {'error': 'Unit price must be non-negative'})
+            if result['status'] == 'duplicate':
+                self._send_json(200, {
+                    'ok': True,
+                    'duplicate': True,
+                    'sale': result['sale'],
+                    'stock_adjusted': False,
+                    'new_quantity': None,
+                })
                 return
-            unit_price = unit_price.quantize(Decimal('0.01'))
-            override_price = (data.get('override_price') or '').strip()
-            payment_method = (data.get('payment_method') or '').strip()
-            color = (data.get('color') or '').strip()
-            size = (data.get('size') or '').strip()
+        else:
+            result = db.record_sale(line)
+        if not result:
+            self._send_json(500, {'error': 'Failed to record sale'})
+            return
+        if 'error' in result:
+            self._send_json(404, {'error': result['error']})
+            return
 
-            product = db.fetch_product(category, product_folder)
-            if not product:
-                self._send_json(404, {'error': 'Product not found'})
+        self._send_json(
+            200,
+            {
+                'ok': True,
+                'sale': result['sale'],
+                'stock_adjusted': result['stock_adjusted'],
+                'new_quantity': result['new_quantity'],
+            },
+        )
+
+    @ROUTES.route('POST', '/api/sales_batch', body='json')
+    def handle_post_sales_batch(self, parsed, data):
+        raw_lines = data.get('sales')
+        if not isinstance(raw_lines, list) or not raw_lines:
+            self._send_json(400, {'error': 'Missing sales'})
+            return
+        if len(raw_lines) > SALES_BATCH_MAX_LINES:
+            self._send_json(400, {'error': f'At most {SALES_BATCH_MAX_LINES} sales per batch'})
+            return
+        results = [None] * len(raw_lines)
+        lines = []
+        positions = []
+        for index, raw in enumerate(raw_lines):
+            line, error = parse_sale_line(raw) if isinstance(raw, dict) else (None, 'Invalid sale line')
+            if not error and not line['idempotency_key']:
+                error = 'Missing idempotency_key'
+            if error:
+                key = raw.get('idempotency_key') if isinstance(raw, dict) else None
+                results[index] = {'idempotency_key': key, 'status': 'invalid', 'error': error}
+                continue
+            lines.append(line)
+            positions.append(index)
+        stock = []
+        if lines:
+            batch = db.record_sales_batch(lines)
+            for index, result in zip(positions, batch['results']):
+                results[index] = result
+            stock = batch['stock']
+        counts = {}
+        for result in results:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        self._send_json(200, {'ok': True, 'results': results, 'counts': counts, 'stock': stock})
+
+    @ROUTES.route('POST', '/api/checkout', body='json')
+    def handle_post_checkout(self, parsed, data):
+        raw_lines = data.get('lines')
+        if not isinstance(raw_lines, list) or not raw_lines:
+            self._send_json(400, {'error': 'Missing lines'})
+            return
+        if len(raw_lines) > SALES_BATCH_MAX_LINES:
+            self._send_json(400, {'error': f'At most {SALES_BATCH_MAX_LINES} lines per basket'})
+            return
+        lines = []
+        for index, raw in enumerate(raw_lines, start=1):
+            if not isinstance(raw, dict):
+                self._send_json(400, {'error': f'Line {index}: invalid line'})
                 return
-            sku = (product.get('sku') or '').strip()
-            product_id = product.get('id')
-
-            updated = db.update_sale(
-                sale_id,
-                {
-                    'product_id': product_id,
-                    'category': category,
-                    'product_folder': product_folder,
-                    'sku': sku,
-                    'color': color,
-                    'size': size,
-                    'quantity': quantity,
-                    'unit_price': unit_price,
-                    'override_price': override_price,
-                    'payment_method': payment_method,
-                },
+            line, error = parse_sale_line(
+                {**raw, 'event_id': data.get('event_id'), 'sold_at': data.get('sold_at')}, require_price=False
             )
-            if not updated:
-                self._send_json(500, {'error': 'Failed to update sale'})
+            if error:
+                self._send_json(400, {'error': f'Line {index}: {error}'})
                 return
+            lines.append(line)
+        discount = None
+        discount_pct = None
+        try:
+            if str(data.get('discount') or '').strip():
+                discount = Decimal(str(data['discount']).strip()).quantize(Decimal('0.01'))
+            if str(data.get('discount_pct') or '').strip():
+                discount_pct = Decimal(str(data['discount_pct']).strip())
+        except (InvalidOperation, TypeError):
+            self._send_json(400, {'error': 'Invalid discount'})
+            return
+        if discount is not None and discount_pct is not None:
+            self._send_json(400, {'error': 'Send discount or discount_pct, not both'})
+            return
+        if (discount is not None and not (discount.is_finite() and discount >= 0)) or (
+            discount_pct is not None and not (discount_pct.is_finite() and 0 <= discount_pct <= 100)
+        ):
+            self._send_json(400, {'error': 'Invalid discount'})
+            return
+        basket = {
+            'event_id': lines[0]['event_id'],
+            'payment_method': (data.get('payment_method') or '').strip(),
+            'discount': discount,
+            'discount_pct': discount_pct,
+            'idempotency_key': str(data.get('idempotency_key') or '').strip()[:200],
+            'sold_at': lines[0]['sold_at'],
+            'lines': lines,
+        }
+        try:
+            result = db.checkout(basket)
+        except ValueError as exc:
+            self._send_json(400, {'error': str(exc)})
+            return
+        self._send_json(200, {'ok': True, **result})
 
-            stock_adjusted = False
-            new_qty = None
-            old_key = (
-                existing.get('category', ''),
-                existing.get('product_folder', ''),
-                existing.get('color', ''),
-                existing.get('size', ''),
-            )
-            try:
-                old_qty = int(existing.get('quantity') or 0)
-            except (TypeError, ValueError):
-                old_qty = 0
-            new_key = (category, product_folder, color, size)
-            if old_key == new_key:
-                existing_stock = db.get_stock_entry(category, product_folder, color, size)
-                if existing_stock:
-                    try:
-                        current_qty = int(existing_stock.get('quantity') or 0)
-                    except (TypeError, ValueError):
-                        current_qty = 0
-                    delta = quantity - old_qty
-                    updated_qty = current_qty - delta
-                    if updated_qty <= 0:
-                        db.delete_stock_entry(category, product_folder, color, size)
-                        new_qty = 0
-                    else:
-                        db.upsert_stock_entry(category, product_folder, sku, color, size, updated_qty)
-                        new_qty = updated_qty
-                    stock_adjusted = True
-            else:
-                old_stock = db.get_stock_entry(*old_key)
-                if old_stock:
-                    try:
-                        current_qty = int(old_stock.get('quantity') or 0)
-                    except (TypeError, ValueError):
-                        current_qty = 0
-                    updated_qty = current_qty + old_qty
-                    db.upsert_stock_entry(
-                        old_key[0],
-                        old_key[1],
-                        existing.get('sku') or '',
-                        old_key[2],
-                        old_key[3],
-                        updated_qty,
-                    )
-                    stock_adjusted = True
-                new_stock = db.get_stock_entry(category, product_folder, color, size)
-                if new_stock:
-                    try:
-                        current_qty = int(new_stock.get('quantity') or 0)
-                    except (TypeError, ValueError):
-                        current_qty = 0
-                    updated_qty = current_qty - quantity
-                    if updated_qty <= 0:
-                        db.delete_stock_entry(category, product_folder, color, size)
-                        new_qty = 0
-                    else:
-                        db.upsert_stock_entry(category, product_folder, sku, color, size, updated_qty)
-                        new_qty = updated_qty
-                    stock_adjusted = True
-
-            if old_key == new_key:
-                db.adjust_production_by_key(
-                    category,
-                    product_folder,
-                    sku,
-                    color,
-                    size,
-                    quantity - old_qty,
-                    'Queued',
-                )
-            else:
-                db.adjust_production_by_key(
-                    old_key[0],
-                    old_key[1],
-                    existing.get('sku') or '',
-                    old_key[2],
-                    old_key[3],
-                    -old_qty,
-                    'Queued',
-                )
-                db.adjust_production_by_key(
-                    category,
-                    product_folder,
-                    sku,
-                    color,
-                    size,
-                    quantity,
-                    'Queued',
-                )
-
-            self._send_json(
-                200,
-                {
-                    'ok': True,
-                    'sale': updated,
-                    'stock_adjusted': stock_adjusted,
-                    'new_quantity': new_qty,
-                },
-            )
+    @ROUTES.route('GET', '/api/sale_transaction')
+    def handle_get_sale_transaction(self, parsed, data):
+        query = parse_qs(parsed.query)
+        try:
+            transaction_id = int(query.get('id', [''])[0])
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid id'})
             return
+        result = db.fetch_sale_transaction(transaction_id)
+        if not result:
+            self._send_json(404, {'error': 'Transaction not found'})
+            return
+        self._send_json(200, result)
 
-        if parsed.path == '/api/sale_delete':
-            sale_id_raw = data.get('id')
+    @ROUTES.route('POST', '/api/sale_update', body='json')
+    def handle_post_sale_update(self, parsed, data):
+        sale_id_raw = data.get('id')
+        try:
+            sale_id = int(sale_id_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid sale id'})
+            return
+        existing = db.fetch_sale(sale_id)
+        if not existing:
+            self._send_json(404, {'error': 'Sale not found'})
+            return
+        event_id_raw = data.get('event_id')
+        if event_id_raw is not None:
             try:
-                sale_id = int(sale_id_raw)
+                event_id = int(event_id_raw)
             except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid sale id'})
+                self._send_json(400, {'error': 'Invalid event id'})
                 return
-            existing = db.fetch_sale(sale_id)
-            if not existing:
-                self._send_json(404, {'error': 'Sale not found'})
+            if event_id != existing.get('event_id'):
+                self._send_json(400, {'error': 'Event mismatch'})
                 return
-            event_id_raw = data.get('event_id')
-            if event_id_raw is not None:
-                try:
-                    event_id = int(event_id_raw)
-                except (TypeError, ValueError):
-                    self._send_json(400, {'error': 'Invalid event id'})
-                    return
-                if event_id != existing.get('event_id'):
-                    self._send_json(400, {'error': 'Event mismatch'})
-                    return
-            deleted = db.delete_sale(sale_id)
-            if not deleted:
-                self._send_json(500, {'error': 'Failed to delete sale'})
-                return
-            stock_adjusted = False
-            new_qty = None
-            category = existing.get('category', '')
-            product_folder = existing.get('product_folder', '')
-            color = existing.get('color', '')
-            size = existing.get('size', '')
-            try:
-                old_qty = int(existing.get('quantity') or 0)
-            except (TypeError, ValueError):
-                old_qty = 0
-            existing_stock = db.get_stock_entry(category, product_folder, color, size)
-            if existing_stock:
-                try:
-                    current_qty = int(existing_stock.get('quantity') or 0)
-                except (TypeError, ValueError):
-                    current_qty = 0
-                updated_qty = current_qty + old_qty
-                db.upsert_stock_entry(
-                    category,
-                    product_folder,
-                    existing.get('sku') or '',
-                    color,
-                    size,
-                    updated_qty,
-                )
-                stock_adjusted = True
-                new_qty = updated_qty
-            db.adjust_production_by_key(
-                category,
-                product_folder,
-                existing.get('sku') or '',
-                color,
-                size,
-                -old_qty,
-                'Queued',
-            )
-            self._send_json(
-                200,
-                {
-                    'ok': True,
-                    'stock_adjusted': stock_adjusted,
-                    'new_quantity': new_qty,
-                },
-            )
+        category = safe_path_component(data.get('category', ''))
+        product_folder = safe_path_component(data.get('product_folder', ''))
+        if not category or not product_folder:
+            self._send_json(400, {'error': 'Missing category/product_folder'})
             return
+        quantity_raw = data.get('quantity')
+        try:
+            quantity = int(quantity_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid quantity'})
+            return
+        if quantity <= 0:
+            self._send_json(400, {'error': 'Quantity must be greater than 0'})
+            return
+        unit_price_raw = (data.get('unit_price') or '').strip()
+        try:
+            unit_price = Decimal(unit_price_raw)
+        except (InvalidOperation, TypeError):
+            self._send_json(400, {'error': 'Invalid unit price'})
+            return
+        if unit_price < 0:
+            self._send_json(400, {'error': 'Unit price must be non-negative'})
+            return
+        unit_price = unit_price.quantize(Decimal('0.01'))
+        override_price = (data.get('override_price') or '').strip()
+        payment_method = (data.get('payment_method') or '').strip()
+        color = (data.get('color') or '').strip()
+        size = (data.get('size') or '').strip()
+
+        product = db.fetch_product(category, product_folder)
+        if not product:
+            self._send_json(404, {'error': 'Product not found'})
+            return
+        sku = (product.get('sku') or '').strip()
+        product_id = product.get('id')
 
-        if parsed.path == '/api/event_targets':
-            action = (data.get('action') or 'upsert').strip().lower()
-            if action == 'delete':
-                target_id = data.get('id')
-                try:
-                    target_id = int(target_id)
-                except (TypeError, ValueError):
-                    self._send_json(400, {'error': 'Invalid target id'})
-                    return
-                if not db.delete_event_target(target_id):
-                    self._send_json(404, {'error': 'Target not found'})
-                    return
-                self._send_json(200, {'ok': True})
-                return
+        result = db.record_sale_update(
+            sale_id,
+            {
+                'product_id': product_id,
+                'category': category,
+                'product_folder': product_folder,
+                'sku': sku,
+                'color': color,
+                'size': size,
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'override_price': override_price,
+                'payment_method': payment_method,
+            },
+        )
+        if not result:
+            self._send_json(500, {'error': 'Failed to update sale'})
+            return
 
-            event_id_raw = data.get('event_id')
+        self._send_json(
+            200,
+            {
+                'ok': True,
+                'sale': result['sale'],
+                'stock_adjusted': result['stock_adjusted'],
+                'new_quantity': result['new_quantity'],
+            },
+        )
+
+    @ROUTES.route('POST', '/api/sale_delete', body='json')
+    def handle_post_sale_delete(self, parsed, data):
+        sale_id_raw = data.get('id')
+        try:
+            sale_id = int(sale_id_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid sale id'})
+            return
+        existing = db.fetch_sale(sale_id)
+        if not existing:
+            self._send_json(404, {'error': 'Sale not found'})
+            return
+        event_id_raw = data.get('event_id')
+        if event_id_raw is not None:
             try:
                 event_id = int(event_id_raw)
             except (TypeError, ValueError):
                 self._send_json(400, {'error': 'Invalid event id'})
                 return
-            if not db.fetch_event(event_id):
-                self._send_json(404, {'error': 'Event not found'})
+            if event_id != existing.get('event_id'):
+                self._send_json(400, {'error': 'Event mismatch'})
                 return
-            category = safe_path_component(data.get('category', ''))
-            product_folder = safe_path_component(data.get('product_folder', ''))
-            color = (data.get('color') or '').strip()
-            size = (data.get('size') or '').strip()
-            target_qty_raw = data.get('target_qty', 0)
+        result = db.record_sale_delete(sale_id)
+        if not result:
+            self._send_json(500, {'error': 'Failed to delete sale'})
+            return
+        self._send_json(
+            200,
+            {
+                'ok': True,
+                'stock_adjusted': result['stock_adjusted'],
+                'new_quantity': result['new_quantity'],
+            },
+        )
+
+    @ROUTES.route('POST', '/api/event_targets', body='json')
+    def handle_post_event_targets(self, parsed, data):
+        action = (data.get('action') or 'upsert').strip().lower()
+        if action == 'delete':
+            target_id = data.get('id')
             try:
-                target_qty = int(target_qty_raw)
+                target_id = int(target_id)
             except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid target quantity'})
+                self._send_json(400, {'error': 'Invalid target id'})
                 return
-            if target_qty <= 0:
-                self._send_json(400, {'error': 'Target quantity must be greater than 0'})
+            if not db.delete_event_target(target_id):
+                self._send_json(404, {'error': 'Target not found'})
                 return
-            if not category or not product_folder:
-                self._send_json(400, {'error': 'Missing category/product_folder'})
-                return
-            product = db.fetch_product(category, product_folder)
-            if not product:
-                self._send_json(404, {'error': 'Product not found'})
-                return
-            sku = (product.get('sku') or '').strip()
-            target = db.upsert_event_target({
-                'event_id': event_id,
-                'product_id': product.get('id'),
-                'category': category,
-                'product_folder': product_folder,
-                'sku': sku,
-                'color': color,
-                'size': size,
-                'target_qty': target_qty,
-            })
-            if not target:
-                self._send_json(500, {'error': 'Failed to save target'})
-                return
-            self._send_json(200, {'ok': True, 'target': target})
+            self._send_json(200, {'ok': True})
+            return
+
+        event_id_raw = data.get('event_id')
+        try:
+            event_id = int(event_id_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid event id'})
+            return
+        if not db.fetch_event(event_id):
+            self._send_json(404, {'error': 'Event not found'})
+            return
+        category = safe_path_component(data.get('category', ''))
+        product_folder = safe_path_component(data.get('product_folder', ''))
+        color = (data.get('color') or '').strip()
+        size = (data.get('size') or '').strip()
+        target_qty_raw = data.get('target_qty', 0)
+        try:
+            target_qty = int(target_qty_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid target quantity'})
+            return
+        if target_qty <= 0:
+            self._send_json(400, {'error': 'Target quantity must be greater than 0'})
+            return
+        if not category or not product_folder:
+            self._send_json(400, {'error': 'Missing category/product_folder'})
+            return
+        product = db.fetch_product(category, product_folder)
+        if not product:
+            self._send_json(404, {'error': 'Product not found'})
+            return
+        sku = (product.get('sku') or '').strip()
+        target = db.upsert_event_target({
+            'event_id': event_id,
+            'product_id': product.get('id'),
+            'category': category,
+            'product_folder': product_folder,
+            'sku': sku,
+            'color': color,
+            'size': size,
+            'target_qty': target_qty,
+        })
+        if not target:
+            self._send_json(500, {'error': 'Failed to save target'})
             return
+        self._send_json(200, {'ok': True, 'target': target})
 
-        if parsed.path == '/api/supplies':
-            action = (data.get('action') or '').strip().lower()
-            if action == 'create':
-                supply = data.get('supply', {})
-                if not (supply.get('name') or '').strip():
-                    self._send_json(400, {'error': 'Supply name is required'})
-                    return
-                row = db.insert_supply(supply)
-                if not row:
-                    self._send_json(500, {'error': 'Failed to save supply'})
-                    return
-                self._send_json(200, {'row': row})
-                return
-            if action == 'update':
-                supply_id = data.get('id')
-                supply = data.get('supply', {})
-                try:
-                    supply_id = int(supply_id)
-                except (TypeError, ValueError):
-                    self._send_json(400, {'error': 'Invalid supply id'})
-                    return
-                if not (supply.get('name') or '').strip():
-                    self._send_json(400, {'error': 'Supply name is required'})
-                    return
-                if not db.update_supply(supply_id, supply):
-                    self._send_json(404, {'error': 'Supply not found'})
-                    return
-                self._send_json(200, {'ok': True})
+    @ROUTES.route('POST', '/api/supplies', body='json')
+    def handle_post_supplies(self, parsed, data):
+        action = (data.get('action') or '').strip().lower()
+        if action == 'create':
+            supply = data.get('supply', {})
+            if not (supply.get('name') or '').strip():
+                self._send_json(400, {'error': 'Supply name is required'})
                 return
-            if action == 'delete':
-                supply_id = data.get('id')
-                try:
-                    supply_id = int(supply_id)
-                except (TypeError, ValueError):
-                    self._send_json(400, {'error': 'Invalid supply id'})
-                    return
-                if not db.delete_supply(supply_id):
-                    self._send_json(404, {'error': 'Supply not found'})
-                    return
-                self._send_json(200, {'ok': True})
+            row = db.insert_supply(supply)
+            if not row:
+                self._send_json(500, {'error': 'Failed to save supply'})
                 return
-            self._send_json(400, {'error': 'Invalid action'})
+            self._send_json(200, {'row': row})
             return
-
-        if parsed.path == '/api/supply_adjust':
+        if action == 'update':
             supply_id = data.get('id')
-            delta = data.get('delta')
+            supply = data.get('supply', {})
             try:
                 supply_id = int(supply_id)
-                delta = int(delta)
             except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid supply adjustment'})
+                self._send_json(400, {'error': 'Invalid supply id'})
                 return
-            row = db.adjust_supply_quantity(supply_id, delta)
-            if not row:
+            if not (supply.get('name') or '').strip():
+                self._send_json(400, {'error': 'Supply name is required'})
+                return
+            if not db.update_supply(supply_id, supply):
                 self._send_json(404, {'error': 'Supply not found'})
                 return
-            self._send_json(200, {'row': row})
+            self._send_json(200, {'ok': True})
             return
-
-        if parsed.path == '/api/expenses':
-            action = (data.get('action') or '').strip().lower()
-            if action not in ('create', 'update', 'delete'):
-                self._send_json(400, {'error': 'Invalid action'})
+        if action == 'delete':
+            supply_id = data.get('id')
+            try:
+                supply_id = int(supply_id)
+            except (TypeError, ValueError):
+                self._send_json(400, {'error': 'Invalid supply id'})
                 return
-            if action == 'delete':
-                expense_id = data.get('id')
-                try:
-                    expense_id = int(expense_id)
-                except (TypeError, ValueError):
-                    self._send_json(400, {'error': 'Invalid expense id'})
-                    return
-                if not db.delete_expense(expense_id):
-                    self._send_json(404, {'error': 'Expense not found'})
-                    return
-                self._send_json(200, {'ok': True})
+            if not db.delete_supply(supply_id):
+                self._send_json(404, {'error': 'Supply not found'})
                 return
+            self._send_json(200, {'ok': True})
+            return
+        self._send_json(400, {'error': 'Invalid action'})
 
-            expense = data.get('expense', {})
-            expense_date = (expense.get('expense_date') or '').strip()
-            if not EVENT_DATE_RE.match(expense_date):
-                self._send_json(400, {'error': 'Invalid expense date'})
-                return
-            try:
-                amount_value = Decimal(str(expense.get('amount') or ''))
-            except (InvalidOperation, TypeError):
-                self._send_json(400, {'error': 'Invalid expense amount'})
-                return
-            if amount_value < 0:
-                self._send_json(400, {'error': 'Expense amount must be positive'})
-                return
-            receipt_path = (expense.get('receipt_path') or '').strip()
-            if receipt_path:
-                rel_clean = safe_rel_path(receipt_path)
-                if not rel_clean:
-                    self._send_json(400, {'error': 'Invalid receipt path'})
-                    return
-            expense['expense_date'] = expense_date
-            expense['amount'] = f"{amount_value:.2f}"
-            if action == 'create':
-                row = db.insert_expense(expense)
-                if not row:
-                    self._send_json(500, {'error': 'Failed to save expense'})
-                    return
-                self._send_json(200, {'row': row})
-                return
+    @ROUTES.route('POST', '/api/supply_adjust', body='json')
+    def handle_post_supply_adjust(self, parsed, data):
+        supply_id = data.get('id')
+        delta = data.get('delta')
+        try:
+            supply_id = int(supply_id)
+            delta = int(delta)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid supply adjustment'})
+            return
+        row = db.adjust_supply_quantity(supply_id, delta)
+        if not row:
+            self._send_json(404, {'error': 'Supply not found'})
+            return
+        self._send_json(200, {'row': row})
+
+    @ROUTES.route('POST', '/api/expenses', body='json')
+    def handle_post_expenses(self, parsed, data):
+        action = (data.get('action') or '').strip().lower()
+        if action not in ('create', 'update', 'delete'):
+            self._send_json(400, {'error': 'Invalid action'})
+            return
+        if action == 'delete':
             expense_id = data.get('id')
             try:
                 expense_id = int(expense_id)
             except (TypeError, ValueError):
                 self._send_json(400, {'error': 'Invalid expense id'})
                 return
-            if not db.update_expense(expense_id, expense):
+            if not db.delete_expense(expense_id):
                 self._send_json(404, {'error': 'Expense not found'})
                 return
             self._send_json(200, {'ok': True})
             return
 
-        if parsed.path == '/api/production':
-            action = (data.get('action') or '').strip().lower()
-            if action not in ('create', 'update', 'delete'):
-                self._send_json(400, {'error': 'Invalid action'})
-                return
-            if action == 'delete':
-                item_id = data.get('id')
-                try:
-                    item_id = int(item_id)
-                except (TypeError, ValueError):
-                    self._send_json(400, {'error': 'Invalid production id'})
-                    return
-                if not db.delete_production_item(item_id):
-                    self._send_json(404, {'error': 'Production item not found'})
-                    return
-                self._send_json(200, {'ok': True})
-                return
-            if action == 'update':
-                item_id = data.get('id')
-                status = (data.get('status') or '').strip() or 'Queued'
-                if status not in ('Queued', 'Printing'):
-                    self._send_json(400, {'error': 'Invalid status'})
-                    return
-                try:
-                    item_id = int(item_id)
-                except (TypeError, ValueError):
-                    self._send_json(400, {'error': 'Invalid production id'})
-                    return
-                if not db.update_production_status(item_id, status):
-                    self._send_json(404, {'error': 'Production item not found'})
-                    return
-                self._send_json(200, {'ok': True})
-                return
-
-            category = safe_path_component(data.get('category', ''))
-            product_folder = safe_path_component(data.get('product_folder', ''))
-            if not category or not product_folder:
-                self._send_json(400, {'error': 'Missing category/product_folder'})
-                return
-            quantity_raw = data.get('quantity')
-            try:
-                quantity = int(quantity_raw)
-            except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid quantity'})
-                return
-            if quantity <= 0:
-                self._send_json(400, {'error': 'Quantity must be greater than 0'})
-                return
-            status = (data.get('status') or '').strip() or 'Queued'
-            if status not in ('Queued', 'Printing'):
-                self._send_json(400, {'error': 'Invalid status'})
-                return
-            color = (data.get('color') or '').strip()
-            size = (data.get('size') or '').strip()
-            product = db.fetch_product(category, product_folder)
-            if not product:
-                self._send_json(404, {'error': 'Product not found'})
+        expense = data.get('expense', {})
+        expense_date = (expense.get('expense_date') or '').strip()
+        if not EVENT_DATE_RE.match(expense_date):
+            self._send_json(400, {'error': 'Invalid expense date'})
+            return
+        try:
+            amount_value = Decimal(str(expense.get('amount') or ''))
+        except (InvalidOperation, TypeError):
+            self._send_json(400, {'error': 'Invalid expense amount'})
+            return
+        if amount_value < 0:
+            self._send_json(400, {'error': 'Expense amount must be positive'})
+            return
+        receipt_path = (expense.get('receipt_path') or '').strip()
+        if receipt_path:
+            rel_clean = safe_rel_path(receipt_path)
+            if not rel_clean:
+                self._send_json(400, {'error': 'Invalid receipt path'})
                 return
-            sku = (product.get('sku') or '').strip()
-            row = db.insert_production_item(
-                {
-                    'category': category,
-                    'product_folder': product_folder,
-                    'sku': sku,
-                    'color': color,
-                    'size': size,
-                    'quantity': quantity,
-                    'status': status,
-                }
-            )
+        expense['expense_date'] = expense_date
+        expense['amount'] = f"{amount_value:.2f}"
+        if action == 'create':
+            row = db.insert_expense(expense)
             if not row:
-                self._send_json(500, {'error': 'Failed to save production item'})
+                self._send_json(500, {'error': 'Failed to save expense'})
                 return
             self._send_json(200, {'row': row})
             return
+        expense_id = data.get('id')
+        try:
+            expense_id = int(expense_id)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid expense id'})
+            return
+        if not db.update_expense(expense_id, expense):
+            self._send_json(404, {'error': 'Expense not found'})
+            return
+        self._send_json(200, {'ok': True})
 
-        if parsed.path == '/api/production_adjust':
+    @ROUTES.route('POST', '/api/production', body='json')
+    def handle_post_production(self, parsed, data):
+        action = (data.get('action') or '').strip().lower()
+        if action not in ('create', 'update', 'delete'):
+            self._send_json(400, {'error': 'Invalid action'})
+            return
+        if action == 'delete':
             item_id = data.get('id')
-            delta = data.get('delta')
             try:
                 item_id = int(item_id)
-                delta = int(delta)
             except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid production adjustment'})
+                self._send_json(400, {'error': 'Invalid production id'})
                 return
-            existing = db.fetch_production_item(item_id)
-            if not existing:
+            if not db.delete_production_item(item_id):
                 self._send_json(404, {'error': 'Production item not found'})
                 return
-            row = db.adjust_production_quantity(item_id, delta)
-            if not row:
-                self._send_json(200, {'ok': True, 'deleted': True})
-                return
-            self._send_json(200, {'row': row})
+            self._send_json(200, {'ok': True})
             return
-
-        if parsed.path == '/api/production_complete':
+        if action == 'update':
             item_id = data.get('id')
+            status = (data.get('status') or '').strip() or 'Queued'
+            if status not in ('Queued', 'Printing'):
+                self._send_json(400, {'error': 'Invalid status'})
+                return
             try:
                 item_id = int(item_id)
             except (TypeError, ValueError):
                 self._send_json(400, {'error': 'Invalid production id'})
                 return
-            item = db.fetch_production_item(item_id)
-            if not item:
+            if not db.update_production_status(item_id, status):
                 self._send_json(404, {'error': 'Production item not found'})
                 return
-            try:
-                quantity = int(item.get('quantity') or 0)
-            except (TypeError, ValueError):
-                quantity = 0
-            if quantity <= 0:
-                db.delete_production_item(item_id)
-                self._send_json(200, {'ok': True, 'stock_adjusted': False})
-                return
-            category = item.get('category', '')
-            product_folder = item.get('product_folder', '')
-            color = item.get('color', '')
-            size = item.get('size', '')
-            sku = item.get('sku', '')
-            existing_stock = db.get_stock_entry(category, product_folder, color, size)
-            if existing_stock:
-                try:
-                    current_qty = int(existing_stock.get('quantity') or 0)
-                except (TypeError, ValueError):
-                    current_qty = 0
-            else:
-                current_qty = 0
-            new_qty = current_qty + quantity
-            db.upsert_stock_entry(category, product_folder, sku, color, size, new_qty)
-            db.delete_production_item(item_id)
-            self._send_json(200, {'ok': True, 'stock_adjusted': True, 'new_quantity': new_qty})
+            self._send_json(200, {'ok': True})
+            return
+
+        category = safe_path_component(data.get('category', ''))
+        product_folder = safe_path_component(data.get('product_folder', ''))
+        if not category or not product_folder:
+            self._send_json(400, {'error': 'Missing category/product_folder'})
+            return
+        quantity_raw = data.get('quantity')
+        try:
+            quantity = int(quantity_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid quantity'})
+            return
+        if quantity <= 0:
+            self._send_json(400, {'error': 'Quantity must be greater than 0'})
+            return
+        status = (data.get('status') or '').strip() or 'Queued'
+        if status not in ('Queued', 'Printing'):
+            self._send_json(400, {'error': 'Invalid status'})
+            return
+        color = (data.get('color') or '').strip()
+        size = (data.get('size') or '').strip()
+        product = db.fetch_product(category, product_folder)
+        if not product:
+            self._send_json(404, {'error': 'Product not found'})
+            return
+        sku = (product.get('sku') or '').strip()
+        row = db.insert_production_item(
+            {
+                'category': category,
+                'product_folder': product_folder,
+                'sku': sku,
+                'color': color,
+                'size': size,
+                'quantity': quantity,
+                'status': status,
+            }
+        )
+        if not row:
+            self._send_json(500, {'error': 'Failed to save production item'})
+            return
+        self._send_json(200, {'row': row})
+
+    @ROUTES.route('POST', '/api/production_adjust', body='json')
+    def handle_post_production_adjust(self, parsed, data):
+        item_id = data.get('id')
+        delta = data.get('delta')
+        try:
+            item_id = int(item_id)
+            delta = int(delta)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid production adjustment'})
             return
+        existing = db.fetch_production_item(item_id)
+        if not existing:
+            self._send_json(404, {'error': 'Production item not found'})
+            return
+        row = db.adjust_production_quantity(item_id, delta)
+        if not row:
+            self._send_json(200, {'ok': True, 'deleted': True})
+            return
+        self._send_json(200, {'row': row})
+
+    @ROUTES.route('POST', '/api/production_complete', body='json')
+    def handle_post_production_complete(self, parsed, data):
+        item_id = data.get('id')
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid production id'})
+            return
+        result = db.complete_production(item_id)
+        if result is None:
+            self._send_json(404, {'error': 'Production item not found'})
+            return
+        if not result['stock_adjusted']:
+            self._send_json(200, {'ok': True, 'stock_adjusted': False})
+            return
+        self._send_json(200, {'ok': True, 'stock_adjusted': True, 'new_quantity': result['new_quantity']})
 
-        if parsed.path == '/api/save':
-            rows = data.get('rows') or []
-            if not isinstance(rows, list):
-                self._send_json(400, {'error': 'Invalid rows payload'})
+    @ROUTES.route('POST', '/api/save', body='json')
+    def handle_post_save(self, parsed, data):
+        rows = data.get('rows') or []
+        if not isinstance(rows, list):
+            self._send_json(400, {'error': 'Invalid rows payload'})
+            return
+        for row in rows:
+            if not (row.get('category') or '').strip() or not (row.get('product_folder') or '').strip():
+                self._send_json(400, {'error': 'Row missing category or product_folder'})
                 return
-            for row in rows:
-                if not (row.get('category') or '').strip() or not (row.get('product_folder') or '').strip():
-                    self._send_json(400, {'error': 'Row missing category or product_folder'})
-                    return
+        with fs_lock():
             existing_rows = db.fetch_products()
             existing_by_id = {
                 str(row.get('id')): row
@@ -2098,6 +2816,18 @@ class Handler(BaseHTTPRequestHandler):
                 for row in existing_rows
             }
             refresh_needed = False
+            updates = []
+            inserts = []
+            changed = []
+            # Folder moves and file renames done so far, undone if a later row
+            # or the database write fails.
+            undo = []
+
+            def fail(status, error):
+                for action in reversed(undo):
+                    action()
+                self._send_json(status, {'error': error})
+
             for row in rows:
                 row_id = row.get('id')
                 existing = None
@@ -2106,6 +2836,7 @@ class Handler(BaseHTTPRequestHandler):
                 if not existing:
                     existing = existing_by_key.get((row.get('category', ''), row.get('product_folder', '')))
                 if not existing:
+                    inserts.append(row)
                     continue
                 if 'Status' not in row and 'status' not in row:
                     row['Status'] = existing.get('Status')
@@ -2116,70 +2847,90 @@ class Handler(BaseHTTPRequestHandler):
                 new_category = safe_path_component(row.get('category', '')) or old_category
                 new_folder = normalize_folder_name(row.get('product_folder', ''), old_folder)
                 new_sku = (row.get('sku') or '').strip() or None
+                auto_renamed = False
                 if new_sku and old_sku and new_folder == old_folder:
                     new_folder, auto_renamed = derive_folder_for_sku(new_folder, old_sku, new_sku)
-                    if auto_renamed:
-                        row['product_folder'] = new_folder
-                        refresh_needed = True
+                row['category'] = new_category
+                row['product_folder'] = new_folder
+                fields = db.diff_product_row(existing, row)
+                if not fields:
+                    continue
+                if auto_renamed:
+                    refresh_needed = True
                 conflict = existing_by_key.get((new_category, new_folder))
                 if conflict and conflict.get('id') != existing.get('id'):
-                    self._send_json(409, {'error': 'Destination already exists'})
+                    fail(409, 'Destination already exists')
                     return
-                row['category'] = new_category
-                row['product_folder'] = new_folder
                 old_path = product_dir(old_category, old_folder, old_status)
                 new_path = product_dir(new_category, new_folder, old_status)
                 renamed_folder = False
-                sku_renames = []
                 if new_category != old_category or new_folder != old_folder:
                     if not old_path.exists():
-                        self._send_json(404, {'error': 'Source folder not found'})
+                        fail(404, 'Source folder not found')
                         return
                     if new_path.exists():
-                        self._send_json(409, {'error': 'Destination already exists'})
+                        fail(409, 'Destination already exists')
                         return
-                    old_path.rename(new_path)
+                    move_product_folder(old_path, new_path)
+                    undo.append(lambda src=new_path, dst=old_path: move_product_folder(src, dst))
                     renamed_folder = True
                     refresh_needed = True
                 target_path = new_path if renamed_folder else old_path
                 if new_sku and old_sku and new_sku != old_sku:
                     ok, error, sku_renames = apply_sku_renames_with_tracking(target_path, old_sku, new_sku)
                     if not ok:
-                        if renamed_folder:
-                            new_path.rename(old_path)
-                        self._send_json(409, {'error': error or 'Failed to rename files'})
+                        fail(409, error or 'Failed to rename files')
                         return
                     if sku_renames:
+                        undo.append(lambda renames=sku_renames: rollback_sku_renames(renames))
                         refresh_needed = True
-                if not db.update_product(old_category, old_folder, row):
-                    if sku_renames:
-                        rollback_sku_renames(sku_renames)
-                    if renamed_folder:
-                        new_path.rename(old_path)
-                    self._send_json(404, {'error': 'Row not found'})
-                    return
-                if new_category != old_category or new_folder != old_folder or new_sku:
-                    update_stock_refs(old_category, old_folder, new_category, new_folder, new_sku)
+                updates.append({
+                    'old_category': old_category,
+                    'old_product_folder': old_folder,
+                    'row': row,
+                    'stock_refs': 'category' in fields or 'product_folder' in fields or 'sku' in fields,
+                })
+                changed.append({
+                    'id': existing.get('id'),
+                    'category': new_category,
+                    'product_folder': new_folder,
+                    'fields': fields,
+                })
                 if renamed_folder:
                     existing_by_key.pop((old_category, old_folder), None)
                     existing_by_key[(new_category, new_folder)] = row
                     if row_id is not None:
                         existing_by_id[str(row_id)] = row
-            db.upsert_products(rows)
-            self._send_json(200, {'ok': True, 'refresh': refresh_needed})
+            try:
+                saved = db.save_product_changes(updates, inserts)
+            except Exception:
+                for action in reversed(undo):
+                    action()
+                raise
+            if not saved:
+                fail(404, 'Row not found')
+                return
+        self._send_json(200, {
+            'ok': True,
+            'refresh': refresh_needed,
+            'changed': changed,
+            'inserted': len(inserts),
+            'unchanged': len(rows) - len(changed) - len(inserts),
+        })
+
+    @ROUTES.route('POST', '/api/rename', body='json')
+    def handle_post_rename(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        old_name = safe_path_component(data.get('old_name', ''))
+        new_name = sanitize_folder_name(data.get('new_name', ''))
+        status = data.get('status', '')
+        if not category or not old_name or not new_name:
+            self._send_json(400, {'error': 'Missing category/old_name/new_name'})
             return
-
-        if parsed.path == '/api/rename':
-            category = safe_path_component(data.get('category', ''))
-            old_name = safe_path_component(data.get('old_name', ''))
-            new_name = sanitize_folder_name(data.get('new_name', ''))
-            status = data.get('status', '')
-            if not category or not old_name or not new_name:
-                self._send_json(400, {'error': 'Missing category/old_name/new_name'})
-                return
-            if not is_safe_component(new_name):
-                self._send_json(400, {'error': 'Invalid folder name'})
-                return
+        if not is_safe_component(new_name):
+            self._send_json(400, {'error': 'Invalid folder name'})
+            return
+        with fs_lock():
             if not db.product_exists(category, old_name):
                 self._send_json(404, {'error': 'Row not found'})
                 return
@@ -2194,9 +2945,9 @@ class Handler(BaseHTTPRequestHandler):
             if new_path.exists():
                 self._send_json(409, {'error': 'Destination already exists'})
                 return
-            old_path.rename(new_path)
+            move_product_folder(old_path, new_path)
             if not db.rename_product(category, old_name, new_name):
-                new_path.rename(old_path)
+                move_product_folder(new_path, old_path)
                 self._send_json(404, {'error': 'Row not found'})
                 return
             new_sku = None
@@ -2204,28 +2955,29 @@ class Handler(BaseHTTPRequestHandler):
             if existing:
                 new_sku = (existing.get('sku') or '').strip() or None
             update_stock_refs(category, old_name, category, new_name, new_sku)
-            self._send_json(200, {'ok': True})
+        self._send_json(200, {'ok': True})
+
+    @ROUTES.route('POST', '/api/update_row', body='json')
+    def handle_post_update_row(self, parsed, data):
+        old_category = safe_path_component(data.get('old_category', ''))
+        old_product_folder = safe_path_component(data.get('old_product_folder', ''))
+        row = data.get('row') or {}
+        if not old_category or not old_product_folder:
+            self._send_json(400, {'error': 'Missing old_category/old_product_folder'})
             return
-
-        if parsed.path == '/api/update_row':
-            old_category = safe_path_component(data.get('old_category', ''))
-            old_product_folder = safe_path_component(data.get('old_product_folder', ''))
-            row = data.get('row') or {}
-            if not old_category or not old_product_folder:
-                self._send_json(400, {'error': 'Missing old_category/old_product_folder'})
-                return
-            existing = db.fetch_product(old_category, old_product_folder)
-            if not existing:
-                self._send_json(404, {'error': 'Row not found'})
-                return
-            old_status = existing.get('Status') or 'Live'
-            old_sku = (existing.get('sku') or '').strip()
-            new_category = safe_path_component(row.get('category', '')) or old_category
-            new_folder = normalize_folder_name(row.get('product_folder', ''), old_product_folder)
-            new_sku = (row.get('sku') or '').strip() or None
-            if new_sku and old_sku and new_folder == old_product_folder:
-                new_folder, _ = derive_folder_for_sku(new_folder, old_sku, new_sku)
-                row['product_folder'] = new_folder
+        existing = db.fetch_product(old_category, old_product_folder)
+        if not existing:
+            self._send_json(404, {'error': 'Row not found'})
+            return
+        old_status = existing.get('Status') or 'Live'
+        old_sku = (existing.get('sku') or '').strip()
+        new_category = safe_path_component(row.get('category', '')) or old_category
+        new_folder = normalize_folder_name(row.get('product_folder', ''), old_product_folder)
+        new_sku = (row.get('sku') or '').strip() or None
+        if new_sku and old_sku and new_folder == old_product_folder:
+            new_folder, _ = derive_folder_for_sku(new_folder, old_sku, new_sku)
+            row['product_folder'] = new_folder
+        with fs_lock():
             if (
                 (new_category != old_category or new_folder != old_product_folder)
                 and db.product_exists(new_category, new_folder)
@@ -2249,221 +3001,238 @@ class Handler(BaseHTTPRequestHandler):
                 if new_path.exists():
                     self._send_json(409, {'error': 'Destination already exists'})
                     return
-                old_path.rename(new_path)
+                move_product_folder(old_path, new_path)
                 renamed_folder = True
             target_path = new_path if renamed_folder else old_path
             if new_sku and old_sku and new_sku != old_sku:
                 ok, error, sku_renames = apply_sku_renames_with_tracking(target_path, old_sku, new_sku)
                 if not ok:
                     if renamed_folder:
-                        new_path.rename(old_path)
+                        move_product_folder(new_path, old_path)
                     self._send_json(409, {'error': error or 'Failed to rename files'})
                     return
             if not db.update_product(old_category, old_product_folder, row):
                 if sku_renames:
                     rollback_sku_renames(sku_renames)
                 if renamed_folder:
-                    new_path.rename(old_path)
+                    move_product_folder(new_path, old_path)
                 self._send_json(404, {'error': 'Row not found'})
                 return
             if new_category != old_category or new_folder != old_product_folder or new_sku:
                 update_stock_refs(old_category, old_product_folder, new_category, new_folder, new_sku)
-            self._send_json(200, {'ok': True, 'row': row})
+        self._send_json(200, {'ok': True, 'row': row})
+
+    @ROUTES.route('POST', '/api/stock_adjust', body='json')
+    def handle_post_stock_adjust(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        product_folder = safe_path_component(data.get('product_folder', ''))
+        sku = (data.get('sku', '') or '').strip()
+        color = (data.get('color', '') or '').strip()
+        size = (data.get('size', '') or '').strip()
+        delta_raw = data.get('delta', 0)
+        try:
+            delta = int(delta_raw)
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid delta'})
+            return
+        if not category or not product_folder:
+            self._send_json(400, {'error': 'Missing category/product_folder'})
+            return
+        if delta == 0:
+            self._send_json(400, {'error': 'Delta must be non-zero'})
+            return
+        if not sku:
+            existing = db.fetch_product(category, product_folder)
+            if existing:
+                sku = (existing.get('sku') or '').strip()
+        result = db.adjust_stock(category, product_folder, sku, color, size, delta)
+        if result is None:
+            self._send_json(400, {'error': 'No existing stock entry to decrement'})
+            return
+        if result['removed']:
+            self._send_json(200, {'ok': True, 'quantity': 0, 'removed': True})
+            return
+        self._send_json(200, {'ok': True, 'quantity': result['quantity']})
+
+    @ROUTES.route('POST', '/api/stock_snapshot', body='json')
+    def handle_post_stock_snapshot(self, parsed, data):
+        note = str(data.get('note') or '').strip()
+        self._send_json(200, {'snapshot': db.take_stock_snapshot(note)})
+
+    @ROUTES.route('POST', '/api/readme', body='json')
+    def handle_post_readme(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        folder_name = safe_path_component(data.get('folder_name', ''))
+        action = data.get('action')
+        status = data.get('status', '')
+        if not category or not folder_name or action not in ('read', 'write'):
+            self._send_json(400, {'error': 'Missing category/folder_name/action'})
+            return
+        readme_path = product_dir(category, folder_name, status) / 'README.md'
+        if action == 'read':
+            content = readme_path.read_text(encoding='utf-8') if readme_path.exists() else ''
+            self._send_json(200, {'ok': True, 'content': content})
+            return
+        content = data.get('content', '')
+        readme_path.write_text(content, encoding='utf-8')
+        fs_index.invalidate(readme_path)
+        db.set_product_readme_text(category, folder_name, content)
+        self._send_json(200, {'ok': True})
+
+    @ROUTES.route('POST', '/api/product_meta', body='json')
+    def handle_post_product_meta(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        folder_name = safe_path_component(data.get('folder_name', ''))
+        if not category or not folder_name:
+            self._send_json(400, {'error': 'Missing category/folder_name'})
+            return
+        existing = db.fetch_product(category, folder_name)
+        if not existing:
+            self._send_json(404, {'error': 'Product not found'})
             return
 
-        if parsed.path == '/api/stock_adjust':
-            category = safe_path_component(data.get('category', ''))
-            product_folder = safe_path_component(data.get('product_folder', ''))
-            sku = (data.get('sku', '') or '').strip()
-            color = (data.get('color', '') or '').strip()
-            size = (data.get('size', '') or '').strip()
-            delta_raw = data.get('delta', 0)
-            try:
-                delta = int(delta_raw)
-            except (TypeError, ValueError):
-                self._send_json(400, {'error': 'Invalid delta'})
-                return
-            if not category or not product_folder:
-                self._send_json(400, {'error': 'Missing category/product_folder'})
-                return
-            if delta == 0:
-                self._send_json(400, {'error': 'Delta must be non-zero'})
-                return
-            if not sku:
-                existing = db.fetch_product(category, product_folder)
-                if existing:
-                    sku = (existing.get('sku') or '').strip()
-            matched = db.get_stock_entry(category, product_folder, color, size)
-            if matched:
-                try:
-                    current_qty = int(matched.get('quantity') or 0)
-                except (TypeError, ValueError):
-                    current_qty = 0
-                new_qty = current_qty + delta
-                if new_qty <= 0:
-                    db.delete_stock_entry(category, product_folder, color, size)
-                    self._send_json(200, {'ok': True, 'quantity': 0, 'removed': True})
-                    return
-                db.upsert_stock_entry(category, product_folder, sku, color, size, new_qty)
-                self._send_json(200, {'ok': True, 'quantity': new_qty})
-                return
-            if delta < 0:
-                self._send_json(400, {'error': 'No existing stock entry to decrement'})
-                return
-            db.upsert_stock_entry(category, product_folder, sku, color, size, delta)
-            self._send_json(200, {'ok': True, 'quantity': delta})
+        def normalize_field(value) -> str:
+            if value is None:
+                return ''
+            if isinstance(value, list):
+                return ', '.join([str(item).strip() for item in value if str(item).strip()])
+            return str(value).strip()
+
+        updated = dict(existing)
+        if 'tags' in data:
+            updated['tags'] = normalize_field(data.get('tags'))
+        if 'colors' in data or 'Colors' in data:
+            updated['Colors'] = normalize_field(data.get('colors', data.get('Colors')))
+        if 'sizes' in data or 'Sizes' in data:
+            updated['Sizes'] = normalize_field(data.get('sizes', data.get('Sizes')))
+
+        if not db.update_product(category, folder_name, updated):
+            self._send_json(404, {'error': 'Product not found'})
             return
 
-        if parsed.path == '/api/readme':
-            category = safe_path_component(data.get('category', ''))
-            folder_name = safe_path_component(data.get('folder_name', ''))
-            action = data.get('action')
-            status = data.get('status', '')
-            if not category or not folder_name or action not in ('read', 'write'):
-                self._send_json(400, {'error': 'Missing category/folder_name/action'})
-                return
+        readme_content = data.get('readme')
+        if readme_content is not None:
+            status = data.get('status', existing.get('Status') or 'Live')
             readme_path = product_dir(category, folder_name, status) / 'README.md'
-            if action == 'read':
-                content = readme_path.read_text(encoding='utf-8') if readme_path.exists() else ''
-                self._send_json(200, {'ok': True, 'content': content})
-                return
-            content = data.get('content', '')
-            readme_path.write_text(content, encoding='utf-8')
-            self._send_json(200, {'ok': True})
+            readme_path.write_text(str(readme_content), encoding='utf-8')
+            fs_index.invalidate(readme_path)
+            db.set_product_readme_text(category, folder_name, str(readme_content))
+
+        refreshed = db.fetch_product(category, folder_name)
+        self._send_json(200, {'ok': True, 'row': refreshed or updated})
+
+    @ROUTES.route('POST', '/api/pricing', body='json')
+    def handle_post_pricing(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        folder_name = safe_path_component(data.get('folder_name', ''))
+        action = (data.get('action') or '').strip().lower()
+        if not category or not folder_name or action not in ('read', 'write'):
+            self._send_json(400, {'error': 'Missing category/folder_name/action'})
             return
-
-        if parsed.path == '/api/product_meta':
-            category = safe_path_component(data.get('category', ''))
-            folder_name = safe_path_component(data.get('folder_name', ''))
-            if not category or not folder_name:
-                self._send_json(400, {'error': 'Missing category/folder_name'})
-                return
-            existing = db.fetch_product(category, folder_name)
-            if not existing:
-                self._send_json(404, {'error': 'Product not found'})
-                return
-
-            def normalize_field(value) -> str:
-                if value is None:
-                    return ''
-                if isinstance(value, list):
-                    return ', '.join([str(item).strip() for item in value if str(item).strip()])
-                return str(value).strip()
-
-            updated = dict(existing)
-            if 'tags' in data:
-                updated['tags'] = normalize_field(data.get('tags'))
-            if 'colors' in data or 'Colors' in data:
-                updated['Colors'] = normalize_field(data.get('colors', data.get('Colors')))
-            if 'sizes' in data or 'Sizes' in data:
-                updated['Sizes'] = normalize_field(data.get('sizes', data.get('Sizes')))
-
-            if not db.update_product(category, folder_name, updated):
+        if action == 'read':
+            pricing_data = db.get_pricing(category, folder_name)
+            if pricing_data is None:
                 self._send_json(404, {'error': 'Product not found'})
                 return
-
-            readme_content = data.get('readme')
-            if readme_content is not None:
-                status = data.get('status', existing.get('Status') or 'Live')
-                readme_path = product_dir(category, folder_name, status) / 'README.md'
-                readme_path.write_text(str(readme_content), encoding='utf-8')
-
-            refreshed = db.fetch_product(category, folder_name)
-            self._send_json(200, {'ok': True, 'row': refreshed or updated})
+            self._send_json(200, {'ok': True, 'pricing': pricing_data or {'base': {}, 'sizes': []}})
             return
-
-        if parsed.path == '/api/pricing':
-            category = safe_path_component(data.get('category', ''))
-            folder_name = safe_path_component(data.get('folder_name', ''))
-            action = (data.get('action') or '').strip().lower()
-            if not category or not folder_name or action not in ('read', 'write'):
-                self._send_json(400, {'error': 'Missing category/folder_name/action'})
-                return
-            if action == 'read':
-                pricing_data = db.get_pricing(category, folder_name)
-                if pricing_data is None:
-                    self._send_json(404, {'error': 'Product not found'})
-                    return
-                self._send_json(200, {'ok': True, 'pricing': pricing_data or {'base': {}, 'sizes': []}})
-                return
-            pricing_data = data.get('pricing') or {}
-            if not isinstance(pricing_data, dict):
-                self._send_json(400, {'error': 'Invalid pricing payload'})
-                return
-            if not db.set_pricing(category, folder_name, pricing_data):
-                self._send_json(404, {'error': 'Product not found'})
-                return
-            self._send_json(200, {'ok': True})
+        pricing_data = data.get('pricing') or {}
+        if not isinstance(pricing_data, dict):
+            self._send_json(400, {'error': 'Invalid pricing payload'})
             return
-
-        if parsed.path == '/api/add_product':
-            category = safe_path_component(data.get('category', ''))
-            description = sanitize_folder_name(data.get('description', ''))
-            tags = (data.get('tags') or '').strip()
-            requires_ukca = bool(data.get('requires_ukca'))
-            notes = (data.get('notes') or '').strip()
-            if not category or not description:
-                self._send_json(400, {'error': 'Missing category/description'})
-                return
-            if category not in CATEGORY_PREFIXES:
-                self._send_json(400, {'error': 'Unknown category'})
-                return
-            sku = next_sku_for_category(category)
-            if not sku:
-                self._send_json(500, {'error': 'Failed to create SKU'})
-                return
-            product_folder = f'{sku} - {description}'
-            product_path = DRAFT_DIR / category / product_folder
+        if not db.set_pricing(category, folder_name, pricing_data):
+            self._send_json(404, {'error': 'Product not found'})
+            return
+        self._send_json(200, {'ok': True})
+
+    @ROUTES.route('POST', '/api/add_product', body='json')
+    def handle_post_add_product(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        description = sanitize_folder_name(data.get('description', ''))
+        tags = (data.get('tags') or '').strip()
+        requires_ukca = bool(data.get('requires_ukca'))
+        notes = (data.get('notes') or '').strip()
+        if not category or not description:
+            self._send_json(400, {'error': 'Missing category/description'})
+            return
+        if category not in CATEGORY_PREFIXES:
+            self._send_json(400, {'error': 'Unknown category'})
+            return
+        row = {
+            'category': category,
+            'product_folder': '',
+            'sku': '',
+            'UKCA': 'No' if requires_ukca else 'N/A',
+            'Listings': '',
+            'tags': tags,
+            'Colors': '',
+            'Sizes': '',
+            'Cost To Make': '',
+            'Sale Price': '',
+            'Postage Price': '',
+            'Completed': '',
+            'Status': 'Draft',
+            'TikTok URL': '',
+            'Ebay URL': '',
+            'Etsy URL': '',
+        }
+
+        def create_folder(payload):
+            product_path = DRAFT_DIR / category / payload['product_folder']
             if product_path.exists():
-                self._send_json(409, {'error': 'Folder already exists'})
-                return
-            if db.product_exists(category, product_folder):
-                self._send_json(409, {'error': 'Row already exists'})
-                return
-            product_path.mkdir(parents=True, exist_ok=True)
+                raise FileExistsError(product_path)
+            product_path.mkdir(parents=True)
             (product_path / 'Media').mkdir(exist_ok=True)
             (product_path / 'STL').mkdir(exist_ok=True)
             (product_path / 'MISC').mkdir(exist_ok=True)
             if requires_ukca:
                 (product_path / 'UKCA').mkdir(exist_ok=True)
-            readme_path = product_path / 'README.md'
-            if not readme_path.exists():
-                content = readme_template(description, sku)
-                if notes:
-                    content = f"{content}\n## Notes\n{notes}\n"
-                readme_path.write_text(content, encoding='utf-8')
-
-            row = {
-                'category': category,
-                'product_folder': product_folder,
-                'sku': sku,
-                'UKCA': 'No' if requires_ukca else 'N/A',
-                'Listings': '',
-                'tags': tags,
-                'Colors': '',
-                'Sizes': '',
-                'Cost To Make': '',
-                'Sale Price': '',
-                'Postage Price': '',
-                'Completed': '',
-                'Status': 'Draft',
-                'TikTok URL': '',
-                'Ebay URL': '',
-                'Etsy URL': '',
-            }
-            inserted = db.insert_product(row)
-            if inserted and 'id' in inserted:
-                row['id'] = inserted['id']
-            self._send_json(200, {'ok': True, 'headers': db.PRODUCT_HEADERS, 'row': row})
-            return
-
-        if parsed.path == '/api/archive':
-            category = safe_path_component(data.get('category', ''))
-            folder_name = safe_path_component(data.get('folder_name', ''))
-            if not category or not folder_name:
-                self._send_json(400, {'error': 'Missing category/folder_name'})
+            content = readme_template(description, payload['sku'])
+            if notes:
+                content = f"{content}\n## Notes\n{notes}\n"
+            (product_path / 'README.md').write_text(content, encoding='utf-8')
+            fs_index.invalidate(product_path)
+
+        # The SKU is allocated in the insert transaction; if the folder cannot
+        # be created the row and the SKU number are rolled back.
+        with fs_lock():
+            try:
+                inserted = db.insert_product_with_new_sku(CATEGORY_PREFIXES[category], description, row, create_folder)
+            except FileExistsError:
+                self._send_json(409, {'error': 'Folder already exists'})
                 return
-            src_path = CATEGORIES_DIR / category / folder_name
+            except ValueError as exc:
+                self._send_json(409, {'error': str(exc)})
+                return
+        row.update(id=inserted['id'], sku=inserted['sku'], product_folder=inserted['product_folder'])
+        index_product_readme(category, inserted['product_folder'], 'Draft')
+        self._send_json(200, {'ok': True, 'headers': db.PRODUCT_HEADERS, 'row': row})
+
+    @ROUTES.route('POST', '/api/reserve_skus', body='json')
+    def handle_post_reserve_skus(self, parsed, data):
+        category = (data.get('category') or '').strip()
+        if category not in CATEGORY_PREFIXES:
+            self._send_json(400, {'error': 'Unknown category'})
+            return
+        try:
+            count = int(data.get('count', 1))
+        except (TypeError, ValueError):
+            self._send_json(400, {'error': 'Invalid count'})
+            return
+        if not 1 <= count <= SKU_RESERVE_MAX:
+            self._send_json(400, {'error': f'count must be between 1 and {SKU_RESERVE_MAX}'})
+            return
+        self._send_json(200, {'ok': True, 'skus': db.reserve_skus(CATEGORY_PREFIXES[category], count)})
+
+    @ROUTES.route('POST', '/api/archive', body='json')
+    def handle_post_archive(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        folder_name = safe_path_component(data.get('folder_name', ''))
+        if not category or not folder_name:
+            self._send_json(400, {'error': 'Missing category/folder_name'})
+            return
+        src_path = CATEGORIES_DIR / category / folder_name
+        with fs_lock():
             if not src_path.exists():
                 self._send_json(404, {'error': 'Source folder not found'})
                 return
@@ -2473,18 +3242,19 @@ class Handler(BaseHTTPRequestHandler):
             if dest_path.exists():
                 self._send_json(409, {'error': 'Destination already exists'})
                 return
-            src_path.rename(dest_path)
+            move_product_folder(src_path, dest_path)
             db.set_product_status(category, folder_name, 'Archived')
-            self._send_json(200, {'ok': True})
+        self._send_json(200, {'ok': True})
+
+    @ROUTES.route('POST', '/api/approve', body='json')
+    def handle_post_approve(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        folder_name = safe_path_component(data.get('folder_name', ''))
+        if not category or not folder_name:
+            self._send_json(400, {'error': 'Missing category/folder_name'})
             return
-
-        if parsed.path == '/api/approve':
-            category = safe_path_component(data.get('category', ''))
-            folder_name = safe_path_component(data.get('folder_name', ''))
-            if not category or not folder_name:
-                self._send_json(400, {'error': 'Missing category/folder_name'})
-                return
-            src_path = DRAFT_DIR / category / folder_name
+        src_path = DRAFT_DIR / category / folder_name
+        with fs_lock():
             if not src_path.exists():
                 self._send_json(404, {'error': 'Source folder not found'})
                 return
@@ -2494,18 +3264,19 @@ class Handler(BaseHTTPRequestHandler):
             if dest_path.exists():
                 self._send_json(409, {'error': 'Destination already exists'})
                 return
-            src_path.rename(dest_path)
+            move_product_folder(src_path, dest_path)
             db.set_product_status(category, folder_name, 'Live')
-            self._send_json(200, {'ok': True})
+        self._send_json(200, {'ok': True})
+
+    @ROUTES.route('POST', '/api/move_to_draft', body='json')
+    def handle_post_move_to_draft(self, parsed, data):
+        category = safe_path_component(data.get('category', ''))
+        folder_name = safe_path_component(data.get('folder_name', ''))
+        if not category or not folder_name:
+            self._send_json(400, {'error': 'Missing category/folder_name'})
             return
-
-        if parsed.path == '/api/move_to_draft':
-            category = safe_path_component(data.get('category', ''))
-            folder_name = safe_path_component(data.get('folder_name', ''))
-            if not category or not folder_name:
-                self._send_json(400, {'error': 'Missing category/folder_name'})
-                return
-            src_path = CATEGORIES_DIR / category / folder_name
+        src_path = CATEGORIES_DIR / category / folder_name
+        with fs_lock():
             if not src_path.exists():
                 self._send_json(404, {'error': 'Source folder not found'})
                 return
@@ -2515,20 +3286,205 @@ class Handler(BaseHTTPRequestHandler):
             if dest_path.exists():
                 self._send_json(409, {'error': 'Destination already exists'})
                 return
-            src_path.rename(dest_path)
+            move_product_folder(src_path, dest_path)
             db.set_product_status(category, folder_name, 'Draft')
-            self._send_json(200, {'ok': True})
+        self._send_json(200, {'ok': True})
+
+
+class BoundedThreadPoolHTTPServer(HTTPServer):
+    """HTTPServer that hands each connection to a fixed-size thread pool.
+
+    Accepting blocks once every worker is busy and the pending queue is full,
+    so a burst of slow uploads applies backpressure instead of spawning an
+    unbounded number of threads.
+    """
+
+    def __init__(self, server_address, handler_class, max_workers: int, bind_and_activate=True):
+        super().__init__(server_address, handler_class, bind_and_activate)
+        self.max_workers = max_workers
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+
+    def process_request(self, request, client_address):
+        if self._executor is None:
+            # Created lazily so prefork children each get their own pool.
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='http')
+        self._slots.acquire()
+        try:
+            self._executor.submit(self._process_request_worker, request, client_address)
+        except RuntimeError:
+            self._slots.release()
+            self.shutdown_request(request)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+
+def serve_prefork(server: HTTPServer, workers: int, worker_init=None):
+    # Children inherit the already-listening socket and the kernel spreads
+    # accepted connections across them. The parent only supervises.
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                if worker_init:
+                    worker_init()
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                children.discard(pid)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            print(f'Worker {pid} exited; restarting')
+            spawn()
+    server.server_close()
+
+
+def start_readme_sync():
+    def run():
+        try:
+            updated = sync_readme_index()
+        except Exception as exc:  # Search still works, just without README text
+            print(f'README search index sync failed: {exc}')
             return
+        if updated:
+            print(f'Indexed README text for {updated} products')
+
+    threading.Thread(target=run, name='readme-sync', daemon=True).start()
+
+
+def sync_print_files() -> dict | None:
+    """Index new or changed .3mf files across the catalogue; drop removed ones.
+
+    Returns None when another server process is already running the sync.
+    """
+    with db.try_advisory_lock('print_file_sync') as acquired:
+        if not acquired:
+            return None
+        known = db.fetch_print_file_states(threemf.EXTRACTOR_VERSION)
+        seen = set()
+        indexed = 0
+        for row in db.fetch_products():
+            product_path = product_dir(row['category'], row['product_folder'], row['Status'])
+            listing = fs_index.listing(product_path, fresh=True)
+            if listing is None:
+                continue
+            base_rel = product_path.relative_to(CATEGORIES_DIR).as_posix()
+            for entry in listing.with_kind('3mf'):
+                rel = f'{base_rel}/{entry.rel_path}'
+                seen.add(rel)
+                if known.get(rel) != (entry.size, entry.mtime_ns, True):
+                    threemf.index_file(product_path / entry.rel_path, rel, row['category'], row['product_folder'])
+                    indexed += 1
+        removed = db.prune_print_files([rel for rel in known if rel not in seen])
+    return {'indexed': indexed, 'removed': removed}
+
+
+def start_print_file_sync():
+    def run():
+        while True:
+            try:
+                result = sync_print_files()
+            except Exception as exc:  # Retried next interval; /api/3mf still indexes on demand
+                print(f'3MF print-file sync failed: {exc}')
+            else:
+                if result and (result['indexed'] or result['removed']):
+                    print(f"Indexed {result['indexed']} 3MF files, removed {result['removed']}")
+            time.sleep(PRINT_FILE_SYNC_SECONDS)
 
-        self.send_error(404)
+    threading.Thread(target=run, name='print-file-sync', daemon=True).start()
+
+
+def start_stock_snapshots():
+    def run():
+        while True:
+            time.sleep(STOCK_SNAPSHOT_INTERVAL_SECONDS)
+            try:
+                snapshot = db.maybe_take_stock_snapshot(STOCK_SNAPSHOT_MIN_MOVEMENTS)
+            except Exception as exc:  # Retried next interval; as-of queries just replay more
+                print(f'Stock snapshot failed: {exc}')
+                continue
+            if snapshot:
+                print(f"Stock snapshot {snapshot['id']} ({snapshot['rows']} rows)")
+
+    threading.Thread(target=run, name='stock-snapshots', daemon=True).start()
+
+
+def start_background_jobs():
+    start_stock_snapshots()
+    start_print_file_sync()
 
 
 def main():
     db.ensure_schema()
+    db.seed_sku_counters(CATEGORY_PREFIXES.values())
     port = int(os.environ.get('CSV_EDITOR_PORT', '8555'))
-    server = HTTPServer(('0.0.0.0', port), Handler)
-    print(f'Serving product manager at: http://localhost:{port}/')
-    server.serve_forever()
+    mode = SERVER_MODE
+    if mode == 'prefork' and not hasattr(os, 'fork'):
+        print('Prefork mode needs os.fork; falling back to threaded mode')
+        mode = 'threaded'
+    if mode == 'prefork' and auth_enabled() and not sessions.get_store().shared:
+        # In-memory sessions are per process, so a login handled by one
+        # worker would not be visible to the others.
+        print('Prefork mode needs SESSION_BACKEND=postgres when auth is enabled; falling back to threaded mode')
+        mode = 'threaded'
+    if mode == 'single':
+        server = HTTPServer(('0.0.0.0', port), Handler)
+    else:
+        server = BoundedThreadPoolHTTPServer(('0.0.0.0', port), Handler, SERVER_THREADS)
+    print(f'Serving product manager at: http://localhost:{port}/ (mode={mode})')
+    if mode == 'prefork':
+        # Pool threads and sockets must not be shared across fork(), so the
+        # README sync runs to completion before the workers start.
+        sync_readme_index()
+        db.close_pool()
+        serve_prefork(server, SERVER_WORKERS, worker_init=start_background_jobs)
+        return
+    start_readme_sync()
+    start_background_jobs()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
 
 
 if __name__ == '__main__':
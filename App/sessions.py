@@ -0,0 +1,118 @@
+"""Login session stores.
+
+``SESSION_BACKEND=memory`` (default) keeps sessions in this process with a
+min-heap of expiry times, so expiring old sessions costs O(log n) per expired
+entry instead of a scan per request. ``SESSION_BACKEND=postgres`` stores them
+in the ``auth_sessions`` table so they survive restarts and are shared by
+prefork workers and other nodes.
+"""
+import hashlib
+import heapq
+import os
+import secrets
+import threading
+import time
+
+import db
+
+SESSION_BACKEND = (os.environ.get('SESSION_BACKEND') or 'memory').strip().lower()
+SESSION_PURGE_INTERVAL_SECONDS = float(os.environ.get('SESSION_PURGE_INTERVAL_SECONDS', '60'))
+
+
+def new_session_id() -> str:
+    return secrets.token_hex(24)
+
+
+class MemorySessionStore:
+    shared = False
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}
+        self.expiry_heap = []
+
+    def create(self, username: str, ttl_seconds: int) -> str:
+        session_id = new_session_id()
+        expires_at = int(time.time()) + ttl_seconds
+        with self.lock:
+            self.sessions[session_id] = {'user': username, 'expires_at': expires_at}
+            heapq.heappush(self.expiry_heap, (expires_at, session_id))
+        return session_id
+
+    def _purge_expired(self, now: int):
+        heap = self.expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, session_id = heapq.heappop(heap)
+            session = self.sessions.get(session_id)
+            # Deleted sessions leave stale heap entries; skip those.
+            if session and session['expires_at'] == expires_at:
+                del self.sessions[session_id]
+
+    def get(self, session_id: str) -> dict | None:
+        now = int(time.time())
+        with self.lock:
+            self._purge_expired(now)
+            session = self.sessions.get(session_id)
+            if not session or session['expires_at'] <= now:
+                return None
+            return session
+
+    def delete(self, session_id: str):
+        with self.lock:
+            self.sessions.pop(session_id, None)
+
+    def count(self) -> int:
+        with self.lock:
+            return len(self.sessions)
+
+
+class PostgresSessionStore:
+    shared = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_purge = 0.0
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        # Only a hash is stored, so a database dump does not leak live cookies.
+        return hashlib.sha256(session_id.encode('utf-8')).hexdigest()
+
+    def create(self, username: str, ttl_seconds: int) -> str:
+        session_id = new_session_id()
+        db.insert_auth_session(self._key(session_id), username, ttl_seconds)
+        return session_id
+
+    def get(self, session_id: str) -> dict | None:
+        now = time.monotonic()
+        purge = False
+        with self.lock:
+            if now >= self.next_purge:
+                self.next_purge = now + SESSION_PURGE_INTERVAL_SECONDS
+                purge = True
+        if purge:
+            db.purge_auth_sessions()
+        return db.fetch_auth_session(self._key(session_id))
+
+    def delete(self, session_id: str):
+        db.delete_auth_session(self._key(session_id))
+
+    def count(self) -> int:
+        return db.count_auth_sessions()
+
+
+BACKENDS = {'memory': MemorySessionStore, 'postgres': PostgresSessionStore}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            backend = BACKENDS.get(SESSION_BACKEND)
+            if backend is None:
+                raise ValueError(f'Unknown SESSION_BACKEND: {SESSION_BACKEND}')
+            _store = backend()
+        return _store
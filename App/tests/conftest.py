@@ -0,0 +1,46 @@
+import os
+import secrets
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+
+# Per-category rows a test may leave behind, children first.
+CATEGORY_TABLES = ('stock', 'production_queue', 'products')
+
+
+def require_database():
+    if not os.environ.get('DATABASE_URL'):
+        pytest.skip('DATABASE_URL is not set')
+    db.ensure_schema()
+
+
+@pytest.fixture
+def temp_category():
+    """A unique ``_pytest-`` category whose products, stock and production queue rows are deleted afterwards."""
+    require_database()
+    name = f'_pytest-{secrets.token_hex(4)}'
+    yield name
+    with db.get_connection() as conn:
+        for table in CATEGORY_TABLES:
+            conn.execute(f'DELETE FROM {table} WHERE category = %s', (name,))
+
+
+@pytest.fixture
+def temp_event():
+    """Create events with ``temp_event(name, event_date)``; they and their sales are deleted afterwards."""
+    require_database()
+    created = []
+
+    def make(name: str, event_date: str) -> dict:
+        event = db.insert_event({'name': name, 'event_date': event_date})
+        created.append(event['id'])
+        return event
+
+    yield make
+    for event_id in created:
+        db.delete_event(event_id)
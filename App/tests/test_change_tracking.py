@@ -0,0 +1,74 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('DATABASE_URL is not set', allow_module_level=True)
+
+import db  # noqa: E402
+
+
+def test_changes_report_inserts_updates_and_deletes(temp_category):
+    start = db.fetch_changes(0)['cursor']
+    db.upsert_products([{'category': temp_category, 'product_folder': 'A', 'sku': 'GT-TST-00001'}])
+    db.upsert_stock_entry(temp_category, 'A', 'GT-TST-00001', 'Red', '', 3)
+
+    changes = db.fetch_changes(start)
+    assert [row['product_folder'] for row in changes['products'] if row['category'] == temp_category] == ['A']
+    stock_ids = [row['id'] for row in changes['stock'] if row['category'] == temp_category]
+    assert len(stock_ids) == 1
+    cursor = changes['cursor']
+    assert cursor > start
+
+    assert db.fetch_changes(cursor)['products'] == []
+    db.delete_stock_entry(temp_category, 'A', 'Red', '')
+    later = db.fetch_changes(cursor)
+    assert later['deleted']['stock'] == stock_ids
+    assert later['cursor'] > cursor
+
+
+def test_change_version_ignores_noop_updates(temp_category):
+    db.upsert_stock_entry(temp_category, 'A', 'GT-TST-00001', 'Red', '', 3)
+    version = db.fetch_change_version('stock')
+    with db.get_connection() as conn:
+        conn.execute('UPDATE stock SET quantity = quantity WHERE category = %s', (temp_category,))
+    assert db.fetch_change_version('stock') == version
+    db.upsert_stock_entry(temp_category, 'A', 'GT-TST-00001', 'Red', '', 4)
+    assert db.fetch_change_version('stock') != version
+
+
+def test_change_version_moves_when_an_earlier_version_commits_last(temp_category):
+    for color in ('Red', 'Blue'):
+        db.upsert_stock_entry(temp_category, 'A', 'GT-TST-00001', color, '', 1)
+    with db.get_connection() as slow:
+        slow.execute("UPDATE stock SET quantity = 2 WHERE category = %s AND color = 'Red'", (temp_category,))
+        with db.get_connection() as fast:
+            fast.execute("UPDATE stock SET quantity = 2 WHERE category = %s AND color = 'Blue'", (temp_category,))
+        before = db.fetch_change_version('stock')
+    assert db.fetch_change_version('stock') != before
+
+
+def test_changes_wait_for_open_writers_without_blocking_them(temp_category):
+    db.upsert_products([{'category': temp_category, 'product_folder': name, 'sku': ''} for name in ('Slow', 'Fast')])
+    start = db.fetch_changes(0)['cursor']
+    with db.get_connection() as slow:
+        # The first writer stays open; the second must neither wait for it
+        # nor let the cursor move past it.
+        slow.execute(
+            "UPDATE products SET tags = 'slow' WHERE category = %s AND product_folder = 'Slow'", (temp_category,)
+        )
+        with db.get_connection() as fast:
+            fast.execute("SET LOCAL lock_timeout = '2s'")
+            fast.execute(
+                "UPDATE products SET tags = 'fast' WHERE category = %s AND product_folder = 'Fast'", (temp_category,)
+            )
+        during = db.fetch_changes(start)
+        assert [row['product_folder'] for row in during['products'] if row['category'] == temp_category] == []
+    after = db.fetch_changes(during['cursor'])
+    assert sorted(row['product_folder'] for row in after['products'] if row['category'] == temp_category) == [
+        'Fast', 'Slow',
+    ]
@@ -0,0 +1,80 @@
+import os
+import secrets
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('DATABASE_URL is not set', allow_module_level=True)
+
+import db  # noqa: E402
+import server  # noqa: E402
+
+
+@pytest.fixture
+def basket_fixture(temp_category, temp_event):
+    category = temp_category
+    folders = ['GT-BSK-00001 - Frog', 'GT-BSK-00002 - Toad']
+    db.insert_product({'category': category, 'product_folder': folders[0], 'sku': 'GT-BSK-00001',
+                       'sale_price': '£4.00'})
+    event = temp_event('Checkout test', '2026-07-04')
+    db.upsert_stock_entry(category, folders[0], 'GT-BSK-00001', 'Green', '', 10)
+    return event['id'], category, folders
+
+
+def basket(event_id, category, folders, **extra):
+    lines = []
+    for raw in (
+        {'product_folder': folders[0], 'color': 'Green', 'quantity': 3},
+        {'product_folder': folders[1], 'sku': 'GT-BSK-00002', 'quantity': 1, 'unit_price': '2.50'},
+        {'product_folder': folders[0], 'color': 'Green', 'quantity': 1, 'override_price': '3'},
+    ):
+        line, error = server.parse_sale_line({'event_id': event_id, 'category': category, **raw}, require_price=False)
+        assert error is None
+        lines.append(line)
+    return {'event_id': event_id, 'payment_method': 'Card', 'lines': lines, **extra}
+
+
+def test_allocate_discount_sums_to_the_penny():
+    shares = db.allocate_discount([Decimal('12.00'), Decimal('2.50'), Decimal('3.00')], Decimal('1.00'))
+    assert shares == [Decimal('0.69'), Decimal('0.14'), Decimal('0.17')]
+    assert db.allocate_discount([Decimal('1.00')] * 3, Decimal('0.10')) == [Decimal('0.04'), Decimal('0.03'), Decimal('0.03')]
+    assert db.allocate_discount([Decimal('0')], Decimal('0')) == [Decimal('0.00')]
+
+
+def test_checkout_records_priced_basket(basket_fixture):
+    event_id, category, folders = basket_fixture
+    key = secrets.token_hex(8)
+    result = db.checkout(basket(event_id, category, folders, discount=Decimal('1.00'), idempotency_key=key))
+    header = result['transaction']
+    assert (header['items'], header['subtotal'], header['discount'], header['total']) == (5, '17.50', '1.00', '16.50')
+    assert [(line['unit_price'], line['discount'], line['line_total']) for line in result['lines']] == [
+        ('4.00', '0.69', '11.31'), ('2.50', '0.14', '2.36'), ('4.00', '0.17', '2.83'),
+    ]
+    assert result['lines'][2]['new_quantity'] == 6
+    assert db.get_stock_entry(category, folders[0], 'Green', '')['quantity'] == 6
+
+    totals = db.fetch_event_totals(event_id)
+    assert totals['total_revenue'] == server.calculate_event_totals(db.fetch_sales(event_id))['total_revenue'] == '16.50'
+    assert db.check_sales_rollups() == {'events': 0, 'days': 0, 'variants': 0}
+
+    again = db.checkout(basket(event_id, category, folders, discount=Decimal('1.00'), idempotency_key=key))
+    assert again['duplicate'] and again['transaction']['id'] == header['id']
+    assert len(again['lines']) == 3 and len(db.fetch_sales(event_id)) == 3
+
+
+def test_checkout_rejects_bad_baskets(basket_fixture):
+    event_id, category, folders = basket_fixture
+    with pytest.raises(ValueError, match='larger'):
+        db.checkout(basket(event_id, category, folders, discount=Decimal('50')))
+    unpriced = basket(event_id, category, folders)
+    unpriced['lines'][1]['unit_price'] = None
+    with pytest.raises(ValueError, match='No price for line 2'):
+        db.checkout(unpriced)
+    with pytest.raises(ValueError, match='Event not found'):
+        db.checkout(basket(event_id + 1000000, category, folders))
+    assert db.fetch_sales(event_id) == []
@@ -0,0 +1,81 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('DATABASE_URL is not set', allow_module_level=True)
+
+import db  # noqa: E402
+import server  # noqa: E402
+
+SALES = [
+    # sku, quantity, unit_price, override_price, payment_method, sold_at
+    ('GT-A', 2, '5.00', '4.50', 'Cash', '2026-03-07 10:05+00'),
+    ('GT-A', 1, '5.00', '', 'Card', '2026-03-07 10:40+00'),
+    ('GT-B', 1, '7.25', 'freebie', '', '2026-03-07 12:15+00'),
+    ('GT-B', 3, '7.25', '0', 'Card', '2026-03-07 12:20+00'),
+]
+
+
+@pytest.fixture
+def event_id(temp_event):
+    event = temp_event('Totals test', '2026-03-07')
+    with db.get_connection() as conn:
+        for sku, quantity, unit_price, override_price, payment_method, sold_at in SALES:
+            conn.execute(
+                """
+                INSERT INTO sales (event_id, sku, quantity, unit_price, override_price, payment_method, sold_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """,
+                (event['id'], sku, quantity, unit_price, override_price, payment_method, sold_at),
+            )
+    return event['id']
+
+
+def test_sql_totals_match_python_reference(event_id):
+    totals = db.fetch_event_totals(event_id)
+    reference = server.calculate_event_totals(db.fetch_sales(event_id))
+    assert totals['total_items'] == reference['total_items'] == 7
+    assert totals['total_revenue'] == reference['total_revenue'] == '21.25'
+    assert totals['payments'] == reference['payments'] == {'Card': '5.00', 'Cash': '9.00', 'Unknown': '7.25'}
+    assert (totals['sales'], totals['overridden']) == (4, 2)
+
+
+def test_sku_and_hourly_breakdowns(event_id):
+    totals = db.fetch_event_totals(event_id)
+    assert [(row['sku'], row['items'], row['revenue']) for row in totals['by_sku']] == [
+        ('GT-A', 3, '14.00'),
+        ('GT-B', 4, '7.25'),
+    ]
+    assert [(row['sales'], row['revenue'], row['cumulative_revenue']) for row in totals['hourly']] == [
+        (2, '14.00', '14.00'),
+        (2, '7.25', '21.25'),
+    ]
+
+    with db.get_connection() as conn:
+        conn.execute(
+            "UPDATE sales SET override_price = '6' WHERE event_id = %s AND override_price = 'freebie'",
+            (event_id,),
+        )
+    assert db.fetch_event_totals(event_id)['total_revenue'] == '20.00'
+
+
+def test_hourly_buckets_are_uk_local_time_during_bst(temp_event):
+    event = temp_event('BST totals test', '2026-07-04')
+    with db.get_connection() as conn:
+        # 23:30 UTC is 00:30 BST on the next day, the day sale_day() rolls it into.
+        for sold_at in ('2026-07-04 09:15+00', '2026-07-04 23:30+00'):
+            conn.execute(
+                "INSERT INTO sales (event_id, sku, quantity, unit_price, sold_at) VALUES (%s, 'GT-A', 1, '5.00', %s)",
+                (event['id'], sold_at),
+            )
+        days = [row[0] for row in conn.execute(
+            "SELECT sale_day(sold_at)::text FROM sales WHERE event_id = %s ORDER BY sold_at", (event['id'],)
+        )]
+    hours = [row['hour'] for row in db.fetch_event_totals(event['id'])['hourly']]
+    assert hours == ['2026-07-04 10:00:00', '2026-07-05 00:00:00']
+    assert [hour[:10] for hour in hours] == days
@@ -0,0 +1,77 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fs_index  # noqa: E402
+
+
+def age(root: Path):
+    """Back-date every directory so the listing is not treated as racy."""
+    for path in [root, *(p for p in root.rglob('*') if p.is_dir())]:
+        os.utime(path, (1_700_000_000, 1_700_000_000))
+
+
+@pytest.fixture
+def product(tmp_path):
+    root = tmp_path / 'GT-PRT-00001 - Dragon'
+    for name in ('Media', 'STL/Parts', 'MISC', '_Deleted'):
+        (root / name).mkdir(parents=True)
+    (root / 'README.md').write_text('# Dragon')
+    (root / 'Media' / 'b.jpg').write_bytes(b'b' * 10)
+    (root / 'Media' / 'a.png').write_bytes(b'a')
+    (root / 'Media' / '.upload-123').write_bytes(b'partial')
+    (root / 'STL' / 'Parts' / 'Head.3MF').write_bytes(b'3mf')
+    (root / '_Deleted' / 'Old.3mf').write_bytes(b'old')
+    age(root)
+    return root
+
+
+def test_listing_kinds_order_and_skips(product):
+    listing = fs_index.FsIndex().listing(product)
+    assert [entry.rel_path for entry in listing.files] == [
+        'Media/a.png', 'Media/b.jpg', 'README.md', 'STL/Parts/Head.3MF',
+    ]
+    assert [(entry.name, entry.size, entry.kind) for entry in listing.in_dir('Media')] == [
+        ('a.png', 1, 'image'), ('b.jpg', 10, 'image'),
+    ]
+    assert [entry.rel_path for entry in listing.with_kind('3mf')] == ['STL/Parts/Head.3MF']
+    assert listing.exists('STL/Parts') and not listing.exists('_Deleted/Old.3mf')
+    assert fs_index.FsIndex().listing(product / 'missing') is None
+
+
+def test_cache_hits_revalidates_and_invalidates(product):
+    index = fs_index.FsIndex(check_seconds=3600)
+    first = index.listing(product)
+    assert index.listing(product) is first
+    (product / 'Media' / 'c.gif').write_bytes(b'c')
+    assert index.listing(product) is first
+    refreshed = index.listing(product, fresh=True)
+    assert refreshed is not first and refreshed.exists('Media/c.gif')
+
+    age(product)
+    index.listing(product)
+    assert index.listing(product, fresh=True).exists('Media/c.gif')
+    index.invalidate(product / 'Media' / 'c.gif')
+    assert index.stats()['products'] == 0
+    index.listing(product)
+    stats = index.stats()
+    assert (stats['products'], stats['hits'], stats['misses'], stats['revalidations'], stats['invalidations']) == (
+        1, 3, 4, 2, 1,
+    )
+
+
+def test_recent_changes_are_rescanned_and_lru_evicts(tmp_path, product):
+    index = fs_index.FsIndex(max_products=1, check_seconds=3600)
+    (product / 'MISC' / 'notes.txt').write_text('racy')
+    assert index.listing(product).racy
+    assert index.listing(product).exists('MISC/notes.txt')
+    assert index.stats()['misses'] == 2
+
+    other = tmp_path / 'Other'
+    other.mkdir()
+    index.listing(other)
+    assert index.stats()['evictions'] == 1 and index.stats()['products'] == 1
@@ -0,0 +1,111 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import lookup_index  # noqa: E402
+
+
+def product(product_id, folder, sku, tags='', category='Prints'):
+    return {'id': product_id, 'category': category, 'product_folder': folder, 'sku': sku, 'tags': tags}
+
+
+def stock(stock_id, folder, color, size, quantity, category='Prints'):
+    return {
+        'id': stock_id, 'category': category, 'product_folder': folder, 'sku': '',
+        'color': color, 'size': size, 'quantity': quantity,
+    }
+
+
+def changes(cursor, products=(), stock_rows=(), deleted_products=(), deleted_stock=()):
+    return {
+        'cursor': cursor,
+        'products': list(products),
+        'stock': list(stock_rows),
+        'deleted': {'products': list(deleted_products), 'stock': list(deleted_stock)},
+    }
+
+
+def build_index():
+    index = lookup_index.LookupIndex()
+    index.load(changes(
+        5,
+        [
+            product(1, 'Dragon Planter', 'PRT-0001', 'green, plant'),
+            product(2, 'Dragon Egg', 'PRT-0002'),
+            product(3, 'Cat Planter', 'PRT-0010'),
+        ],
+        [
+            stock(10, 'Dragon Planter', 'Green', 'L', 2),
+            stock(11, 'Dragon Planter', 'Blue', 'S', 3),
+        ],
+    ))
+    return index
+
+
+def test_search_orders_exact_sku_then_prefix_then_tokens():
+    index = build_index()
+    exact = index.search('prt-0001')
+    assert [(item['match'], item['product']['id']) for item in exact] == [('sku', 1)]
+    assert exact[0]['total_quantity'] == 5
+    assert [item['color'] for item in exact[0]['stock']] == ['Blue', 'Green']
+
+    prefix = index.search('PRT-000')
+    assert [item['product']['id'] for item in prefix] == [1, 2]
+    assert {item['match'] for item in prefix} == {'sku_prefix'}
+
+    names = index.search('plan')
+    assert [item['product']['id'] for item in names] == [1, 3]
+    assert [item['product']['id'] for item in index.search('drag plant')] == [1]
+    assert [item['product']['id'] for item in index.search('green')] == [1]
+    assert index.search('dragon', limit=1)[0]['product']['id'] in {1, 2}
+    assert index.search('  ') == []
+
+
+def test_apply_handles_renames_and_deletes():
+    index = build_index()
+    index.apply(changes(
+        9,
+        [product(2, 'Wyvern Egg', 'PRT-0020')],
+        [stock(12, 'Wyvern Egg', 'Red', 'M', 1)],
+        deleted_products=[3],
+        deleted_stock=[11],
+    ))
+    assert index.cursor == 9
+    assert index.search('PRT-0002') == []
+    assert [item['product']['id'] for item in index.search('wyvern')] == [2]
+    assert index.search('wyvern')[0]['total_quantity'] == 1
+    assert [item['product']['id'] for item in index.search('planter')] == [1]
+    assert index.search('PRT-0001')[0]['total_quantity'] == 2
+    assert index.stats() == {'cursor': 9, 'products': 2, 'stock_rows': 2, 'tokens': len(index.tokens_sorted)}
+
+
+def test_duplicate_sku_takes_over_exact_match():
+    index = lookup_index.LookupIndex()
+    index.load(changes(1, [product(1, 'Fox', 'GT-A-1'), product(2, 'Fox Copy', 'GT-A-1')]))
+    assert [(item['product']['id'], item['match']) for item in index.search('gt-a-1')] == [(1, 'sku'), (2, 'sku_prefix')]
+    index.apply(changes(2, [product(1, 'Fox', 'GT-A-9')]))
+    assert [(item['product']['id'], item['match']) for item in index.search('GT-A-1')] == [(2, 'sku')]
+    index.apply(changes(3, deleted_products=[2]))
+    assert index.search('GT-A-1') == []
+
+
+def test_refresh_loads_once_then_applies_deltas(monkeypatch):
+    calls = []
+
+    def fake_fetch_changes(since):
+        calls.append(since)
+        if since == 0:
+            return changes(4, [product(1, 'Dragon Planter', 'PRT-0001')])
+        return changes(6, [product(1, 'Dragon Planter', 'PRT-0099')])
+
+    monkeypatch.setattr(lookup_index.db, 'fetch_changes', fake_fetch_changes)
+    monkeypatch.setattr(lookup_index, 'LOOKUP_REFRESH_SECONDS', 3600)
+    index = lookup_index.LookupIndex()
+    index.refresh()
+    index.refresh()
+    assert calls == [0]
+    index.mark_stale()
+    index.refresh()
+    assert calls == [0, 4]
+    assert index.search('PRT-0099')[0]['match'] == 'sku'
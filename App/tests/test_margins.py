@@ -0,0 +1,63 @@
+import os
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('DATABASE_URL is not set', allow_module_level=True)
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def category(temp_category):
+    db.upsert_products([
+        {'category': temp_category, 'product_folder': 'A', 'Cost To Make': '4.19', 'Sale Price': '20',
+         'Postage Price': '2.97'},
+        {'category': temp_category, 'product_folder': 'B', 'Cost To Make': '1', 'Sale Price': '£5', 'Status': 'Draft'},
+        {'category': temp_category, 'product_folder': 'C', 'Sale Price': 'ten'},
+    ])
+    return temp_category
+
+
+def test_margins_and_rollups_are_computed_in_sql(category):
+    result = db.fetch_margins({'category': category}, sort='margin', descending=True)
+    by_folder = {row['product_folder']: row for row in result['products']}
+    assert [row['product_folder'] for row in result['products']] == ['A', 'B', 'C']
+    assert by_folder['A']['margin'] == '15.81'
+    assert by_folder['A']['margin_pct'] == '79.1'
+    assert by_folder['A']['profit_after_postage'] == '12.84'
+    assert by_folder['B']['markup_pct'] == '400.0'
+    assert by_folder['C']['margin'] is None
+
+    total = result['groups']['total']
+    assert (total['products'], total['costed']) == (3, 2)
+    # Weighted: (15.81 + 4.00) / (20 + 5)
+    assert total['margin_pct'] == '79.2'
+    assert {row['status']: row['products'] for row in result['groups']['status']} == {'Draft': 1, 'Live': 2}
+
+    unparsed = [row for row in db.fetch_unparsed_prices() if row['category'] == category]
+    assert [(row['product_folder'], row['field'], row['value']) for row in unparsed] == [('C', 'Sale Price', 'ten')]
+
+
+def test_reprice_preview_and_trigger_sync(category):
+    preview = db.fetch_margins({'category': category, 'status': 'live'}, Decimal('10'), Decimal('-0.01'), sort='folder')
+    row = preview['products'][0]
+    assert (row['proposed_price'], row['proposed_margin']) == ('21.99', '17.80')
+    assert len(preview['products']) == 2
+
+    stored = db.fetch_product(category, 'C')
+    stored['Sale Price'] = '12.5'
+    stored['Cost To Make'] = '2.50'
+    db.update_product(category, 'C', stored)
+    row = next(row for row in db.fetch_margins({'category': category})['products'] if row['product_folder'] == 'C')
+    assert (row['sale_price'], row['margin']) == ('12.50', '10.00')
+    assert 'proposed_price' not in row
+    assert db.fetch_product(category, 'C')['Sale Price'] == '12.5'
+
+    with pytest.raises(ValueError):
+        db.fetch_margins({}, sort='bogus')
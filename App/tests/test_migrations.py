@@ -0,0 +1,99 @@
+import os
+import secrets
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import schema_migrations  # noqa: E402
+
+
+def write(directory: Path, name: str, sql: str) -> Path:
+    path = directory / name
+    path.write_text(sql, encoding='utf-8')
+    return path
+
+
+def test_repo_migrations_parse():
+    migrations = schema_migrations.discover()
+    assert [migration.version for migration in migrations] == sorted({m.version for m in migrations})
+    concurrent = [migration for migration in migrations if not migration.transactional]
+    assert concurrent and all(migration.concurrent_indexes() for migration in concurrent)
+
+
+def test_markers_and_statement_split(tmp_path):
+    path = write(tmp_path, '0002_indexes.sql', (
+        '-- migrate: no-transaction\n'
+        '-- comment\n'
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS a_idx\n    ON a (x);\n\n'
+        'CREATE UNIQUE INDEX CONCURRENTLY b_idx ON b (y);\n'
+    ))
+    migration = schema_migrations.Migration(path)
+    assert (migration.version, migration.name) == (2, 'indexes')
+    assert not migration.transactional and not migration.optional
+    assert migration.statements() == [
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS a_idx\n    ON a (x);',
+        'CREATE UNIQUE INDEX CONCURRENTLY b_idx ON b (y);',
+    ]
+    assert migration.concurrent_indexes() == ['a_idx', 'b_idx']
+
+    write(tmp_path, '2_dup.sql', 'SELECT 1;')
+    with pytest.raises(schema_migrations.MigrationError):
+        schema_migrations.discover(tmp_path)
+    with pytest.raises(schema_migrations.MigrationError):
+        schema_migrations.Migration(write(tmp_path, 'notes.sql', ''))
+    with pytest.raises(schema_migrations.MigrationError):
+        schema_migrations.Migration(write(tmp_path, '0003_x.sql', '-- migrate: sometimes\n'))
+
+
+@pytest.fixture
+def scratch():
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        pytest.skip('DATABASE_URL is not set')
+    suffix = secrets.token_hex(4)
+    names = {'table': f'_pytest_migrations_{suffix}', 'data': f'_pytest_mig_data_{suffix}'}
+    yield database_url, names
+    with schema_migrations.psycopg.connect(database_url, autocommit=True) as conn:
+        conn.execute(f"DROP TABLE IF EXISTS {names['table']}, {names['data']}")
+
+
+def test_concurrent_runners_apply_each_migration_once(tmp_path, scratch):
+    database_url, names = scratch
+    data = names['data']
+    write(tmp_path, '0001_create.sql', f'CREATE TABLE {data} (step TEXT NOT NULL);\nINSERT INTO {data} VALUES (\'create\');\n')
+    write(tmp_path, '0002_index.sql', (
+        f'-- migrate: no-transaction\nCREATE INDEX CONCURRENTLY IF NOT EXISTS {data}_idx ON {data} (step);\n'
+        f"INSERT INTO {data} VALUES ('index');\n"
+    ))
+    write(tmp_path, '0003_optional.sql', '-- migrate: optional\nCREATE EXTENSION IF NOT EXISTS no_such_extension_here;\n')
+    write(tmp_path, '0004_after.sql', f"INSERT INTO {data} VALUES ('after');\n")
+
+    results = []
+    logs = []
+
+    def run():
+        results.append(schema_migrations.migrate(database_url, tmp_path, names['table'], log=logs.append))
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 4
+    assert sorted(version for applied in results for version in applied) == [1, 2, 4]
+    assert any('0003_optional.sql skipped' in line for line in logs)
+    with schema_migrations.psycopg.connect(database_url) as conn:
+        steps = [row[0] for row in conn.execute(f'SELECT step FROM {data} ORDER BY step')]
+        valid = conn.execute(
+            'SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)', (f'{data}_idx',)
+        ).fetchone()
+    assert steps == ['after', 'create', 'index']
+    assert valid == (True,)
+    assert schema_migrations.migrate(database_url, tmp_path, names['table']) == []
+    statuses = schema_migrations.status(database_url, tmp_path, names['table'])
+    assert [row['skipped'] for row in statuses] == [False, False, True, False]
@@ -0,0 +1,75 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import multipart_stream  # noqa: E402
+
+BOUNDARY = 'XyZBoundary'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+
+
+def build_body(fields: list, files: list) -> bytes:
+    parts = []
+    for name, value in fields:
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode('utf-8')
+            + value.encode('utf-8') + b'\r\n'
+        )
+    for name, filename, content in files:
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8')
+            + content + b'\r\n'
+        )
+    return b''.join(parts) + f'--{BOUNDARY}--\r\n'.encode('utf-8')
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64 * 1024])
+def test_parse_stream_handles_any_chunk_size(chunk_size):
+    payload = (b'\r\n--' + BOUNDARY.encode('utf-8')[:-1] + b'x') * 50 + bytes(range(256))
+    body = build_body([('category', 'Toys'), ('sku', 'GT-TOY-00001')], [('files', 'a.bin', payload), ('files', 'b.bin', b'')])
+    seen_fields = []
+
+    def open_file(fields, name, filename):
+        seen_fields.append(dict(fields))
+        return io.BytesIO()
+
+    fields, files = multipart_stream.parse_stream(io.BytesIO(body), CONTENT_TYPE, len(body), open_file, chunk_size)
+    assert fields == {'category': 'Toys', 'sku': 'GT-TOY-00001'}
+    assert [item['filename'] for item in files] == ['a.bin', 'b.bin']
+    assert files[0]['file'].getvalue() == payload
+    assert files[0]['size'] == len(payload)
+    assert files[1]['size'] == 0
+    assert seen_fields[0] == fields
+
+
+def test_temp_upload_commits_without_overwriting(tmp_path):
+    body = build_body([], [('file', 'receipt.pdf', b'PDF' * 1000)])
+
+    fields, files = multipart_stream.parse_stream(
+        io.BytesIO(body), CONTENT_TYPE, len(body), lambda fields, name, filename: multipart_stream.TempUpload(tmp_path), 100
+    )
+    upload = files[0]['file']
+    (tmp_path / 'taken.pdf').write_bytes(b'old')
+    with pytest.raises(FileExistsError):
+        upload.commit(tmp_path / 'taken.pdf')
+    upload.commit(tmp_path / 'receipt.pdf')
+    assert (tmp_path / 'receipt.pdf').read_bytes() == b'PDF' * 1000
+    assert (tmp_path / 'taken.pdf').read_bytes() == b'old'
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['receipt.pdf', 'taken.pdf']
+
+
+def test_truncated_body_discards_temp_files(tmp_path):
+    body = build_body([], [('file', 'clip.mp4', b'0' * 5000)])
+    truncated = body[:3000]
+
+    with pytest.raises(multipart_stream.MultipartError):
+        multipart_stream.parse_stream(
+            io.BytesIO(truncated), CONTENT_TYPE, len(truncated),
+            lambda fields, name, filename: multipart_stream.TempUpload(tmp_path),
+        )
+    assert list(tmp_path.iterdir()) == []
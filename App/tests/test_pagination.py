@@ -0,0 +1,86 @@
+import os
+import secrets
+import sys
+from pathlib import Path
+from urllib.parse import urlparse
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+import server  # noqa: E402
+
+
+def test_page_request_only_pages_when_asked():
+    assert server.page_request(urlparse('/api/expenses'), 'expenses') is None
+    assert server.page_request(urlparse('/api/expenses?format=columns'), 'expenses') is None
+    request = server.page_request(urlparse('/api/expenses?category=Filament&sort=-date&limit=5&bogus=1'), 'expenses')
+    assert request == {'filters': {'category': 'Filament'}, 'sort': '-date', 'cursor': None, 'limit': '5'}
+    assert server.page_request(urlparse('/api/sales_recent'), 'sales', always=True)['limit'] == '100'
+
+
+def test_page_cursor_round_trips_and_rejects_garbage():
+    cursor = db.encode_page_cursor('date', True, ['2024-01-02', 7])
+    assert db.decode_page_cursor(cursor) == ('date', True, ['2024-01-02', 7])
+    with pytest.raises(ValueError):
+        db.decode_page_cursor('not-a-cursor')
+
+
+@pytest.fixture
+def expense_category():
+    if not os.environ.get('DATABASE_URL'):
+        pytest.skip('DATABASE_URL is not set')
+    db.ensure_schema()
+    name = f'_pytest-{secrets.token_hex(4)}'
+    for index in range(25):
+        db.insert_expense({
+            'expense_date': f'2024-01-{index % 10 + 1:02d}',
+            'vendor': 'Vendor',
+            'category': name,
+            'amount': f'{index}.50',
+            'payment_method': 'Card' if index % 2 else 'Cash',
+        })
+    yield name
+    with db.get_connection() as conn:
+        conn.execute('DELETE FROM expenses WHERE category = %s', (name,))
+
+
+def walk(name, filters, sort=None, limit=4):
+    rows, cursor = [], None
+    while True:
+        page = db.fetch_page(name, filters, sort=sort, cursor=cursor, limit=limit)
+        rows.extend(page['rows'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return rows
+
+
+def test_keyset_pages_cover_every_row_in_order(expense_category):
+    rows = walk('expenses', {'category': expense_category})
+    assert len(rows) == 25
+    assert len({row['id'] for row in rows}) == 25
+    keys = [(row['expense_date'], row['id']) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+
+    ascending = walk('expenses', {'category': expense_category}, sort='-amount', limit=7)
+    assert [float(row['amount']) for row in ascending] == [index + 0.5 for index in range(25)]
+
+    cash = walk('expenses', {
+        'category': expense_category, 'payment_method': 'Cash',
+        'date_from': '2024-01-03', 'date_to': '2024-01-05',
+    })
+    assert {row['expense_date'] for row in cash} == {'2024-01-03', '2024-01-05'}
+    assert all(row['payment_method'] == 'Cash' for row in cash)
+
+
+def test_fetch_page_rejects_bad_arguments(expense_category):
+    with pytest.raises(ValueError):
+        db.fetch_page('expenses', {}, sort='vendor')
+    with pytest.raises(ValueError):
+        db.fetch_page('expenses', {'date_from': '2024-13-01'})
+    cursor = db.fetch_page('expenses', {'category': expense_category}, limit=2)['next_cursor']
+    with pytest.raises(ValueError):
+        db.fetch_page('expenses', {'category': expense_category}, sort='amount', cursor=cursor)
+    with pytest.raises(ValueError):
+        db.fetch_page('sales', {'event_id': 'abc'})
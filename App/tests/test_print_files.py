@@ -0,0 +1,60 @@
+import os
+import shutil
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('DATABASE_URL is not set', allow_module_level=True)
+
+import db  # noqa: E402
+import threemf  # noqa: E402
+
+
+def write_3mf(path: Path, seconds: int, grams: str, color: str) -> Path:
+    slice_info = (
+        f'<config><plate><metadata key="index" value="1"/><metadata key="prediction" value="{seconds}"/>'
+        f'<metadata key="weight" value="{grams}"/><object identify_id="1" name="Part" skipped="false"/>'
+        f'<filament id="1" type="PLA" color="{color}" used_g="{grams}"/></plate></config>'
+    )
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('3D/3dmodel.model', '<model><resources>')
+        archive.writestr('Metadata/slice_info.config', slice_info)
+    return path
+
+
+@pytest.fixture
+def category(temp_category):
+    yield temp_category
+    with db.get_connection() as conn:
+        conn.execute('DELETE FROM print_files WHERE category = %s', (temp_category,))
+    db.prune_print_files([])
+
+
+def test_index_dedupes_by_hash_and_filters(category, tmp_path):
+    slow = write_3mf(tmp_path / 'Slow.3mf', 7200, '40.5', '#FFFFFF')
+    fast = write_3mf(tmp_path / 'Fast.3mf', 600, '5.25', '#FF0000')
+    copy = shutil.copy(fast, tmp_path / 'Copy.3mf')
+    before = threemf.stats()
+    for path, folder in ((slow, 'Dragon'), (fast, 'Dragon'), (copy, 'Cat')):
+        threemf.index_file(Path(path), f'{category}/{folder}/STL/{Path(path).name}', category, folder)
+    after = threemf.stats()
+    assert (after['extracted'] - before['extracted'], after['cached'] - before['cached']) == (2, 1)
+
+    result = db.fetch_print_files({'category': category}, sort='time')
+    assert result['total'] == 3
+    assert [row['file_name'] for row in result['rows']] == ['Copy.3mf', 'Fast.3mf', 'Slow.3mf']
+    assert (result['rows'][2]['print_seconds'], result['rows'][2]['filament_grams']) == (7200, '40.50')
+    assert db.fetch_print_files({'category': category, 'color': '#ff0000', 'q': 'dragon'})['total'] == 1
+    assert db.fetch_print_files({'category': category, 'max_grams': 10}, sort='grams', descending=True)['total'] == 2
+    with pytest.raises(ValueError):
+        db.fetch_print_files(sort='colour')
+
+    states = db.fetch_print_file_states(threemf.EXTRACTOR_VERSION)
+    assert states[f'{category}/Cat/STL/Copy.3mf'][2] is True
+    assert db.prune_print_files([f'{category}/Cat/STL/Copy.3mf']) == 1
+    assert db.fetch_print_files({'category': category})['total'] == 2
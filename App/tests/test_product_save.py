@@ -0,0 +1,86 @@
+import json
+import os
+import sys
+import threading
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('DATABASE_URL is not set', allow_module_level=True)
+
+import db  # noqa: E402
+import server  # noqa: E402
+
+
+@pytest.fixture
+def category(temp_category):
+    db.upsert_products([
+        {'category': temp_category, 'product_folder': f'Item {index}', 'sku': f'GT-TST-{index:05d}',
+         'Sale Price': '5.00'}
+        for index in range(20)
+    ])
+    return temp_category
+
+
+def post_save(rows):
+    httpd = server.BoundedThreadPoolHTTPServer(('127.0.0.1', 0), server.Handler, 2)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        request = urllib.request.Request(
+            f'http://127.0.0.1:{httpd.server_address[1]}/api/save',
+            data=json.dumps({'rows': rows}).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.loads(response.read())
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_save_writes_only_changed_rows(category):
+    rows = [row for row in db.fetch_products() if row['category'] == category]
+    versions = {row['id']: version for row, version in zip(rows, row_versions(category))}
+    target = next(row for row in rows if row['product_folder'] == 'Item 3')
+    target['Sale Price'] = '6.50'
+    new_row = {'category': category, 'product_folder': 'Item new', 'sku': 'GT-TST-99999'}
+
+    result = post_save(rows + [new_row])
+
+    assert result['ok'] is True
+    assert result['changed'] == [{
+        'id': target['id'],
+        'category': category,
+        'product_folder': 'Item 3',
+        'fields': ['sale_price'],
+    }]
+    assert result['inserted'] == 1
+    assert result['unchanged'] == 19
+    after = dict(zip([row['id'] for row in rows], row_versions(category)))
+    bumped = [row_id for row_id in versions if after[row_id] != versions[row_id]]
+    assert bumped == [target['id']]
+
+
+def test_save_product_changes_is_all_or_nothing(category):
+    rows = [row for row in db.fetch_products() if row['category'] == category]
+    good = dict(rows[0], **{'Sale Price': '9.99'})
+    updates = [
+        {'old_category': category, 'old_product_folder': 'Item 0', 'row': good, 'stock_refs': False},
+        {'old_category': category, 'old_product_folder': 'Missing', 'row': dict(good), 'stock_refs': False},
+    ]
+    assert db.save_product_changes(updates, []) is False
+    assert db.fetch_product(category, 'Item 0')['Sale Price'] == '5.00'
+
+
+def row_versions(category):
+    with db.get_connection() as conn:
+        rows = conn.execute(
+            'SELECT row_version FROM products WHERE category = %s ORDER BY category, product_folder',
+            (category,),
+        ).fetchall()
+    return [row[0] for row in rows]
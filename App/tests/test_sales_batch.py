@@ -0,0 +1,75 @@
+import os
+import secrets
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('DATABASE_URL is not set', allow_module_level=True)
+
+import db  # noqa: E402
+import server  # noqa: E402
+
+FOLDER = 'GT-BAT-00001 - Batch'
+
+
+@pytest.fixture
+def batch_fixture(temp_category, temp_event):
+    event = temp_event('Batch test', '2026-06-06')
+    db.upsert_stock_entry(temp_category, FOLDER, 'GT-BAT-00001', 'Red', '', 50)
+    db.upsert_stock_entry(temp_category, FOLDER, 'GT-BAT-00001', 'Blue', '', 5)
+    return event['id'], temp_category
+
+
+def line(event_id, category, key, color='Red', quantity=1, **extra):
+    parsed, error = server.parse_sale_line({
+        'idempotency_key': key, 'event_id': event_id, 'category': category, 'product_folder': FOLDER,
+        'sku': 'GT-BAT-00001', 'color': color, 'quantity': quantity, 'unit_price': '6.50',
+        'payment_method': 'Card', **extra,
+    })
+    assert error is None
+    return parsed
+
+
+def test_retried_batch_is_applied_once(batch_fixture):
+    event_id, category = batch_fixture
+    prefix = secrets.token_hex(4)
+    lines = [
+        line(event_id, category, f'{prefix}-1', quantity=2, sold_at='2026-06-06T10:15:00'),
+        line(event_id, category, f'{prefix}-2', color='Blue'),
+        line(event_id, category, f'{prefix}-1', quantity=2, sold_at='2026-06-06T10:15:00'),
+        line(event_id + 1000000, category, f'{prefix}-3'),
+    ]
+    first = db.record_sales_batch(lines)
+    assert [result['status'] for result in first['results']] == ['applied', 'applied', 'duplicate', 'error']
+    assert first['results'][0]['sale']['sold_at'].startswith('2026-06-06 09:15:00')
+    assert first['results'][2]['sale']['id'] == first['results'][0]['sale']['id']
+    assert [(row['color'], row['quantity']) for row in first['stock']] == [('Blue', 4), ('Red', 48)]
+
+    retry = db.record_sales_batch(lines[:3])
+    assert [result['status'] for result in retry['results']] == ['duplicate'] * 3
+    assert retry['stock'] == first['stock']
+    assert len(db.fetch_sales(event_id)) == 2
+
+    changed = db.record_sales_batch([line(event_id, category, f'{prefix}-2', color='Blue', quantity=3)])
+    assert changed['results'][0]['status'] == 'conflict'
+
+    db.record_sale_delete(first['results'][1]['sale']['id'])
+    after_delete = db.record_sales_batch([lines[1]])['results'][0]
+    assert (after_delete['status'], after_delete['sale']) == ('duplicate', None)
+
+
+def test_concurrent_flushes_of_one_queue(batch_fixture):
+    event_id, category = batch_fixture
+    prefix = secrets.token_hex(4)
+    lines = [line(event_id, category, f'{prefix}-{index}', color=('Red', 'Blue')[index % 2]) for index in range(6)]
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        batches = list(pool.map(lambda offset: db.record_sales_batch(lines[offset:] + lines[:offset]), range(6)))
+    applied = sum(result['status'] == 'applied' for batch in batches for result in batch['results'])
+    assert applied == 6
+    assert db.get_stock_entry(category, FOLDER, 'Red', '')['quantity'] == 47
+    assert db.get_stock_entry(category, FOLDER, 'Blue', '')['quantity'] == 2
@@ -0,0 +1,89 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('DATABASE_URL is not set', allow_module_level=True)
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def sale_fixture(temp_category, temp_event):
+    folder = 'GT-TST-00001 - Concurrency'
+    event = temp_event('Concurrency test', '2026-01-01')
+    db.upsert_stock_entry(temp_category, folder, 'GT-TST-00001', 'Red', '', 1000)
+    return event['id'], temp_category, folder
+
+
+def sale_payload(event_id, category, folder, quantity=1):
+    return {
+        'event_id': event_id,
+        'product_id': None,
+        'category': category,
+        'product_folder': folder,
+        'sku': 'GT-TST-00001',
+        'color': 'Red',
+        'size': '',
+        'quantity': quantity,
+        'unit_price': Decimal('5.00'),
+        'override_price': '',
+        'payment_method': 'Cash',
+    }
+
+
+def production_quantity(category):
+    rows = [row for row in db.fetch_production_queue('Queued') if row['category'] == category]
+    return sum(row['quantity'] for row in rows)
+
+
+def test_parallel_sales_keep_stock_exact(sale_fixture):
+    event_id, category, folder = sale_fixture
+    payload = sale_payload(event_id, category, folder)
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = list(pool.map(lambda _: db.record_sale(dict(payload)), range(300)))
+
+    assert all(result and result['stock_adjusted'] for result in results)
+    assert db.get_stock_entry(category, folder, 'Red', '')['quantity'] == 700
+    assert production_quantity(category) == 300
+    assert len(db.fetch_sales(event_id)) == 300
+
+
+def test_sale_update_and_delete_restore_stock(sale_fixture):
+    event_id, category, folder = sale_fixture
+    sale = db.record_sale(sale_payload(event_id, category, folder, quantity=4))['sale']
+    assert db.get_stock_entry(category, folder, 'Red', '')['quantity'] == 996
+
+    updated = db.record_sale_update(sale['id'], sale_payload(event_id, category, folder, quantity=10))
+    assert updated['new_quantity'] == 990
+    assert production_quantity(category) == 10
+
+    deleted = db.record_sale_delete(sale['id'])
+    assert deleted['new_quantity'] == 1000
+    assert production_quantity(category) == 0
+
+
+def test_sale_removes_stock_row_at_zero(sale_fixture):
+    event_id, category, folder = sale_fixture
+    result = db.record_sale(sale_payload(event_id, category, folder, quantity=1200))
+    assert result['new_quantity'] == 0
+    assert db.get_stock_entry(category, folder, 'Red', '') is None
+
+
+def test_sale_looks_up_product_and_reports_missing_event(sale_fixture):
+    event_id, category, folder = sale_fixture
+    db.upsert_products([{'category': category, 'product_folder': folder, 'sku': 'GT-TST-00001'}])
+    product = db.fetch_product(category, folder)
+    sale = db.record_sale({**sale_payload(event_id, category, folder), 'sku': ''})['sale']
+    assert (sale['product_id'], sale['sku']) == (product['id'], 'GT-TST-00001')
+    assert db.get_stock_entry(category, folder, 'Red', '')['sku'] == 'GT-TST-00001'
+
+    assert db.record_sale(sale_payload(event_id + 10 ** 9, category, folder)) == {'error': 'Event not found'}
+    assert db.get_stock_entry(category, folder, 'Red', '')['quantity'] == 999
+    assert production_quantity(category) == 1
@@ -0,0 +1,89 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('DATABASE_URL is not set', allow_module_level=True)
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def rollup_fixture(temp_category, temp_event):
+    events = [temp_event(f'Rollup {name}', '2026-05-02') for name in 'AB']
+    yield [event['id'] for event in events], temp_category
+    # Drop the events (and their sales) before the rollup rows they would otherwise decrement.
+    for event in events:
+        db.delete_event(event['id'])
+    with db.get_connection() as conn:
+        conn.execute('DELETE FROM sales_rollup_days WHERE category = %s', (temp_category,))
+        conn.execute('DELETE FROM sales_rollup_variants WHERE category = %s', (temp_category,))
+
+
+def sale(event_id, category, folder, color='Red', quantity=1, unit_price='5.00', override_price=''):
+    return {
+        'event_id': event_id,
+        'product_id': None,
+        'category': category,
+        'product_folder': folder,
+        'sku': folder.split(' ')[0],
+        'color': color,
+        'size': '',
+        'quantity': quantity,
+        'unit_price': Decimal(unit_price),
+        'override_price': override_price,
+        'payment_method': 'Cash',
+    }
+
+
+def test_rollups_follow_sale_writes(rollup_fixture):
+    (event_a, event_b), category = rollup_fixture
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: db.record_sale(sale(event_a, category, 'GT-R-1 Dragon')), range(40)))
+    big = db.record_sale(sale(event_b, category, 'GT-R-2 Owl', quantity=3, unit_price='9.00', override_price='8'))
+    moved = db.record_sale(sale(event_a, category, 'GT-R-1 Dragon', color='Blue'))
+    dropped = db.record_sale(sale(event_b, category, 'GT-R-2 Owl'))
+    db.record_sale_update(moved['sale']['id'], {**sale(event_a, category, 'GT-R-1 Dragon', 'Blue', 2), 'sale_id': moved['sale']['id']})
+    db.record_sale_delete(dropped['sale']['id'])
+    assert big['sale']
+
+    assert db.check_sales_rollups() == {'events': 0, 'days': 0, 'variants': 0}
+
+    products = db.fetch_best_sellers(by='items', category=category)
+    assert [(row['sku'], row['items'], row['revenue']) for row in products] == [
+        ('GT-R-1', 42, '210.00'),
+        ('GT-R-2', 3, '24.00'),
+    ]
+    by_revenue = db.fetch_best_sellers(by='revenue', level='variant', category=category, limit=1)
+    assert [(row['color'], row['revenue']) for row in by_revenue] == [('Red', '200.00')]
+
+    league = [row for row in db.fetch_event_league(by='items', limit=200) if row['event_id'] in (event_a, event_b)]
+    assert [(row['event_id'], row['sales'], row['items']) for row in league] == [(event_a, 41, 42), (event_b, 1, 3)]
+    assert league[0]['average_sale'] == '5.12'
+
+    months = db.fetch_revenue_by_month(category=category)
+    assert [(row['sales'], row['items'], row['revenue']) for row in months] == [(42, 45, '234.00')]
+    assert db.fetch_revenue_by_month(category=category, month_to='2000-01') == []
+    with pytest.raises(ValueError):
+        db.fetch_revenue_by_month(month_from='2026-13')
+
+
+def test_event_delete_and_rebuild_keep_rollups_consistent(rollup_fixture):
+    (event_a, event_b), category = rollup_fixture
+    db.record_sale(sale(event_a, category, 'GT-R-3 Fox', quantity=2))
+    db.record_sale(sale(event_b, category, 'GT-R-3 Fox'))
+    db.delete_event(event_b)
+    assert db.check_sales_rollups() == {'events': 0, 'days': 0, 'variants': 0}
+    assert [row['items'] for row in db.fetch_best_sellers(category=category)] == [2]
+
+    with db.get_connection() as conn:
+        conn.execute('UPDATE sales_rollup_events SET items = items + 5 WHERE event_id = %s', (event_a,))
+    assert db.check_sales_rollups()['events'] == 1
+    db.rebuild_sales_rollups()
+    assert db.check_sales_rollups() == {'events': 0, 'days': 0, 'variants': 0}
@@ -0,0 +1,55 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('DATABASE_URL is not set', allow_module_level=True)
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def category(temp_category):
+    db.upsert_products([
+        {'category': temp_category, 'product_folder': 'GT-TST-00001 - Dragon Planter', 'sku': 'GT-TST-00001',
+         'tags': 'plant, succulent', 'Colors': 'Green', 'Status': 'Live', 'UKCA': 'Yes'},
+        {'category': temp_category, 'product_folder': 'GT-TST-00002 - Dragon Egg', 'sku': 'GT-TST-00002',
+         'tags': 'fantasy', 'Colors': 'Red', 'Status': 'Draft'},
+        {'category': temp_category, 'product_folder': 'GT-TST-00003 - Cat Lamp', 'sku': 'GT-TST-00003',
+         'tags': 'light', 'Status': 'Live'},
+    ])
+    return temp_category
+
+
+def test_search_ranks_prefix_matches_and_counts_facets(category):
+    result = db.search_products('drag', {'category': category})
+    assert result['total'] == 2
+    assert {row['product_folder'] for row in result['results']} == {
+        'GT-TST-00001 - Dragon Planter', 'GT-TST-00002 - Dragon Egg',
+    }
+    assert result['facets']['category'] == {category: 2}
+    assert result['facets']['status'] == {'Live': 1, 'Draft': 1}
+
+    live = db.search_products('dragon', {'category': category, 'status': 'live'})
+    assert [row['sku'] for row in live['results']] == ['GT-TST-00001']
+
+    # Name matches (weight A) outrank colour matches (weight C).
+    db.set_product_readme_text(category, 'GT-TST-00003 - Cat Lamp', 'Prints in green PLA.')
+    ranked = db.search_products('green', {'category': category})
+    assert [row['sku'] for row in ranked['results']] == ['GT-TST-00001', 'GT-TST-00003']
+    assert ranked['results'][0]['rank'] > ranked['results'][1]['rank']
+
+
+def test_search_paginates_and_tracks_readme_changes(category):
+    page = db.search_products('', {'category': category}, limit=2, offset=2)
+    assert page['total'] == 3
+    assert [row['sku'] for row in page['results']] == ['GT-TST-00003']
+
+    assert db.search_products('lithophane', {'category': category})['total'] == 0
+    assert db.set_product_readme_text(category, 'GT-TST-00002 - Dragon Egg', 'A lithophane egg') is True
+    assert db.set_product_readme_text(category, 'GT-TST-00002 - Dragon Egg', 'A lithophane egg') is False
+    assert [row['sku'] for row in db.search_products('litho', {'category': category})['results']] == ['GT-TST-00002']
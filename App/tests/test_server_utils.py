@@ -101,3 +101,173 @@ def test_calculate_event_totals_ignores_invalid_override():
     totals = server.calculate_event_totals(rows)
     assert totals['total_revenue'] == '7.25'
     assert totals['payments']['Unknown'] == '7.25'
+
+
+def test_bounded_thread_pool_server_handles_concurrent_requests():
+    import json
+    import threading
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+
+    httpd = server.BoundedThreadPoolHTTPServer(('127.0.0.1', 0), server.Handler, 4)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = f'http://127.0.0.1:{httpd.server_address[1]}/api/config'
+
+        def fetch(_):
+            with urllib.request.urlopen(url, timeout=5) as response:
+                return json.loads(response.read())
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(fetch, range(16)))
+        assert all('paths' in result for result in results)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_route_registry_resolves_exact_and_prefix_paths():
+    assert server.ROUTES.resolve('GET', '/api/rows').func is server.Handler.handle_get_rows
+    assert server.ROUTES.resolve('POST', '/api/sale').body == 'json'
+    assert server.ROUTES.resolve('POST', '/api/upload').max_bytes == server.UPLOAD_MAX_BYTES
+    assert server.ROUTES.resolve('GET', '/files/Toys/readme.md').path == '/files/'
+    assert server.ROUTES.resolve('GET', '/files-records/Expenses/a.pdf').path == '/files-records/'
+    assert server.ROUTES.resolve('GET', '/files-token/abc/name.stl').auth is False
+    assert server.ROUTES.resolve('GET', '/api/sale') is None
+    assert server.ROUTES.resolve('GET', '/index.html') is None
+
+
+def test_route_registry_rejects_duplicates():
+    registry = server.RouteRegistry()
+    registry.route('GET', '/api/x')(lambda *args: None)
+    try:
+        registry.route('GET', '/api/x')(lambda *args: None)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('duplicate route accepted')
+
+
+def test_parse_range_header():
+    assert server.parse_range_header(None, 100) is None
+    assert server.parse_range_header('bytes=0-9', 100) == (0, 9)
+    assert server.parse_range_header('bytes=90-', 100) == (90, 99)
+    assert server.parse_range_header('bytes=-10', 100) == (90, 99)
+    assert server.parse_range_header('bytes=50-500', 100) == (50, 99)
+    assert server.parse_range_header('bytes=0-1,5-6', 100) is None
+    assert server.parse_range_header('items=0-1', 100) is None
+    for unsatisfiable in ('bytes=100-', 'bytes=-0'):
+        try:
+            server.parse_range_header(unsatisfiable, 100)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f'{unsatisfiable} accepted')
+
+
+def test_file_token_serving_supports_range_and_conditional_requests(tmp_path):
+    import threading
+    import urllib.error
+    import urllib.request
+
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(bytes(range(256)) * 40)
+    token = server.create_file_token(video)
+    httpd = server.BoundedThreadPoolHTTPServer(('127.0.0.1', 0), server.Handler, 2)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    url = f'http://127.0.0.1:{httpd.server_address[1]}/files-token/{token}/clip.mp4'
+
+    def fetch(headers):
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.headers, exc.read()
+
+    try:
+        status, headers, body = fetch({})
+        assert status == 200
+        assert body == video.read_bytes()
+        assert headers['Accept-Ranges'] == 'bytes'
+        etag = headers['ETag']
+
+        status, headers, body = fetch({'Range': 'bytes=256-511'})
+        assert status == 206
+        assert headers['Content-Range'] == 'bytes 256-511/10240'
+        assert body == bytes(range(256))
+
+        status, _, body = fetch({'If-None-Match': etag})
+        assert (status, body) == (304, b'')
+
+        status, headers, _ = fetch({'Range': 'bytes=20000-'})
+        assert status == 416
+        assert headers['Content-Range'] == 'bytes */10240'
+
+        status, _, body = fetch({'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+        assert status == 200
+        assert len(body) == 10240
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_choose_encoding_honours_quality_values(monkeypatch):
+    monkeypatch.setattr(server, 'brotli', None)
+    assert server.choose_encoding('gzip, deflate, br') == 'gzip'
+    assert server.choose_encoding('br;q=1, gzip;q=0') is None
+    assert server.choose_encoding('identity') is None
+    assert server.choose_encoding('*') == 'gzip'
+    assert server.choose_encoding(None) is None
+
+
+def test_columnar_sends_headers_once():
+    rows = [{'sku': 'A', 'quantity': 1}, {'sku': 'B', 'quantity': 2}]
+    assert server.columnar(rows) == {'headers': ['sku', 'quantity'], 'rows': [['A', 1], ['B', 2]]}
+    assert server.columnar(rows, ['quantity']) == {'headers': ['quantity'], 'rows': [[1], [2]]}
+    assert server.columnar([]) == {'headers': [], 'rows': []}
+
+
+def test_json_responses_are_gzipped_above_threshold(monkeypatch):
+    import gzip
+    import json
+    import threading
+    import urllib.request
+
+    monkeypatch.setattr(server, 'COMPRESS_MIN_BYTES', 0)
+    monkeypatch.setattr(server, 'brotli', None)
+    httpd = server.BoundedThreadPoolHTTPServer(('127.0.0.1', 0), server.Handler, 2)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        request = urllib.request.Request(
+            f'http://127.0.0.1:{httpd.server_address[1]}/api/config',
+            headers={'Accept-Encoding': 'gzip'},
+        )
+        with urllib.request.urlopen(request, timeout=5) as response:
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert response.headers['Vary'] == 'Accept-Encoding'
+            payload = json.loads(gzip.decompress(response.read()))
+        assert 'paths' in payload
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_parse_sale_line_validates_and_normalises():
+    line, error = server.parse_sale_line({
+        'event_id': '3', 'category': 'Fidgets', 'product_folder': 'GT-FDG-00001 - Ladybug',
+        'quantity': '2', 'unit_price': '4.5', 'sold_at': '2026-07-01T14:00:00', 'idempotency_key': ' k1 ',
+    })
+    assert error is None
+    assert (line['event_id'], line['quantity'], str(line['unit_price']), line['idempotency_key']) == (3, 2, '4.50', 'k1')
+    assert line['sold_at'].utcoffset().total_seconds() == 3600
+    assert server.parse_sale_line({'event_id': 'x'}) == (None, 'Invalid event id')
+    assert server.parse_sale_line({
+        'event_id': 1, 'category': 'A', 'product_folder': 'B', 'unit_price': 'NaN',
+    }) == (None, 'Unit price must be non-negative')
+    assert server.parse_sale_line({
+        'event_id': 1, 'category': 'A', 'product_folder': 'B', 'unit_price': '1', 'sold_at': 'yesterday',
+    }) == (None, 'Invalid sold_at')
@@ -0,0 +1,59 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import server  # noqa: E402
+import sessions  # noqa: E402
+
+
+def test_memory_store_expires_sessions(monkeypatch):
+    now = [1000]
+    monkeypatch.setattr(sessions.time, 'time', lambda: now[0])
+    store = sessions.MemorySessionStore()
+    short = store.create('alice', 10)
+    long = store.create('alice', 100)
+    assert store.get(short)['user'] == 'alice'
+
+    now[0] = 1010
+    assert store.get(short) is None
+    assert store.get(long)['user'] == 'alice'
+    assert store.count() == 1
+
+    store.delete(long)
+    assert store.get(long) is None
+    now[0] = 2000
+    assert store.get('missing') is None
+    assert store.expiry_heap == []
+
+
+def test_file_tokens_are_signed_and_expire(tmp_path, monkeypatch):
+    target = tmp_path / 'model.3mf'
+    token = server.create_file_token(target)
+    assert '/' not in token
+    assert server.get_file_token(token)['path'] == str(target)
+
+    expires_hex, path_part, signature = token.split('.')
+    other = server._b64encode(str(tmp_path / 'other.3mf').encode('utf-8'))
+    assert server.get_file_token(f'{expires_hex}.{other}.{signature}') is None
+    assert server.get_file_token(f'{expires_hex}.{path_part}.{signature[:-2]}AA') is None
+    assert server.get_file_token('garbage') is None
+    assert server.get_file_token('a.b.\u00e9') is None
+
+    later = server.time.time() + server.FILE_TOKEN_TTL_SECONDS + 1
+    monkeypatch.setattr(server.time, 'time', lambda: later)
+    assert server.get_file_token(token) is None
+
+
+@pytest.mark.skipif(not os.environ.get('DATABASE_URL'), reason='DATABASE_URL is not set')
+def test_postgres_store_round_trip():
+    sessions.db.ensure_schema()
+    store = sessions.PostgresSessionStore()
+    session_id = store.create('bob', 60)
+    assert store.get(session_id)['user'] == 'bob'
+    assert store.get(session_id + 'x') is None
+    store.delete(session_id)
+    assert store.get(session_id) is None
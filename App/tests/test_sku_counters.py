@@ -0,0 +1,53 @@
+import os
+import secrets
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('DATABASE_URL is not set', allow_module_level=True)
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def prefix(temp_category):
+    value = f'GT-T{secrets.token_hex(3).upper()}'
+    db.insert_product({'category': temp_category, 'product_folder': f'{value}-00007 - Old', 'sku': f'{value}-00007'})
+    db.insert_product({'category': temp_category, 'product_folder': f'{value}-00003b - Odd', 'sku': f'{value}-00003b'})
+    yield value, temp_category
+    with db.get_connection() as conn:
+        conn.execute('DELETE FROM sku_counters WHERE prefix = %s', (value,))
+
+
+def test_counters_seed_from_existing_skus_and_stay_unique(prefix):
+    value, _ = prefix
+    assert db.reserve_skus(value) == [f'{value}-00008']
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        batches = list(pool.map(lambda count: db.reserve_skus(value, count), [1, 2, 3] * 8))
+    skus = [sku for batch in batches for sku in batch]
+    assert len(set(skus)) == len(skus) == 48
+    assert sorted(skus) == [f'{value}-{number:05d}' for number in range(9, 57)]
+    db.seed_sku_counters([value])
+    assert db.reserve_skus(value) == [f'{value}-00057']
+
+
+def test_new_product_sku_rolls_back_with_insert(prefix):
+    value, category = prefix
+    db.seed_sku_counters([value])
+
+    def fail(payload):
+        raise FileExistsError(payload['product_folder'])
+
+    with pytest.raises(FileExistsError):
+        db.insert_product_with_new_sku(value, 'Lost', {'category': category}, fail)
+    created = db.insert_product_with_new_sku(value, 'Frog', {'category': category, 'Status': 'Draft'})
+    assert (created['sku'], created['product_folder']) == (f'{value}-00008', f'{value}-00008 - Frog')
+    assert db.product_exists(category, f'{value}-00008 - Frog')
+
+    db.insert_product({'category': category, 'product_folder': 'Manual', 'sku': f'{value}-123456'})
+    assert db.reserve_skus(value, 2) == [f'{value}-123457', f'{value}-123458']
@@ -0,0 +1,102 @@
+import datetime
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+if not os.environ.get('DATABASE_URL'):
+    pytest.skip('DATABASE_URL is not set', allow_module_level=True)
+
+import psycopg  # noqa: E402
+
+import db  # noqa: E402
+
+FOLDER = 'GT-LED-00001 - Ledger'
+
+
+@pytest.fixture
+def category(temp_category, temp_event):
+    event = temp_event('Ledger test', '2026-04-04')
+    return temp_category, event['id']
+
+
+def movements(category):
+    return db.fetch_page('stock_movements', {'category': category}, sort='-recent', limit=100)['rows']
+
+
+def now():
+    with db.get_connection() as conn:
+        return conn.execute('SELECT clock_timestamp()').fetchone()[0]
+
+
+def test_every_stock_write_is_recorded(category):
+    name, event_id = category
+    assert db.adjust_stock(name, FOLDER, 'GT-LED-00001', 'Red', '', 5) == {'quantity': 5, 'removed': False}
+    sale = db.record_sale({
+        'event_id': event_id, 'product_id': None, 'category': name, 'product_folder': FOLDER,
+        'sku': 'GT-LED-00001', 'color': 'Red', 'size': '', 'quantity': 2,
+        'unit_price': Decimal('5.00'), 'override_price': '', 'payment_method': 'Cash',
+    })
+    db.record_sale_delete(sale['sale']['id'])
+    item = db.insert_production_item({'category': name, 'product_folder': FOLDER, 'color': 'Red', 'quantity': 1})
+    assert db.complete_production(item['id']) == {'stock_adjusted': True, 'new_quantity': 6}
+    assert db.adjust_stock(name, FOLDER, 'GT-LED-00001', 'Red', '', -9) == {'quantity': 0, 'removed': True}
+    assert db.adjust_stock(name, FOLDER, 'GT-LED-00001', 'Red', '', -1) is None
+
+    rows = movements(name)
+    assert [(row['reason'], row['delta'], row['quantity_after']) for row in rows] == [
+        ('adjust', 5, 5),
+        ('sale', -2, 3),
+        ('sale_delete', 2, 5),
+        ('production', 1, 6),
+        ('adjust', -6, 0),
+    ]
+    assert rows[1]['sale_id'] == rows[2]['sale_id'] == sale['sale']['id']
+    assert rows[3]['production_id'] == item['id']
+    with db.get_connection() as conn:
+        with pytest.raises(psycopg.errors.RaiseException):
+            conn.execute('DELETE FROM stock_movements WHERE id = %s', (rows[0]['id'],))
+
+
+def test_production_complete_moves_stock_once(category):
+    name, _ = category
+    item = db.insert_production_item({'category': name, 'product_folder': FOLDER, 'color': 'Blue', 'quantity': 4})
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: db.complete_production(item['id']), range(4)))
+    assert sorted(results, key=lambda result: result is None) == [
+        {'stock_adjusted': True, 'new_quantity': 4}, None, None, None,
+    ]
+    assert db.get_stock_entry(name, FOLDER, 'Blue', '')['quantity'] == 4
+
+
+def test_stock_as_of_replays_from_nearest_snapshot(category):
+    name, _ = category
+    db.adjust_stock(name, FOLDER, 'GT-LED-00001', 'Red', '', 10)
+    db.adjust_stock(name, FOLDER, 'GT-LED-00001', 'Green', 'L', 1)
+    before_snapshot = now()
+    snapshot = db.take_stock_snapshot('test')
+    db.adjust_stock(name, FOLDER, 'GT-LED-00001', 'Red', '', -4)
+    middle = now()
+    db.adjust_stock(name, FOLDER, 'GT-LED-00001', 'Green', 'L', -1)
+    db.adjust_stock(name, FOLDER, 'GT-LED-00001', 'Red', '', 7)
+
+    def quantities(moment):
+        result = db.fetch_stock_as_of(moment, {'category': name})
+        return result, {(row['color'], row['size']): row['quantity'] for row in result['rows']}
+
+    result, stock = quantities(before_snapshot)
+    assert stock == {('Red', ''): 10, ('Green', 'L'): 1}
+    assert result['snapshot'] is None or result['snapshot']['id'] != snapshot['id']
+
+    result, stock = quantities(middle)
+    assert stock == {('Red', ''): 6, ('Green', 'L'): 1}
+    assert (result['snapshot']['id'], result['replayed']) == (snapshot['id'], 1)
+
+    _, stock = quantities(now() + datetime.timedelta(seconds=1))
+    current = {(row['color'], row['size']): row['quantity'] for row in db.fetch_stock() if row['category'] == name}
+    assert stock == current == {('Red', ''): 13}
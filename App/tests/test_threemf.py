@@ -0,0 +1,100 @@
+import json
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import threemf  # noqa: E402
+
+MODEL_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<model unit="millimeter" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">\n'
+    ' <metadata name="Application">BambuStudio-01.09.05.51</metadata>\n'
+    ' <metadata name="Title">Articulated Dragon</metadata>\n'
+    ' <resources>'
+)
+SLICE_INFO = """<?xml version="1.0" encoding="UTF-8"?>
+<config>
+  <header><header_item key="X-BBL-Client-Version" value="01.09.05.51"/></header>
+  <plate>
+    <metadata key="index" value="1"/>
+    <metadata key="printer_model_id" value="C12"/>
+    <metadata key="prediction" value="5025"/>
+    <metadata key="weight" value="16.58"/>
+    <object identify_id="10" name="Body" skipped="false"/>
+    <object identify_id="11" name="Tail" skipped="false"/>
+    <object identify_id="12" name="Brim ear" skipped="true"/>
+    <filament id="1" type="PLA" color="#ffffff" used_m="4.1" used_g="12.30"/>
+    <filament id="2" type="PLA" color="#FF0000" used_m="1.4" used_g="4.28"/>
+  </plate>
+  <plate>
+    <metadata key="index" value="2"/>
+    <metadata key="weight" value="3.10"/>
+    <object identify_id="13" name="Stand" skipped="false"/>
+    <filament id="1" type="PLA" color="#FFFFFF" used_m="1.0" used_g="3.10"/>
+  </plate>
+</config>
+"""
+
+
+def write_3mf(path: Path, members: dict) -> Path:
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return path
+
+
+@pytest.fixture
+def bambu(tmp_path):
+    # The mesh is large and never read past the header.
+    mesh = MODEL_HEADER + '<object id="1"><mesh>' + '<vertex x="1" y="2" z="3"/>' * 200000 + '</mesh></object>'
+    return write_3mf(tmp_path / 'Dragon.3mf', {
+        '3D/3dmodel.model': mesh,
+        'Metadata/slice_info.config': SLICE_INFO,
+        'Metadata/project_settings.config': json.dumps({
+            'printer_model': 'Bambu Lab P1S', 'layer_height': '0.2',
+            'filament_colour': ['#FFFFFF', '#FF0000'], 'filament_type': ['PLA', 'PLA'],
+        }),
+        'Metadata/plate_1.png': b'\x89PNG plate one',
+        'Metadata/plate_1_small.png': b'\x89PNG small',
+        'Metadata/plate_2.png': b'\x89PNG plate two',
+        'Metadata/plate_2.gcode': '; HEADER_BLOCK_START\n; model printing time: 20m 5s; total estimated time: 1h 2m 3s\n',
+    })
+
+
+def test_extracts_bambu_plates_filament_and_thumbnails(bambu):
+    meta = threemf.extract(bambu)
+    assert meta['slicer'] == 'BambuStudio-01.09.05.51'
+    assert (meta['title'], meta['printer'], meta['layer_height']) == ('Articulated Dragon', 'Bambu Lab P1S', 0.2)
+    assert (meta['sliced'], meta['plate_count'], meta['object_count']) == (True, 2, 3)
+    assert meta['print_seconds'] == 5025 + 3723
+    assert meta['filament_grams'] == 19.68
+    assert meta['filament_by_color'] == {'#FFFFFF': 15.4, '#FF0000': 4.28}
+    assert [plate['thumbnail'] for plate in meta['plates']] == ['Metadata/plate_1.png', 'Metadata/plate_2.png']
+    assert 'Metadata/plate_1_small.png' in meta['thumbnails']
+    assert threemf.read_thumbnail(bambu, 2) == b'\x89PNG plate two'
+    assert threemf.read_thumbnail(bambu, 9) is None
+
+
+def test_unsliced_prusa_project_and_bad_files(tmp_path):
+    prusa = write_3mf(tmp_path / 'Vase.3mf', {
+        '3D/3dmodel.model': '<model><resources>',
+        'Metadata/Slic3r_PE.config': '; layer_height = 0.15\n; printer_model = MK4\n; filament_colour = #00FF00;#0000FF\n',
+        'Metadata/Slic3r_PE_model.config': '<config><object id="1"/><object id="2"/></config>',
+        'Metadata/thumbnail.png': b'\x89PNG prusa',
+    })
+    meta = threemf.extract(prusa)
+    assert (meta['slicer'], meta['printer'], meta['layer_height']) == ('PrusaSlicer', 'MK4', 0.15)
+    assert (meta['sliced'], meta['object_count'], meta['print_seconds']) == (False, 2, None)
+    assert meta['filament_colors'] == ['#00FF00', '#0000FF']
+    assert threemf.read_thumbnail(prusa) == b'\x89PNG prusa'
+
+    (tmp_path / 'broken.3mf').write_bytes(b'not a zip')
+    with pytest.raises(ValueError):
+        threemf.extract(tmp_path / 'broken.3mf')
+    with pytest.raises(ValueError):
+        threemf.extract(write_3mf(tmp_path / 'empty.3mf', {'readme.txt': 'hi'}))
+    assert threemf.parse_duration('2d 1h 5s') == 176405
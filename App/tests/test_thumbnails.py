@@ -0,0 +1,92 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import thumbnails  # noqa: E402
+
+pytestmark = pytest.mark.skipif(not thumbnails.available(), reason='Pillow not installed')
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache = tmp_path / 'thumbs'
+    monkeypatch.setattr(thumbnails, 'THUMB_CACHE_DIR', cache)
+    monkeypatch.setattr(thumbnails, '_cache_bytes', None)
+    return cache
+
+
+def make_photo(path: Path, size=(2000, 1000)):
+    from PIL import Image
+
+    Image.new('RGB', size, (200, 40, 40)).save(path, 'JPEG')
+
+
+def test_get_resizes_and_reuses_cached_derivative(tmp_path, cache_dir):
+    source = tmp_path / 'photo.jpg'
+    make_photo(source)
+
+    first = thumbnails.get(source, 256, 'webp')
+    assert first is not None and first.is_relative_to(cache_dir)
+    from PIL import Image
+    with Image.open(first) as image:
+        assert image.size == (256, 128)
+        assert image.format == 'WEBP'
+    mtime_ns = first.stat().st_mtime_ns
+    assert thumbnails.get(source, 256, 'webp') == first
+    assert first.stat().st_mtime_ns == mtime_ns  # stable ETag across cache hits
+
+    make_photo(source, (1000, 1000))
+    second = thumbnails.get(source, 256, 'webp')
+    assert second != first
+
+
+def test_get_returns_none_for_unsupported_or_broken_sources(tmp_path, cache_dir):
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'not an image')
+    broken = tmp_path / 'broken.jpg'
+    broken.write_bytes(b'not an image')
+    assert thumbnails.get(video, 256, 'jpeg') is None
+    assert thumbnails.get(broken, 256, 'jpeg') is None
+
+
+def test_failed_render_leaves_no_temp_file(tmp_path, cache_dir, monkeypatch):
+    from PIL import Image
+
+    source = tmp_path / 'photo.jpg'
+    make_photo(source)
+
+    def failing_save(self, path, *args, **kwargs):
+        Path(path).write_bytes(b'partial')
+        raise OSError('disk full')
+
+    monkeypatch.setattr(Image.Image, 'save', failing_save)
+    assert thumbnails.get(source, 256, 'jpeg') is None
+    assert [path for path in cache_dir.rglob('*') if path.is_file()] == []
+
+
+def test_cache_size_ignores_in_progress_temp_files(tmp_path, cache_dir):
+    source = tmp_path / 'photo.jpg'
+    make_photo(source)
+    derivative = thumbnails.get(source, 128, 'jpeg')
+    (derivative.parent / f'.{derivative.name}.1.tmp').write_bytes(bytes(5000))
+    assert thumbnails._scan_cache_bytes() == derivative.stat().st_size
+
+
+def test_evict_trims_least_recently_used(tmp_path, cache_dir):
+    import os
+
+    paths = []
+    for index in range(4):
+        source = tmp_path / f'photo-{index}.jpg'
+        make_photo(source)
+        derivative = thumbnails.get(source, 128, 'jpeg')
+        os.utime(derivative, (1000 + index, 1000 + index))
+        paths.append(derivative)
+    size = paths[0].stat().st_size
+    removed = thumbnails.evict(max_bytes=size * 3)
+    assert removed >= 1
+    assert not paths[0].exists()
+    assert paths[-1].exists()
@@ -0,0 +1,66 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db  # noqa: E402
+import ukca_bulk  # noqa: E402
+
+SHARED_DIR = Path(__file__).resolve().parents[2] / 'Products' / 'UKCA_Shared'
+STATUS_CSV = SHARED_DIR.parent / 'ukca_status.csv'
+
+
+def old_apply_replacements(template: str, replacements: dict) -> str:
+    for key, value in replacements.items():
+        template = template.replace(f'{{{{{key}}}}}', value)
+    return template
+
+
+def test_compiled_templates_match_sequential_replace():
+    templates = ukca_bulk.load_templates(SHARED_DIR)
+    assert ukca_bulk.load_templates(SHARED_DIR)['readme'] is templates['readme']
+    values = ukca_bulk.replacements_for({'product_name': 'Flexi Rex', 'sku': 'GT-TOY-00044', 'notes': 'Small parts'})
+    assert values['TESTER'] == 'Dan Robinson' and values['TEST_DATE'] == ''
+    docs = ukca_bulk.render_pack(templates, values)
+    for key in ('readme', 'declaration', 'risk_assessment'):
+        source = (SHARED_DIR / ukca_bulk.TEMPLATE_FILES[key]).read_text(encoding='utf-8')
+        assert docs[key] == old_apply_replacements(source, values)
+    assert docs['en71'].startswith('# Flexi Rex (SKU: GT-TOY-00044)\n\nMaterial: PLA / PETG')
+    assert ukca_bulk.Template('{{A}} {{B}} {{A}}').render({'A': '{{B}}'}) == '{{B}} {{B}} {{B}}'
+    assert ukca_bulk.product_name('GT-TOY-00044 - Flexi Rex', 'GT-TOY-00044') == 'Flexi Rex'
+    assert 'GT-TOY-00044' in ukca_bulk.incomplete_skus(STATUS_CSV)
+    assert 'GT-TOY-00040' not in ukca_bulk.incomplete_skus(STATUS_CSV)
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_generate_writes_packs_in_a_pool(tmp_path, processes):
+    jobs = [
+        {'product_id': None, 'product_path': tmp_path / f'GT-TOY-{n:05d} - Toy {n}',
+         'fields': {'product_name': f'Toy {n}', 'sku': f'GT-TOY-{n:05d}'}}
+        for n in range(6)
+    ]
+    (tmp_path / 'GT-TOY-00005 - Toy 5').write_text('a file where the folder should be')
+    report = ukca_bulk.generate(jobs, ukca_bulk.load_templates(SHARED_DIR), workers=3, processes=processes)
+    assert (report['products'], report['written'], report['workers']) == (6, 5, 3)
+    assert report['pool'] == ('process' if processes else 'thread')
+    assert len(report['errors']) == 1 and report['errors'][0]['product_path'].endswith('Toy 5')
+    declaration = jobs[2]['product_path'] / ukca_bulk.UKCA_FILES['declaration']
+    assert 'GT-TOY-00002' in declaration.read_text(encoding='utf-8')
+    assert (jobs[0]['product_path'] / 'UKCA' / 'Evidence').is_dir()
+
+
+def test_bulk_saves_documents_and_status_in_one_go(temp_category, tmp_path):
+    category = temp_category
+    for n, ukca in ((1, 'No'), (2, 'No'), (3, 'Yes')):
+        db.insert_product({
+            'category': category, 'product_folder': f'GT-TOY-9000{n} - Toy', 'sku': f'GT-TOY-9000{n}', 'UKCA': ukca,
+        })
+    products = db.fetch_ukca_candidates({'category': category, 'ukca': 'No'})
+    assert [row['sku'] for row in products] == ['GT-TOY-90001', 'GT-TOY-90002']
+    jobs = ukca_bulk.jobs_for(products, {'tester': 'A Tester'}, lambda c, f, s: tmp_path / c / f)
+    report = ukca_bulk.generate(jobs, ukca_bulk.load_templates(SHARED_DIR), workers=2)
+    assert (report['documents'], report['updated']) == (8, 2)
+    assert db.fetch_ukca_candidates({'category': category, 'ukca': 'No'}) == []
+    assert 'A Tester' in db.get_ukca_doc(category, 'GT-TOY-90002 - Toy', 'declaration')
@@ -0,0 +1,300 @@
+"""Print-file metadata read from 3MF archives (Bambu Studio, Orca, PrusaSlicer).
+
+Only the small members are read: slicer configs under ``Metadata/``, the
+first few KB of ``3D/3dmodel.model`` (for the application/title header) and
+the G-code header of sliced plates. Mesh data is never decompressed, so a
+50MB project costs a hash pass and a few small inflates. Results are cached
+in ``print_file_meta`` keyed by the file's SHA-256 (see ``db.py``);
+``schedule()`` extracts in a small background pool after uploads.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import db
+
+# Bump when the extracted fields change so cached rows are re-read.
+EXTRACTOR_VERSION = 1
+THREEMF_WORKERS = max(int(os.environ.get('THREEMF_WORKERS', '2')), 1)
+CONFIG_MAX_BYTES = 8 * 1024 * 1024
+MODEL_HEADER_BYTES = 64 * 1024
+GCODE_HEADER_BYTES = 16 * 1024
+THUMBNAIL_MAX_BYTES = 4 * 1024 * 1024
+
+MODEL_MEMBER = '3D/3dmodel.model'
+SLICE_INFO = 'Metadata/slice_info.config'
+MODEL_SETTINGS = 'Metadata/model_settings.config'
+PROJECT_SETTINGS = 'Metadata/project_settings.config'
+PRUSA_CONFIG = 'Metadata/Slic3r_PE.config'
+PRUSA_MODEL_CONFIG = 'Metadata/Slic3r_PE_model.config'
+PLATE_THUMBNAIL_RE = re.compile(r'^Metadata/plate_(\d+)\.png$')
+THUMBNAIL_RE = re.compile(r'^(Metadata/[^/]*\.png|Thumbnails/[^/]*\.png|Auxiliaries/\.thumbnails/[^/]*\.png)$')
+MODEL_METADATA_RE = re.compile(rb'<metadata\s+name="([^"]+)"\s*>([^<]{0,500})</metadata>')
+DURATION_RE = re.compile(r'(\d+)\s*([dhms])')
+GCODE_TIME_RE = re.compile(r';\s*(?:total estimated time|estimated printing time \(normal mode\))\s*[:=]\s*([^;\n]+)')
+
+_lock = threading.Lock()
+_executor = None
+_pending = {}
+_stats = {'extracted': 0, 'cached': 0, 'failed': 0}
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        while chunk := handle.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_duration(text: str) -> int | None:
+    """Seconds from ``1d 2h 3m 4s`` style text (None if nothing matched)."""
+    parts = DURATION_RE.findall(text or '')
+    if not parts:
+        return None
+    scale = {'d': 86400, 'h': 3600, 'm': 60, 's': 1}
+    return sum(int(value) * scale[unit] for value, unit in parts)
+
+
+def _number(value, cast=float):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _read(archive: zipfile.ZipFile, name: str, limit: int = CONFIG_MAX_BYTES, partial: bool = False) -> bytes | None:
+    """Member bytes, or None if missing or (unless ``partial``) over ``limit``."""
+    try:
+        info = archive.getinfo(name)
+    except KeyError:
+        return None
+    if info.file_size > limit and not partial:
+        return None
+    with archive.open(info) as handle:
+        return handle.read(limit)
+
+
+def _xml(archive: zipfile.ZipFile, name: str):
+    data = _read(archive, name)
+    if not data:
+        return None
+    try:
+        return ET.fromstring(data)
+    except ET.ParseError:
+        return None
+
+
+def _metadata(element) -> dict:
+    return {item.get('key'): item.get('value') for item in element.findall('metadata')}
+
+
+def _plates_from_slice_info(root) -> list[dict]:
+    plates = []
+    for plate in root.findall('plate'):
+        meta = _metadata(plate)
+        filaments = [
+            {
+                'type': filament.get('type') or '',
+                'color': (filament.get('color') or '').upper(),
+                'grams': _number(filament.get('used_g')),
+                'meters': _number(filament.get('used_m')),
+            }
+            for filament in plate.findall('filament')
+        ]
+        plates.append({
+            'index': _number(meta.get('index'), int),
+            'print_seconds': _number(meta.get('prediction'), int),
+            'filament_grams': _number(meta.get('weight')),
+            'objects': sum(1 for item in plate.findall('object') if item.get('skipped') != 'true'),
+            'printer': meta.get('printer_model_id') or None,
+            'filaments': filaments,
+        })
+    return plates
+
+
+def _plate_gcode_seconds(archive: zipfile.ZipFile, index: int) -> int | None:
+    header = _read(archive, f'Metadata/plate_{index}.gcode', GCODE_HEADER_BYTES, partial=True)
+    match = GCODE_TIME_RE.search((header or b'').decode('utf-8', 'replace'))
+    return parse_duration(match.group(1)) if match else None
+
+
+def _prusa_config(archive: zipfile.ZipFile) -> dict:
+    data = _read(archive, PRUSA_CONFIG)
+    settings = {}
+    for line in (data or b'').decode('utf-8', 'replace').splitlines():
+        key, sep, value = line.lstrip('; ').partition(' = ')
+        if sep:
+            settings[key.strip()] = value.strip()
+    return settings
+
+
+def _model_header(archive: zipfile.ZipFile) -> dict:
+    header = _read(archive, MODEL_MEMBER, MODEL_HEADER_BYTES, partial=True) or b''
+    return {
+        name.decode('utf-8', 'replace'): value.decode('utf-8', 'replace').strip()
+        for name, value in MODEL_METADATA_RE.findall(header)
+    }
+
+
+def _object_count(archive: zipfile.ZipFile) -> int | None:
+    for name in (MODEL_SETTINGS, PRUSA_MODEL_CONFIG):
+        root = _xml(archive, name)
+        if root is not None:
+            return len(root.findall('object'))
+    return None
+
+
+def extract(path: Path) -> dict:
+    """Metadata for one 3MF file; raises ValueError if it is not a readable 3MF."""
+    try:
+        archive = zipfile.ZipFile(path)
+    except (OSError, zipfile.BadZipFile) as exc:
+        raise ValueError(f'Not a 3MF archive: {exc}') from exc
+    with archive:
+        names = archive.namelist()
+        if MODEL_MEMBER not in names:
+            raise ValueError(f'Missing {MODEL_MEMBER}')
+        header = _model_header(archive)
+        project = {}
+        project_data = _read(archive, PROJECT_SETTINGS)
+        if project_data:
+            try:
+                project = json.loads(project_data)
+            except ValueError:
+                project = {}
+        prusa = _prusa_config(archive)
+        slice_info = _xml(archive, SLICE_INFO)
+        plates = _plates_from_slice_info(slice_info) if slice_info is not None else []
+        for plate in plates:
+            if plate['print_seconds'] is None and plate['index'] is not None:
+                plate['print_seconds'] = _plate_gcode_seconds(archive, plate['index'])
+        plate_thumbnails = {}
+        for name in names:
+            match = PLATE_THUMBNAIL_RE.match(name)
+            if match:
+                plate_thumbnails[int(match.group(1))] = name
+        for plate in plates:
+            plate['thumbnail'] = plate_thumbnails.get(plate['index'])
+        thumbnails = sorted(name for name in names if THUMBNAIL_RE.match(name))
+        model_objects = _object_count(archive)
+
+    colours = project.get('filament_colour') or [c for c in prusa.get('filament_colour', '').split(';') if c]
+    types = project.get('filament_type') or [t for t in prusa.get('filament_type', '').split(';') if t]
+    by_color = {}
+    for plate in plates:
+        for filament in plate['filaments']:
+            if filament['grams'] is not None:
+                by_color[filament['color']] = round(by_color.get(filament['color'], 0) + filament['grams'], 2)
+    seconds = [plate['print_seconds'] for plate in plates if plate['print_seconds'] is not None]
+    grams = [plate['filament_grams'] for plate in plates if plate['filament_grams'] is not None]
+    sliced_objects = sum(plate['objects'] for plate in plates)
+    application = header.get('Application') or ''
+    if not application and prusa:
+        application = 'PrusaSlicer'
+    printer = (
+        project.get('printer_model') or prusa.get('printer_model')
+        or next((plate['printer'] for plate in plates if plate['printer']), None)
+    )
+    return {
+        'extractor_version': EXTRACTOR_VERSION,
+        'title': header.get('Title') or None,
+        'designer': header.get('Designer') or None,
+        'slicer': application or None,
+        'printer': printer or None,
+        'layer_height': _number(project.get('layer_height') or prusa.get('layer_height')),
+        'sliced': bool(seconds or grams),
+        'plate_count': len(plates) or len(plate_thumbnails) or None,
+        'object_count': sliced_objects or model_objects,
+        'print_seconds': sum(seconds) if seconds else None,
+        'filament_grams': round(sum(grams), 2) if grams else None,
+        'filament_by_color': by_color,
+        'filament_colors': [str(colour).upper() for colour in colours],
+        'filament_types': [str(kind) for kind in types],
+        'plates': plates,
+        'thumbnails': thumbnails,
+    }
+
+
+def read_thumbnail(path: Path, plate: int | None = None) -> bytes | None:
+    """PNG bytes for a plate (or the first embedded thumbnail), if any."""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            names = archive.namelist()
+            if plate is not None:
+                candidates = [f'Metadata/plate_{plate}.png']
+            else:
+                candidates = sorted(name for name in names if THUMBNAIL_RE.match(name))
+            for name in candidates:
+                data = _read(archive, name, THUMBNAIL_MAX_BYTES)
+                if data:
+                    return data
+    except (OSError, zipfile.BadZipFile):
+        return None
+    return None
+
+
+def index_file(path: Path, rel_path: str, category: str, product_folder: str) -> dict | None:
+    """Hash, extract (unless cached by hash) and record one file; returns its metadata."""
+    try:
+        stat = path.stat()
+        sha256 = file_sha256(path)
+    except OSError:
+        return None
+    meta = db.fetch_print_file_meta(sha256)
+    if meta and meta['extractor_version'] >= EXTRACTOR_VERSION:
+        with _lock:
+            _stats['cached'] += 1
+    else:
+        try:
+            meta = extract(path)
+            error = None
+        except ValueError as exc:
+            meta, error = None, str(exc)
+        db.save_print_file_meta(sha256, stat.st_size, meta, error)
+        with _lock:
+            _stats['extracted' if error is None else 'failed'] += 1
+    db.upsert_print_file({
+        'rel_path': rel_path,
+        'category': category,
+        'product_folder': product_folder,
+        'file_name': path.name,
+        'file_size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': sha256,
+    })
+    return meta
+
+
+def _run(key, path, rel_path, category, product_folder):
+    try:
+        index_file(path, rel_path, category, product_folder)
+    except Exception as exc:  # Retried by the next catalogue sync
+        print(f'3MF metadata extraction failed for {rel_path}: {exc}')
+        with _lock:
+            _stats['failed'] += 1
+    finally:
+        with _lock:
+            _pending.pop(key, None)
+
+
+def schedule(path: Path, rel_path: str, category: str, product_folder: str):
+    """Index a file in the background (no-op if it is already queued)."""
+    global _executor
+    with _lock:
+        if rel_path in _pending:
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=THREEMF_WORKERS, thread_name_prefix='threemf')
+        _pending[rel_path] = _executor.submit(_run, rel_path, path, rel_path, category, product_folder)
+
+
+def stats() -> dict:
+    with _lock:
+        return {'pending': len(_pending), 'workers': THREEMF_WORKERS, **_stats}
@@ -0,0 +1,243 @@
+"""Resized image derivatives for media galleries.
+
+Derivatives are generated on demand in a small background pool and stored in
+a content-addressed cache (key = source path + mtime + size + width + format),
+so editing a source image naturally invalidates its thumbnails. The cache is
+trimmed to a disk budget by evicting the least recently used files.
+"""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps
+except ModuleNotFoundError:  # Optional; originals are served without Pillow
+    Image = None
+    ImageOps = None
+
+BASE_DIR = Path(__file__).resolve().parent
+THUMB_CACHE_DIR = Path(os.environ.get('THUMB_CACHE_DIR', BASE_DIR / '.cache' / 'thumbs')).resolve()
+THUMB_CACHE_MAX_BYTES = int(os.environ.get('THUMB_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+THUMB_WORKERS = max(int(os.environ.get('THUMB_WORKERS', '2')), 1)
+THUMB_WAIT_SECONDS = float(os.environ.get('THUMB_WAIT_SECONDS', '20'))
+NAMED_SIZES = {'thumb': 256, 'grid': 512, 'preview': 1024}
+ALLOWED_WIDTHS = frozenset(NAMED_SIZES.values()) | {128, 1600}
+SOURCE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.webp', '.tiff'})
+FORMATS = {'webp': ('WEBP', 'image/webp'), 'jpeg': ('JPEG', 'image/jpeg')}
+
+_lock = threading.Lock()
+_executor = None
+_pending = {}
+_cache_bytes = None
+_stats = {'hits': 0, 'generated': 0, 'failed': 0, 'evicted': 0}
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def supports(path: Path) -> bool:
+    return available() and path.suffix.lower() in SOURCE_EXTENSIONS
+
+
+def resolve_width(size: str | None, width: str | None) -> int | None:
+    """Map ``?size=grid`` or ``?w=512`` to an allowed width (None if invalid)."""
+    if size:
+        return NAMED_SIZES.get(size)
+    if width and width.isdigit() and int(width) in ALLOWED_WIDTHS:
+        return int(width)
+    return None
+
+
+def choose_format(requested: str | None, accept_header: str | None) -> str:
+    if requested in FORMATS:
+        return requested
+    if accept_header and 'image/webp' in accept_header:
+        return 'webp'
+    return 'jpeg'
+
+
+def mime_for(fmt: str) -> str:
+    return FORMATS[fmt][1]
+
+
+def cache_path(source: Path, stat: os.stat_result, width: int, fmt: str) -> Path:
+    key = hashlib.sha256(
+        f'{source}\0{stat.st_mtime_ns}\0{stat.st_size}\0{width}\0{fmt}'.encode('utf-8')
+    ).hexdigest()
+    return THUMB_CACHE_DIR / key[:2] / f'{key}.{fmt}'
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=THUMB_WORKERS, thread_name_prefix='thumbs')
+        return _executor
+
+
+def _render(source: Path, target: Path, width: int, fmt: str) -> Path:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f'.{target.name}.{threading.get_ident()}.tmp')
+    try:
+        with Image.open(source) as image:
+            image.draft('RGB', (width, width))
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+            mode = 'RGBA' if has_alpha and fmt == 'webp' else 'RGB'
+            if image.mode != mode:
+                image = image.convert(mode)
+            if image.width > width:
+                height = max(round(image.height * width / image.width), 1)
+                image = image.resize((width, height), Image.LANCZOS)
+            image.save(tmp_path, FORMATS[fmt][0], quality=80)
+        os.replace(tmp_path, target)
+    finally:
+        # evict() skips dot-files, so a partial write would never be removed.
+        try:
+            tmp_path.unlink()
+        except FileNotFoundError:
+            pass
+    _account(target.stat().st_size)
+    return target
+
+
+def _generate(source: Path, target: Path, width: int, fmt: str) -> Path | None:
+    try:
+        result = _render(source, target, width, fmt)
+        with _lock:
+            _stats['generated'] += 1
+        return result
+    except Exception:
+        with _lock:
+            _stats['failed'] += 1
+        return None
+    finally:
+        with _lock:
+            _pending.pop(target, None)
+
+
+def _schedule(source: Path, width: int, fmt: str):
+    """Return ``(cached_path, None)`` on a hit or ``(None, future)`` otherwise."""
+    try:
+        stat = source.stat()
+    except OSError:
+        return None, None
+    target = cache_path(source, stat, width, fmt)
+    try:
+        cached = target.stat()
+    except OSError:
+        cached = None
+    if cached is not None:
+        # Mark the use in atime for evict(); mtime feeds the response ETag.
+        try:
+            os.utime(target, ns=(time.time_ns(), cached.st_mtime_ns))
+        except OSError:
+            pass
+        with _lock:
+            _stats['hits'] += 1
+        return target, None
+    executor = _get_executor()
+    with _lock:
+        future = _pending.get(target)
+        if future is None:
+            future = executor.submit(_generate, source, target, width, fmt)
+            _pending[target] = future
+    return None, future
+
+
+def get(source: Path, width: int, fmt: str) -> Path | None:
+    """Return the cached derivative, generating it if needed.
+
+    Returns None when Pillow is unavailable, the source cannot be decoded or
+    generation takes longer than THUMB_WAIT_SECONDS; callers then fall back to
+    the original file.
+    """
+    if not supports(source):
+        return None
+    cached, future = _schedule(source, width, fmt)
+    if cached or future is None:
+        return cached
+    try:
+        return future.result(timeout=THUMB_WAIT_SECONDS)
+    except FutureTimeoutError:
+        return None
+
+
+def prefetch(source: Path, widths=(NAMED_SIZES['grid'],), formats=('webp',)):
+    """Queue derivatives in the background (e.g. right after an upload)."""
+    if not supports(source):
+        return
+    for width in widths:
+        for fmt in formats:
+            _schedule(source, width, fmt)
+
+
+def _scan_cache_bytes() -> int:
+    total = 0
+    if THUMB_CACHE_DIR.exists():
+        for entry in THUMB_CACHE_DIR.rglob('*'):
+            # Same entries as evict(): in-progress dot temp files are not cache.
+            if entry.is_file() and not entry.name.startswith('.'):
+                total += entry.stat().st_size
+    return total
+
+
+def _account(added: int):
+    global _cache_bytes
+    with _lock:
+        if _cache_bytes is None:
+            _cache_bytes = _scan_cache_bytes()
+        else:
+            _cache_bytes += added
+        over_budget = _cache_bytes > THUMB_CACHE_MAX_BYTES
+    if over_budget:
+        evict()
+
+
+def evict(max_bytes: int | None = None) -> int:
+    """Delete least recently used derivatives until under ``max_bytes``."""
+    global _cache_bytes
+    budget = THUMB_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    # Trim to 90% of the budget so a full cache does not evict on every write.
+    target_bytes = int(budget * 0.9)
+    entries = []
+    total = 0
+    if THUMB_CACHE_DIR.exists():
+        for entry in THUMB_CACHE_DIR.rglob('*'):
+            if not entry.is_file() or entry.name.startswith('.'):
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_atime, stat.st_size, entry))
+            total += stat.st_size
+    removed = 0
+    if total > budget:
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= target_bytes:
+                break
+            try:
+                entry.unlink()
+            except FileNotFoundError:
+                continue
+            total -= size
+            removed += 1
+    with _lock:
+        _cache_bytes = total
+        _stats['evicted'] += removed
+    return removed
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            'available': available(),
+            'cache_dir': str(THUMB_CACHE_DIR),
+            'cache_bytes': _cache_bytes,
+            'max_bytes': THUMB_CACHE_MAX_BYTES,
+            'pending': len(_pending),
+            **_stats,
+        }
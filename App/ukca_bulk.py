@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""Generate UKCA packs (README, declaration, risk assessment, EN71 pack).
+
+Templates from ``UKCA_SHARED_DIR`` are compiled once into literal/placeholder
+parts (recompiled only when a template file changes), packs are rendered and
+written to each product's ``UKCA`` folder in a worker pool, and all
+``ukca_documents`` rows plus ``products.ukca`` are saved in one transaction.
+``/api/ukca_create`` uses the same code for a single product and
+``/api/ukca_bulk`` for many. From the command line:
+
+    DATABASE_URL=postgresql://... python3 App/ukca_bulk.py --category "Toys & Games" --ukca No --dry-run
+    DATABASE_URL=postgresql://... python3 App/ukca_bulk.py --status-csv Products/ukca_status.csv --tester "A N Other"
+"""
+import argparse
+import csv
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+from pathlib import Path
+
+import db
+
+BASE_DIR = Path(__file__).resolve().parent
+ROOT_DIR = BASE_DIR.parent
+PRODUCTS_DIR = Path(os.environ.get('PRODUCTS_DIR', ROOT_DIR / 'Products')).resolve()
+CATEGORIES_DIR = PRODUCTS_DIR / 'Categories'
+ARCHIVE_DIR = CATEGORIES_DIR / '_Archive'
+DRAFT_DIR = CATEGORIES_DIR / '_Draft'
+UKCA_SHARED_DIR = PRODUCTS_DIR / 'UKCA_Shared'
+UKCA_WORKERS = max(int(os.environ.get('UKCA_WORKERS', str(min(os.cpu_count() or 1, 8)))), 1)
+
+UKCA_FILES = {
+    'readme': 'UKCA/README.md',
+    'declaration': 'UKCA/Declarations/UKCA_Declaration_of_Conformity.md',
+    'risk_assessment': 'UKCA/Risk_Assessment/Risk_Assessment.md',
+    'en71': 'UKCA/EN71-1_Compliance_Pack.md',
+}
+UKCA_SUBDIRS = ('UKCA/Declarations', 'UKCA/Risk_Assessment', 'UKCA/Evidence', 'UKCA/Labels')
+TEMPLATE_FILES = {
+    'readme': 'UKCA_README_TEMPLATE.md',
+    'declaration': 'UKCA_Declaration_TEMPLATE.md',
+    'risk_assessment': 'UKCA_Risk_Assessment_TEMPLATE.md',
+    'en71': 'EN71-1_Compliance_Pack_TEMPLATE.md',
+}
+# Request/CLI field -> template placeholder, with the defaults used when blank.
+FIELDS = {
+    'product_name': 'PRODUCT_NAME',
+    'sku': 'SKU',
+    'materials': 'MATERIALS',
+    'intended_age': 'INTENDED_AGE',
+    'manufacturer': 'MANUFACTURER',
+    'address': 'ADDRESS',
+    'tester': 'TESTER',
+    'test_date': 'TEST_DATE',
+    'notes': 'NOTES',
+}
+DEFAULTS = {
+    'MATERIALS': 'PLA / PETG',
+    'INTENDED_AGE': '3+',
+    'MANUFACTURER': 'GeekyThingsUK',
+    'ADDRESS': 'United Kingdom',
+    'TESTER': 'Dan Robinson',
+}
+PLACEHOLDER_RE = re.compile(r'\{\{([A-Z0-9_]+)\}\}')
+
+
+class Template:
+    """A template split once into literal text and ``{{KEY}}`` placeholders.
+
+    Unknown placeholders are kept as written, and values are inserted in a
+    single pass (a value containing ``{{KEY}}`` is not expanded again).
+    """
+    __slots__ = ('parts',)
+
+    def __init__(self, source: str):
+        self.parts = PLACEHOLDER_RE.split(source)
+
+    def render(self, values: dict) -> str:
+        out = list(self.parts)
+        for index in range(1, len(out), 2):
+            key = out[index]
+            out[index] = values[key] if key in values else f'{{{{{key}}}}}'
+        return ''.join(out)
+
+
+_template_lock = threading.Lock()
+_template_cache = {}
+
+
+def load_templates(shared_dir: Path = UKCA_SHARED_DIR) -> dict:
+    """Compiled templates by pack key (None where the file is missing)."""
+    templates = {}
+    for key, name in TEMPLATE_FILES.items():
+        path = shared_dir / name
+        try:
+            stat = path.stat()
+        except OSError:
+            templates[key] = None
+            continue
+        cache_key = (str(path), stat.st_mtime_ns, stat.st_size)
+        with _template_lock:
+            template = _template_cache.get(cache_key)
+        if template is None:
+            template = Template(path.read_text(encoding='utf-8'))
+            with _template_lock:
+                _template_cache[cache_key] = template
+        templates[key] = template
+    return templates
+
+
+def product_name(folder_name: str, sku: str) -> str:
+    """``GT-TOY-00044 - Flexi Rex`` -> ``Flexi Rex``."""
+    if sku and folder_name.startswith(sku):
+        rest = folder_name[len(sku):].lstrip(' -')
+        if rest:
+            return rest
+    return folder_name
+
+
+def replacements_for(fields: dict) -> dict:
+    values = {}
+    for field, placeholder in FIELDS.items():
+        values[placeholder] = (str(fields.get(field) or '')).strip() or DEFAULTS.get(placeholder, '')
+    return values
+
+
+def render_pack(templates: dict, values: dict) -> dict:
+    """Rendered documents by pack key; a missing or empty template is skipped."""
+    docs = {}
+    for key in ('readme', 'declaration', 'risk_assessment'):
+        template = templates.get(key)
+        content = template.render(values) if template else ''
+        if content:
+            docs[key] = content
+    en71 = templates.get('en71')
+    if en71 and en71.parts != ['']:
+        docs['en71'] = (
+            f"# {values['PRODUCT_NAME']} (SKU: {values['SKU']})\n\n"
+            f"Material: {values['MATERIALS']}\n\n"
+            f"Intended age: {values['INTENDED_AGE']}\n\n"
+            f"Date tested: {values['TEST_DATE']}\n\n"
+            f"Tester: {values['TESTER']}\n\n"
+            "---\n\n"
+        ) + en71.render({})
+    return docs
+
+
+def write_pack(product_path: Path, docs: dict):
+    for subdir in UKCA_SUBDIRS:
+        (product_path / subdir).mkdir(parents=True, exist_ok=True)
+    for key, content in docs.items():
+        (product_path / UKCA_FILES[key]).write_text(content, encoding='utf-8')
+
+
+def _build(templates: dict, job: dict) -> dict:
+    """Render and write one pack (runs in a pool worker)."""
+    try:
+        docs = render_pack(templates, replacements_for(job['fields']))
+        if not job.get('dry_run'):
+            write_pack(Path(job['product_path']), docs)
+        return {'product_id': job.get('product_id'), 'docs': docs, 'error': None}
+    except OSError as exc:
+        return {'product_id': job.get('product_id'), 'docs': {}, 'error': str(exc)}
+
+
+# Process workers receive the compiled templates once, via the initializer.
+_worker_templates = None
+
+
+def _init_process(templates: dict):
+    global _worker_templates
+    _worker_templates = templates
+
+
+def _build_in_process(job: dict) -> dict:
+    return _build(_worker_templates, job)
+
+
+def generate(jobs: list, templates: dict, workers: int = UKCA_WORKERS, processes: bool = False,
+             dry_run: bool = False) -> dict:
+    """Render, write and save packs for ``jobs``.
+
+    Each job is ``{'product_id', 'product_path', 'fields'}`` (``fields`` as
+    in FIELDS; ``product_id`` may be None for a folder with no product row).
+    Files are written by a thread pool, or with ``processes`` a process
+    pool; the database is updated once, after every file is written.
+    """
+    started = time.perf_counter()
+    jobs = [{**job, 'product_path': str(job['product_path']), 'dry_run': dry_run} for job in jobs]
+    workers = max(min(int(workers), len(jobs)), 1)
+    if workers == 1:
+        results = [_build(templates, job) for job in jobs]
+    elif processes:
+        with ProcessPoolExecutor(workers, mp_context=get_context('spawn'),
+                                 initializer=_init_process, initargs=(templates,)) as pool:
+            results = list(pool.map(_build_in_process, jobs, chunksize=max(len(jobs) // (workers * 4), 1)))
+    else:
+        with ThreadPoolExecutor(workers, thread_name_prefix='ukca') as pool:
+            results = list(pool.map(partial(_build, templates), jobs))
+    rendered = time.perf_counter() - started
+    saved = {'documents': 0, 'products': 0}
+    packs = [result for result in results if not result['error'] and result['product_id'] is not None]
+    if packs and not dry_run:
+        saved = db.save_ukca_packs(packs)
+    seconds = time.perf_counter() - started
+    errors = [
+        {'product_path': job['product_path'], 'error': result['error']}
+        for job, result in zip(jobs, results) if result['error']
+    ]
+    return {
+        'products': len(jobs),
+        'written': len(jobs) - len(errors),
+        'documents': saved['documents'],
+        'updated': saved['products'],
+        'errors': errors,
+        'workers': workers,
+        'pool': 'process' if processes and workers > 1 else 'thread',
+        'render_seconds': round(rendered, 4),
+        'seconds': round(seconds, 4),
+        'packs_per_second': round(len(jobs) / seconds, 1) if seconds else None,
+        'dry_run': dry_run,
+    }
+
+
+def product_path(category: str, folder_name: str, status: str) -> Path:
+    normalized = db.normalize_status(status)
+    if normalized == 'Draft':
+        return DRAFT_DIR / category / folder_name
+    if normalized == 'Archived':
+        return ARCHIVE_DIR / category / folder_name
+    return CATEGORIES_DIR / category / folder_name
+
+
+def jobs_for(products: list, overrides: dict | None = None, resolve=product_path) -> list:
+    """Jobs for ``db.fetch_ukca_candidates`` rows; ``overrides`` fill every pack.
+
+    ``resolve(category, folder, status)`` maps a product to its folder.
+    """
+    overrides = {key: value for key, value in (overrides or {}).items() if key in FIELDS and value}
+    return [
+        {
+            'product_id': row['id'],
+            'product_path': resolve(row['category'], row['product_folder'], row['status']),
+            'fields': {
+                'product_name': product_name(row['product_folder'], row['sku']),
+                'sku': row['sku'],
+                **overrides,
+            },
+        }
+        for row in products
+    ]
+
+
+def incomplete_skus(status_csv: Path) -> list:
+    """``sku_base`` of rows marked Incomplete in a ukca_status.csv export."""
+    with open(status_csv, newline='', encoding='utf-8') as handle:
+        return [
+            row['sku_base'].strip()
+            for row in csv.DictReader(handle)
+            if (row.get('ukca_complete') or '').strip().lower() == 'incomplete' and (row.get('sku_base') or '').strip()
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--category', help='only this category')
+    parser.add_argument('--status', help='only Live, Draft or Archived products')
+    parser.add_argument('--ukca', help='only products with this UKCA value (e.g. No)')
+    parser.add_argument('--sku', action='append', default=[], help='only these SKUs (repeatable)')
+    parser.add_argument('--status-csv', type=Path, help='only SKUs marked Incomplete in this ukca_status.csv')
+    parser.add_argument('--all', action='store_true', help='every product (when no other filter is given)')
+    parser.add_argument('--workers', type=int, default=UKCA_WORKERS)
+    parser.add_argument('--processes', action='store_true', help='use a process pool instead of threads')
+    parser.add_argument('--dry-run', action='store_true', help='render only; write no files or rows')
+    for field in FIELDS:
+        if field not in ('product_name', 'sku'):
+            parser.add_argument(f"--{field.replace('_', '-')}", dest=field, help=f'{FIELDS[field]} for every pack')
+    args = parser.parse_args()
+
+    skus = list(args.sku)
+    if args.status_csv:
+        skus += incomplete_skus(args.status_csv)
+        if not skus:
+            print(f'No Incomplete rows in {args.status_csv}')
+            return
+    if not (args.category or args.ukca or skus or args.all):
+        parser.error('choose products with --category, --ukca, --sku or --status-csv (or pass --all)')
+    db.ensure_schema()
+    products = db.fetch_ukca_candidates(
+        {'category': args.category, 'status': args.status, 'ukca': args.ukca, 'skus': skus}
+    )
+    overrides = {field: getattr(args, field, None) for field in FIELDS}
+    report = generate(jobs_for(products, overrides), load_templates(), args.workers, args.processes, args.dry_run)
+    print(
+        f"{'Rendered' if args.dry_run else 'Generated'} {report['written']}/{report['products']} packs "
+        f"({report['documents']} documents, {report['updated']} products marked UKCA Yes) in {report['seconds']:.2f}s "
+        f"with {report['workers']} {report['pool']} workers: {report['packs_per_second'] or 0} packs/s"
+    )
+    for error in report['errors']:
+        print(f"  {error['product_path']}: {error['error']}")
+
+
+if __name__ == '__main__':
+    main()